@@ -1,11 +1,12 @@
 import os
 import logging
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, abort, render_template, request, jsonify, session, redirect, send_file, url_for
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.utils import secure_filename
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
@@ -28,22 +29,149 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
 }
 db.init_app(app)
 
+# Configure the background analysis worker pool
+app.config["ANALYSIS_WORKERS"] = int(os.environ.get("ANALYSIS_WORKERS", "2"))
+app.config["ANALYSIS_EXECUTOR"] = os.environ.get("ANALYSIS_EXECUTOR", "thread")  # 'thread' or 'process'
+app.config["ANALYSIS_MAX_PENDING"] = int(os.environ.get("ANALYSIS_MAX_PENDING", "16"))
+
+# Configure the report rendering worker pool (PDF layout is CPU-bound, so processes by default)
+app.config["REPORT_WORKERS"] = int(os.environ.get("REPORT_WORKERS", "2"))
+app.config["REPORT_EXECUTOR"] = os.environ.get("REPORT_EXECUTOR", "process")  # 'thread' or 'process'
+app.config["REPORT_MAX_PENDING"] = int(os.environ.get("REPORT_MAX_PENDING", "16"))
+# Rendered PDFs, and the bytes of them kept before the least recently downloaded are deleted
+app.config["REPORTS_DIR"] = os.environ.get("REPORTS_DIR", os.path.join("static", "reports"))
+app.config["REPORTS_MAX_BYTES"] = int(os.environ.get("REPORTS_MAX_BYTES", str(512 * 1024 * 1024)))
+# Seconds after which a pending report no server process is rendering is marked failed
+app.config["REPORT_RENDER_TIMEOUT"] = int(os.environ.get("REPORT_RENDER_TIMEOUT", "600"))
+
+# Configure the server-side analysis result store (the session only keeps the result id)
+app.config["RESULT_STORE_BACKEND"] = os.environ.get("RESULT_STORE_BACKEND", "memory")  # 'memory', 'sqlite' or 'directory'
+app.config["RESULT_STORE_PATH"] = os.environ.get("RESULT_STORE_PATH", os.path.join(app.instance_path, "result_store"))
+app.config["RESULT_STORE_TTL"] = int(os.environ.get("RESULT_STORE_TTL", "86400"))
+app.config["RESULT_STORE_MAX_ITEMS"] = int(os.environ.get("RESULT_STORE_MAX_ITEMS", "1000"))
+app.config["RESULT_STORE_MAX_BYTES"] = int(os.environ.get("RESULT_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Configure the geometry-keyed analysis cache ('none' disables it)
+app.config["ANALYSIS_CACHE_BACKEND"] = os.environ.get("ANALYSIS_CACHE_BACKEND", "sqlite")
+app.config["ANALYSIS_CACHE_PATH"] = os.environ.get("ANALYSIS_CACHE_PATH", os.path.join(app.instance_path, "analysis_cache"))
+app.config["ANALYSIS_CACHE_TTL"] = int(os.environ.get("ANALYSIS_CACHE_TTL", str(7 * 86400)))
+app.config["ANALYSIS_CACHE_MAX_ITEMS"] = int(os.environ.get("ANALYSIS_CACHE_MAX_ITEMS", "5000"))
+app.config["ANALYSIS_CACHE_MAX_BYTES"] = int(os.environ.get("ANALYSIS_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+# Configure tiled analysis of large project areas ('off' analyses a single static map)
+app.config["ANALYSIS_TILING"] = os.environ.get("ANALYSIS_TILING", "on") != "off"
+app.config["ANALYSIS_TILE_RESOLUTION_M"] = float(os.environ.get("ANALYSIS_TILE_RESOLUTION_M", "1.2"))
+app.config["ANALYSIS_MAX_TILES"] = int(os.environ.get("ANALYSIS_MAX_TILES", "32"))
+app.config["ANALYSIS_TILE_WORKERS"] = int(os.environ.get("ANALYSIS_TILE_WORKERS", "4"))
+# Right-of-way width analysed around roads, pipelines and transmission lines ('0' analyses whole tiles)
+app.config["ANALYSIS_CORRIDOR_WIDTH_M"] = float(os.environ.get("ANALYSIS_CORRIDOR_WIDTH_M", "60"))
+
+# Projects shown per page on the /projects listing
+app.config["PROJECTS_PAGE_SIZE"] = int(os.environ.get("PROJECTS_PAGE_SIZE", "50"))
+# Upper bound on projects returned by one /api/projects viewport query
+app.config["PROJECTS_API_LIMIT"] = int(os.environ.get("PROJECTS_API_LIMIT", "200"))
+# Upper bound on projects returned by one /api/projects/nearby query
+app.config["PROJECTS_NEARBY_LIMIT"] = int(os.environ.get("PROJECTS_NEARBY_LIMIT", "20"))
+
 # Add datetime.now function to templates
 @app.context_processor
 def utility_processor():
     return {'now': datetime.now}
 
 # Import utility modules
-from utils.image_processor import preprocess_imagery
-from utils.land_cover import classify_land_cover
-from utils.object_detection import detect_objects
-from utils.report_generator import generate_report
+from utils.analysis_cache import AnalysisCache
+from utils.analysis_pipeline import run_analysis
+from utils.geometry import is_linear_project
+from utils.imagery_client import get_imagery_client
+from utils.job_queue import JobQueue, QueueFullError
+from utils.report_files import collect_report_files, mark_used, report_fingerprint
+from utils.report_generator import REPORT_GENERATOR_VERSION, get_project_dimensions, render_report_file
+from utils.result_store import ResultStore, create_backend
+from utils.tile_cache import get_tile_cache
+
+_result_store_path = app.config["RESULT_STORE_PATH"]
+if app.config["RESULT_STORE_BACKEND"] == "sqlite":
+    _result_store_path += ".sqlite"
+result_store = ResultStore(create_backend(
+    app.config["RESULT_STORE_BACKEND"],
+    path=_result_store_path,
+    ttl=app.config["RESULT_STORE_TTL"],
+    max_items=app.config["RESULT_STORE_MAX_ITEMS"],
+    max_bytes=app.config["RESULT_STORE_MAX_BYTES"]
+))
+
+analysis_cache = None
+if app.config["ANALYSIS_CACHE_BACKEND"] != "none":
+    _analysis_cache_path = app.config["ANALYSIS_CACHE_PATH"]
+    if app.config["ANALYSIS_CACHE_BACKEND"] == "sqlite":
+        _analysis_cache_path += ".sqlite"
+    analysis_cache = AnalysisCache(create_backend(
+        app.config["ANALYSIS_CACHE_BACKEND"],
+        path=_analysis_cache_path,
+        ttl=app.config["ANALYSIS_CACHE_TTL"],
+        max_items=app.config["ANALYSIS_CACHE_MAX_ITEMS"],
+        max_bytes=app.config["ANALYSIS_CACHE_MAX_BYTES"]
+    ))
+
+analysis_tiling = None
+if app.config["ANALYSIS_TILING"]:
+    analysis_tiling = {
+        'target_resolution_m': app.config["ANALYSIS_TILE_RESOLUTION_M"],
+        'max_tiles': app.config["ANALYSIS_MAX_TILES"],
+        'workers': app.config["ANALYSIS_TILE_WORKERS"]
+    }
+
+def _analysis_tiling(project_type):
+    # Linear projects are open alignments, sampled along a buffered corridor when a width is set
+    if analysis_tiling is None or not is_linear_project(project_type):
+        return analysis_tiling
+    tiling = {**analysis_tiling, 'closed': False}
+    if app.config["ANALYSIS_CORRIDOR_WIDTH_M"] > 0:
+        tiling['corridor_m'] = app.config["ANALYSIS_CORRIDOR_WIDTH_M"]
+    return tiling
+
+def _store_analysis_output(output):
+    # Runs in the web process when a job finishes, so the job record only keeps the result id
+    return {
+        'result_id': result_store.put(output['results']),
+        'timings': output['timings'],
+        'cache': output.get('cache')
+    }
+
+analysis_jobs = JobQueue(
+    max_workers=app.config["ANALYSIS_WORKERS"],
+    max_pending=app.config["ANALYSIS_MAX_PENDING"],
+    executor=app.config["ANALYSIS_EXECUTOR"],
+    result_handler=_store_analysis_output
+)
+
+def _store_report_output(output):
+    # Runs in the web process when a render job finishes: marks the report ready
+    with app.app_context():
+        report = db.session.get(models.Report, output['report_id'])
+        if report is None:
+            raise LookupError(f"Report {output['report_id']} no longer exists")
+        report.set_encoded_results(output['summary'], output['results_blob'])
+        report.status = 'ready'
+        db.session.commit()
+    collect_report_files(app.config["REPORTS_DIR"], app.config["REPORTS_MAX_BYTES"], keep=[output['file_path']])
+    return {'report_id': output['report_id'], 'bytes': output['bytes'],
+            'render_seconds': output['render_seconds']}
+
+report_jobs = JobQueue(
+    max_workers=app.config["REPORT_WORKERS"],
+    max_pending=app.config["REPORT_MAX_PENDING"],
+    executor=app.config["REPORT_EXECUTOR"],
+    result_handler=_store_report_output
+)
 
 # Import models
 import models
+import migrations
 
 with app.app_context():
     db.create_all()
+    migrations.upgrade()
 
 # Routes
 @app.route('/')
@@ -52,11 +180,79 @@ def index():
     google_maps_api_key = os.environ.get('GOOGLE_MAPS_API_KEY', '')
     return render_template('index.html', google_maps_api_key=google_maps_api_key)
 
+def _encode_cursor(cursor):
+    created_at, project_id = cursor
+    return f"{created_at.isoformat()}_{project_id}"
+
+def _decode_cursor(value):
+    # Returns (created_at, id) or None; raises ValueError for a malformed cursor
+    if not value:
+        return None
+    created_at, _, project_id = value.rpartition('_')
+    return datetime.fromisoformat(created_at), int(project_id)
+
 @app.route('/projects')
 def list_projects():
-    # Retrieve all projects from the database
-    projects = models.Project.query.order_by(models.Project.created_at.desc()).all()
-    return render_template('projects.html', projects=projects)
+    # One page of projects with their report counts, newest first (keyset pagination)
+    try:
+        before = _decode_cursor(request.args.get('before'))
+    except ValueError:
+        abort(400)
+    projects, next_cursor = models.project_listing_page(limit=app.config["PROJECTS_PAGE_SIZE"], before=before)
+    return render_template('projects.html', projects=projects,
+                           next_cursor=_encode_cursor(next_cursor) if next_cursor else None,
+                           is_first_page=before is None)
+
+def _parse_bbox(value):
+    # 'west,south,east,north' in degrees; west > east crosses the antimeridian
+    west, south, east, north = (float(part) for part in value.split(','))
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+        raise ValueError(f"Invalid bbox: {value}")
+    return {'north': north, 'south': south, 'east': east, 'west': west}
+
+def _project_json(project):
+    # A project as listed by the map APIs
+    return {
+        'id': project.id,
+        'name': project.name,
+        'project_type': project.project_type,
+        'centroid': [project.centroid_lat, project.centroid_lng],
+        'area_sqkm': project.area_sqkm,
+        'coordinates': project.coordinates,
+        'url': url_for('view_project', project_id=project.id)
+    }
+
+@app.route('/api/projects')
+def api_projects():
+    # Projects whose geometry touches a map viewport, newest first
+    try:
+        bounds = _parse_bbox(request.args.get('bbox', ''))
+        limit = min(int(request.args.get('limit', app.config["PROJECTS_API_LIMIT"])), app.config["PROJECTS_API_LIMIT"])
+    except ValueError:
+        return jsonify({'error': "bbox must be 'west,south,east,north' in degrees"}), 400
+    projects, truncated = models.projects_in_bounds(bounds, limit=max(limit, 1))
+    return jsonify({
+        'projects': [_project_json(project) for project in projects],
+        'truncated': truncated
+    })
+
+@app.route('/api/projects/nearby')
+def api_projects_nearby():
+    # The projects closest to a point, nearest first, optionally within a radius
+    try:
+        lat, lng = float(request.args['lat']), float(request.args['lng'])
+        radius_m = float(request.args['radius_m']) if 'radius_m' in request.args else None
+        limit = min(int(request.args.get('limit', app.config["PROJECTS_NEARBY_LIMIT"])),
+                    app.config["PROJECTS_NEARBY_LIMIT"])
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180) or (radius_m is not None and radius_m < 0):
+            raise ValueError(f"Invalid point or radius: {lat}, {lng}, {radius_m}")
+    except (KeyError, ValueError):
+        return jsonify({'error': "lat and lng must be degrees and radius_m a distance in metres"}), 400
+    nearby, truncated = models.projects_near([lat, lng], radius_m=radius_m, limit=max(limit, 1))
+    return jsonify({
+        'projects': [{**_project_json(project), 'distance_m': round(distance, 1)} for project, distance in nearby],
+        'truncated': truncated
+    })
 
 @app.route('/project/<int:project_id>')
 def view_project(project_id):
@@ -74,7 +270,7 @@ def view_project(project_id):
                           coordinates=coordinates,
                           google_maps_api_key=google_maps_api_key)
 
-@app.route('/project/<int:project_id>/analyze')
+@app.route('/project/<int:project_id>/analyze', methods=['POST'])
 def reanalyze_project(project_id):
     # Retrieve the project from the database
     project = models.Project.query.get_or_404(project_id)
@@ -90,35 +286,30 @@ def reanalyze_project(project_id):
         'coordinates': coordinates
     }
     
-    # Mock the analysis process in this simplified version
-    # In a real application, these would use actual imagery and AI models
-    imagery_data = preprocess_imagery(coordinates)
-    land_cover_results = classify_land_cover(imagery_data)
-    objects_detected = detect_objects(imagery_data)
-    
-    # Combine results for client
-    analysis_results = {
-        'land_cover': land_cover_results,
-        'objects': objects_detected,
-        'terrain': {
-            'type': 'Mostly flat with slight undulation',
-            'confidence': 0.85
-        },
-        'vegetation': {
-            'density': 'Moderate',
-            'types': ['Trees', 'Shrubs'],
-            'confidence': 0.78
-        },
-        'water_bodies': ['Small stream detected', 'Potential seasonal drainage'],
-        'access_roads': ['Primary access from north', 'Secondary dirt track from east'],
-        'constraints': ['Stream crossing required', 'Dense vegetation in southern section']
-    }
+    # Queue the analysis on the worker pool, as /analyze does; the client polls
+    # /jobs/<id> and then opens the report page
+    try:
+        job_id = analysis_jobs.submit(run_analysis, coordinates, analysis_cache,
+                                      _analysis_tiling(project.project_type),
+                                      closed=not is_linear_project(project.project_type))
+    except QueueFullError as e:
+        logger.warning(f"Analysis queue full: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'The analysis queue is full. Please try again shortly.'
+        }), 503
     
-    # Store analysis results in session
-    session['analysis_results'] = analysis_results
+    session['analysis_job_id'] = job_id
+    session.pop('analysis_result_id', None)
     
-    # Redirect to the report generation page
-    return redirect(url_for('generate_report_route'))
+    return jsonify({
+        'success': True,
+        'message': 'Analysis queued',
+        'job_id': job_id,
+        'project_id': project.id,
+        'status_url': url_for('job_status', job_id=job_id),
+        'report_url': url_for('generate_report_route')
+    }), 202
 
 @app.route('/project/<int:project_id>/reports')
 def project_reports(project_id):
@@ -138,8 +329,8 @@ def view_report(report_id):
     # Retrieve the project for this report
     project = models.Project.query.get_or_404(report.project_id)
     
-    # Load analysis results from the JSON string
-    analysis_results = json.loads(report.analysis_results_json)
+    # Stored analysis results; blob sections are only decoded when the template reads them
+    analysis_results = report.analysis_results
     
     # Parse project coordinates
     project_details = {
@@ -149,7 +340,8 @@ def view_report(report_id):
         'coordinates': json.loads(project.coordinates_json)
     }
     
-    return render_template('report.html', project=project_details, results=analysis_results)
+    return render_template('report.html', project=project_details, results=analysis_results,
+                          dimensions=get_project_dimensions(project_details))
 
 @app.route('/analyze', methods=['POST'])
 def analyze():
@@ -170,9 +362,9 @@ def analyze():
         # Create a new project in the database
         new_project = models.Project(
             name=project_name,
-            project_type=project_type,
-            coordinates_json=json.dumps(area_coordinates)
+            project_type=project_type
         )
+        new_project.set_coordinates(area_coordinates)
         db.session.add(new_project)
         db.session.commit()
         
@@ -184,38 +376,28 @@ def analyze():
             'coordinates': area_coordinates
         }
         
-        # Mock the analysis process in this simplified version
-        # In a real application, these would use actual imagery and AI models
-        imagery_data = preprocess_imagery(area_coordinates)
-        land_cover_results = classify_land_cover(imagery_data)
-        objects_detected = detect_objects(imagery_data)
-        
-        # Combine results for client
-        analysis_results = {
-            'land_cover': land_cover_results,
-            'objects': objects_detected,
-            'terrain': {
-                'type': 'Mostly flat with slight undulation',
-                'confidence': 0.85
-            },
-            'vegetation': {
-                'density': 'Moderate',
-                'types': ['Trees', 'Shrubs'],
-                'confidence': 0.78
-            },
-            'water_bodies': ['Small stream detected', 'Potential seasonal drainage'],
-            'access_roads': ['Primary access from north', 'Secondary dirt track from east'],
-            'constraints': ['Stream crossing required', 'Dense vegetation in southern section']
-        }
+        # Queue the analysis on the worker pool; the client polls /jobs/<id>
+        try:
+            job_id = analysis_jobs.submit(run_analysis, area_coordinates, analysis_cache,
+                                          _analysis_tiling(project_type),
+                                          closed=not is_linear_project(project_type))
+        except QueueFullError as e:
+            logger.warning(f"Analysis queue full: {str(e)}")
+            return jsonify({
+                'success': False,
+                'error': 'The analysis queue is full. Please try again shortly.'
+            }), 503
         
-        # Store analysis results in session
-        session['analysis_results'] = analysis_results
+        session['analysis_job_id'] = job_id
+        session.pop('analysis_result_id', None)
         
         return jsonify({
             'success': True,
-            'message': 'Analysis completed successfully',
-            'results': analysis_results
-        })
+            'message': 'Analysis queued',
+            'job_id': job_id,
+            'project_id': new_project.id,
+            'status_url': url_for('job_status', job_id=job_id)
+        }), 202
     
     except Exception as e:
         logger.error(f"Error in analysis: {str(e)}")
@@ -224,11 +406,55 @@ def analyze():
             'error': str(e)
         }), 500
 
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    response = {
+        'success': True,
+        'job_id': job_id,
+        'status': job['status'],
+        'timings': {}
+    }
+    if 'queued_seconds' in job:
+        response['timings']['queued'] = round(job['queued_seconds'], 4)
+    
+    if job['status'] == 'completed':
+        output = job['result']
+        analysis_results = result_store.get(output['result_id'])
+        if analysis_results is None:
+            return jsonify({'success': False, 'error': 'Analysis results have expired'}), 410
+        response['timings'].update(output['timings'])
+        response['cache'] = output.get('cache')
+        response['results'] = analysis_results
+        
+        # Point the session at the stored results once the owning client collects them
+        if session.get('analysis_job_id') == job_id:
+            session['analysis_result_id'] = output['result_id']
+    elif job['status'] == 'failed':
+        response['error'] = job['error']
+    
+    return jsonify(response)
+
+@app.route('/metrics')
+def metrics():
+    # Per-process counters for the background pipeline
+    tile_cache = get_tile_cache()
+    return jsonify({
+        'analysis_jobs': analysis_jobs.stats(),
+        'report_jobs': report_jobs.stats(),
+        'analysis_cache': analysis_cache.stats() if analysis_cache is not None else None,
+        'imagery_client': get_imagery_client().metrics(),
+        'tile_cache': tile_cache.stats() if tile_cache is not None else None
+    })
+
 @app.route('/generate-report', methods=['GET'])
 def generate_report_route():
     try:
-        # Get analysis results and project details from session
-        analysis_results = session.get('analysis_results')
+        # Resolve the stored analysis results and project details from the session
+        analysis_results = result_store.get(session.get('analysis_result_id'))
         project_details = session.get('project_details')
         
         if not analysis_results or not project_details:
@@ -238,7 +464,8 @@ def generate_report_route():
         # Here we'll just pass the data to the template
         return render_template('report.html', 
                               project=project_details,
-                              results=analysis_results)
+                              results=analysis_results,
+                              dimensions=get_project_dimensions(project_details))
     
     except Exception as e:
         logger.error(f"Error generating report: {str(e)}")
@@ -247,47 +474,71 @@ def generate_report_route():
 @app.route('/download-report', methods=['POST'])
 def download_report():
     try:
-        # Get analysis results and project details from session
-        analysis_results = session.get('analysis_results')
+        # Resolve the stored analysis results and project details from the session
+        analysis_results_json = result_store.get_json(session.get('analysis_result_id'))
         project_details = session.get('project_details')
         
-        if not analysis_results or not project_details:
+        if not analysis_results_json or not project_details:
             return jsonify({'error': 'No analysis data found'}), 404
             
         project_id = project_details.get('id')
         if not project_id:
             return jsonify({'error': 'Invalid project data'}), 400
         
-        # Generate PDF report (this is a placeholder in this simplified version)
-        pdf_data = generate_report(project_details, analysis_results)
+        # Reports are addressed by content: an identical request reuses the rendered file
+        content_hash = report_fingerprint(project_details, analysis_results_json, REPORT_GENERATOR_VERSION)
+        report = (models.Report.query
+                  .filter_by(project_id=project_id, content_hash=content_hash)
+                  .order_by(models.Report.id.desc())
+                  .first())
+        if report is not None and report.status == 'ready' and os.path.exists(report.file_path):
+            return jsonify({
+                'success': True,
+                'message': 'Report already generated',
+                'report_id': report.id,
+                'status': 'ready',
+                'download_url': url_for('download_report_file', report_id=report.id)
+            })
+        if report is not None and report.status == 'pending':
+            return jsonify({
+                'success': True,
+                'message': 'Report already queued',
+                'report_id': report.id,
+                'status_url': url_for('report_status', report_id=report.id)
+            }), 202
         
-        # Create reports directory if it doesn't exist
-        reports_dir = os.path.join('static', 'reports')
-        os.makedirs(reports_dir, exist_ok=True)
+        # Record the report as pending (again, if its render failed or its file was collected);
+        # the worker pool renders the PDF and fills in the results
+        if report is None:
+            file_path = os.path.join(app.config["REPORTS_DIR"], f"project_{project_id}_report_{content_hash[:16]}.pdf")
+            report = models.Report(project_id=project_id, file_path=file_path, content_hash=content_hash)
+            db.session.add(report)
+        report.status = 'pending'
+        report.generated_at = datetime.utcnow()
+        db.session.commit()
         
-        # Create a filename for the report
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        filename = f"project_{project_id}_report_{timestamp}.pdf" # Changed to .pdf
-        file_path = os.path.join(reports_dir, filename)
+        try:
+            job_id = report_jobs.submit(render_report_file, report.id, project_details,
+                                        analysis_results_json, os.path.abspath(report.file_path),
+                                        analysis_cache)
+        except QueueFullError as e:
+            logger.warning(f"Report queue full: {str(e)}")
+            report.status = 'failed'
+            db.session.commit()
+            return jsonify({
+                'success': False,
+                'error': 'The report queue is full. Please try again shortly.'
+            }), 503
         
-        # Save the report to a file (now a PDF)
-        with open(file_path, 'wb') as f: # Changed to 'wb' for binary writing
-            f.write(pdf_data)
-            
-        # Save the report in the database
-        new_report = models.Report(
-            project_id=project_id,
-            file_path=file_path, # This now reflects the .pdf path
-            analysis_results_json=json.dumps(analysis_results) # Keep storing full analysis data
-        )
-        db.session.add(new_report)
+        report.job_id = job_id
         db.session.commit()
         
         return jsonify({
             'success': True,
-            'message': 'Report generated successfully',
-            'download_url': f"/static/reports/{filename}"
-        })
+            'message': 'Report queued',
+            'report_id': report.id,
+            'status_url': url_for('report_status', report_id=report.id)
+        }), 202
     
     except Exception as e:
         logger.error(f"Error downloading report: {str(e)}")
@@ -296,5 +547,60 @@ def download_report():
             'error': str(e)
         }), 500
 
+@app.route('/reports/<int:report_id>/status')
+def report_status(report_id):
+    report = db.session.get(models.Report, report_id)
+    if report is None:
+        return jsonify({'success': False, 'error': 'Report not found'}), 404
+    
+    job = report_jobs.get(report.job_id) if report.job_id else None
+    response = {'success': True, 'report_id': report.id, 'status': report.status or 'ready', 'timings': {}}
+    if job is not None and 'queued_seconds' in job:
+        response['timings']['queued'] = round(job['queued_seconds'], 4)
+    
+    if report.status == 'pending':
+        # The owning server process updates the row; only it knows about failures
+        if job is not None and job['status'] in ('failed', 'cancelled'):
+            report.status = 'failed'
+            db.session.commit()
+            response['status'] = 'failed'
+            response['error'] = job['error'] or 'Report rendering was cancelled'
+        elif job is None and report.generated_at < datetime.utcnow() - timedelta(
+                seconds=app.config["REPORT_RENDER_TIMEOUT"]):
+            report.status = 'failed'
+            db.session.commit()
+            response['status'] = 'failed'
+            response['error'] = 'Report rendering was interrupted'
+        elif job is not None and job['status'] != 'completed':
+            response['status'] = job['status']
+    
+    if response['status'] == 'ready' and not (report.file_path and os.path.exists(report.file_path)):
+        response['status'] = 'expired'
+        response['error'] = 'The report file was removed to free space; generate the report again'
+    elif response['status'] == 'ready':
+        response['download_url'] = url_for('download_report_file', report_id=report.id)
+        if job is not None and job['result']:
+            response['timings']['render'] = job['result']['render_seconds']
+            response['bytes'] = job['result']['bytes']
+    
+    return jsonify(response)
+
+@app.route('/reports/<int:report_id>/download')
+def download_report_file(report_id):
+    report = models.Report.query.get_or_404(report_id)
+    if not report.is_ready or not report.file_path:
+        abort(404)
+    file_path = os.path.abspath(report.file_path)
+    if not os.path.exists(file_path):
+        abort(410)
+    mark_used(file_path)
+    
+    # Streamed from disk in chunks; the content hash doubles as the ETag for conditional requests
+    project = db.session.get(models.Project, report.project_id)
+    name = secure_filename(project.name) if project is not None else ''
+    return send_file(file_path, mimetype='application/pdf', as_attachment=True,
+                     download_name=f"{name or 'project'}_report_{report.id}.pdf",
+                     etag=report.content_hash or True, conditional=True)
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
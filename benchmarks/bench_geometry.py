@@ -0,0 +1,68 @@
+"""
+Throughput of the vectorized geometry engine (utils.geometry).
+
+Run from the repository root:
+    python -m benchmarks.bench_geometry
+"""
+import time
+
+import numpy as np
+
+from utils.geometry import batch_measure, measure, pack_ragged
+
+
+def _loop_area(coordinates):
+    # The previous per-vertex Python implementation of calculate_area, for comparison
+    area = 0.0
+    n = len(coordinates)
+    for i in range(n):
+        j = (i + 1) % n
+        R = 6371.0
+        lat1_rad = np.radians(coordinates[i][0])
+        lon1_rad = np.radians(coordinates[i][1])
+        lat2_rad = np.radians(coordinates[j][0])
+        lon2_rad = np.radians(coordinates[j][1])
+        x1 = R * lon1_rad * np.cos((lat1_rad + lat2_rad) / 2)
+        y1 = R * lat1_rad
+        x2 = R * lon2_rad * np.cos((lat1_rad + lat2_rad) / 2)
+        y2 = R * lat2_rad
+        area += (x1 * y2 - x2 * y1)
+    return abs(area / 2.0)
+
+
+def _best_of(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _ring(count, center, radius, rng):
+    angles = np.sort(rng.uniform(0, 2 * np.pi, count))
+    return np.column_stack([center[0] + radius * np.sin(angles), center[1] + radius * np.cos(angles)])
+
+
+def main():
+    rng = np.random.default_rng(0)
+
+    polygon = _ring(10_000, (20.0, 78.0), 0.5, rng)
+    polygon_list = polygon.tolist()
+    vectorized = _best_of(lambda: measure(polygon))
+    looped = _best_of(lambda: _loop_area(polygon_list), repeat=2)
+    print(f"10k-vertex polygon: measure() {vectorized * 1e3:.2f} ms "
+          f"({len(polygon) / vectorized / 1e6:.1f} M vertices/s); "
+          f"previous loop area only {looped * 1e3:.1f} ms ({looped / vectorized:.0f}x slower)")
+
+    counts = rng.integers(4, 9, size=100_000)
+    centers = rng.uniform(-60, 60, size=(len(counts), 2))
+    geometries = [_ring(c, centers[i], 0.01, rng) for i, c in enumerate(counts)]
+    points, offsets = pack_ragged(geometries)
+    batched = _best_of(lambda: batch_measure(points=points, offsets=offsets), repeat=3)
+    print(f"100k small polygons ({len(points)} vertices): batch_measure() {batched * 1e3:.1f} ms "
+          f"({len(counts) / batched / 1e3:.0f} k polygons/s)")
+
+
+if __name__ == '__main__':
+    main()
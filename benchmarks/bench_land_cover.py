@@ -0,0 +1,57 @@
+"""
+Throughput of the pixel-level land cover classifier (utils.land_cover) on a
+4096x4096 tile.
+
+Run from the repository root:
+    python -m benchmarks.bench_land_cover
+"""
+import io
+import time
+
+import numpy as np
+from PIL import Image
+
+from utils.land_cover import classify_land_cover, classify_pixels
+from utils.image_buffer import ImageBuffer
+
+
+def _best_of(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _scene(side, rng):
+    # Blocky land cover patches with per-pixel sensor noise
+    palette = np.array([[30, 90, 30], [120, 200, 100], [20, 40, 90], [150, 150, 150],
+                        [90, 90, 95], [160, 120, 80], [60, 60, 70]], dtype=np.int16)
+    patches = rng.integers(0, len(palette), size=(side // 64, side // 64))
+    scene = palette[np.kron(patches, np.ones((64, 64), dtype=np.int64))]
+    scene += rng.integers(-12, 13, size=scene.shape, dtype=np.int16)
+    return np.clip(scene, 0, 255).astype(np.uint8)
+
+
+def main(side=4096):
+    rng = np.random.default_rng(0)
+    rgb = _scene(side, rng)
+    # Satellite map types are delivered as JPEG
+    buffer = io.BytesIO()
+    Image.fromarray(rgb).save(buffer, 'JPEG', quality=90)
+    jpeg = buffer.getvalue()
+    mask = np.zeros(rgb.shape[:2], dtype=bool)
+    mask[:, : side // 3] = True
+
+    decode = _best_of(lambda: ImageBuffer.decode(jpeg))
+    pixels = _best_of(lambda: classify_pixels(rgb))
+    total = _best_of(lambda: classify_land_cover({'processed_data': jpeg}))
+    masked = _best_of(lambda: classify_land_cover({'processed_data': jpeg, 'mask': mask}))
+    print(f"{side}x{side} tile ({len(jpeg) / 2 ** 20:.1f} MiB JPEG): decode {decode * 1000:.0f} ms, "
+          f"classify pixels {pixels * 1000:.0f} ms ({side * side / pixels / 1e6:.0f} Mpx/s)")
+    print(f"classify_land_cover end to end: {total * 1000:.0f} ms, with a corridor mask {masked * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Throughput of the sliding-window object detector (utils.object_detection):
+windows scored per second on a 2048x2048 tile, and non-maximum suppression
+time for 100k candidate boxes.
+
+Run from the repository root:
+    python -m benchmarks.bench_object_detection
+"""
+import time
+
+import numpy as np
+
+from utils.image_buffer import ImageBuffer
+from utils.object_detection import detect_objects, non_max_suppression
+from benchmarks.bench_land_cover import _scene
+
+
+def _best_of(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _candidates(count, side, rng):
+    # Window-sized boxes clustered around objects, like detector output
+    centres = rng.uniform(0, side, size=(count // 20, 2))
+    corners = np.repeat(centres, 20, axis=0) + rng.normal(0, 12, size=(count, 2))
+    sizes = rng.uniform(24, 64, size=(count, 2))
+    return np.hstack([corners, corners + sizes]), rng.random(count), rng.integers(0, 5, size=count)
+
+
+def main(side=2048, boxes=100_000):
+    rng = np.random.default_rng(0)
+    image = ImageBuffer(_scene(side, rng))
+    imagery = {'image': image}
+
+    detections = detect_objects(imagery)
+    windows = detections['detector']['windows']
+    detect = _best_of(lambda: detect_objects(imagery), repeat=3)
+    print(f"{side}x{side} tile: {windows} windows in {detect * 1000:.0f} ms "
+          f"({windows / detect:,.0f} windows/s), {detections['detector']['candidates']} candidates")
+
+    candidates = _candidates(boxes, side, rng)
+    nms = _best_of(lambda: non_max_suppression(*candidates))
+    kept = len(non_max_suppression(*candidates))
+    print(f"non-max suppression of {boxes:,} boxes: {nms * 1000:.0f} ms, {kept:,} kept")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Latency of the /projects listing query with 100k projects.
+
+Seeds a temporary SQLite database, then times the first and a deep keyset
+page of models.project_listing_page against the previous approach (load
+every Project and count each one's reports through the lazy relationship).
+
+Run from the repository root:
+    python -m benchmarks.bench_projects_listing
+"""
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'bench.db')}"
+os.environ.setdefault("ANALYSIS_CACHE_BACKEND", "none")
+
+from app import app, db  # noqa: E402
+import models  # noqa: E402
+
+PROJECTS = 100_000
+REPORT_BLOB = '{"land_cover": "' + 'x' * 20_000 + '"}'
+
+
+def _seed():
+    base = datetime(2020, 1, 1)
+    db.session.execute(models.Project.__table__.insert(), [
+        {'name': f"Project {i}", 'project_type': 'Solar Farm',
+         'created_at': base + timedelta(minutes=i), 'coordinates_json': '[[0, 0], [0, 1], [1, 1]]'}
+        for i in range(PROJECTS)
+    ])
+    # Every tenth project has two reports with a sizeable results blob
+    db.session.execute(models.Report.__table__.insert(), [
+        {'project_id': pid, 'generated_at': base, 'analysis_results_json': REPORT_BLOB}
+        for pid in range(1, PROJECTS + 1, 10) for _ in range(2)
+    ])
+    db.session.commit()
+
+
+def _timed(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+        db.session.expunge_all()
+    return best, result
+
+
+def _deep_cursor(pages):
+    cursor = None
+    for _ in range(pages):
+        _, cursor = models.project_listing_page(limit=50, before=cursor)
+    return cursor
+
+
+def main():
+    with app.app_context():
+        _seed()
+        first, _ = _timed(lambda: models.project_listing_page(limit=50))
+        cursor = _deep_cursor(1000)
+        deep, _ = _timed(lambda: models.project_listing_page(limit=50, before=cursor))
+        print(f"{PROJECTS} projects: first page {first * 1e3:.2f} ms, page 1001 {deep * 1e3:.2f} ms")
+
+        def previous():
+            projects = models.Project.query.order_by(models.Project.created_at.desc()).all()
+            return [len(project.reports) for project in projects[:2000]]
+        looped, _ = _timed(previous, repeat=1)
+        print(f"previous listing (all projects, report counts for the first 2000 rows only): "
+              f"{looped * 1e3:.0f} ms ({looped / first:.0f}x slower)")
+
+
+if __name__ == '__main__':
+    main()
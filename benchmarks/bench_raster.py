@@ -0,0 +1,47 @@
+"""
+Size and speed of land cover class map storage: the previous JSON list of
+codes against the encoded ClassMap form (utils.raster).
+
+Run from the repository root:
+    python -m benchmarks.bench_raster
+"""
+import json
+import time
+
+import numpy as np
+
+from utils.raster import ClassMap
+
+
+def _best_of(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(side=4096):
+    rng = np.random.default_rng(0)
+    # A blocky map, as a segmentation model produces, and a worst-case noisy one
+    blocky = np.kron(rng.integers(0, 4, size=(side // 32, side // 32)), np.ones((32, 32), dtype=np.uint8))
+    noisy = rng.integers(0, 4, size=(side, side))
+    for label, codes in (('blocky', blocky), ('noisy', noisy)):
+        class_map = ClassMap(codes)
+        legacy = {'width': side, 'height': side, 'classes': class_map.codes.ravel().tolist()}
+        legacy_text = json.dumps(legacy)
+        encoded_text = json.dumps(class_map.to_json())
+
+        legacy_encode = _best_of(lambda: json.dumps(legacy), repeat=2)
+        legacy_decode = _best_of(lambda: np.asarray(json.loads(legacy_text)['classes'], dtype=np.uint8), repeat=2)
+        encode = _best_of(lambda: json.dumps(class_map.to_json()))
+        decode = _best_of(lambda: ClassMap.from_json(json.loads(encoded_text)))
+        print(f"{label} {side}x{side} ({class_map.to_json()['encoding']}): "
+              f"{len(legacy_text) / 2 ** 20:.1f} MiB -> {len(encoded_text) / 2 ** 20:.2f} MiB; "
+              f"encode {legacy_encode * 1000:.0f} -> {encode * 1000:.0f} ms, "
+              f"decode {legacy_decode * 1000:.0f} -> {decode * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
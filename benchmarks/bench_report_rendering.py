@@ -0,0 +1,105 @@
+"""
+Report PDF rendering time, size and page count as the number of detected
+objects grows, in the large-result mode (summary tables, capped sections)
+and, up to a few thousand detections, in the detailed mode that lists every
+detection. Also compares a typical report built with and without a
+ReportTemplate (boilerplate paragraphs laid out once).
+
+Run from the repository root:
+    python -m benchmarks.bench_report_rendering
+"""
+import io
+import time
+
+import numpy as np
+from PIL import Image
+
+from utils.georef import GeoTransform, fit_view
+from utils.report_generator import ReportTemplate, build_report
+
+_PROJECT = {'id': 1, 'name': 'Benchmark Corridor', 'type': 'Road',
+            'coordinates': [[20.0, 78.0], [20.05, 78.05], [20.1, 78.08]]}
+
+# (category, type) of the synthetic detections
+_CLASSES = [('buildings', 'Building'), ('infrastructure', 'Utility Pole'),
+            ('obstacles', 'Large Tree'), ('obstacles', 'Water Crossing'), ('roads', 'Paved Road')]
+
+
+def _best_of(fn, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def _results(count, rng):
+    # Detector-like output: georeferenced boxes, and short lines for roads
+    objects = {'buildings': [], 'roads': [], 'infrastructure': [], 'obstacles': [],
+               'analysis_date': '2026-01-01', 'detection_model': 'Sliding Window Spectral Detector v1'}
+    classes = rng.integers(0, len(_CLASSES), count)
+    lats = rng.uniform(20.0, 20.1, count)
+    lngs = rng.uniform(78.0, 78.1, count)
+    for class_index, lat, lng, confidence in zip(classes.tolist(), lats.tolist(), lngs.tolist(),
+                                                 rng.uniform(0.35, 1, count).round(3).tolist()):
+        category, object_type = _CLASSES[class_index]
+        item = {'type': object_type, 'confidence': confidence}
+        if category == 'roads':
+            item['points'] = [[0, 0], [40, 40]]
+            item['lat_lngs'] = [[lat, lng], [lat + 3e-4, lng + 3e-4]]
+        else:
+            item['bbox'] = [0, 0, 24, 24]
+            item['lat_lng'] = [lat, lng]
+            item['geo_bbox'] = [lat - 5e-5, lng - 5e-5, lat + 5e-5, lng + 5e-5]
+        objects[category].append(item)
+    return {'objects': objects, 'terrain': {'type': 'Flat'}, 'vegetation': {'density': 'Moderate'},
+            'water_bodies': [f'Stream {index}' for index in range(count // 100)]}
+
+
+def _render(results, large, template=None, imagery=None):
+    pdf = build_report(_PROJECT, results, large=large, template=template, imagery=imagery)
+    return len(pdf.output()), pdf.pages_count
+
+
+def _imagery(width, height, rng):
+    # A noisy scene over the project, georeferenced like a static map of that size
+    pixels = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, 'JPEG', quality=90)
+    centre, zoom = fit_view(_PROJECT['coordinates'], (width, height))
+    return {'processed_data': buffer.getvalue(), 'source': 'Benchmark', 'imagery_date': '2026-01-01',
+            'georef': GeoTransform.from_view(centre, zoom, (width, height)).to_dict((width, height))}
+
+
+def main(counts=(10, 100, 1_000, 10_000, 100_000), detailed_up_to=2_000):
+    rng = np.random.default_rng(0)
+    for count in counts:
+        results = _results(count, rng)
+        seconds, (size, pages) = _best_of(lambda: _render(results, True))
+        line = f"{count:>7,} detections: summary {seconds * 1e3:7.0f} ms, {size / 1024:5.0f} KiB, {pages:3d} pages"
+        if count <= detailed_up_to:
+            seconds, (size, pages) = _best_of(lambda: _render(results, False), repeat=1)
+            line += f"; detailed {seconds * 1e3:7.0f} ms, {size / 1024:5.0f} KiB, {pages:3d} pages"
+        print(line)
+
+    started = time.perf_counter()
+    template = ReportTemplate()
+    built = time.perf_counter() - started
+    results = _results(20, rng)
+    plain, _ = _best_of(lambda: _render(results, False), repeat=20)
+    templated, _ = _best_of(lambda: _render(results, False, template), repeat=20)
+    print(f"typical report: {plain * 1e3:.1f} ms without a template, {templated * 1e3:.1f} ms with one "
+          f"({1 - templated / plain:.0%} less; the template takes {built * 1e3:.0f} ms to build, "
+          f"{len(template)} paragraphs)")
+
+    results = _results(1_000, rng)
+    for width, height in ((600, 400), (2_400, 1_600), (9_600, 6_400)):
+        imagery = _imagery(width, height, rng)
+        seconds, (size, pages) = _best_of(lambda: _render(results, True, template, imagery))
+        print(f"{width:>5}x{height:<5} source image: {seconds * 1e3:5.0f} ms, {size / 1024:5.0f} KiB, "
+              f"{pages} pages ({len(imagery['processed_data']) / 1024:,.0f} KiB source)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Row size and decode time of stored report results: the previous JSON text
+column against the compressed, sectioned blob (utils.report_storage).
+
+Run from the repository root:
+    python -m benchmarks.bench_report_storage
+"""
+import json
+import time
+
+import numpy as np
+
+from utils.analysis_pipeline import build_analysis_results
+from utils.land_cover import classify_land_cover
+from utils.object_detection import detect_objects
+from utils.raster import ClassMap
+from utils.report_storage import LazyResults, encode_results, to_plain
+
+
+def _best_of(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _large_results(rng, side=512, objects=2000):
+    imagery = {'bounds': {'north': 1, 'south': 0, 'east': 1, 'west': 0}}
+    land_cover = classify_land_cover(imagery)
+    # A blocky class map, as a segmentation model would produce
+    blocks = rng.integers(0, 4, size=(side // 16, side // 16))
+    land_cover['map_data'] = ClassMap(np.kron(blocks, np.ones((16, 16), dtype=np.uint8))).to_json()
+    detections = detect_objects(imagery)
+    detections['buildings'] = [
+        {'type': 'Residential', 'confidence': round(float(c), 3),
+         'bbox': [int(x), int(y), int(x) + 12, int(y) + 9], 'lat_lng': [0.5, 0.5]}
+        for c, x, y in zip(rng.uniform(0.5, 1, objects), rng.integers(0, side, objects), rng.integers(0, side, objects))
+    ]
+    return build_analysis_results(land_cover, detections)
+
+
+def main():
+    results = _large_results(np.random.default_rng(0))
+    text = json.dumps(results)
+    blob = encode_results(results)
+    print(f"row size: JSON {len(text) / 1024:.0f} KiB, blob {len(blob) / 1024:.0f} KiB "
+          f"({len(text) / len(blob):.0f}x smaller)")
+
+    full_json = _best_of(lambda: json.loads(text))
+    summary = _best_of(lambda: LazyResults(blob)['land_cover']['classifications'])
+    page = _best_of(lambda: [LazyResults(blob)[key] for key in ('land_cover', 'terrain', 'vegetation', 'objects')])
+    full_blob = _best_of(lambda: to_plain(LazyResults(blob)))
+    print(f"decode: json.loads {full_json * 1e3:.2f} ms; blob land cover summary {summary * 1e3:.3f} ms, "
+          f"report page sections {page * 1e3:.2f} ms, everything {full_blob * 1e3:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
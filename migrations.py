@@ -0,0 +1,143 @@
+"""
+Schema upgrades and data backfills for existing databases.
+
+db.create_all() only creates missing tables, so columns and indexes added to
+a model after its table exists are applied here. upgrade() runs at start-up;
+the report storage backfill can take a while on large databases and is run
+separately:
+
+    python migrations.py
+"""
+import json
+import logging
+
+from sqlalchemy import inspect, text
+
+from app import app, db
+import models
+
+logger = logging.getLogger(__name__)
+
+
+def add_missing_columns():
+    """Adds model columns missing from existing tables (nullable, without defaults)."""
+    inspector = inspect(db.engine)
+    preparer = db.engine.dialect.identifier_preparer
+    added = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            with db.engine.begin() as connection:
+                connection.execute(text(f"ALTER TABLE {preparer.format_table(table)} "
+                                        f"ADD COLUMN {preparer.format_column(column)} {column_type}"))
+            added.append(f"{table.name}.{column.name}")
+    if added:
+        logger.info(f"Added columns: {', '.join(added)}")
+    return added
+
+
+def create_missing_indexes():
+    """Creates indexes declared on the models that an existing database lacks."""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+
+
+def upgrade():
+    """Brings an existing database schema up to date with the models."""
+    add_missing_columns()
+    create_missing_indexes()
+    backfill_project_extents()
+
+
+def backfill_project_extents(batch_size=500, refresh=False):
+    """
+    Fills the extent, centroid and area columns of projects stored before
+    they existed, one committed batch at a time. Cheap enough to run at
+    start-up: only rows whose extent is still empty are read.
+
+    Args:
+        batch_size (int): Projects per committed batch
+        refresh (bool): Recompute every project, e.g. after the area formula changed
+
+    Returns:
+        int: Projects filled
+    """
+    filled = 0
+    last_id = 0
+    while True:
+        query = models.Project.query.filter(models.Project.id > last_id,
+                                            models.Project.coordinates_json.isnot(None))
+        if not refresh:
+            query = query.filter(models.Project.min_lat.is_(None))
+        projects = (query
+                    .order_by(models.Project.id)
+                    .limit(batch_size)
+                    .all())
+        if not projects:
+            break
+        for project in projects:
+            coordinates = project.coordinates
+            if coordinates:
+                project.set_coordinates(coordinates)
+                filled += 1
+        last_id = projects[-1].id
+        db.session.commit()
+    if filled:
+        logger.info(f"Filled the extent of {filled} project(s)")
+    return filled
+
+
+def backfill_report_storage(batch_size=200):
+    """
+    Moves legacy Report.analysis_results_json rows into the compressed blob
+    and summary columns, one committed batch at a time.
+
+    Rows whose JSON cannot be parsed are left untouched and logged.
+
+    Returns:
+        tuple: (rows migrated, rows skipped)
+    """
+    migrated = skipped = 0
+    last_id = 0
+    while True:
+        reports = (models.Report.query
+                   .options(db.undefer(models.Report.analysis_results_json))
+                   .filter(models.Report.id > last_id,
+                           models.Report.results_blob.is_(None),
+                           models.Report.analysis_results_json.isnot(None))
+                   .order_by(models.Report.id)
+                   .limit(batch_size)
+                   .all())
+        if not reports:
+            break
+        for report in reports:
+            try:
+                results = json.loads(report.analysis_results_json)
+            except ValueError as e:
+                logger.warning(f"Skipping report {report.id}: unreadable analysis results ({e})")
+                skipped += 1
+                continue
+            report.set_analysis_results(results)
+            migrated += 1
+        last_id = reports[-1].id
+        db.session.commit()
+        db.session.expunge_all()
+        logger.info(f"Migrated {migrated} report(s) to compressed storage")
+    return migrated, skipped
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    with app.app_context():
+        upgrade()
+        # Areas stored before they were measured geodesically are recomputed
+        refreshed = backfill_project_extents(refresh=True)
+        print(f"Project extents: {refreshed} recomputed")
+        migrated, skipped = backfill_report_storage()
+        print(f"Report storage backfill: {migrated} migrated, {skipped} skipped")
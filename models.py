@@ -1,24 +1,242 @@
+import json
+import threading
 from app import db
 from datetime import datetime
+from sqlalchemy import func, or_, select
+from utils.geometry import is_linear_project, measure
+from utils.report_storage import LazyResults, encode_results, summarize_results
+from utils.spatial_index import ProjectIndex, intersects_bounds
 
 class Project(db.Model):
+    __table_args__ = (
+        # Serves viewport queries: a range seek on min_lat, the other bounds checked in the index
+        db.Index('ix_project_bounds', 'min_lat', 'max_lat', 'min_lng', 'max_lng'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     project_type = db.Column(db.String(50), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     coordinates_json = db.Column(db.Text)  # Store coordinates as JSON string
-    
+    # Extent and summary of the geometry, filled by set_coordinates, so spatial
+    # queries never parse coordinates_json
+    min_lat = db.Column(db.Float)
+    max_lat = db.Column(db.Float)
+    min_lng = db.Column(db.Float)
+    max_lng = db.Column(db.Float)
+    centroid_lat = db.Column(db.Float)
+    centroid_lng = db.Column(db.Float)
+    area_sqkm = db.Column(db.Float)
+
+    def set_coordinates(self, coordinates):
+        """Stores the geometry and fills the extent, centroid and area columns from it."""
+        self.coordinates_json = json.dumps(coordinates)
+        if not coordinates:
+            return
+        metrics = measure(coordinates, closed=not is_linear_project(self.project_type) and len(coordinates) > 2)
+        bounds = metrics['bounds']
+        self.min_lat, self.max_lat = bounds['south'], bounds['north']
+        self.min_lng, self.max_lng = bounds['west'], bounds['east']
+        self.centroid_lat, self.centroid_lng = metrics['centroid']
+        self.area_sqkm = metrics['area_sqkm']
+
+    @property
+    def coordinates(self):
+        return _parse_coordinates(self.coordinates_json) or []
+
     def __repr__(self):
         return f'<Project {self.name}>'
 
 class Report(db.Model):
+    __table_args__ = (
+        # Serves per-project report counts and the newest-first report listing
+        db.Index('ix_report_project_id_generated_at', 'project_id', 'generated_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
     generated_at = db.Column(db.DateTime, default=datetime.utcnow)
     file_path = db.Column(db.String(255))
-    analysis_results_json = db.Column(db.Text)  # Store analysis results as JSON
+    analysis_results_json = db.deferred(db.Column(db.Text))  # Legacy JSON results; migrated into results_blob
+    # Summary of the analysis results, queryable without decoding them
+    dominant_land_cover = db.Column(db.String(50), index=True)
+    dominant_land_cover_pct = db.Column(db.Float)
+    object_count = db.Column(db.Integer)
+    confidence_score = db.Column(db.Float, index=True)
+    # Full analysis results as compressed sections (see utils.report_storage); deferred so
+    # listing reports never reads the blob
+    results_blob = db.deferred(db.Column(db.LargeBinary))
+    # Background rendering: 'pending' until the worker pool has written file_path, then
+    # 'ready' or 'failed'; NULL for reports rendered before rendering moved off the request
+    status = db.Column(db.String(20))
+    job_id = db.Column(db.String(32))
+    # Hash of the project details, analysis results and generator version (see
+    # utils.report_files.report_fingerprint); identical requests share one report
+    content_hash = db.Column(db.String(64), index=True)
     
     project = db.relationship('Project', backref=db.backref('reports', lazy=True))
     
+    def set_analysis_results(self, results):
+        """Stores analysis results as a compressed blob plus summary columns."""
+        self.set_encoded_results(summarize_results(results), encode_results(results))
+
+    def set_encoded_results(self, summary, results_blob):
+        """Stores results already summarized and encoded, e.g. by a report worker."""
+        for column, value in summary.items():
+            setattr(self, column, value)
+        self.results_blob = results_blob
+        self.analysis_results_json = None
+
+    @property
+    def analysis_results(self):
+        """The stored analysis results; sections of the blob are decoded on access."""
+        if self.results_blob is not None:
+            return LazyResults(self.results_blob)
+        if self.analysis_results_json:
+            return json.loads(self.analysis_results_json)
+        return {}
+    
+    @property
+    def is_ready(self):
+        return self.status in (None, 'ready')
+
     def __repr__(self):
         return f'<Report {self.id} for Project {self.project_id}>'
+
+def project_listing_page(limit=50, before=None):
+    """
+    Returns one page of the project listing, newest first.
+
+    Only the listed columns are selected, so neither coordinates nor report
+    blobs are loaded, and the report count is a correlated subquery answered
+    from the (project_id, generated_at) index for the rows on the page only.
+    Pages are addressed by keyset on (created_at, id) rather than by offset,
+    so every page costs the same however deep it is.
+
+    Args:
+        limit (int): Projects per page
+        before (tuple): (created_at, id) of the last project on the previous page
+
+    Returns:
+        tuple: (rows with id, name, project_type, created_at and report_count,
+                cursor of the next page or None on the last page)
+    """
+    report_count = (select(func.count(Report.id))
+                    .where(Report.project_id == Project.id)
+                    .correlate(Project)
+                    .scalar_subquery()
+                    .label('report_count'))
+    query = (db.session.query(Project.id, Project.name, Project.project_type, Project.created_at, report_count)
+             .order_by(Project.created_at.desc(), Project.id.desc()))
+    if before is not None:
+        created_at, project_id = before
+        # The leading range term lets the created_at index seek straight to the page
+        query = query.filter(Project.created_at <= created_at,
+                             or_(Project.created_at < created_at, Project.id < project_id))
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = (rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
+
+_project_index = ProjectIndex()
+_project_index_lock = threading.Lock()
+
+def project_index():
+    """
+    Returns the process-wide spatial index of project footprints.
+
+    Built lazily on first use, then brought up to date on every call by
+    indexing only the projects created since (ids above the highest one
+    indexed), so adding projects never rebuilds the index from scratch. The
+    index is started afresh if the newest project id went down (the table
+    was reset). Request threads update it under a lock; queries on the
+    returned index are thread-safe.
+    """
+    global _project_index
+    with _project_index_lock:
+        newest = db.session.query(func.max(Project.id)).scalar() or 0
+        if newest < _project_index.last_id:
+            _project_index = ProjectIndex()
+        rows = (db.session.query(Project.id, Project.coordinates_json)
+                .filter(Project.id > _project_index.last_id)
+                .order_by(Project.id)
+                .all())
+        if rows:
+            _project_index.add((row.id, _parse_coordinates(row.coordinates_json)) for row in rows)
+        return _project_index
+
+def projects_near(lat_lng, radius_m=None, limit=20):
+    """
+    Returns the projects closest to a point, nearest first.
+
+    Answered by the in-memory project index (see project_index); distances
+    are in metres to the project's extent, so 0 for a point inside it.
+
+    Args:
+        lat_lng (list): [lat, lng] in degrees
+        radius_m (float): Only projects within this distance; any distance when None
+        limit (int): Maximum number of projects returned
+
+    Returns:
+        tuple: ((project, distance in metres) pairs, whether more matched than `limit`)
+    """
+    nearest = project_index().nearest(lat_lng, k=limit + 1)
+    if radius_m is not None:
+        nearest = [(project_id, distance) for project_id, distance in nearest if distance <= radius_m]
+    projects = {project.id: project
+                for project in Project.query.filter(Project.id.in_([project_id for project_id, _ in nearest]))}
+    found = [(projects[project_id], distance) for project_id, distance in nearest if project_id in projects]
+    return found[:limit], len(found) > limit
+
+def _parse_coordinates(coordinates_json):
+    try:
+        return json.loads(coordinates_json) if coordinates_json else None
+    except ValueError:
+        return None
+
+def projects_in_bounds(bounds, limit=200):
+    """
+    Returns the projects whose geometry touches a viewport, newest first.
+
+    Candidates come from a range scan over the extent columns (the
+    ix_project_bounds index); only their geometries are parsed, and each is
+    tested exactly against the viewport (see utils.spatial_index.intersects_bounds).
+    A viewport crossing the antimeridian has west > east.
+
+    Args:
+        bounds (dict): {'north', 'south', 'east', 'west'} in degrees
+        limit (int): Maximum number of projects returned
+
+    Returns:
+        tuple: (matching projects, whether more matched than `limit`)
+    """
+    north, south, east, west = bounds['north'], bounds['south'], bounds['east'], bounds['west']
+    if west <= east:
+        longitude = [Project.min_lng <= east, Project.max_lng >= west]
+    else:
+        longitude = [or_(Project.min_lng <= east, Project.max_lng >= west)]
+    query = (Project.query
+             .filter(Project.min_lat <= north, Project.max_lat >= south, *longitude)
+             .order_by(Project.id.desc()))
+    matches, before = [], None
+    # Candidates are fetched in keyset batches until enough pass the exact test
+    while len(matches) <= limit:
+        batch_query = query.filter(Project.id < before) if before is not None else query
+        batch = batch_query.limit(limit + 1).all()
+        for project in batch:
+            coordinates = project.coordinates
+            closed = not is_linear_project(project.project_type) and len(coordinates) > 2
+            if west > east:
+                # Split the viewport at the antimeridian
+                hit = (intersects_bounds(coordinates, {**bounds, 'east': 180.0}, closed)
+                       or intersects_bounds(coordinates, {**bounds, 'west': -180.0}, closed))
+            else:
+                hit = intersects_bounds(coordinates, bounds, closed)
+            if hit:
+                matches.append(project)
+        if len(batch) <= limit:
+            break
+        before = batch[-1].id
+    return matches[:limit], len(matches) > limit
@@ -0,0 +1,107 @@
+"""
+Bulk analysis of a portfolio of project geometries.
+
+Reads a GeoJSON FeatureCollection, line-delimited GeoJSON or CSV file as a
+stream and, for every feature, fetches its imagery, classifies land cover,
+detects objects and renders its report, storing a Project and a ready
+Report row per feature (see utils.portfolio.run_portfolio):
+
+    python portfolio.py sites.geojson --project-type "Solar Farm"
+
+Progress is checkpointed next to the input, so an interrupted run picks up
+where it stopped with --resume.
+"""
+import argparse
+import logging
+import os
+
+from app import app, db
+import models
+from utils.portfolio import (DEFAULT_BATCH_SIZE, DEFAULT_FETCH_WORKERS, DEFAULT_PROGRESS_INTERVAL, Checkpoint,
+                             FeatureReader, run_portfolio)
+from utils.report_files import report_fingerprint
+from utils.report_generator import REPORT_GENERATOR_VERSION
+
+logger = logging.getLogger(__name__)
+
+
+def save_batch(outputs):
+    """
+    Inserts the Project and Report rows of finished features in one transaction.
+
+    Features whose report file is already recorded (rows committed by a run
+    that stopped before checkpointing them) are not inserted again.
+
+    Returns:
+        list: {'project_id', 'report_id'} per output
+    """
+    existing = dict(db.session.query(models.Report.file_path, models.Report)
+                    .filter(models.Report.file_path.in_([output['file_path'] for output in outputs])))
+    rows = []
+    for output in outputs:
+        report = existing.get(output['file_path'])
+        if report is None:
+            feature = output['feature']
+            project = models.Project(name=feature['name'], project_type=feature['type'])
+            project.set_coordinates(feature['coordinates'])
+            db.session.add(project)
+            report = models.Report(project=project, file_path=output['file_path'], status='ready')
+            report.set_encoded_results(output['summary'], output['results_blob'])
+            db.session.add(report)
+        rows.append((output, report))
+    # Assigns the ids the content hashes cover
+    db.session.flush()
+    for output, report in rows:
+        if report.content_hash is None:
+            feature = output['feature']
+            project_details = {'id': report.project_id, 'name': feature['name'], 'type': feature['type'],
+                               'coordinates': feature['coordinates']}
+            report.content_hash = report_fingerprint(project_details, output['results_json'],
+                                                     REPORT_GENERATOR_VERSION)
+    db.session.commit()
+    ids = [{'project_id': report.project_id, 'report_id': report.id} for _, report in rows]
+    db.session.expunge_all()
+    return ids
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('input', help="GeoJSON (.geojson/.json), line-delimited GeoJSON or CSV file")
+    parser.add_argument('--project-type', help="Project type of features without a project_type property")
+    parser.add_argument('--checkpoint', help="Checkpoint file (default: <input>.checkpoint.jsonl)")
+    parser.add_argument('--resume', action='store_true', help="Skip the features an earlier run finished")
+    parser.add_argument('--retry-failed', action='store_true', help="With --resume, retry features that failed")
+    parser.add_argument('--output-dir', help="Directory for the PDFs (default: <REPORTS_DIR>/portfolio/<input name>)")
+    parser.add_argument('--fetch-workers', type=int, default=DEFAULT_FETCH_WORKERS,
+                        help="Concurrent imagery fetches (network-bound)")
+    parser.add_argument('--cpu-workers', type=int, default=os.cpu_count() or 1,
+                        help="Analysis and rendering processes (CPU-bound)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Features stored per database transaction")
+    parser.add_argument('--progress-interval', type=float, default=DEFAULT_PROGRESS_INTERVAL,
+                        help="Seconds between progress lines")
+    args = parser.parse_args(argv)
+
+    checkpoint_path = args.checkpoint or f"{args.input}.checkpoint.jsonl"
+    if os.path.exists(checkpoint_path) and not args.resume:
+        parser.error(f"{checkpoint_path} exists; pass --resume to continue that run or remove it")
+    checkpoint = Checkpoint(checkpoint_path, args.input)
+    if checkpoint.finished:
+        counts = checkpoint.counts()
+        print(f"Resuming: {counts['done']} feature(s) done and {counts['failed']} failed before")
+    output_dir = args.output_dir or os.path.join(app.config["REPORTS_DIR"], 'portfolio',
+                                                 os.path.splitext(os.path.basename(args.input))[0])
+
+    with app.app_context():
+        progress = run_portfolio(FeatureReader(args.input, default_type=args.project_type), save_batch,
+                                 output_dir, checkpoint=checkpoint, fetch_workers=args.fetch_workers,
+                                 cpu_workers=args.cpu_workers, batch_size=args.batch_size,
+                                 retry_failed=args.retry_failed, progress_interval=args.progress_interval)
+    print(f"Portfolio run: {progress.done} done, {progress.failed} failed, {progress.skipped} skipped; "
+          f"reports in {output_dir}, checkpoint {checkpoint_path}")
+    return 1 if progress.failed else 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    raise SystemExit(main())
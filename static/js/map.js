@@ -3,6 +3,11 @@ let map;
 let drawingManager;
 let selectedShape = null;
 let allShapes = [];
+let detectionOverlays = [];
+let nearbyProjects = {}; // project id -> overlay of existing projects in view
+let nearbyProjectsTimer = null;
+let nearbyProjectsRequest = null;
+let projectInfoWindow = null;
 
 // Initialize the map
 function initMap() {
@@ -113,6 +118,79 @@ function initMap() {
     
     // Initialize report generation button
     document.getElementById('generate-report-btn').addEventListener('click', generateReport);
+    
+    // Show existing projects in the viewport once the map settles after panning or zooming
+    map.addListener('idle', function() {
+        clearTimeout(nearbyProjectsTimer);
+        nearbyProjectsTimer = setTimeout(loadNearbyProjects, 250);
+    });
+}
+
+// Fetch the existing projects touching the current viewport and draw them
+function loadNearbyProjects() {
+    const bounds = map.getBounds();
+    if (!bounds) {
+        return;
+    }
+    const sw = bounds.getSouthWest();
+    const ne = bounds.getNorthEast();
+    const bbox = [sw.lng(), sw.lat(), ne.lng(), ne.lat()].map(v => v.toFixed(6)).join(',');
+    
+    // Only the latest viewport matters; drop a response still in flight
+    if (nearbyProjectsRequest) {
+        nearbyProjectsRequest.abort();
+    }
+    nearbyProjectsRequest = new AbortController();
+    fetch(`/api/projects?bbox=${bbox}`, { signal: nearbyProjectsRequest.signal })
+        .then(response => response.ok ? response.json() : Promise.reject(response.status))
+        .then(data => showNearbyProjects(data.projects))
+        .catch(error => {
+            if (error.name !== 'AbortError') {
+                console.warn('Could not load nearby projects:', error);
+            }
+        });
+}
+
+// Keep one overlay per project in view, reusing overlays that are already drawn
+function showNearbyProjects(projects) {
+    const visible = new Set(projects.map(project => String(project.id)));
+    Object.keys(nearbyProjects).forEach(id => {
+        if (!visible.has(id)) {
+            nearbyProjects[id].setMap(null);
+            delete nearbyProjects[id];
+        }
+    });
+    
+    projects.forEach(project => {
+        if (nearbyProjects[project.id] || !project.coordinates.length) {
+            return;
+        }
+        const path = project.coordinates.map(([lat, lng]) => ({ lat: lat, lng: lng }));
+        const options = {
+            map: map,
+            path: path,
+            strokeColor: '#6c757d',
+            strokeWeight: 2,
+            strokeOpacity: 0.8,
+            zIndex: 0
+        };
+        const isLinear = project.project_type.includes('Road') || project.project_type === 'Pipeline' || project.project_type === 'Transmission Line';
+        const overlay = isLinear || path.length < 3
+            ? new google.maps.Polyline(options)
+            : new google.maps.Polygon({ ...options, fillColor: '#6c757d', fillOpacity: 0.15 });
+        overlay.addListener('click', event => {
+            if (!projectInfoWindow) {
+                projectInfoWindow = new google.maps.InfoWindow();
+            }
+            const link = document.createElement('a');
+            link.href = project.url;
+            link.textContent = `${project.name} (${project.project_type})`;
+            projectInfoWindow.setContent(link);
+            projectInfoWindow.setPosition(event.latLng);
+            projectInfoWindow.open(map);
+        });
+        nearbyProjects[project.id] = overlay;
+    });
 }
 
 // Clear all drawn shapes
@@ -125,6 +203,7 @@ function clearDrawing() {
     // Clear the shapes array
     allShapes = [];
     selectedShape = null;
+    clearDetectionOverlays();
     
     // Disable the analyze button
     updateAnalyzeButtonState();
@@ -295,7 +374,7 @@ function analyzeProject() {
     // Simulate analysis progress
     simulateAnalysisProgress();
     
-    // Send data for analysis
+    // Queue the analysis, then poll the job endpoint until it finishes
     fetch('/analyze', {
         method: 'POST',
         headers: {
@@ -305,14 +384,20 @@ function analyzeProject() {
     })
     .then(response => response.json())
     .then(data => {
+        if (!data.success) {
+            throw new Error(data.error);
+        }
+        return pollAnalysisJob(data.status_url);
+    })
+    .then(job => {
         // Hide analysis modal
         analysisModal.hide();
         
-        if (data.success) {
+        if (job.status === 'completed') {
             // Display results
-            displayAnalysisResults(data.results, projectData);
+            displayAnalysisResults(job.results, projectData);
         } else {
-            alert('Analysis failed: ' + data.error);
+            alert('Analysis failed: ' + (job.error || job.status));
         }
     })
     .catch(error => {
@@ -322,6 +407,27 @@ function analyzeProject() {
     });
 }
 
+// Poll an analysis job until it completes or fails
+function pollAnalysisJob(statusUrl, intervalMs = 1000) {
+    return new Promise((resolve, reject) => {
+        function poll() {
+            fetch(statusUrl)
+            .then(response => response.json())
+            .then(job => {
+                if (!job.success) {
+                    reject(new Error(job.error));
+                } else if (job.status === 'queued' || job.status === 'running') {
+                    setTimeout(poll, intervalMs);
+                } else {
+                    resolve(job);
+                }
+            })
+            .catch(reject);
+        }
+        poll();
+    });
+}
+
 // Simulate analysis progress for better UX
 function simulateAnalysisProgress() {
     const statusElement = document.getElementById('analysis-status');
@@ -533,8 +639,45 @@ function updateLandCoverTab(landCoverData) {
         '. Further detailed topographical survey is recommended for precise elevation data.';
 }
 
+// Remove detected objects drawn on the map
+function clearDetectionOverlays() {
+    detectionOverlays.forEach(overlay => overlay.setMap(null));
+    detectionOverlays = [];
+}
+
+// Draw georeferenced detections: boxes as rectangles, roads as polylines
+function showDetectionsOnMap(objectsData) {
+    clearDetectionOverlays();
+    const colors = { buildings: '#0dcaf0', roads: '#ffc107', infrastructure: '#6f42c1', obstacles: '#dc3545' };
+    Object.keys(colors).forEach(category => {
+        (objectsData[category] || []).forEach(item => {
+            if (item.geo_bbox) {
+                const [south, west, north, east] = item.geo_bbox;
+                detectionOverlays.push(new google.maps.Rectangle({
+                    map: map,
+                    bounds: { south: south, west: west, north: north, east: east },
+                    strokeColor: colors[category],
+                    strokeWeight: 1,
+                    fillOpacity: 0.1,
+                    clickable: false
+                }));
+            } else if (item.lat_lngs) {
+                detectionOverlays.push(new google.maps.Polyline({
+                    map: map,
+                    path: item.lat_lngs.map(([lat, lng]) => ({ lat: lat, lng: lng })),
+                    strokeColor: colors[category],
+                    strokeWeight: 3,
+                    clickable: false
+                }));
+            }
+        });
+    });
+}
+
 // Update objects tab with detection results
 function updateObjectsTab(objectsData) {
+    showDetectionsOnMap(objectsData);
+
     // Update objects list
     const objectsList = document.getElementById('objects-list');
     objectsList.innerHTML = '';
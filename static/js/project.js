@@ -0,0 +1,63 @@
+// This file contains JavaScript functions for the project pages:
+// re-analyzing a saved project on the analysis worker pool
+
+document.addEventListener('DOMContentLoaded', function() {
+    // Initialize re-analyze buttons
+    document.querySelectorAll('.reanalyze-btn').forEach(button => {
+        button.addEventListener('click', () => reanalyzeProject(button));
+    });
+});
+
+// Delay between analysis job polls
+const ANALYSIS_POLL_MS = 1000;
+
+// Queue a new analysis of the project, then open its report once the job completes
+function reanalyzeProject(button) {
+    const btnText = button.innerHTML;
+    button.disabled = true;
+    button.innerHTML = '<span class="spinner-border spinner-border-sm" role="status" aria-hidden="true"></span> Analyzing...';
+
+    const restoreButton = () => {
+        button.innerHTML = btnText;
+        button.disabled = false;
+    };
+
+    fetch(button.dataset.analyzeUrl, { method: 'POST' })
+    .then(response => response.json())
+    .then(data => {
+        if (!data.success) {
+            throw new Error(data.error);
+        }
+        pollReanalysis(data.status_url, data.report_url, restoreButton);
+    })
+    .catch(error => {
+        restoreButton();
+        console.error('Analysis error:', error);
+        alert('An error occurred during analysis. Please try again.');
+    });
+}
+
+// Poll the analysis job until it completes or fails
+function pollReanalysis(statusUrl, reportUrl, done) {
+    setTimeout(() => {
+        fetch(statusUrl)
+        .then(response => response.json())
+        .then(job => {
+            if (!job.success) {
+                throw new Error(job.error);
+            } else if (job.status === 'queued' || job.status === 'running') {
+                pollReanalysis(statusUrl, reportUrl, done);
+            } else if (job.status === 'completed') {
+                window.location.href = reportUrl;
+            } else {
+                done();
+                alert('Analysis failed: ' + (job.error || job.status));
+            }
+        })
+        .catch(error => {
+            done();
+            console.error('Analysis error:', error);
+            alert('An error occurred during analysis. Please try again.');
+        });
+    }, ANALYSIS_POLL_MS);
+}
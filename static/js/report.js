@@ -9,13 +9,24 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 });
 
+// Delay between report status polls, growing up to the maximum while the PDF renders
+const REPORT_POLL_INITIAL_MS = 500;
+const REPORT_POLL_MAX_MS = 5000;
+
 // Function to download the report as PDF
 function downloadReport() {
     // Show loading indicator
-    const btnText = document.getElementById('download-report-btn').innerHTML;
-    document.getElementById('download-report-btn').innerHTML = '<span class="spinner-border spinner-border-sm" role="status" aria-hidden="true"></span> Generating...';
+    const button = document.getElementById('download-report-btn');
+    const btnText = button.innerHTML;
+    button.disabled = true;
+    button.innerHTML = '<span class="spinner-border spinner-border-sm" role="status" aria-hidden="true"></span> Generating...';
+    
+    const restoreButton = () => {
+        button.innerHTML = btnText;
+        button.disabled = false;
+    };
     
-    // Call the backend to generate the PDF
+    // Queue the PDF on the server; it is rendered in the background
     fetch('/download-report', {
         method: 'POST',
         headers: {
@@ -24,35 +35,58 @@ function downloadReport() {
     })
     .then(response => response.json())
     .then(data => {
-        // Restore button text
-        document.getElementById('download-report-btn').innerHTML = btnText;
-        
-        if (data.success) {
-            // In a real implementation, this would download the actual PDF
-            // For this simplified version, we'll just show a success message
-            showDownloadSuccess();
-            
-            // In a production app, you would trigger the download like this:
-            // window.location.href = data.download_url;
-        } else {
+        if (!data.success) {
+            restoreButton();
             showDownloadError(data.error);
+            return;
+        }
+        if (data.status === 'ready') {
+            // An identical report was already rendered
+            restoreButton();
+            showDownloadSuccess();
+            window.location.href = data.download_url;
+            return;
         }
+        pollReportStatus(data.status_url, REPORT_POLL_INITIAL_MS, restoreButton);
     })
     .catch(error => {
-        // Restore button text
-        document.getElementById('download-report-btn').innerHTML = btnText;
+        restoreButton();
         console.error('Download error:', error);
         showDownloadError('An error occurred while generating the report.');
     });
 }
 
+// Polls the report status until the PDF is ready, then starts the download
+function pollReportStatus(statusUrl, delay, done) {
+    setTimeout(() => {
+        fetch(statusUrl)
+        .then(response => response.json())
+        .then(data => {
+            if (data.status === 'ready') {
+                done();
+                showDownloadSuccess();
+                window.location.href = data.download_url;
+            } else if (data.status === 'failed' || data.status === 'expired' || !data.success) {
+                done();
+                showDownloadError(data.error || 'The report could not be generated.');
+            } else {
+                pollReportStatus(statusUrl, Math.min(delay * 2, REPORT_POLL_MAX_MS), done);
+            }
+        })
+        .catch(error => {
+            done();
+            console.error('Report status error:', error);
+            showDownloadError('Lost track of the report while it was being generated.');
+        });
+    }, delay);
+}
+
 // Function to show download success message
 function showDownloadSuccess() {
     // Create a Bootstrap alert to show the success message
     const alertHtml = `
         <div class="alert alert-success alert-dismissible fade show mt-3" role="alert">
-            <strong>Success!</strong> Your report has been generated. 
-            <span>In a production implementation, the PDF would download automatically.</span>
+            <strong>Success!</strong> Your report has been generated and is downloading.
             <button type="button" class="btn-close" data-bs-dismiss="alert" aria-label="Close"></button>
         </div>
     `;
@@ -0,0 +1,34 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+# Horizontal bands of a synthetic satellite scene: (share of the rows, RGB)
+SCENE_BANDS = [
+    (0.30, (30, 90, 30)),     # trees
+    (0.15, (60, 120, 50)),    # shrubs
+    (0.08, (20, 40, 90)),     # water
+    (0.13, (150, 150, 150)),  # buildings
+    (0.34, (160, 120, 80)),   # soil
+]
+
+
+def make_scene(width=100, height=100, image_format='PNG'):
+    """Encodes a banded scene (see SCENE_BANDS) as image bytes."""
+    rows = np.round(np.cumsum([share for share, _ in SCENE_BANDS]) * height).astype(int)
+    pixels = np.empty((height, width, 3), dtype=np.uint8)
+    start = 0
+    for end, (_, color) in zip(rows, SCENE_BANDS):
+        pixels[start:end] = color
+        start = end
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def scene_imagery():
+    """Imagery data carrying a 100x100 banded scene."""
+    return {'error': None, 'processed_data': make_scene(),
+            'bounds': {'north': 1, 'south': 0, 'east': 1, 'west': 0}}
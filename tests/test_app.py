@@ -1,3 +1,4 @@
+import json
 import pytest
 from app import app as flask_app, db
 import os # For setting environment variables for tests
@@ -73,3 +74,421 @@ def test_view_report_route_invalid_id(client):
 #     response = client.get(f'/project/{project_id}')
 #     assert response.status_code == 200
 #     assert b"Test Project" in response.data
+
+
+def test_analyze_requires_coordinates(client):
+    """Test that '/analyze' rejects requests without a geometry."""
+    response = client.post('/analyze', json={'project_name': 'Empty', 'project_type': 'Road'})
+    assert response.status_code == 400
+
+
+def test_job_status_unknown_id(client):
+    """Test polling a job id that was never issued ('/jobs/<id>')."""
+    response = client.get('/jobs/not-a-real-job')
+    assert response.status_code == 404
+    assert response.get_json()['success'] is False
+
+
+def test_analyze_queues_job_and_job_endpoint_reports_results(client, monkeypatch):
+    """Test that '/analyze' returns a job id at once and '/jobs/<id>' returns the results."""
+    import time
+    import app as app_module
+
+    from utils.analysis_pipeline import build_analysis_results
+
+    fake_output = {
+        'results': build_analysis_results({'classifications': {'vegetation': {'percentage': 40.0}}}, {}),
+        'timings': {'imagery': 0.0, 'land_cover': 0.0, 'objects': 0.0, 'total': 0.0}
+    }
+    monkeypatch.setattr(app_module, 'run_analysis', lambda coordinates, cache=None, tiling=None, closed=None: fake_output)
+
+    response = client.post('/analyze', json={
+        'project_name': 'Queued Project',
+        'project_type': 'Solar Farm',
+        'area_coordinates': [[10.0, 20.0], [10.1, 20.0], [10.1, 20.1]]
+    })
+    assert response.status_code == 202
+    payload = response.get_json()
+    assert payload['job_id']
+
+    for _ in range(100):
+        job = client.get(payload['status_url']).get_json()
+        if job['status'] not in ('queued', 'running'):
+            break
+        time.sleep(0.01)
+
+    assert job['status'] == 'completed'
+    assert job['results'] == fake_output['results']
+    assert 'imagery' in job['timings']
+
+    # The session only carries the result id; the report page resolves it server-side
+    with client.session_transaction() as sess:
+        assert 'analysis_results' not in sess
+        assert sess['analysis_result_id']
+    response = client.get('/generate-report')
+    assert response.status_code == 200
+    assert b"Queued Project" in response.data
+
+
+def test_reanalyze_queues_job_like_analyze(client, monkeypatch):
+    """Test that '/project/<id>/analyze' queues the analysis and returns 202 instead of running it."""
+    import threading
+    import time
+    import app as app_module
+    import models
+
+    from utils.analysis_pipeline import build_analysis_results
+
+    project = models.Project(name="Reanalysed", project_type="Solar Farm")
+    project.set_coordinates([[10.0, 20.0], [10.1, 20.0], [10.1, 20.1]])
+    db.session.add(project)
+    db.session.commit()
+
+    release = threading.Event()
+
+    def slow_analysis(coordinates, cache=None, tiling=None, closed=None):
+        release.wait(5)
+        return {'results': build_analysis_results({'classifications': {'vegetation': {'percentage': 40.0}}}, {}),
+                'timings': {'total': 0.0}}
+    monkeypatch.setattr(app_module, 'run_analysis', slow_analysis)
+
+    response = client.post(f'/project/{project.id}/analyze')
+    # Answered while the analysis is still blocked on the worker
+    assert response.status_code == 202
+    payload = response.get_json()
+    assert payload['job_id'] and payload['project_id'] == project.id
+    release.set()
+
+    for _ in range(100):
+        job = client.get(payload['status_url']).get_json()
+        if job['status'] not in ('queued', 'running'):
+            break
+        time.sleep(0.01)
+    assert job['status'] == 'completed'
+    response = client.get(payload['report_url'])
+    assert response.status_code == 200
+    assert b"Reanalysed" in response.data
+    assert client.post('/project/99999/analyze').status_code == 404
+
+
+def test_generate_report_without_stored_results_redirects(client):
+    """Test that '/generate-report' redirects home when the result id is unknown or expired."""
+    with client.session_transaction() as sess:
+        sess['analysis_result_id'] = 'expired-result'
+        sess['project_details'] = {'id': 1, 'name': 'Gone', 'type': 'Road', 'coordinates': []}
+    response = client.get('/generate-report')
+    assert response.status_code == 302
+
+
+def test_projects_route_pages_with_report_counts_in_one_query(client, app_with_context, monkeypatch):
+    """Test that '/projects' counts reports without loading them and pages by keyset."""
+    from datetime import datetime, timedelta
+    from sqlalchemy import event
+    import models
+    from app import _encode_cursor
+
+    base = datetime(2024, 1, 1)
+    for i in range(5):
+        project = models.Project(name=f"Listed {i}", project_type="Road",
+                                 created_at=base + timedelta(days=i), coordinates_json="[]")
+        db.session.add(project)
+        db.session.flush()
+        for _ in range(i):
+            db.session.add(models.Report(project_id=project.id, analysis_results_json='{"large": "blob"}'))
+    db.session.commit()
+    db.session.expire_all()
+    monkeypatch.setitem(app_with_context.config, "PROJECTS_PAGE_SIZE", 2)
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        first = client.get('/projects')
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+    assert first.status_code == 200
+    assert b"Listed 4" in first.data and b"Listed 3" in first.data and b"Listed 2" not in first.data
+    project_queries = [s for s in statements if 'project' in s.lower()]
+    assert len(project_queries) == 1
+    assert 'analysis_results_json' not in project_queries[0]
+    assert 'coordinates_json' not in project_queries[0]
+
+    rows, cursor = models.project_listing_page(limit=2)
+    assert [(row.name, row.report_count) for row in rows] == [("Listed 4", 4), ("Listed 3", 3)]
+    rows, cursor = models.project_listing_page(limit=2, before=cursor)
+    assert [row.name for row in rows] == ["Listed 2", "Listed 1"]
+    rows, cursor = models.project_listing_page(limit=2, before=cursor)
+    assert [(row.name, row.report_count) for row in rows] == [("Listed 0", 0)]
+    assert cursor is None
+
+    # "Listed 3" (id 4) is the last row of the first page
+    second = client.get('/projects', query_string={'before': _encode_cursor((base + timedelta(days=3), 4))})
+    assert b"Listed 2" in second.data and b"Listed 4" not in second.data
+    assert client.get('/projects?before=not-a-cursor').status_code == 400
+
+
+def test_legacy_report_rows_are_migrated_to_compressed_storage(client, app_with_context, scene_imagery):
+    """Test the schema upgrade and the backfill of JSON report rows, then viewing a migrated report."""
+    import json
+    from sqlalchemy import text
+    import migrations
+    import models
+    from utils.analysis_pipeline import build_analysis_results
+    from utils.land_cover import classify_land_cover
+    from utils.object_detection import detect_objects
+
+    results = build_analysis_results(classify_land_cover(scene_imagery), detect_objects(scene_imagery))
+
+    # An older database: a summary column is missing and results are stored as JSON text
+    db.session.execute(text("ALTER TABLE report DROP COLUMN object_count"))
+    db.session.commit()
+    assert migrations.add_missing_columns() == ['report.object_count']
+
+    project = models.Project(name="Legacy Project", project_type="Solar Farm",
+                             coordinates_json="[[0, 0], [0, 1], [1, 1]]")
+    db.session.add(project)
+    db.session.flush()
+    project_id = project.id
+    db.session.execute(models.Report.__table__.insert(), [
+        {'project_id': project_id, 'analysis_results_json': json.dumps(results)},
+        {'project_id': project_id, 'analysis_results_json': 'not json'}
+    ])
+    db.session.commit()
+
+    assert migrations.backfill_report_storage(batch_size=1) == (1, 1)
+    report = models.Report.query.order_by(models.Report.id).first()
+    assert report.analysis_results_json is None
+    assert report.results_blob is not None
+    assert (report.dominant_land_cover, report.object_count) == ('vegetation', 6)
+    assert report.analysis_results['land_cover']['classifications']['water']['percentage'] == 8.0
+
+    response = client.get(f'/report/{report.id}/view')
+    assert response.status_code == 200
+    assert b"Legacy Project" in response.data
+    listing = client.get(f'/project/{project_id}/reports')
+    assert b"Vegetation (45.0%)" in listing.data
+
+
+def test_project_index_picks_up_new_projects(app_with_context, monkeypatch):
+    import json
+    import models
+    from utils.spatial_index import ProjectIndex
+    monkeypatch.setattr(models, '_project_index', ProjectIndex())
+    db.session.add(models.Project(name='A', project_type='Road', coordinates_json=json.dumps([[20.0, 78.0], [20.01, 78.01]])))
+    db.session.commit()
+    index = models.project_index()
+    first = models.Project.query.filter_by(name='A').one()
+    assert first.id in index.in_bounds({'north': 20.5, 'south': 19.5, 'east': 78.5, 'west': 77.5})
+
+    db.session.add(models.Project(name='B', project_type='Road', coordinates_json=json.dumps([[40.0, 10.0], [40.01, 10.01]])))
+    db.session.commit()
+    second = models.Project.query.filter_by(name='B').one()
+    assert models.project_index().within_radius([40.0, 10.0], 100) == [second.id]
+
+
+def test_projects_nearby_api_answers_radius_and_nearest_queries(client, app_with_context, monkeypatch):
+    """Test '/api/projects/nearby' through the in-memory project index."""
+    import models
+    from utils.spatial_index import ProjectIndex
+    # Each test starts a new database, whose ids the process-wide index has seen before
+    monkeypatch.setattr(models, '_project_index', ProjectIndex())
+
+    def add(name, coordinates):
+        project = models.Project(name=name, project_type='Building')
+        project.set_coordinates(coordinates)
+        db.session.add(project)
+
+    add('Here', [[20.0, 78.0], [20.0, 78.01], [20.01, 78.01], [20.01, 78.0]])
+    add('Next door', [[20.0, 78.02], [20.0, 78.03], [20.01, 78.03]])  # ~1.6 km east
+    add('Far away', [[45.0, 10.0], [45.1, 10.1], [45.0, 10.1]])
+    db.session.commit()
+
+    nearest = client.get('/api/projects/nearby', query_string={'lat': 20.005, 'lng': 78.005}).get_json()
+    assert [project['name'] for project in nearest['projects']] == ['Here', 'Next door', 'Far away']
+    assert nearest['projects'][0]['distance_m'] == 0.0 and not nearest['truncated']
+    assert 1500 < nearest['projects'][1]['distance_m'] < 1650  # 0.015 degrees of longitude at 20 N
+    within = client.get('/api/projects/nearby', query_string={'lat': 20.005, 'lng': 78.005, 'radius_m': 2000}).get_json()
+    assert [project['name'] for project in within['projects']] == ['Here', 'Next door']
+    one = client.get('/api/projects/nearby', query_string={'lat': 20.005, 'lng': 78.005, 'limit': 1}).get_json()
+    assert [project['name'] for project in one['projects']] == ['Here'] and one['truncated']
+
+    # Projects added later are indexed on the next query
+    add('New', [[45.0, 10.0], [45.0, 10.01], [45.01, 10.0]])
+    db.session.commit()
+    latest = client.get('/api/projects/nearby', query_string={'lat': 45.0, 'lng': 10.0, 'radius_m': 10}).get_json()
+    assert sorted(project['name'] for project in latest['projects']) == ['Far away', 'New']
+
+    assert client.get('/api/projects/nearby', query_string={'lat': 20}).status_code == 400
+    assert client.get('/api/projects/nearby', query_string={'lat': 95, 'lng': 0}).status_code == 400
+
+
+def test_projects_api_answers_viewport_queries(client, app_with_context):
+    """Test '/api/projects?bbox=' with the extent columns, the index and the exact geometry filter."""
+    import json
+    from sqlalchemy import text
+    import migrations
+    import models
+
+    def add(name, project_type, coordinates):
+        project = models.Project(name=name, project_type=project_type)
+        project.set_coordinates(coordinates)
+        db.session.add(project)
+        return project
+
+    square = add('Square', 'Building', [[20.0, 78.0], [20.0, 78.1], [20.1, 78.1], [20.1, 78.0]])
+    # A diagonal road whose extent covers the viewport corner but whose line does not
+    diagonal = add('Diagonal', 'Road', [[21.0, 78.0], [20.0, 79.0]])
+    add('Far away', 'Road', [[45.0, 10.0], [45.1, 10.1]])
+    legacy = models.Project(name='Legacy', project_type='Building',
+                            coordinates_json=json.dumps([[20.05, 78.05], [20.05, 78.06], [20.06, 78.06]]))
+    db.session.add(legacy)
+    db.session.commit()
+    assert square.min_lat == 20.0 and square.max_lng == 78.1 and square.area_sqkm > 100
+    assert diagonal.area_sqkm == 0.0 and diagonal.centroid_lat == 20.5
+
+    # Older rows get their extent at start-up
+    assert legacy.min_lat is None
+    assert migrations.backfill_project_extents() == 1
+    assert legacy.min_lat == 20.05
+    # Areas stored by an older formula are recomputed on request
+    square.area_sqkm = 1.0
+    db.session.commit()
+    assert migrations.backfill_project_extents(refresh=True) == 4
+    assert 100 < square.area_sqkm < 120
+
+    response = client.get('/api/projects', query_string={'bbox': '78.01,20.01,78.04,20.04'})
+    assert response.status_code == 200
+    assert [project['name'] for project in response.get_json()['projects']] == ['Square']
+    response = client.get('/api/projects', query_string={'bbox': '78.0,20.0,79.0,21.0'})
+    names = [project['name'] for project in response.get_json()['projects']]
+    assert names == ['Legacy', 'Diagonal', 'Square']
+    assert response.get_json()['projects'][1]['coordinates'] == [[21.0, 78.0], [20.0, 79.0]]
+    truncated = client.get('/api/projects', query_string={'bbox': '78.0,20.0,79.0,21.0', 'limit': 2}).get_json()
+    assert len(truncated['projects']) == 2 and truncated['truncated']
+
+    assert client.get('/api/projects').status_code == 400
+    assert client.get('/api/projects', query_string={'bbox': '78,21,79,20'}).status_code == 400
+
+    plan = db.session.execute(text(
+        "EXPLAIN QUERY PLAN SELECT id FROM project WHERE min_lat <= 21 AND max_lat >= 20 "
+        "AND min_lng <= 79 AND max_lng >= 78")).fetchall()
+    assert 'ix_project_bounds' in ' '.join(str(row) for row in plan)
+
+
+def _wait_for_report(client, status_url):
+    import time
+    for _ in range(300):
+        db.session.expire_all()  # requests share the test's session; see the worker's commit
+        status = client.get(status_url).get_json()
+        if status['status'] not in ('pending', 'queued', 'running'):
+            return status
+        time.sleep(0.05)
+    return status
+
+
+def test_download_report_renders_in_the_background(client, app_with_context, scene_imagery, monkeypatch, tmp_path):
+    """Test that '/download-report' returns a report id at once and the status endpoint tracks the render."""
+    from datetime import datetime, timedelta
+    import app as app_module
+    import models
+    from utils.analysis_pipeline import build_analysis_results
+    from utils.land_cover import classify_land_cover
+    from utils.object_detection import detect_objects
+
+    monkeypatch.chdir(tmp_path)
+    project = models.Project(name='Rendered Project', project_type='Solar Farm')
+    project.set_coordinates([[10.0, 20.0], [10.1, 20.0], [10.1, 20.1]])
+    db.session.add(project)
+    db.session.commit()
+    results = build_analysis_results(classify_land_cover(scene_imagery), detect_objects(scene_imagery))
+    with client.session_transaction() as sess:
+        sess['analysis_result_id'] = app_module.result_store.put(results)
+        sess['project_details'] = {'id': project.id, 'name': project.name, 'type': project.project_type,
+                                   'coordinates': project.coordinates}
+
+    response = client.post('/download-report')
+    assert response.status_code == 202
+    payload = response.get_json()
+    report = db.session.get(models.Report, payload['report_id'])
+    assert report.status == 'pending' and report.results_blob is None
+    assert b'Rendering' in client.get(f'/project/{project.id}/reports').data
+
+    status = _wait_for_report(client, payload['status_url'])
+    assert status['status'] == 'ready'
+    assert status['download_url'] == f"/reports/{payload['report_id']}/download"
+    assert status['bytes'] > 0 and status['timings']['render'] > 0
+    download = client.get(status['download_url'])
+    assert download.status_code == 200 and download.mimetype == 'application/pdf'
+    assert download.data.startswith(b'%PDF') and len(download.data) == status['bytes']
+    assert 'Rendered_Project_report' in download.headers['Content-Disposition']
+    assert client.get(status['download_url'], headers={'If-None-Match': download.headers['ETag']}).status_code == 304
+
+    report = db.session.get(models.Report, payload['report_id'])
+    assert (report.status, report.dominant_land_cover, report.object_count) == ('ready', 'vegetation', 6)
+    assert report.analysis_results['land_cover']['classifications']['water']['percentage'] == 8.0
+
+    metrics = client.get('/metrics').get_json()['report_jobs']
+    assert metrics['executor'] == 'process' and metrics['run_seconds']['count'] >= 1
+    assert {'queue_depth', 'running', 'saturation'} <= set(metrics)
+
+    # The same request again reuses the rendered file without queueing anything
+    again = client.post('/download-report')
+    assert again.status_code == 200
+    assert again.get_json()['report_id'] == report.id and again.get_json()['status'] == 'ready'
+    assert models.Report.query.count() == 1 and app_module.report_jobs.stats()['jobs'] == metrics['jobs']
+
+    # Once the file is collected the report reads as expired and the next request renders it again
+    os.remove(report.file_path)
+    assert client.get(payload['status_url']).get_json()['status'] == 'expired'
+    assert client.get(status['download_url']).status_code == 410
+    rendered_again = client.post('/download-report').get_json()
+    assert rendered_again['report_id'] == report.id and models.Report.query.count() == 1
+    assert _wait_for_report(client, rendered_again['status_url'])['status'] == 'ready'
+
+    # A pending report no process is rendering fails once the render timeout has passed
+    stale = models.Report(project_id=project.id, status='pending', job_id='lost',
+                          generated_at=datetime.utcnow() - timedelta(hours=1))
+    db.session.add(stale)
+    db.session.commit()
+    assert client.get(f'/reports/{stale.id}/status').get_json()['status'] == 'failed'
+    assert client.get('/reports/99999/status').status_code == 404
+
+
+def test_portfolio_cli_stores_projects_and_reports_and_resumes(app_with_context, scene_imagery, monkeypatch,
+                                                               tmp_path, capsys):
+    """Test that the portfolio runner inserts a project and ready report per feature and resumes from its checkpoint."""
+    import models
+    import portfolio
+    import utils.portfolio
+
+    monkeypatch.setattr(utils.portfolio, 'preprocess_imagery', lambda coordinates, decode=True: {
+        **scene_imagery, 'bounds': {'north': 10.1, 'south': 10.0, 'east': 20.1, 'west': 20.0}})
+    source = tmp_path / 'sites.geojson'
+    source.write_text(json.dumps({'type': 'FeatureCollection', 'features': [
+        {'type': 'Feature', 'properties': {'name': f"Site {index}"},
+         'geometry': {'type': 'Polygon', 'coordinates': [[[20, 10], [20.1, 10], [20.1, 10.1 + index / 100], [20, 10]]]}}
+        for index in range(3)]}))
+    args = [str(source), '--project-type', 'Solar Farm', '--output-dir', str(tmp_path / 'reports'),
+            '--cpu-workers', '1', '--fetch-workers', '2', '--batch-size', '2']
+
+    assert portfolio.main(args) == 0
+    assert 'Portfolio run: 3 done, 0 failed, 0 skipped' in capsys.readouterr().out
+    assert models.Report.query.count() == 3 and models.Project.query.count() == 3
+    project = models.Project.query.filter_by(name='Site 0').one()
+    assert (project.project_type, project.min_lat, project.max_lat) == ('Solar Farm', 10.0, 10.1)
+    report = project.reports[0]
+    # Only the triangle's pixels count, and it covers more of the soil band than of the trees
+    assert (report.status, report.dominant_land_cover, report.object_count) == ('ready', 'barren_land', 6)
+    assert os.path.exists(report.file_path) and report.content_hash
+
+    # Without --resume an existing checkpoint is not overwritten
+    with pytest.raises(SystemExit):
+        portfolio.main(args)
+    assert portfolio.main(args + ['--resume']) == 0
+    assert 'Resuming: 3 feature(s) done' in capsys.readouterr().out
+    assert models.Report.query.count() == 3
+
+    # Rows committed before the checkpoint was written are not inserted twice
+    os.remove(f"{source}.checkpoint.jsonl")
+    assert portfolio.main(args) == 0
+    assert models.Report.query.count() == 3 and models.Project.query.count() == 3
@@ -0,0 +1,71 @@
+from utils.analysis_cache import AnalysisCache, canonical_geometry, geometry_fingerprint
+from utils.result_store import MemoryBackend, SQLiteBackend
+
+SQUARE = [[10.0, 20.0], [10.0, 20.1], [10.1, 20.1], [10.1, 20.0]]
+
+
+def test_fingerprint_ignores_start_vertex_winding_and_closing_vertex():
+    reference = geometry_fingerprint(SQUARE)
+    rotated = SQUARE[2:] + SQUARE[:2]
+    reversed_ring = SQUARE[::-1]
+    closed = SQUARE + [SQUARE[0]]
+    assert geometry_fingerprint(rotated) == reference
+    assert geometry_fingerprint(reversed_ring) == reference
+    assert geometry_fingerprint(closed) == reference
+
+
+def test_fingerprint_rounds_coordinates():
+    jittered = [[lat + 1e-9, lng - 1e-9] for lat, lng in SQUARE]
+    assert geometry_fingerprint(jittered) == geometry_fingerprint(SQUARE)
+    moved = [[lat + 1e-4, lng] for lat, lng in SQUARE]
+    assert geometry_fingerprint(moved) != geometry_fingerprint(SQUARE)
+
+
+def test_fingerprint_line_direction_is_normalized():
+    line = [[10.0, 20.0], [10.5, 20.5]]
+    assert geometry_fingerprint(line) == geometry_fingerprint(line[::-1])
+
+
+def test_fingerprint_of_open_lines_keeps_the_vertex_order():
+    road = [[10.0, 20.0], [10.5, 20.5], [10.0, 21.0]]
+    rotated = road[1:] + road[:1]
+    assert geometry_fingerprint(road, closed=False) == geometry_fingerprint(road[::-1], closed=False)
+    # A-B-C and B-C-A are different alignments, though the same ring
+    assert geometry_fingerprint(road, closed=False) != geometry_fingerprint(rotated, closed=False)
+    assert geometry_fingerprint(road, closed=True) == geometry_fingerprint(rotated, closed=True)
+
+
+def test_canonical_geometry_drops_duplicate_vertices():
+    points = canonical_geometry([[0, 0], [0, 0], [0, 1], [1, 1], [1, 0], [0, 0]])
+    assert points.tolist() == [[0.0, 0.0], [0.0, 1.0], [1.0, 1.0], [1.0, 0.0]]
+
+
+def test_cache_hits_misses_and_counters():
+    cache = AnalysisCache(MemoryBackend())
+    fingerprint = geometry_fingerprint(SQUARE)
+    assert cache.get(fingerprint, 'objects', 'v1') is None
+    cache.put(fingerprint, 'objects', 'v1', {'buildings': []})
+    assert cache.get(fingerprint, 'objects', 'v1') == {'buildings': []}
+    assert cache.stats()['objects'] == {'hits': 1, 'misses': 1}
+
+
+def test_version_change_invalidates_entry():
+    backend = MemoryBackend()
+    cache = AnalysisCache(backend)
+    cache.put('abc', 'objects', 'model-a', {'buildings': [1]})
+    assert cache.get('abc', 'objects', 'model-b') is None
+    assert len(backend) == 0
+
+
+def test_cache_persists_across_instances(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    AnalysisCache(SQLiteBackend(path)).put('abc', 'imagery', 'v1', {'processed_data': b'\x89PNG'})
+    assert AnalysisCache(SQLiteBackend(path)).get('abc', 'imagery', 'v1') == {'processed_data': b'\x89PNG'}
+
+
+def test_invalidate_removes_all_stages():
+    cache = AnalysisCache(MemoryBackend())
+    for stage in ('imagery', 'land_cover', 'objects'):
+        cache.put('abc', stage, 'v1', stage)
+    cache.invalidate('abc')
+    assert all(cache.get('abc', stage, 'v1') is None for stage in ('imagery', 'land_cover', 'objects'))
@@ -0,0 +1,295 @@
+import time
+
+import numpy as np
+import pytest
+import utils.analysis_pipeline as pipeline
+from tests.conftest import make_scene
+from utils.land_cover import MAP_DATA_MAX_SIDE, classify_land_cover
+from utils.raster import ClassMap
+
+
+@pytest.fixture
+def offline_imagery(monkeypatch):
+    """Replaces the network-bound imagery stage with a static payload."""
+    def fake_preprocess(coordinates):
+        return {
+            'error': None,
+            'processed_data': None,
+            'bounds': {
+                'north': max(p[0] for p in coordinates),
+                'south': min(p[0] for p in coordinates),
+                'east': max(p[1] for p in coordinates),
+                'west': min(p[1] for p in coordinates)
+            }
+        }
+    monkeypatch.setattr(pipeline, 'preprocess_imagery', fake_preprocess)
+
+
+def test_run_analysis_returns_results_and_timings(offline_imagery):
+    output = pipeline.run_analysis([[10.0, 20.0], [10.1, 20.0], [10.1, 20.1]])
+    results = output['results']
+    assert set(results) >= {'land_cover', 'objects', 'terrain', 'vegetation',
+                             'water_bodies', 'access_roads', 'constraints'}
+    timings = output['timings']
+    assert set(timings) == {'imagery', 'land_cover', 'objects', 'terrain', 'vegetation', 'water_bodies', 'total'}
+    assert all(value >= 0 for value in timings.values())
+
+
+def test_build_analysis_results_keeps_stage_outputs():
+    results = pipeline.build_analysis_results({'classifications': {}}, {'buildings': []})
+    assert results['land_cover'] == {'classifications': {}}
+    assert results['objects'] == {'buildings': []}
+
+
+@pytest.fixture
+def counted_imagery(monkeypatch):
+    calls = []
+
+    def fake_preprocess(coordinates):
+        calls.append(coordinates)
+        return {'error': None, 'processed_data': b'img',
+                'bounds': {'north': 1, 'south': 0, 'east': 1, 'west': 0}}
+    monkeypatch.setattr(pipeline, 'preprocess_imagery', fake_preprocess)
+    return calls
+
+
+def test_cached_rerun_skips_imagery(counted_imagery):
+    from utils.analysis_cache import AnalysisCache
+    from utils.result_store import MemoryBackend
+
+    cache = AnalysisCache(MemoryBackend())
+    square = [[0, 0], [0, 1], [1, 1], [1, 0]]
+    first = pipeline.run_analysis(square, cache)
+    assert first['cache'] == {'land_cover': 'miss', 'objects': 'miss', 'imagery': 'miss'}
+
+    second = pipeline.run_analysis(square[::-1], cache)
+    assert second['cache'] == {'land_cover': 'hit', 'objects': 'hit', 'imagery': 'skipped'}
+    assert second['results'] == first['results']
+    assert len(counted_imagery) == 1
+
+
+def test_open_lines_do_not_share_cache_entries_with_their_rotations(counted_imagery):
+    from utils.analysis_cache import AnalysisCache
+    from utils.result_store import MemoryBackend
+
+    cache = AnalysisCache(MemoryBackend())
+    road = [[0, 0], [0, 1], [1, 1]]
+    pipeline.run_analysis(road, cache, closed=False)
+    assert pipeline.run_analysis(road[1:] + road[:1], cache, closed=False)['cache']['land_cover'] == 'miss'
+    assert pipeline.run_analysis(road[::-1], cache, closed=False)['cache']['land_cover'] == 'hit'
+    assert pipeline.cached_imagery(road, cache, closed=False) is not None
+    assert pipeline.cached_imagery(road, cache) is None  # three points read as a ring by default
+
+
+def test_detection_model_change_recomputes_objects(counted_imagery, monkeypatch):
+    from utils.analysis_cache import AnalysisCache
+    from utils.result_store import MemoryBackend
+
+    cache = AnalysisCache(MemoryBackend())
+    square = [[0, 0], [0, 1], [1, 1], [1, 0]]
+    pipeline.run_analysis(square, cache)
+    monkeypatch.setattr(pipeline, 'DETECTION_MODEL', 'Upgraded Model')
+    output = pipeline.run_analysis(square, cache)
+    assert output['cache'] == {'land_cover': 'hit', 'objects': 'miss', 'imagery': 'hit'}
+    assert len(counted_imagery) == 1
+
+
+def test_failed_imagery_is_not_cached(monkeypatch):
+    from utils.analysis_cache import AnalysisCache
+    from utils.result_store import MemoryBackend
+
+    monkeypatch.setattr(pipeline, 'preprocess_imagery', lambda coordinates: {
+        'error': 'Timeout fetching map imagery.', 'processed_data': None,
+        'bounds': {'north': 1, 'south': 0, 'east': 1, 'west': 0}})
+    backend = MemoryBackend()
+    pipeline.run_analysis([[0, 0], [0, 1], [1, 1]], AnalysisCache(backend))
+    assert len(backend) == 0
+
+
+def test_polygon_analysis_counts_only_pixels_inside_the_ring(monkeypatch):
+    monkeypatch.setattr(pipeline, 'preprocess_imagery', lambda coordinates: {
+        'error': None, 'processed_data': make_scene(),
+        'bounds': {'north': 1, 'south': 0, 'east': 1, 'west': 0}})
+    # The top quarter of the image, which only shows the band of trees
+    strip = [[0.75, 0.05], [0.75, 0.95], [0.98, 0.95], [0.98, 0.05]]
+    land_cover = pipeline.run_analysis(strip)['results']['land_cover']
+    assert land_cover['classifications']['vegetation']['details']['trees'] == 100.0
+    assert land_cover['pixels_classified'] < 100 * 100 / 4
+    # An open line through the same points is not masked
+    line = pipeline.run_analysis(strip, closed=False)['results']['land_cover']
+    assert line['classifications']['vegetation']['details']['trees'] == 30.0
+
+
+def test_memory_mapped_imagery_is_cached_as_bytes(monkeypatch):
+    from utils.analysis_cache import AnalysisCache, geometry_fingerprint
+    from utils.image_processor import IMAGERY_VERSION
+    from utils.result_store import MemoryBackend
+
+    monkeypatch.setattr(pipeline, 'preprocess_imagery', lambda coordinates: {
+        'error': None, 'processed_data': memoryview(b'img'),
+        'bounds': {'north': 1, 'south': 0, 'east': 1, 'west': 0}})
+    cache = AnalysisCache(MemoryBackend())
+    square = [[0, 0], [0, 1], [1, 1], [1, 0]]
+    pipeline.run_analysis(square, cache)
+    cached = cache.get(geometry_fingerprint(square), 'imagery', IMAGERY_VERSION)
+    assert cached['processed_data'] == b'img'
+
+
+@pytest.fixture
+def tile_imagery(monkeypatch):
+    import threading
+
+    state = {'calls': 0, 'active': 0, 'max_active': 0}
+    lock = threading.Lock()
+
+    def fake_fetch_tile(tile):
+        with lock:
+            state['calls'] += 1
+            state['active'] += 1
+            state['max_active'] = max(state['max_active'], state['active'])
+        time.sleep(0.005)
+        with lock:
+            state['active'] -= 1
+        return {'error': None, 'processed_data': image, 'bounds': tile['bounds']}
+    image = make_scene(640, 640)
+    monkeypatch.setattr(pipeline, 'fetch_tile', fake_fetch_tile)
+    return state
+
+
+def test_tiled_analysis_streams_tiles_through_a_bounded_pool(tile_imagery):
+    square = [[20.0, 78.0], [20.0, 78.05], [20.05, 78.05], [20.05, 78.0]]
+    output = pipeline.run_analysis(square, tiling={'target_resolution_m': 2.0, 'max_tiles': 64, 'workers': 3})
+    tiling = output['results']['land_cover']['tiling']
+    assert tiling['tiles'] == tile_imagery['calls'] > 1
+    assert tile_imagery['max_active'] <= 3
+    assert tiling['failed'] == 0
+    # Identical tiles merge to about the single-tile percentages; edge tiles
+    # only count the part of the scene inside the square
+    single = classify_land_cover({'processed_data': make_scene(640, 640)})
+    merged = output['results']['land_cover']['classifications']
+    for name, values in single['classifications'].items():
+        assert merged[name]['percentage'] == pytest.approx(values['percentage'], abs=2.0)
+    assert tiling['pixels_analysed'] < tiling['tiles'] * 640 * 640
+    assert set(output['timings']) == {'tiles', 'total'}
+    # The tiles' class maps are merged into one coarse map of the whole extent
+    class_map = ClassMap.from_json(output['results']['land_cover']['map_data'])
+    assert max(class_map.width, class_map.height) <= MAP_DATA_MAX_SIDE
+    assert class_map.percentages()['not_analysed'] < 100.0
+
+
+def test_tiled_analysis_is_cached_separately(tile_imagery):
+    from utils.analysis_cache import AnalysisCache
+    from utils.result_store import MemoryBackend
+
+    cache = AnalysisCache(MemoryBackend())
+    square = [[20.0, 78.0], [20.0, 78.01], [20.01, 78.01], [20.01, 78.0]]
+    tiling = {'target_resolution_m': 2.0, 'workers': 2}
+    first = pipeline.run_analysis(square, cache, tiling)
+    assert first['cache'] == {'land_cover': 'miss', 'objects': 'miss', 'imagery': 'tiled'}
+    calls = tile_imagery['calls']
+    second = pipeline.run_analysis(square, cache, tiling)
+    assert second['cache']['imagery'] == 'skipped'
+    assert tile_imagery['calls'] == calls
+
+
+def test_tiled_analysis_leaves_the_report_image_in_the_cache(tile_imagery, monkeypatch, tmp_path):
+    import json
+    from utils.analysis_cache import AnalysisCache
+    from utils.report_generator import render_report_file
+    from utils.result_store import MemoryBackend
+
+    fetched = []
+
+    def fake_preprocess(coordinates, decode=True):
+        fetched.append(decode)
+        return {'error': None, 'processed_data': make_scene(), 'image': None,
+                'bounds': {'north': 20.01, 'south': 20.0, 'east': 78.01, 'west': 78.0}}
+    monkeypatch.setattr(pipeline, 'preprocess_imagery', fake_preprocess)
+    cache = AnalysisCache(MemoryBackend())
+    square = [[20.0, 78.0], [20.0, 78.01], [20.01, 78.01], [20.01, 78.0]]
+    tiling = {'target_resolution_m': 2.0, 'workers': 2}
+    output = pipeline.run_analysis(square, cache, tiling)
+    # Fetched once on the analysis side, undecoded
+    assert fetched == [False] and 'report_imagery' in output['timings']
+    assert pipeline.cached_imagery(square, cache) is not None
+    pipeline.run_analysis(square, cache, tiling)
+    assert len(fetched) == 1
+
+    # Rendering only reads the cached bytes back
+    monkeypatch.setattr(pipeline, 'preprocess_imagery', lambda *args, **kwargs: pytest.fail("fetched while rendering"))
+    project = {'id': 1, 'name': 'Tiled', 'type': 'Solar Farm', 'coordinates': square}
+    results = json.dumps(output['results'])
+    with_image = render_report_file(1, project, results, str(tmp_path / 'a.pdf'), cache)
+    without = render_report_file(2, project, results, str(tmp_path / 'b.pdf'))
+    assert with_image['bytes'] > without['bytes']
+
+
+def test_tiled_analysis_falls_back_when_every_tile_fails(monkeypatch):
+    monkeypatch.setattr(pipeline, 'fetch_tile', lambda tile: {
+        'error': 'Missing GOOGLE_MAPS_API_KEY', 'processed_data': None, 'bounds': tile['bounds']})
+    output = pipeline.run_analysis([[0, 0], [0, 0.01], [0.01, 0.01]], tiling={'target_resolution_m': 5.0})
+    assert 'tiling' not in output['results']['land_cover']
+    assert output['results']['objects']['buildings'] == []
+    assert output['results']['objects']['status']
+
+
+def test_corridor_analysis_restricts_pixels_to_the_right_of_way(tile_imagery):
+    route = [[20.0, 78.0], [20.1, 78.1], [20.2, 78.2]]
+    tiling = {'target_resolution_m': 5.0, 'max_tiles': 500, 'closed': False, 'workers': 4}
+    whole = pipeline.run_analysis(route, tiling=tiling)['results']['land_cover']['tiling']
+    corridor = pipeline.run_analysis(route, tiling={**tiling, 'corridor_m': 60})['results']['land_cover']['tiling']
+    assert corridor['corridor_m'] == 60
+    assert corridor['pixels_analysed'] * 10 < whole['pixels_analysed']
+
+
+def test_stages_share_one_decoded_image(monkeypatch):
+    from utils.image_buffer import image_array
+
+    monkeypatch.setattr(pipeline, 'preprocess_imagery', lambda coordinates: {
+        'error': None, 'processed_data': make_scene(), 'bounds': {'north': 1, 'south': 0, 'east': 1, 'west': 0}})
+    seen = []
+
+    def record(stage_output):
+        def stage(imagery_data):
+            seen.append((imagery_data['image'], image_array(imagery_data)))
+            return stage_output
+        return stage
+    monkeypatch.setattr(pipeline, 'classify_land_cover', record({'classifications': {}}))
+    monkeypatch.setattr(pipeline, 'detect_objects', record({}))
+
+    pipeline.run_analysis([[0, 0], [0, 1], [1, 1]])
+    (first_buffer, first), (second_buffer, second) = seen
+    assert first_buffer is second_buffer and np.shares_memory(first, second)
+    with pytest.raises(ValueError):
+        first_buffer.array  # released after the stages
+
+
+def test_independent_stages_run_concurrently(offline_imagery, monkeypatch):
+    def slow(result):
+        def stage(imagery_data):
+            time.sleep(0.2)
+            return result
+        return stage
+    monkeypatch.setattr(pipeline, 'classify_land_cover', slow({'classifications': {}}))
+    monkeypatch.setattr(pipeline, 'detect_objects', slow({}))
+
+    output = pipeline.run_analysis([[10.0, 20.0], [10.1, 20.0], [10.1, 20.1]])
+    timings = output['timings']
+    assert timings['land_cover'] >= 0.2 and timings['objects'] >= 0.2
+    assert timings['total'] < timings['land_cover'] + timings['objects']
+
+
+def test_stage_failure_aborts_the_analysis(offline_imagery, monkeypatch):
+    from utils.stage_graph import StageError, StageTimeoutError
+
+    def broken(imagery_data):
+        raise RuntimeError('model missing')
+    monkeypatch.setattr(pipeline, 'detect_objects', broken)
+    with pytest.raises(StageError, match='model missing') as raised:
+        pipeline.run_analysis([[10.0, 20.0], [10.1, 20.0], [10.1, 20.1]])
+    assert raised.value.stage == 'objects'
+
+    monkeypatch.setenv('ANALYSIS_STAGE_TIMEOUT', '0.05')
+    monkeypatch.setattr(pipeline, 'detect_objects', lambda imagery_data: time.sleep(0.5))
+    with pytest.raises(StageTimeoutError):
+        pipeline.run_analysis([[10.0, 20.0], [10.1, 20.0], [10.1, 20.1]])
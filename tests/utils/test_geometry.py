@@ -0,0 +1,150 @@
+import numpy as np
+import pytest
+from utils.geometry import (
+    as_points, batch_measure, bounds, is_linear_project, measure,
+    pack_ragged, path_length_km, polygon_area_sqkm
+)
+
+SQUARE = [[0, 0], [0, 1], [1, 1], [1, 0]]
+
+
+def test_polygon_area_matches_reference_formula():
+    # A 1-degree cell at the equator: R^2 * dlng * (sin(lat2) - sin(lat1))
+    assert np.isclose(polygon_area_sqkm(SQUARE), 6371.0 ** 2 * np.radians(1) * np.sin(np.radians(1)))
+    assert polygon_area_sqkm([[0, 0], [1, 1]]) == 0.0
+
+
+@pytest.mark.parametrize('origin', [(0, 0), (28.6, 77.2), (45, -120), (60, 100), (-33.9, 151.2)])
+def test_polygon_area_does_not_depend_on_location(origin):
+    # A 1 km x 1 km square measures 1 sq km wherever it is
+    lat, lng = origin
+    side = np.degrees(1 / 6371.0)
+    width = side / np.cos(np.radians(lat))
+    square = [[lat, lng], [lat, lng + width], [lat + side, lng + width], [lat + side, lng]]
+    assert np.isclose(polygon_area_sqkm(square), 1.0, rtol=1e-3)
+    assert np.isclose(measure(square)['area_sqkm'], 1.0, rtol=1e-3)
+    assert np.isclose(batch_measure([square])['area_sqkm'][0], 1.0, rtol=1e-3)
+
+
+def test_polygon_area_across_the_antimeridian():
+    crossing = [[0, 179.9], [0, -179.9], [0.1, -179.9], [0.1, 179.9]]
+    assert np.isclose(polygon_area_sqkm(crossing), polygon_area_sqkm([[0, 0], [0, 0.2], [0.1, 0.2], [0.1, 0]]))
+
+
+def test_path_length_one_degree_at_equator():
+    # 1 degree of arc on a 6371 km sphere
+    assert np.isclose(path_length_km([[0, 0], [0, 1]]), 111.19492664455873)
+    assert path_length_km([[0, 0]]) == 0.0
+
+
+def test_closed_path_length_includes_closing_edge():
+    assert np.isclose(path_length_km(SQUARE, closed=True),
+                      path_length_km(SQUARE + [SQUARE[0]]))
+
+
+def test_bounds():
+    assert bounds([[1, 5], [-2, 7], [3, 6]]) == {'north': 3.0, 'south': -2.0, 'east': 7.0, 'west': 5.0}
+    assert bounds([]) == {'north': 0, 'south': 0, 'east': 0, 'west': 0}
+
+
+def test_measure_polygon():
+    metrics = measure(SQUARE)
+    assert np.isclose(metrics['area_sqkm'], polygon_area_sqkm(SQUARE))
+    assert np.isclose(metrics['perimeter_km'], path_length_km(SQUARE, closed=True))
+    assert np.allclose(metrics['centroid'], [0.5, 0.5])
+    assert metrics['vertex_count'] == 4
+
+
+def test_measure_line():
+    metrics = measure([[0, 0], [0, 1]])
+    assert metrics['area_sqkm'] == 0.0
+    assert np.isclose(metrics['length_km'], 111.19492664455873)
+    assert measure([[0, 0], [0, 1], [1, 1]], closed=False)['area_sqkm'] == 0.0
+
+
+def test_measure_centroid_is_area_weighted():
+    # Extra vertices along one edge must not pull the centroid
+    dense_edge = [[0, 0], [0, 0.25], [0, 0.5], [0, 0.75], [0, 1], [1, 1], [1, 0]]
+    assert np.allclose(measure(dense_edge)['centroid'], [0.5, 0.5])
+
+
+def test_batch_measure_matches_single_geometry_measure():
+    rng = np.random.default_rng(7)
+    geometries = []
+    for count in rng.integers(3, 12, size=50):
+        angles = np.sort(rng.uniform(0, 2 * np.pi, count))
+        center = rng.uniform(-60, 60, 2)
+        geometries.append(np.column_stack([center[0] + 0.1 * np.sin(angles),
+                                           center[1] + 0.1 * np.cos(angles)]))
+    batch = batch_measure(geometries)
+    for i, geometry in enumerate(geometries):
+        single = measure(geometry)
+        assert np.isclose(batch['area_sqkm'][i], single['area_sqkm'])
+        assert np.isclose(batch['perimeter_km'][i], single['perimeter_km'])
+        assert np.isclose(batch['length_km'][i], single['length_km'])
+        assert np.allclose(batch['centroid'][i], single['centroid'])
+        assert batch['north'][i] == single['bounds']['north']
+        assert batch['west'][i] == single['bounds']['west']
+
+
+def test_batch_measure_accepts_packed_arrays_and_degenerate_rings():
+    points, offsets = pack_ragged([SQUARE, [[0, 0], [0, 1]]])
+    batch = batch_measure(points=points, offsets=offsets)
+    assert batch['vertex_count'].tolist() == [4, 2]
+    assert batch['area_sqkm'][1] == 0.0
+    assert np.isclose(batch['length_km'][1], 111.19492664455873)
+
+
+def test_as_points_rejects_bad_shapes():
+    with pytest.raises(ValueError):
+        as_points([1, 2, 3])
+    assert as_points([]).shape == (0, 2)
+
+
+@pytest.mark.parametrize('project_type, expected', [
+    ('Rural Road', True), ('Urban Road', True), ('Road', True), ('Pipeline', True),
+    ('Transmission Line', True), ('Solar Farm', False), ('Warehouse', False), (None, False)
+])
+def test_is_linear_project(project_type, expected):
+    assert is_linear_project(project_type) is expected
+
+
+def test_simplify_line_keeps_endpoints_and_respects_tolerance():
+    from utils.geometry import project_to_metres, simplify
+    lng = np.linspace(78.0, 78.1, 1001)
+    lat = 20.0 + 0.0001 * np.sin(lng * 500)  # ~11 m wiggle
+    line = np.column_stack([lat, lng])
+    simplified, indices, deviation = simplify(line, 50.0, closed=False)
+    assert indices[0] == 0 and indices[-1] == len(line) - 1
+    assert len(simplified) < len(line) // 10
+    assert 0 < deviation <= 50.0
+    # Every original vertex lies within the tolerance of the simplified path
+    xy = project_to_metres(line, origin=line.mean(axis=0))
+    kept = xy[indices]
+    for i in range(len(indices) - 1):
+        seg = xy[indices[i]:indices[i + 1] + 1]
+        a, b = kept[i], kept[i + 1]
+        ab = b - a
+        t = np.clip(((seg - a) @ ab) / (ab @ ab), 0, 1)
+        assert np.hypot(*(seg - (a + t[:, None] * ab)).T).max() <= 50.0 + 1e-6
+
+
+def test_simplify_ring_keeps_corners():
+    from utils.geometry import simplify
+    edge = np.linspace(0, 1, 50, endpoint=False)
+    ring = np.concatenate([
+        np.column_stack([np.zeros(50), edge]),
+        np.column_stack([edge, np.ones(50)]),
+        np.column_stack([np.ones(50), 1 - edge]),
+        np.column_stack([1 - edge, np.zeros(50)])
+    ])
+    simplified, _, deviation = simplify(ring, 10.0)
+    assert sorted(map(tuple, simplified.tolist())) == [(0.0, 0.0), (0.0, 1.0), (1.0, 0.0), (1.0, 1.0)]
+    assert deviation < 1e-6
+
+
+def test_simplify_zero_tolerance_is_identity():
+    from utils.geometry import simplify
+    simplified, indices, deviation = simplify(SQUARE, 0)
+    assert simplified.tolist() == [[float(a), float(b)] for a, b in SQUARE]
+    assert deviation == 0.0
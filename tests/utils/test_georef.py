@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from utils.georef import GeoTransform, fit_view, georeference_detections, ring_mask
+from utils.tiling import lat_lng_to_pixels, plan_tiles
+
+
+def test_pixel_round_trip():
+    transform = GeoTransform.from_view([20.5, 78.9], 16, (600, 400))
+    pixels = np.random.default_rng(0).uniform(0, 600, size=(1000, 2))
+    assert np.allclose(transform.lat_lng_to_pixels(transform.pixels_to_lat_lng(pixels)), pixels, atol=1e-6)
+    # The centre pixel is the requested centre
+    assert np.allclose(transform.pixels_to_lat_lng([[300, 200]]), [[20.5, 78.9]], atol=1e-9)
+
+
+def test_tile_transform_matches_the_tile_plan():
+    plan = plan_tiles([[20.0, 78.0], [20.0, 78.02], [20.02, 78.02], [20.02, 78.0]], target_resolution_m=5.0)
+    tile = plan['tiles'][0]
+    transform = GeoTransform.from_tile(tile)
+    corners = transform.pixels_to_lat_lng([[0, 0], [tile['pixel_box'][2] - tile['pixel_box'][0],
+                                                    tile['pixel_box'][3] - tile['pixel_box'][1]]])
+    bounds = tile['bounds']
+    assert np.allclose(corners, [[bounds['north'], bounds['west']], [bounds['south'], bounds['east']]], atol=1e-7)
+    assert transform.ground_resolution_m(20.0) == pytest.approx(plan['resolution_m'], rel=0.01)
+
+
+def test_fit_view_keeps_the_geometry_inside_the_padding():
+    coords = [[20.0, 78.0], [20.05, 78.1], [19.98, 78.03]]
+    centre, zoom = fit_view(coords, (600, 400), padding_px=20)
+    pixels = GeoTransform.from_view(centre, zoom, (600, 400)).lat_lng_to_pixels(coords)
+    assert (pixels >= 20).all() and (pixels[:, 0] <= 580).all() and (pixels[:, 1] <= 380).all()
+    # One zoom level more would not fit
+    span = np.ptp(lat_lng_to_pixels(coords, zoom + 1), axis=0)
+    assert (span > [560, 360]).any()
+    assert fit_view([[20.0, 78.0]], (600, 400), max_zoom=18)[1] == 18
+    with pytest.raises(ValueError):
+        fit_view([], (600, 400))
+
+
+def test_boxes_and_polylines_convert_both_ways():
+    transform = GeoTransform.from_bounds({'north': 1.0, 'south': 0.0, 'east': 1.0, 'west': 0.0}, (100, 100))
+    centres, extents = transform.boxes_to_lat_lng([[0, 0, 100, 100], [0, 0, 50, 50]])
+    assert np.allclose(extents[0], [0.0, 0.0, 1.0, 1.0], atol=1e-9)
+    assert np.allclose(centres[1], [0.75, 0.25], atol=1e-3)
+    assert np.allclose(transform.lat_lng_to_boxes(extents), [[0, 0, 100, 100], [0, 0, 50, 50]], atol=1e-6)
+
+    lines = [[[0, 0], [10, 10], [20, 0]], [[50, 50], [60, 60]]]
+    converted = transform.polylines_to_lat_lng(lines)
+    assert [len(line) for line in converted] == [3, 2]
+    back = transform.lat_lng_to_polylines(converted)
+    assert all(np.allclose(a, b, atol=1e-6) for a, b in zip(back, lines))
+    assert transform.polylines_to_lat_lng([]) == []
+
+
+def test_for_imagery_prefers_the_georef_and_rescales_it():
+    transform = GeoTransform.from_view([20.5, 78.9], 16, (600, 400))
+    imagery = {'georef': transform.to_dict((600, 400)), 'bounds': {'north': 1, 'south': 0, 'east': 1, 'west': 0}}
+    # A high-DPI image has twice the pixels over the same extent
+    doubled = GeoTransform.for_imagery(imagery, (800, 1200, 3))
+    assert np.allclose(doubled.pixels_to_lat_lng([[600, 400]]), transform.pixels_to_lat_lng([[300, 200]]))
+    assert GeoTransform.for_imagery({'bounds': imagery['bounds']}, (10, 10, 3)) is not None
+    assert GeoTransform.for_imagery({'bounds': imagery['bounds']}) is None
+    with pytest.raises(ValueError):
+        GeoTransform([0, 0], [0, 1])
+
+
+def test_georeference_detections_covers_boxes_and_lines():
+    transform = GeoTransform.from_view([20.5, 78.9], 16, (600, 400))
+    boxes = np.random.default_rng(1).uniform(0, 300, size=(20000, 2))
+    detections = {
+        'buildings': [{'bbox': [x, y, x + 10, y + 10]} for x, y in boxes.tolist()],
+        'roads': [{'points': [[0, 0], [600, 400]]}],
+        'analysis_date': '2024-01-01'
+    }
+    georeference_detections(detections, transform)
+    building = detections['buildings'][0]
+    south, west, north, east = building['geo_bbox']
+    assert south < building['lat_lng'][0] < north and west < building['lat_lng'][1] < east
+    assert np.allclose(detections['roads'][0]['lat_lngs'],
+                       transform.pixels_to_lat_lng([[0, 0], [600, 400]]), atol=1e-7)
+
+
+def test_ring_mask_matches_a_point_in_polygon_test():
+    from utils.spatial_index import points_in_polygon
+
+    transform = GeoTransform.from_view([20.0, 78.0], 15, (64, 48))
+    # A concave ring that leaves the image on the left
+    ring = transform.pixels_to_lat_lng([[-10, 5], [50, 3], [30, 20], [55, 44], [5, 40]])
+    mask = ring_mask(ring, transform, (48, 64, 3))
+    assert mask.shape == (48, 64)
+    centres = np.stack(np.meshgrid(np.arange(64) + 0.5, np.arange(48) + 0.5), axis=-1).reshape(-1, 2)
+    expected = points_in_polygon(centres, transform.lat_lng_to_pixels(ring)).reshape(48, 64)
+    assert (mask != expected).sum() <= 2  # pixel centres exactly on an edge may go either way
+    assert not ring_mask(ring[:2], transform, (48, 64)).any()
+
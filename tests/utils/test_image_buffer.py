@@ -0,0 +1,91 @@
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+from tests.conftest import make_scene
+from utils.image_buffer import ImageBuffer, close_image, image_array, with_image
+
+
+def _checksum(image):
+    # Runs in a worker process
+    return int(image.array.sum(dtype=np.int64)), image.shape
+
+
+def test_decode_gives_a_read_only_array():
+    with ImageBuffer.decode(make_scene(60, 40)) as image:
+        assert image.shape == (40, 60, 3) and not image.memory_mapped
+        assert image.array[0, 0].tolist() == [30, 90, 30]
+        with pytest.raises(ValueError):
+            image.array[0, 0] = 0
+    with pytest.raises(ValueError):
+        image.array
+
+
+def test_memoryviews_are_decoded_in_place(tmp_path):
+    import io
+    import mmap
+    from utils.image_buffer import _BufferReader
+
+    encoded = make_scene(60, 40)
+    path = tmp_path / 'tile.png'
+    path.write_bytes(encoded)
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        view = memoryview(mapped)
+        with ImageBuffer.decode(view) as image, ImageBuffer.decode(encoded) as expected:
+            assert np.array_equal(image.array, expected.array)
+        view.release()
+
+    reader = _BufferReader(bytearray(encoded))
+    assert reader.read(8) == encoded[:8] and reader.tell() == 8
+    assert reader.seek(-4, io.SEEK_END) == len(encoded) - 4 and reader.read() == encoded[-4:]
+    assert reader.read(1) == b''
+
+
+@pytest.mark.parametrize('data', [None, b'', b'not an image'])
+def test_unreadable_data_decodes_to_none(data):
+    assert ImageBuffer.decode(data) is None
+
+
+def test_large_images_are_memory_mapped(tmp_path):
+    image = ImageBuffer.decode(make_scene(60, 40), memmap_threshold=1, directory=str(tmp_path))
+    assert image.memory_mapped
+    assert len(os.listdir(tmp_path)) == 1
+    assert image.array[-1, -1].tolist() == [160, 120, 80]
+    image.close()
+    assert os.listdir(tmp_path) == []
+
+
+def test_pickling_passes_a_shared_memory_reference():
+    image = ImageBuffer.decode(make_scene(200, 200))
+    payload = pickle.dumps(image)
+    assert len(payload) < 1000  # a reference, not 120 KB of pixels
+    copy = pickle.loads(payload)
+    assert np.array_equal(copy.array, image.array)
+    assert repr(image) == '<ImageBuffer 200x200 shared>'  # the owner now reads the segment too
+    copy.close()
+    assert image.array[0, 0].tolist() == [30, 90, 30]
+    image.close()
+
+
+@pytest.mark.parametrize('memmap_threshold', [1, None])
+def test_process_pool_workers_map_the_same_pixels(memmap_threshold, tmp_path):
+    image = ImageBuffer.decode(make_scene(120, 80), memmap_threshold=memmap_threshold, directory=str(tmp_path))
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        checksum, shape = pool.submit(_checksum, image).result()
+    assert (checksum, shape) == (int(image.array.sum(dtype=np.int64)), (80, 120, 3))
+    image.close()
+
+
+def test_payload_helpers():
+    payload = {'processed_data': make_scene(20, 10)}
+    assert image_array(payload).shape == (10, 20, 3)  # decoded on demand without an attached buffer
+
+    prepared = with_image(payload)
+    assert 'image' not in payload and with_image(prepared) is prepared
+    assert np.shares_memory(image_array(prepared), prepared['image'].array)
+    close_image(prepared)
+    close_image({'image': None})
+    assert with_image({'processed_data': None}) == {'processed_data': None}
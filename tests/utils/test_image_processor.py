@@ -83,7 +83,7 @@ def test_calculate_area_simple_square():
     # Square: (0,0), (0,0.01), (0.01,0.01), (0.01,0)
     # Based on the prompt's analysis of the existing formula.
     coords = [[0,0], [0,0.01], [0.01,0.01], [0.01,0]]
-    expected_area = 1.236431159378928 # Updated based on actual output
+    expected_area = 1.2364311648725121
     assert np.isclose(calculate_area(coords), expected_area)
 
 def test_calculate_area_larger_square():
@@ -111,8 +111,8 @@ def test_calculate_area_larger_square():
     #   area += (x1 * y2 - x2 * y1)  <-- This is the shoelace component for ONE triangle segment (origin, P_i, P_{i+1})
     # return abs(area / 2.0)
     # This is the standard Shoelace formula.
-    # Let's use the output of the function as the ground truth for the test.
-    expected_area_1deg_sq = 12363.134741656222 # Updated based on actual output
+    # Geodesic area of the 1-degree cell: R^2 * rad(1) * sin(1 degree)
+    expected_area_1deg_sq = 12363.683990261117
     assert np.isclose(calculate_area(coords), expected_area_1deg_sq)
     assert calculate_area(coords) > 0 # General check
 
@@ -122,16 +122,16 @@ def test_calculate_area_complex_polygon():
     # For simplicity, let's use a slightly more complex shape where we can verify non-zero.
     coords = [[0,0], [0,1], [0.5, 1.5], [1,1], [1,0], [0.5, -0.5]]
     # Expect a positive, non-zero area.
-    # Actual output from function: 9268.23
-    expected_area_complex = 18544.702109683356 # Updated based on actual output
+    expected_area_complex = 18545.525985391225
     assert np.isclose(calculate_area(coords), expected_area_complex)
 
 def test_calculate_area_degenerate_polygon_collinear():
     # Line (collinear points)
     coords = [[0,0], [1,1], [2,2]] # These are lat/lon
     # For such points, x1,y1, x2,y2, x3,y3 will be collinear after projection too.
-    # The area should be close to zero. Due to floating point, might not be exactly 0.0.
-    assert np.isclose(calculate_area(coords), 0.0)
+    # Straight in degrees is not straight on the sphere, so the sliver has a
+    # small area, negligible next to the 1-degree square's
+    assert calculate_area(coords) < 1e-3 * calculate_area([[0,0], [0,1], [1,1], [1,0]])
 
 def test_calculate_area_degenerate_polygon_duplicate_points():
     coords = [[0,0], [0,1], [1,1], [1,1], [1,0]] # Duplicate (1,1)
@@ -145,18 +145,15 @@ def test_calculate_area_prime_meridian_crossing():
     # The formula uses np.radians which handles negative inputs correctly.
     # The sum of terms should work out.
     # Expected area for a 2-degree longitude span x 1-degree latitude span at equator.
-    # Approx 2 * 111km * 111km for projection.
-    # Actual from function: 12358.10
-    expected_area_meridian_cross = 24726.26948331244 # Updated based on actual output
+    # Twice the 1-degree cell: R^2 * rad(2) * sin(1 degree)
+    expected_area_meridian_cross = 6371.0 ** 2 * np.radians(2) * np.sin(np.radians(1))
     assert np.isclose(calculate_area(coords), expected_area_meridian_cross)
 
 def test_calculate_area_equator_crossing():
     coords = [[-1,0], [-1,1], [1,1], [1,0]] # Crosses equator
     # Similar to prime meridian, radians will handle negative latitudes.
-    # Avg latitude in cos((lat1+lat2)/2) will be correctly calculated.
-    # Expected area for 1-deg lon x 2-deg lat span.
-    # Actual from function: 12358.10 (same as above due to symmetry)
-    expected_area_equator_cross = 24726.740278416048 # Updated based on actual output
+    # Expected area for 1-deg lon x 2-deg lat span: R^2 * rad(1) * (sin(1) - sin(-1))
+    expected_area_equator_cross = 6371.0 ** 2 * np.radians(1) * 2 * np.sin(np.radians(1))
     assert np.isclose(calculate_area(coords), expected_area_equator_cross)
 
 def test_calculate_area_order_of_vertices():
@@ -167,3 +164,119 @@ def test_calculate_area_order_of_vertices():
     area_cw = calculate_area(coords_cw)
     assert np.isclose(area_ccw, area_cw)
     assert area_ccw > 0
+
+
+def test_preprocess_imagery_fetches_detailed_geometry_without_overlay(monkeypatch, tmp_path):
+    from utils import image_processor
+    from utils.tile_cache import TileCache
+
+    class FakeResponse:
+        content = b'\x89PNG'
+        headers = {'Content-Type': 'image/png'}
+
+        def raise_for_status(self):
+            pass
+
+    sent = []
+
+    class FakeClient:
+        def send(self, prepared_request):
+            sent.append(prepared_request.url)
+            return FakeResponse()
+
+    monkeypatch.setenv('GOOGLE_MAPS_API_KEY', 'dummy_test_key')
+    angles = np.linspace(0, 2 * np.pi, 4000, endpoint=False)
+    coords = np.column_stack([20 + 0.05 * np.sin(angles), 78 + 0.05 * np.cos(angles)]).tolist()
+
+    result = image_processor.preprocess_imagery(coords, client=FakeClient(), tile_cache=TileCache(str(tmp_path)))
+    assert result['error'] is None
+    # One request, for the view alone: no overlay is drawn or built, however detailed the geometry
+    assert sent == [result['imagery_url']] and 'path=' not in result['imagery_url']
+    assert 'display_url' not in result and 'path_simplification' not in result
+    # The analysis keeps the full-resolution geometry
+    assert np.isclose(result['area_sqkm'], calculate_area(coords))
+    # The image is requested for an explicit view, so its georeference is exact
+    assert 'center=' in result['imagery_url'] and 'zoom=' in result['imagery_url']
+    assert result['georef']['size'] == [600, 400]
+
+
+def test_preprocess_imagery_serves_repeat_requests_from_tile_cache(monkeypatch, tmp_path):
+    from utils import image_processor
+    from utils.tile_cache import TileCache
+
+    sent = []
+
+    class FakeResponse:
+        content = b'\x89PNG tile'
+        headers = {'Content-Type': 'image/png'}
+
+    class FakeClient:
+        def send(self, prepared_request):
+            sent.append(prepared_request.url)
+            return FakeResponse()
+
+    monkeypatch.setenv('GOOGLE_MAPS_API_KEY', 'dummy_test_key')
+    cache = TileCache(str(tmp_path))
+    square = [[20.0, 78.0], [20.0, 78.1], [20.1, 78.1], [20.1, 78.0]]
+
+    cold = image_processor.preprocess_imagery(square, client=FakeClient(), tile_cache=cache)
+    assert cold['tile_cache'] == 'miss'
+    # A different API key still resolves to the same cached image
+    monkeypatch.setenv('GOOGLE_MAPS_API_KEY', 'another_key')
+    warm = image_processor.preprocess_imagery(square, client=FakeClient(), tile_cache=cache)
+    assert warm['tile_cache'] == 'hit'
+    assert isinstance(warm['processed_data'], memoryview)
+    assert bytes(warm['processed_data']) == b'\x89PNG tile'
+    assert warm['content_type'] == 'image/png'
+    assert len(sent) == 1
+
+
+def test_preprocess_imagery_uses_an_empty_tile_cache_it_is_given(monkeypatch, tmp_path):
+    from utils import image_processor
+    from utils.tile_cache import TileCache
+
+    class FakeResponse:
+        content = b'\x89PNG tile'
+        headers = {'Content-Type': 'image/png'}
+
+    class FakeClient:
+        def send(self, prepared_request):
+            return FakeResponse()
+
+    def no_shared_cache():
+        raise AssertionError("The process-wide tile cache must not replace the one passed in")
+
+    monkeypatch.setenv('GOOGLE_MAPS_API_KEY', 'dummy_test_key')
+    monkeypatch.setattr(image_processor, 'get_tile_cache', no_shared_cache)
+    cache = TileCache(str(tmp_path))
+    assert len(cache) == 0 and not cache  # empty, hence falsy
+    result = image_processor.preprocess_imagery([[20.0, 78.0], [20.0, 78.1], [20.1, 78.1]],
+                                                client=FakeClient(), tile_cache=cache)
+    assert result['tile_cache'] == 'miss' and len(cache) == 1
+
+
+def test_fetch_tile_requests_centre_and_zoom_without_overlay(monkeypatch, tmp_path):
+    from utils import image_processor
+    from utils.tile_cache import TileCache
+    from utils.tiling import plan_tiles
+
+    sent = []
+
+    class FakeResponse:
+        content = b'\x89PNG tile'
+        headers = {'Content-Type': 'image/png'}
+
+    class FakeClient:
+        def send(self, prepared_request):
+            sent.append(prepared_request.url)
+            return FakeResponse()
+
+    monkeypatch.setenv('GOOGLE_MAPS_API_KEY', 'dummy_test_key')
+    tile = plan_tiles([[20.0, 78.0], [20.0, 78.001], [20.001, 78.001]])['tiles'][0]
+    result = image_processor.fetch_tile(tile, client=FakeClient(), tile_cache=TileCache(str(tmp_path)))
+    assert result['error'] is None
+    assert result['bounds'] == tile['bounds']
+    assert result['tile']['zoom'] == tile['zoom']
+    assert f"zoom={tile['zoom']}" in sent[0]
+    assert 'size=640x640' in sent[0]
+    assert 'path=' not in sent[0]
@@ -0,0 +1,176 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from utils.imagery_client import CircuitBreaker, CircuitOpenError, ImageryClient
+
+
+class StandInImageryServer:
+    """Local HTTP server that replays scripted status codes, then serves PNG bytes."""
+
+    def __init__(self):
+        self.script = []
+        self.requests = 0
+        self.client_ports = set()
+        self.active = 0
+        self.max_active = 0
+        self.delay = 0.0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with server.lock:
+                    server.requests += 1
+                    server.client_ports.add(self.client_address[1])
+                    server.active += 1
+                    server.max_active = max(server.max_active, server.active)
+                    status = server.script.pop(0) if server.script else 200
+                time.sleep(server.delay)
+                body = b'\x89PNG fake image' if status == 200 else b'error'
+                self.send_response(status)
+                self.send_header('Content-Type', 'image/png' if status == 200 else 'text/plain')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with server.lock:
+                    server.active -= 1
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/staticmap"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server():
+    stand_in = StandInImageryServer()
+    yield stand_in
+    stand_in.close()
+
+
+def _client(**options):
+    defaults = dict(max_retries=3, backoff_base=0.001, backoff_max=0.01, timeout=5)
+    defaults.update(options)
+    return ImageryClient(**defaults)
+
+
+def test_successful_fetch_reuses_connection(server):
+    client = _client()
+    for _ in range(5):
+        response = client.get(server.url, params={'size': '600x400'})
+        assert response.content == b'\x89PNG fake image'
+    assert server.requests == 5
+    assert len(server.client_ports) == 1  # keep-alive: one TCP connection
+    metrics = client.metrics()
+    assert metrics['requests'] == 5
+    assert metrics['failures'] == 0
+    assert 'latency_p95_ms' in metrics
+    client.close()
+
+
+def test_transient_errors_are_retried(server):
+    server.script = [503, 429, 502]
+    client = _client()
+    response = client.get(server.url)
+    assert response.status_code == 200
+    assert server.requests == 4
+    assert client.metrics()['retries'] == 3
+    client.close()
+
+
+def test_exhausted_retries_raise_http_error(server):
+    server.script = [500] * 10
+    client = _client(max_retries=2)
+    with pytest.raises(requests.exceptions.HTTPError) as excinfo:
+        client.get(server.url)
+    assert excinfo.value.response.status_code == 500
+    assert server.requests == 3
+    client.close()
+
+
+def test_client_errors_are_not_retried(server):
+    server.script = [403]
+    client = _client()
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.get(server.url)
+    assert server.requests == 1
+    assert client.breaker.state == 'closed'
+    client.close()
+
+
+def test_circuit_opens_and_fails_fast(server):
+    server.script = [503] * 4
+    client = _client(max_retries=1, failure_threshold=2, reset_timeout=60)
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.HTTPError):
+            client.get(server.url)
+    assert client.breaker.state == 'open'
+    before = server.requests
+    with pytest.raises(CircuitOpenError):
+        client.get(server.url)
+    assert server.requests == before  # upstream not contacted
+    assert client.metrics()['rejected'] == 1
+    client.close()
+
+
+def test_concurrency_is_bounded(server):
+    server.delay = 0.05
+    client = _client(max_concurrency=2, pool_size=4)
+    threads = [threading.Thread(target=client.get, args=(server.url,)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert server.requests == 6
+    assert server.max_active <= 2
+    client.close()
+
+
+def test_connection_errors_are_retried_then_raised():
+    client = _client(max_retries=1)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.get('http://127.0.0.1:9/unreachable')
+    assert client.metrics()['retries'] == 1
+
+
+def test_breaker_half_open_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()        # one trial request
+    assert not breaker.allow()    # others still rejected
+    breaker.record_success()
+    assert breaker.state == 'closed'
+
+
+def test_unexpected_errors_release_the_half_open_trial(server, monkeypatch):
+    client = _client(failure_threshold=1, reset_timeout=0.05)
+    client.breaker.record_failure()
+    time.sleep(0.06)
+
+    def broken_send(*args, **kwargs):
+        raise requests.exceptions.ChunkedEncodingError("Connection broken while reading the body")
+    monkeypatch.setattr(client.session, 'send', broken_send)
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        client.get(server.url)
+    assert client.breaker.state == 'open'  # the trial failed and reopened the circuit
+
+    monkeypatch.undo()
+    time.sleep(0.06)
+    assert client.get(server.url).status_code == 200  # the next trial is let through
+    assert client.breaker.state == 'closed'
+    client.close()
@@ -0,0 +1,108 @@
+import threading
+import time
+import pytest
+from utils.job_queue import JobQueue, QueueFullError
+
+
+def _wait_for(queue, job_id, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job['status'] not in ('queued', 'running'):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Job {job_id} did not finish in time")
+
+
+def _add(a, b):
+    return a + b
+
+
+def _fail():
+    raise ValueError("boom")
+
+
+def test_submit_returns_id_and_completes():
+    queue = JobQueue(max_workers=1)
+    job_id = queue.submit(_add, 2, 3)
+    job = _wait_for(queue, job_id)
+    assert job['status'] == 'completed'
+    assert job['result'] == 5
+    assert job['queued_seconds'] >= 0
+    assert job['run_seconds'] >= 0
+    queue.shutdown()
+
+
+def test_failed_job_records_error():
+    queue = JobQueue(max_workers=1)
+    job = _wait_for(queue, queue.submit(_fail))
+    assert job['status'] == 'failed'
+    assert 'boom' in job['error']
+    queue.shutdown()
+
+
+def test_unknown_job_returns_none():
+    assert JobQueue().get('does-not-exist') is None
+
+
+def test_queue_rejects_when_full():
+    release = threading.Event()
+    queue = JobQueue(max_workers=1, max_pending=2)
+    queue.submit(release.wait)
+    queue.submit(release.wait)
+    with pytest.raises(QueueFullError):
+        queue.submit(release.wait)
+    release.set()
+    queue.shutdown()
+    assert queue.stats()['jobs'] == {'completed': 2}
+
+
+def test_process_executor_runs_jobs():
+    queue = JobQueue(max_workers=1, executor='process')
+    job = _wait_for(queue, queue.submit(_add, 20, 22), timeout=30)
+    assert job['status'] == 'completed'
+    assert job['result'] == 42
+    queue.shutdown()
+
+
+def test_invalid_executor_type():
+    with pytest.raises(ValueError):
+        JobQueue(executor='fiber')
+
+
+def test_finished_jobs_are_pruned_after_ttl():
+    queue = JobQueue(max_workers=1, result_ttl=0)
+    first = queue.submit(_add, 1, 1)
+    _wait_for(queue, first)
+    time.sleep(0.01)
+    queue.submit(_add, 1, 2)
+    assert queue.get(first) is None
+    queue.shutdown()
+
+
+def test_result_handler_transforms_result():
+    queue = JobQueue(max_workers=1, result_handler=lambda result: {'stored': result})
+    job = _wait_for(queue, queue.submit(_add, 1, 2))
+    assert job['result'] == {'stored': 3}
+    queue.shutdown()
+
+
+def test_stats_report_depth_saturation_and_durations():
+    release = threading.Event()
+    queue = JobQueue(max_workers=1, max_pending=4)
+    blocking = queue.submit(release.wait)
+    waiting = queue.submit(_add, 1, 2)
+    deadline = time.time() + 5
+    while queue.get(blocking)['status'] != 'running' and time.time() < deadline:
+        time.sleep(0.01)
+    stats = queue.stats()
+    assert stats['running'] == 1 and stats['queue_depth'] == 1 and stats['saturation'] == 1.0
+    assert stats['run_seconds'] == {'count': 0, 'mean': None, 'max': None}
+
+    release.set()
+    _wait_for(queue, waiting)
+    stats = queue.stats()
+    assert stats['running'] == 0 and stats['queue_depth'] == 0 and stats['saturation'] == 0.0
+    assert stats['run_seconds']['count'] == 2 and stats['run_seconds']['max'] >= 0
+    assert stats['queued_seconds']['count'] == 2
+    queue.shutdown()
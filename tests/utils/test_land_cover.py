@@ -96,3 +96,85 @@ def test_get_dominant_land_cover_negative_percentages():
     }
     # If all are negative, it will pick the one "closest to zero" (i.e., largest negative number)
     assert get_dominant_land_cover(data_all_negative) == ('water', -5.0)
+
+
+def test_classify_land_cover_reports_masked_pixels():
+    import numpy as np
+    from tests.conftest import make_scene
+    from utils.land_cover import classify_land_cover
+
+    mask = np.zeros((400, 600), dtype=bool)
+    mask[:120, :60] = True  # the tree band only
+    result = classify_land_cover({'processed_data': make_scene(600, 400), 'mask': mask})
+    assert result['pixels_classified'] == 120 * 60
+    assert result['classifications']['vegetation']['details']['trees'] == 100.0
+    assert (result['map_data']['width'], result['map_data']['height']) == (600, 400)
+
+
+def test_classify_land_cover_counts_pixels_per_class(scene_imagery):
+    from utils.land_cover import classify_land_cover
+    from utils.raster import ClassMap
+
+    result = classify_land_cover(scene_imagery)
+    classifications = result['classifications']
+    assert {name: entry['percentage'] for name, entry in classifications.items()} == {
+        'vegetation': 45.0, 'water': 8.0, 'built_up': 13.0, 'barren_land': 34.0}
+    assert classifications['vegetation']['details'] == {'trees': 30.0, 'shrubs': 15.0, 'grass': 0.0}
+    # The middle of the water band is far enough from the shore to count as a pond
+    assert classifications['water']['details'] == {'streams': 4.0, 'ponds': 4.0}
+    assert classifications['barren_land']['details']['soil'] == 34.0
+    assert result['pixels_classified'] == 100 * 100
+    assert get_dominant_land_cover(result) == ('vegetation', 45.0)
+
+    class_map = ClassMap.from_json(result['map_data'])
+    assert class_map.percentages() == {name: entry['percentage'] for name, entry in classifications.items()}
+
+
+def test_classify_land_cover_decodes_jpeg_and_memoryviews():
+    from tests.conftest import make_scene
+    from utils.land_cover import classify_land_cover
+
+    result = classify_land_cover({'processed_data': memoryview(make_scene(image_format='JPEG'))})
+    assert get_dominant_land_cover(result)[0] == 'vegetation'
+    assert result['classifications']['water']['percentage'] > 5.0
+
+
+def test_classify_land_cover_downsamples_the_stored_map(monkeypatch):
+    import utils.land_cover as land_cover
+    from tests.conftest import make_scene
+
+    monkeypatch.setattr(land_cover, 'MAP_DATA_MAX_SIDE', 64)
+    result = land_cover.classify_land_cover({'processed_data': make_scene(200, 100)})
+    assert (result['map_data']['width'], result['map_data']['height']) == (50, 25)
+    assert result['pixels_classified'] == 200 * 100
+
+
+@pytest.mark.parametrize('processed_data', [None, b'', b'not an image'])
+def test_classify_land_cover_without_imagery_reports_nothing(processed_data):
+    from utils.land_cover import classify_land_cover
+
+    result = classify_land_cover({'processed_data': processed_data})
+    assert result['status']
+    assert result['pixels_classified'] == 0
+    assert all(entry['percentage'] == 0.0 for entry in result['classifications'].values())
+    assert 'map_data' not in result
+
+
+def test_classify_pixels_matches_per_pixel_rules():
+    import numpy as np
+    from utils.land_cover import (BUILDINGS, GRASS, PONDS, ROADS, ROCKS, SHRUBS, SOIL, STREAMS, TREES,
+                                  classify_pixels)
+
+    rgb = np.array([[[30, 90, 30], [60, 120, 50], [120, 200, 100], [20, 40, 90]],
+                    [[200, 200, 200], [110, 110, 110], [160, 120, 80], [60, 60, 70]]], dtype=np.uint8)
+    detail, ambiguous = classify_pixels(rgb, chunk_rows=1)
+    assert detail.tolist() == [[TREES, SHRUBS, GRASS, STREAMS], [BUILDINGS, ROADS, SOIL, ROCKS]]
+    assert not ambiguous.any()
+
+    scene = np.full((11, 11, 3), (160, 120, 80), dtype=np.uint8)
+    scene[1:10, 1:10] = (20, 40, 90)  # a lake
+    scene[5, :] = (20, 40, 90)  # and a stream through it
+    detail, _ = classify_pixels(scene)
+    assert detail[5, 5] == PONDS and detail[1, 1] == STREAMS
+    # Water running off the image edge may continue beyond it, so it is not treated as shore
+    assert detail[5, 0] == STREAMS and detail[5, 3] == PONDS
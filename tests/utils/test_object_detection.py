@@ -60,3 +60,160 @@ def test_count_objects_by_type_mixed_valid_and_ignored_keys():
         'cars_detected': 1
     }
     assert count_objects_by_type(results) == expected_counts
+
+
+
+def _road_scene(size=200):
+    # Grass crossed by an 8 px wide diagonal road
+    import io
+    import numpy as np
+    from PIL import Image
+    image = np.zeros((size, size, 3), dtype=np.uint8)
+    image[:] = (60, 120, 50)
+    for y in range(size):
+        image[y, max(0, y - 4):y + 4] = (120, 120, 125)
+    buffer = io.BytesIO()
+    Image.fromarray(image).save(buffer, format='PNG')
+    return {'processed_data': buffer.getvalue(), 'bounds': {'north': 0.01, 'south': 0, 'east': 0.01, 'west': 0}}
+
+
+def _greedy_nms(boxes, scores, classes, iou_threshold):
+    # Reference implementation: the textbook loop
+    from utils.object_detection import box_iou
+    import numpy as np
+    kept = []
+    for index in np.argsort(-scores, kind='stable'):
+        if all(classes[other] != classes[index]
+               or box_iou(boxes[[other]], boxes[[index]])[0] <= iou_threshold for other in kept):
+            kept.append(index)
+    return kept
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_non_max_suppression_matches_greedy_loop(seed):
+    import numpy as np
+    from utils.object_detection import non_max_suppression
+    rng = np.random.default_rng(seed)
+    corners = rng.uniform(0, 200, size=(400, 2))
+    boxes = np.hstack([corners, corners + rng.uniform(5, 40, size=(400, 2))])
+    scores = rng.random(400)
+    classes = rng.integers(0, 3, size=400)
+    kept = non_max_suppression(boxes, scores, classes, iou_threshold=0.3)
+    assert kept.tolist() == _greedy_nms(boxes, scores, classes, 0.3)
+    assert non_max_suppression(boxes, scores, classes, 0.3, max_detections=5).tolist() == kept[:5].tolist()
+
+
+def test_non_max_suppression_with_one_large_box():
+    import numpy as np
+    from utils.object_detection import _overlapping_pairs, non_max_suppression
+    rng = np.random.default_rng(7)
+    corners = rng.uniform(0, 600, size=(300, 2))
+    boxes = np.vstack([np.hstack([corners, corners + rng.uniform(5, 20, size=(300, 2))]),
+                       [[100, 100, 400, 400]]])
+    scores = rng.random(len(boxes))
+    classes = np.zeros(len(boxes), dtype=np.int64)
+    kept = non_max_suppression(boxes, scores, classes, iou_threshold=0.3)
+    assert kept.tolist() == _greedy_nms(boxes, scores, classes, 0.3)
+    # The large box does not inflate the grid: candidates stay near the number of boxes, not N^2
+    first, second = _overlapping_pairs(boxes, classes)
+    assert len(first) < 10 * len(boxes)
+    assert len(set(zip(first.tolist(), second.tolist()))) == len(first)
+
+
+def test_non_max_suppression_is_class_aware():
+    from utils.object_detection import non_max_suppression
+    boxes = [[0, 0, 10, 10], [1, 1, 11, 11], [0, 0, 10, 10]]
+    assert non_max_suppression(boxes, [0.9, 0.8, 0.7], [0, 0, 1]).tolist() == [0, 2]
+    assert non_max_suppression([], []).tolist() == []
+
+
+def test_sliding_windows_cover_the_image():
+    from utils.object_detection import sliding_windows
+    windows = sliding_windows(100, 70, window=48, stride=24)
+    assert windows[:, 2].max() == 70 and windows[:, 3].max() == 100
+    assert len(windows) == 4 * 2  # rows at 0, 24, 48 and the edge-aligned 52; columns at 0 and 22
+    assert sliding_windows(20, 20, window=48).tolist() == [[0, 0, 20, 20]]
+
+
+def test_detect_objects_without_imagery():
+    from utils.object_detection import CATEGORIES, detect_objects
+    detections = detect_objects({'bounds': {'north': 1, 'south': 0, 'east': 1, 'west': 0}})
+    assert detections['status']
+    assert all(detections[category] == [] for category in CATEGORIES)
+
+
+def test_detect_objects_finds_roads_as_centre_lines():
+    from utils.object_detection import detect_objects
+    detections = detect_objects(_road_scene())
+    assert detections['roads'] and detections['buildings'] == []
+    for road in detections['roads']:
+        (x1, y1), (x2, y2) = road['points']
+        assert abs(x1 - y1) < 2 and abs(x2 - y2) < 2  # along the diagonal
+        assert road['width_estimate'] == '31m'  # about 5.6 px across at 5.6 m per pixel
+    assert detections['detector']['windows'] == 64
+
+
+def test_detect_objects_reads_window_settings(monkeypatch):
+    from utils.object_detection import detect_objects
+    monkeypatch.setenv('DETECTION_WINDOW', '100')
+    monkeypatch.setenv('DETECTION_STRIDE', '100')
+    assert detect_objects(_road_scene())['detector']['windows'] == 4
+    assert detect_objects(_road_scene(), window=200)['detector']['windows'] == 1
+
+
+def test_detect_objects_uses_the_scoring_backend():
+    import numpy as np
+    from utils.object_detection import detect_objects
+
+    class EverythingIsABuilding:
+        classes = (('buildings', 'Building'),)
+
+        def score(self, windows):
+            return np.ones((len(windows), 1))
+
+    detections = detect_objects(_road_scene(), scorer=EverythingIsABuilding(), window=100, stride=100, batch_size=3)
+    assert [building['bbox'] for building in detections['buildings']] == [
+        [0, 0, 100, 100], [100, 0, 200, 100], [0, 100, 100, 200], [100, 100, 200, 200]]
+    assert detections['buildings'][0]['lat_lng'] == [0.0075, 0.0025]
+
+
+def test_detect_objects_drops_detections_outside_mask():
+    import numpy as np
+    from utils.object_detection import detect_objects
+
+    imagery = _road_scene()
+    mask = np.zeros((200, 200), dtype=bool)
+    mask[150:, :20] = True  # Off the road
+    masked = detect_objects({**imagery, 'mask': mask})
+    assert masked['roads'] == []
+    assert masked['detector']['windows'] < 64  # windows away from the mask are not scored
+
+    mask[:, :] = True
+    assert detect_objects({**imagery, 'mask': mask})['roads'] == detect_objects(imagery)['roads']
+
+
+def test_detect_objects_resamples_a_mask_of_another_size():
+    import numpy as np
+    from utils.object_detection import detect_objects
+
+    imagery = _road_scene()
+    mask = np.zeros((200, 200), dtype=bool)
+    mask[150:, :20] = True
+    half = mask[::2, ::2]  # The same area at half the image's resolution
+    assert detect_objects({**imagery, 'mask': half}) == detect_objects({**imagery, 'mask': mask})
+    assert detect_objects({**imagery, 'mask': half})['detector']['windows'] < 64
+
+
+def test_detect_objects_traces_roads_from_the_scored_windows():
+    from utils.object_detection import SpectralWindowScorer, detect_objects
+
+    class ScoresOnly:
+        # A backend without score_with_detail: roads are traced from a fresh classification
+        classes = SpectralWindowScorer.classes
+
+        def score(self, windows):
+            return SpectralWindowScorer().score(windows)
+
+    imagery = _road_scene()
+    assert detect_objects(imagery)['roads'] == detect_objects(imagery, scorer=ScoresOnly())['roads']
+    assert detect_objects(imagery)['roads']
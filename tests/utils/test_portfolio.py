@@ -0,0 +1,165 @@
+import json
+
+import pytest
+
+import utils.portfolio as portfolio
+from utils.portfolio import Checkpoint, FeatureReader, Progress, geometry_coordinates, parse_wkt, run_portfolio
+
+SQUARE = [[20.0, 10.0], [20.1, 10.0], [20.1, 10.1], [20.0, 10.1], [20.0, 10.0]]
+
+
+def _collection(features, **members):
+    return json.dumps({'type': 'FeatureCollection', **members, 'features': features})
+
+
+def _feature(name, geometry, **properties):
+    return {'type': 'Feature', 'properties': {'name': name, **properties}, 'geometry': geometry}
+
+
+def test_geometry_coordinates_converts_to_lat_lng():
+    assert geometry_coordinates({'type': 'Polygon', 'coordinates': [SQUARE]}) == [
+        [10.0, 20.0], [10.0, 20.1], [10.1, 20.1], [10.1, 20.0]]
+    assert geometry_coordinates({'type': 'LineString', 'coordinates': [[20, 10, 5], [21, 11, 5]]}) == [
+        [10.0, 20.0], [11.0, 21.0]]
+    small = [[0, 0], [0.01, 0], [0.01, 0.01], [0, 0]]
+    assert geometry_coordinates({'type': 'MultiPolygon', 'coordinates': [[small], [SQUARE]]})[0] == [10.0, 20.0]
+    assert parse_wkt('LINESTRING (20 10, 21 11)') == {'type': 'LineString', 'coordinates': [['20', '10'], ['21', '11']]}
+    for geometry in (None, {'type': 'Point', 'coordinates': [20, 10]},
+                     {'type': 'Polygon', 'coordinates': [[[20, 10], [21, 11], [20, 10]]]},
+                     {'type': 'LineString', 'coordinates': [[10, 95], [11, 96]]}):
+        with pytest.raises(ValueError):
+            geometry_coordinates(geometry)
+
+
+def test_feature_reader_streams_a_feature_collection(tmp_path, monkeypatch):
+    # A tiny read size makes every feature straddle several reads
+    monkeypatch.setattr(portfolio, 'READ_CHUNK_SIZE', 7)
+    path = tmp_path / 'sites.geojson'
+    path.write_text(_collection([
+        _feature('Site A', {'type': 'Polygon', 'coordinates': [SQUARE]}, project_type='Solar Farm'),
+        _feature('Line B', {'type': 'LineString', 'coordinates': [[20, 10], [20.5, 10.5]]}),
+        _feature('Dot C', {'type': 'Point', 'coordinates': [20, 10]}),
+        {'type': 'Feature', 'id': 42, 'properties': None, 'geometry': {'type': 'LineString', 'coordinates': [[20, 10], [21, 11]]}},
+    ], name='portfolio', crs={'type': 'name', 'properties': {'name': 'EPSG:4326'}}, count=4))
+
+    reader = FeatureReader(str(path), default_type='Pipeline')
+    assert reader.fraction == 0.0
+    features = list(reader)
+    assert [feature['index'] for feature in features] == [0, 1, 2, 3]
+    assert features[0] == {'index': 0, 'name': 'Site A', 'type': 'Solar Farm',
+                           'coordinates': [[10.0, 20.0], [10.0, 20.1], [10.1, 20.1], [10.1, 20.0]]}
+    assert (features[1]['name'], features[1]['type']) == ('Line B', 'Pipeline')
+    assert 'Point' in features[2]['error']
+    assert features[3]['name'] == '42'
+    assert reader.fraction == 1.0
+
+
+def test_feature_reader_reads_line_delimited_geojson_and_csv(tmp_path):
+    lines = tmp_path / 'sites.geojsonl'
+    lines.write_text('\x1e' + json.dumps(_feature('A', {'type': 'Polygon', 'coordinates': [SQUARE]})) + '\n\n'
+                     + '{not json\n')
+    features = list(FeatureReader(str(lines), default_type='Warehouse'))
+    assert features[0]['type'] == 'Warehouse' and 'Unreadable' in features[1]['error']
+
+    table = tmp_path / 'sites.csv'
+    table.write_text('name,project_type,geometry,wkt,coordinates\n'
+                     f'"A",Solar Farm,"{json.dumps({"type": "Polygon", "coordinates": [SQUARE]}).replace(chr(34), chr(34) * 2)}",,\n'
+                     'B,Pipeline,,"LINESTRING (20 10, 21 11)",\n'
+                     'C,Rural Road,,,"[[10, 20], [10.1, 20.1], [10.2, 20]]"\n'
+                     'D,,,,"[[10, 20], [10.1, 20.1], [10.2, 20]]"\n'
+                     'E,Warehouse,,,\n')
+    features = list(FeatureReader(str(table)))
+    assert len(features[0]['coordinates']) == 4
+    assert features[1]['coordinates'] == [[10.0, 20.0], [11.0, 21.0]]
+    assert features[2]['coordinates'] == [[10.0, 20.0], [10.1, 20.1], [10.2, 20.0]]
+    assert 'project type' in features[3]['error'] and 'no geometry' in features[4]['error']
+
+
+def test_checkpoint_resumes_and_ignores_a_torn_line(tmp_path):
+    source = tmp_path / 'sites.csv'
+    source.write_text('name\n')
+    path = str(tmp_path / 'run.checkpoint.jsonl')
+    checkpoint = Checkpoint(path, str(source))
+    checkpoint.record([{'index': 0, 'status': 'done', 'report_id': 1},
+                       {'index': 1, 'status': 'failed', 'error': 'Imagery unavailable'}])
+    with open(path, 'a') as f:
+        f.write('{"index": 2, "sta')
+
+    resumed = Checkpoint(path, str(source))
+    assert resumed.is_finished(0) and resumed.is_finished(1) and not resumed.is_finished(2)
+    assert not resumed.is_finished(1, retry_failed=True)
+    assert resumed.counts() == {'done': 1, 'failed': 1}
+
+    other = tmp_path / 'other.csv'
+    other.write_text('name\n')
+    with pytest.raises(ValueError):
+        Checkpoint(path, str(other))
+
+
+def test_progress_estimates_the_total_from_the_input_read():
+    now = [0.0]
+    progress = Progress(clock=lambda: now[0])
+    assert progress.eta(0.5) is None and progress.line(0.5).endswith('ETA ?')
+    progress.read, progress.done, progress.failed, progress.skipped = 30, 18, 2, 5
+    now[0] = 10.0
+    assert progress.rate == 2.0
+    assert progress.estimated_total(0.25) == 120
+    assert progress.eta(0.25) == (120 - 25) / 2.0
+    assert '25/~120 features' in progress.line(0.25) and 'ETA 0:00:47' in progress.line(0.25)
+
+
+def _fake_preprocess(scene):
+    def preprocess(coordinates, decode=True):
+        # Decoding is left to the CPU workers
+        assert decode is False
+        if coordinates[0][0] > 50:
+            return {'error': 'Missing GOOGLE_MAPS_API_KEY', 'processed_data': None, 'image': None}
+        # The scene shows the feature's extent
+        return {**scene, 'image': None, 'bounds': {'north': 10.1, 'south': 10.0, 'east': 20.1, 'west': 20.0}}
+    return preprocess
+
+
+def test_run_portfolio_batches_checkpoints_and_resumes(tmp_path, monkeypatch, scene_imagery):
+    monkeypatch.setattr(portfolio, 'preprocess_imagery', _fake_preprocess(scene_imagery))
+    square = [[10.0, 20.0], [10.0, 20.1], [10.1, 20.1]]
+    features = [{'index': index, 'name': f"Site {index}", 'type': 'Solar Farm',
+                 'coordinates': square if index != 3 else [[60.0, 20.0], [60.0, 20.1], [60.1, 20.1]]}
+                for index in range(5)]
+    features.insert(2, {'index': 5, 'error': 'Feature has no geometry'})
+    source = tmp_path / 'sites.geojson'
+    source.write_text('{}')
+    checkpoint = Checkpoint(str(tmp_path / 'checkpoint.jsonl'), str(source))
+    batches, lines = [], []
+
+    def save_batch(outputs):
+        batches.append(outputs)
+        return [{'report_id': output['feature']['index'] + 100} for output in outputs]
+
+    progress = run_portfolio(features, save_batch, str(tmp_path / 'reports'), checkpoint=checkpoint,
+                             fetch_workers=2, cpu_workers=2, batch_size=2, report=lines.append)
+    assert (progress.done, progress.failed, progress.skipped) == (4, 2, 0)
+    assert all(len(batch) <= 2 for batch in batches)
+    outputs = [output for batch in batches for output in batch]
+    assert sorted(output['feature']['index'] for output in outputs) == [0, 1, 2, 4]
+    output = outputs[0]
+    # Only the triangle's pixels count: it covers more of the soil band at the bottom than of the trees at the top
+    assert output['summary']['dominant_land_cover'] == 'barren_land'
+    land_cover = json.loads(output['results_json'])['land_cover']
+    assert land_cover['pixels_classified'] < 100 * 100 * 0.6
+    assert set(output['timings']) == {'land_cover', 'objects', 'report'}
+    with open(output['file_path'], 'rb') as f:
+        assert f.read(4) == b'%PDF'
+    assert json.loads(output['results_json'])['objects'] is not None
+    assert checkpoint.finished[3]['error'].startswith('Imagery unavailable')
+    assert checkpoint.finished[4] == {'index': 4, 'status': 'done', 'report_id': 104}
+    assert lines[-1].startswith('6/6 features (4 done, 2 failed, 0 skipped)')
+
+    # A resumed run only retries what failed when asked to
+    resumed = Checkpoint(str(tmp_path / 'checkpoint.jsonl'), str(source))
+    batches.clear()
+    progress = run_portfolio(features, save_batch, str(tmp_path / 'reports'), checkpoint=resumed,
+                             cpu_workers=1, report=lines.append)
+    assert (progress.done, progress.failed, progress.skipped) == (0, 0, 6) and not batches
+    progress = run_portfolio(features, save_batch, str(tmp_path / 'reports'), checkpoint=resumed,
+                             cpu_workers=1, retry_failed=True, report=lines.append)
+    assert (progress.done, progress.failed, progress.skipped) == (0, 2, 4)
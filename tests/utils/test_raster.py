@@ -0,0 +1,77 @@
+import json
+
+import numpy as np
+import pytest
+
+from utils.raster import (ClassMap, decode_bitpacked, decode_rle, encode_bitpacked,
+                          encode_rle)
+
+
+def test_rle_round_trip():
+    values = np.array([0, 0, 0, 3, 3, 1, 2, 2, 2, 2], dtype=np.uint8)
+    data = encode_rle(values)
+    assert len(data) == 4 * 5  # four runs: one value byte plus a uint32 length each
+    np.testing.assert_array_equal(decode_rle(data), values)
+    assert encode_rle(np.array([], dtype=np.uint8)) == b''
+    assert decode_rle(b'').size == 0
+
+
+@pytest.mark.parametrize('bits', [1, 2, 4, 8])
+def test_bitpack_round_trip(bits):
+    rng = np.random.default_rng(bits)
+    values = rng.integers(0, 2 ** bits, size=1001).astype(np.uint8)
+    data = encode_bitpacked(values, bits)
+    assert len(data) == -(-1001 * bits // 8)
+    np.testing.assert_array_equal(decode_bitpacked(data, bits, 1001), values)
+
+
+def test_codes_are_a_read_only_view():
+    codes = np.zeros((3, 4), dtype=np.uint8)
+    class_map = ClassMap(codes)
+    assert np.shares_memory(class_map.codes, codes)
+    with pytest.raises(ValueError):
+        class_map.codes[0, 0] = 1
+    codes[0, 0] = 2  # the caller's array stays writable
+    assert (class_map.width, class_map.height) == (4, 3)
+
+
+def test_json_round_trip_picks_the_smaller_encoding():
+    blocky = ClassMap(np.kron(np.arange(4, dtype=np.uint8).reshape(2, 2), np.ones((50, 50), dtype=np.uint8)))
+    noisy = ClassMap(np.random.default_rng(0).integers(0, 4, size=(64, 64)))
+
+    blocky_json, noisy_json = blocky.to_json(), noisy.to_json()
+    assert blocky_json['encoding'] == 'rle'
+    assert noisy_json['encoding'] == 'bitpack2'
+    for original, encoded in ((blocky, blocky_json), (noisy, noisy_json)):
+        assert ClassMap.from_json(json.loads(json.dumps(encoded))) == original
+
+
+def test_percentages_honour_the_mask():
+    codes = np.array([[0, 0, 1, 1], [2, 2, 3, 3]], dtype=np.uint8)
+    class_map = ClassMap(codes)
+    assert class_map.percentages() == {'vegetation': 25.0, 'water': 25.0, 'built_up': 25.0, 'barren_land': 25.0}
+
+    mask = np.zeros_like(codes, dtype=bool)
+    mask[:, :1] = True
+    assert class_map.counts(mask).tolist() == [1, 0, 1, 0]
+    assert class_map.percentages(mask)['built_up'] == 50.0
+    assert class_map.percentages(np.zeros_like(mask))['water'] == 0.0
+
+
+def test_legacy_list_form_is_accepted():
+    class_map = ClassMap.from_json({'width': 5, 'height': 2, 'classes': [0, 1, 2, 3, 0, 1, 2, 0, 1, 3]})
+    assert class_map.codes.tolist() == [[0, 1, 2, 3, 0], [1, 2, 0, 1, 3]]
+
+
+def test_invalid_maps_are_rejected():
+    with pytest.raises(ValueError):
+        ClassMap(np.zeros(4, dtype=np.uint8))
+    with pytest.raises(ValueError):
+        ClassMap([[0, 256]])
+    with pytest.raises(ValueError):
+        ClassMap.from_json({'width': 4, 'height': 4, 'classes': [0, 1]})
+    encoded = ClassMap(np.zeros((2, 2), dtype=np.uint8)).to_json()
+    with pytest.raises(ValueError):
+        ClassMap.from_json(dict(encoded, width=8))
+    with pytest.raises(ValueError):
+        ClassMap.from_json(dict(encoded, encoding='png'))
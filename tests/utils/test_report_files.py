@@ -0,0 +1,40 @@
+import os
+
+from utils.report_files import collect_report_files, mark_used, report_fingerprint, write_chunks
+
+
+def test_fingerprint_changes_with_every_input():
+    project = {'id': 1, 'name': 'Road', 'type': 'Road', 'coordinates': [[0, 0], [1, 1]]}
+    base = report_fingerprint(project, '{"a": 1}', 'v1')
+    assert base == report_fingerprint(dict(reversed(list(project.items()))), '{"a": 1}', 'v1')
+    assert len(base) == 64
+    assert base != report_fingerprint({**project, 'name': 'Other'}, '{"a": 1}', 'v1')
+    assert base != report_fingerprint(project, '{"a": 2}', 'v1')
+    assert base != report_fingerprint(project, '{"a": 1}', 'v2')
+    # Session-only keys do not split identical reports
+    assert base == report_fingerprint({**project, 'user_id': 7}, '{"a": 1}', 'v1')
+
+
+def test_write_chunks_replaces_the_file_atomically(tmp_path):
+    path = tmp_path / 'out' / 'report.pdf'
+    data = bytearray(os.urandom(10_000))
+    assert write_chunks(str(path), data, chunk_size=3000) == 10_000
+    assert path.read_bytes() == data
+    assert os.listdir(tmp_path / 'out') == ['report.pdf']
+
+
+def test_collect_report_files_evicts_least_recently_used(tmp_path):
+    paths = []
+    for index in range(4):
+        path = tmp_path / f'report_{index}.pdf'
+        path.write_bytes(b'x' * 100)
+        os.utime(path, (1000 + index, 1000 + index))
+        paths.append(str(path))
+    (tmp_path / 'notes.txt').write_bytes(b'y' * 1000)
+    mark_used(paths[0])  # downloaded just now
+
+    removed = collect_report_files(str(tmp_path), max_bytes=250, keep=[paths[1]])
+    assert removed == [paths[2], paths[3]]
+    assert sorted(os.listdir(tmp_path)) == ['notes.txt', 'report_0.pdf', 'report_1.pdf']
+    assert collect_report_files(str(tmp_path), max_bytes=250) == []
+    assert collect_report_files(str(tmp_path / 'missing')) == []
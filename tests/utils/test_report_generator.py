@@ -27,13 +27,17 @@ def test_get_center_coordinates_invalid_input():
 
 # Tests for calculate_project_length
 def test_calculate_project_length_road_sufficient_points():
-    details = {'type': 'Road', 'coordinates': [[0,0],[0,1],[1,1]]} # 3 points
-    # Current formula: len(coords) * 0.5 km
-    assert "Approximately 1.5 km (Simplified calculation based on point count)" == calculate_project_length(details)
+    details = {'type': 'Road', 'coordinates': [[0,0],[0,1],[1,1]]} # Two 1-degree legs at the equator
+    # Great-circle length: 2 x 111.19 km
+    assert "Approximately 222.39 km (great-circle length of the alignment)" == calculate_project_length(details)
+
+def test_calculate_project_length_rural_road_is_linear():
+    details = {'type': 'Rural Road', 'coordinates': [[0,0],[0,0.5]]}
+    assert "Approximately 55.60 km (great-circle length of the alignment)" == calculate_project_length(details)
 
 def test_calculate_project_length_pipeline_sufficient_points():
-    details = {'type': 'Pipeline', 'coordinates': [[0,0],[0,1],[1,1],[1,2],[2,2]]} # 5 points
-    assert "Approximately 2.5 km (Simplified calculation based on point count)" == calculate_project_length(details)
+    details = {'type': 'Pipeline', 'coordinates': [[0,0],[0,1],[1,1],[1,2],[2,2]]} # 4 legs
+    assert "Approximately 444.76 km (great-circle length of the alignment)" == calculate_project_length(details)
 
 def test_calculate_project_length_transmission_line_insufficient_points():
     details = {'type': 'Transmission Line', 'coordinates': [[0,0]]} # 1 point
@@ -43,17 +47,16 @@ def test_calculate_project_length_transmission_line_insufficient_points():
 
 
 def test_calculate_project_length_solar_farm():
-    details = {'type': 'Solar Farm', 'coordinates': [[0,0],[0,1],[1,1],[1,0]]} # 4 points
-    # Current formula: len(coords) * 0.25 sq km
-    assert "Project area: approximately 1.0 sq km (Simplified calculation based on point count)" == calculate_project_length(details)
+    details = {'type': 'Solar Farm', 'coordinates': [[0,0],[0,1],[1,1],[1,0]]} # 1-degree square
+    assert "Project area: approximately 12363.68 sq km (perimeter 444.76 km)" == calculate_project_length(details)
 
 def test_calculate_project_length_building_complex():
-    details = {'type': 'Building Complex', 'coordinates': [[0,0],[0,1],[1,1],[1,0],[0.5,0.5]]} # 5 points
-    assert "Project area: approximately 1.25 sq km (Simplified calculation based on point count)" == calculate_project_length(details)
+    details = {'type': 'Small Building', 'coordinates': [[0,0],[0,0.01],[0.01,0.01],[0.01,0]]}
+    assert "Project area: approximately 1.24 sq km (perimeter 4.45 km)" == calculate_project_length(details)
 
 def test_calculate_project_length_other_type_empty_coords():
     details = {'type': 'Wind Farm', 'coordinates': []}
-    assert "Project area: approximately 0.0 sq km (Simplified calculation based on point count)" == calculate_project_length(details)
+    assert "Project area: approximately 0.00 sq km (perimeter 0.00 km)" == calculate_project_length(details)
 
 
 # Tests for estimate_clearing_required
@@ -204,3 +207,223 @@ def test_identify_potential_risks_none_specific():
     assert "Satellite imagery analysis provides a preliminary overview and may not reveal all subsurface conditions (e.g., soil type, utilities)." in risks
     assert "Ground verification, geotechnical investigations, and detailed site surveys are strongly recommended before detailed planning and design." in risks
     assert len(risks) == 3 # "No major" + 2 defaults
+
+
+def test_summarize_map_data_replaces_the_encoded_map(scene_imagery):
+    from utils.land_cover import classify_land_cover
+    from utils.report_generator import summarize_map_data
+
+    land_cover = classify_land_cover(scene_imagery)
+    summary = summarize_map_data(land_cover)
+    assert 'map_data' not in summary and 'map_data' in land_cover
+    assert summary['classification_map'].startswith('100 x 100 px (rle encoded')
+    assert summarize_map_data({'status': 'error'}) == {'status': 'error'}
+
+
+def test_structures_are_counted_inside_the_corridor(monkeypatch):
+    from utils.report_generator import structures_in_footprint
+    monkeypatch.setenv('ANALYSIS_CORRIDOR_WIDTH_M', '60')
+    objects = {'buildings': [
+        {'type': 'Building', 'geo_bbox': [20.0000, 78.0000, 20.0001, 78.0001]},  # on the alignment
+        {'type': 'Building', 'geo_bbox': [20.0002, 78.0050, 20.0003, 78.0051]},  # ~25 m off
+        {'type': 'Building', 'geo_bbox': [20.0100, 78.0050, 20.0101, 78.0051]},  # ~1.1 km off
+    ]}
+    road = {'id': 'corridor-test', 'type': 'Road', 'coordinates': [[20.0, 77.99], [20.0, 78.02]]}
+
+    assert structures_in_footprint(objects, road) == {
+        'buildings': 2, 'other_structures': 0, 'scope': 'within the 60 m corridor'}
+    work_items = identify_major_work_items({'objects': objects}, road)
+    assert ("Potential structure relocation/demolition for 2 building(s) and 0 other structure(s) "
+            "within the 60 m corridor") in work_items
+    # Without the project geometry every detection counts
+    assert "Potential structure relocation/demolition for 3 building(s) and 0 other structure(s)" in \
+        identify_major_work_items({'objects': objects})
+    assert not any('Proximity to multiple structures' in risk for risk in identify_potential_risks({'objects': objects}, road))
+
+    area = {'type': 'Building', 'coordinates': [[19.999, 77.999], [19.999, 78.01], [20.005, 78.01], [20.005, 77.999]]}
+    assert structures_in_footprint(objects, area)['buildings'] == 2
+    # Detections without coordinates cannot be located
+    assert structures_in_footprint({'buildings': [{'bbox': [0, 0, 1, 1]}]}, road) is None
+
+
+def test_render_report_file_writes_the_pdf_and_encodes_the_results(tmp_path, scene_imagery):
+    import json
+    from utils.analysis_pipeline import build_analysis_results
+    from utils.land_cover import classify_land_cover
+    from utils.object_detection import detect_objects
+    from utils.report_generator import render_report_file
+    from utils.report_storage import LazyResults
+
+    results = build_analysis_results(classify_land_cover(scene_imagery), detect_objects(scene_imagery))
+    project = {'name': 'Worker Project', 'type': 'Solar Farm', 'coordinates': [[0, 0], [0, 1], [1, 1]]}
+    path = tmp_path / 'reports' / 'report.pdf'
+
+    output = render_report_file(7, project, json.dumps(results), str(path))
+    assert output['report_id'] == 7 and output['file_path'] == str(path)
+    assert path.read_bytes().startswith(b'%PDF') and output['bytes'] == path.stat().st_size
+    assert not (tmp_path / 'reports' / 'report.pdf.part').exists()
+    assert output['summary']['object_count'] == 6
+    assert LazyResults(output['results_blob'])['objects']['buildings'] == results['objects']['buildings']
+
+
+def test_summarize_detections_aggregates_per_type():
+    from utils.report_generator import summarize_detections
+    objects = {
+        'buildings': [
+            {'type': 'Building', 'confidence': 0.5, 'geo_bbox': [20.0, 78.0, 20.1, 78.1]},
+            {'type': 'Building', 'confidence': 0.7, 'lat_lng': [20.3, 77.9]},
+            {'type': 'Building', 'bbox': [0, 0, 1, 1]},
+        ],
+        'roads': [{'type': 'Paved Road', 'confidence': 0.9, 'lat_lngs': [[19.0, 78.0], [19.5, 78.5]]}],
+        'obstacles': ['legacy text entry'],
+        'analysis_date': '2026-01-01',
+    }
+    assert summarize_detections(objects) == [
+        {'category': 'buildings', 'type': 'Building', 'count': 3, 'mean_confidence': 0.6,
+         'extent': [20.0, 77.9, 20.3, 78.1]},
+        {'category': 'roads', 'type': 'Paved Road', 'count': 1, 'mean_confidence': 0.9,
+         'extent': [19.0, 78.0, 19.5, 78.5]},
+    ]
+    assert summarize_detections({'buildings': [{'type': 'Building', 'bbox': [0, 0, 1, 1]}]})[0]['extent'] is None
+
+
+def test_large_results_render_as_capped_tables(monkeypatch):
+    from utils.report_generator import build_report
+    monkeypatch.setenv('REPORT_LARGE_RESULT_OBJECTS', '50')
+    monkeypatch.setenv('REPORT_SECTION_ROWS', '10')
+    project = {'id': 'large-report-test', 'name': 'Large', 'type': 'Solar Farm',
+               'coordinates': [[20.0, 78.0], [20.0, 78.1], [20.1, 78.1]]}
+
+    def results(count):
+        buildings = [{'type': f'Type {index % 12}', 'confidence': round(index / count, 3),
+                      'bbox': [0, 0, 1, 1], 'lat_lng': [20.05, 78.05]} for index in range(count)]
+        return {'objects': {'buildings': buildings}, 'water_bodies': [f'Pond {index}' for index in range(40)]}
+
+    small = build_report(project, results(20))
+    small.output()
+    pdf = build_report(project, results(5000))
+    pdf.compress = False
+    text = bytes(pdf.output())
+    assert pdf.pages_count <= small.pages_count + 1
+    assert b'4,990 more' in text  # highest-confidence detections beyond the first 10
+    assert b'2 more' in text  # object types beyond the first 10
+    assert b'30 more' in text  # water bodies beyond the first 10
+    assert b'0.999' in text and b'Pond 39' not in text
+
+
+def test_report_template_replays_the_boilerplate_unchanged(scene_imagery, monkeypatch):
+    from datetime import datetime
+    import utils.report_generator as report_generator
+    from utils.analysis_pipeline import build_analysis_results
+    from utils.land_cover import classify_land_cover
+    from utils.object_detection import detect_objects
+    from utils.report_generator import CONCLUSION, ReportTemplate, build_report, default_template
+
+    results = build_analysis_results(classify_land_cover(scene_imagery), detect_objects(scene_imagery))
+    project = {'id': 'template-test', 'name': 'Template', 'type': 'Solar Farm',
+               'coordinates': [[0, 0], [0, 1], [1, 1]]}
+    template = ReportTemplate()
+    assert len(template) >= 10
+
+    class FrozenDatetime(datetime):
+        # The report prints the time it was generated; a second boundary must not split the renders
+        @classmethod
+        def now(cls, tz=None):
+            return cls(2026, 1, 1, 12, 0, 0)
+    monkeypatch.setattr(report_generator, 'datetime', FrozenDatetime)
+    looked_up = []
+    paragraph_lines = template.paragraph_lines
+    template.paragraph_lines = lambda key: looked_up.append(key[-1]) or paragraph_lines(key)
+
+    def render(with_template):
+        pdf = build_report(project, results, template=with_template)
+        pdf.compress = False
+        pdf.set_creation_date(datetime(2026, 1, 1))
+        return bytes(pdf.output())
+
+    assert render(template) == render(None)
+    assert CONCLUSION in looked_up
+    assert default_template() is default_template()
+
+
+def _georeferenced_scene(width, height, coordinates):
+    from tests.conftest import make_scene
+    from utils.georef import GeoTransform, fit_view
+
+    centre, zoom = fit_view(coordinates, (width, height))
+    return {'error': None, 'processed_data': make_scene(width, height), 'source': 'Test imagery',
+            'imagery_date': '2026-01-01',
+            'georef': GeoTransform.from_view(centre, zoom, (width, height)).to_dict((width, height))}
+
+
+_FIGURE_PROJECT = {'id': 'figures', 'name': 'Figures', 'type': 'Solar Farm',
+                   'coordinates': [[20.0, 78.0], [20.01, 78.0], [20.01, 78.012], [20.0, 78.012]]}
+_FIGURE_OBJECTS = {
+    'buildings': [{'type': 'Building', 'confidence': 0.9, 'geo_bbox': [20.004, 78.004, 20.005, 78.005]}],
+    'roads': [{'type': 'Paved Road', 'confidence': 0.8, 'lat_lngs': [[20.001, 78.001], [20.009, 78.011]]}],
+}
+
+
+def test_report_embeds_the_appendix_figures_once():
+    from utils.image_buffer import with_image
+    from utils.land_cover import classify_land_cover
+    from utils.report_generator import build_report
+
+    imagery = _georeferenced_scene(600, 400, _FIGURE_PROJECT['coordinates'])
+    results = {'land_cover': classify_land_cover(with_image(imagery)), 'objects': _FIGURE_OBJECTS}
+    pdf = build_report(_FIGURE_PROJECT, results, imagery=imagery)
+    pdf.compress = False
+    text = bytes(pdf.output())
+    # Satellite (placed in section 2.0 and Appendix A), land cover and detections
+    assert text.count(b'/Subtype /Image') == 3
+    assert text.count(b'/DCTDecode') == 3  # JPEGs embedded as encoded
+    assert b'(Illustrative)' not in text and b'Appendix D' in text
+
+    # Without imagery the land cover map and the detections are still drawn, on their own
+    plain = build_report(_FIGURE_PROJECT, results)
+    plain.compress = False
+    assert bytes(plain.output()).count(b'/Subtype /Image') == 2
+
+
+def test_appendix_figures_are_bounded_by_print_resolution(monkeypatch):
+    from utils.report_generator import appendix_figures
+    from utils.report_images import print_pixels
+
+    monkeypatch.setenv('REPORT_IMAGE_DPI', '100')
+    small = appendix_figures(_FIGURE_PROJECT, {'objects': _FIGURE_OBJECTS},
+                             _georeferenced_scene(600, 400, _FIGURE_PROJECT['coordinates']))
+    large = appendix_figures(_FIGURE_PROJECT, {'objects': _FIGURE_OBJECTS},
+                             _georeferenced_scene(4800, 3200, _FIGURE_PROJECT['coordinates']))
+    max_width, max_height = print_pixels(190, 120, dpi=100)
+    assert small['satellite']['size'] == (600, 400)  # never upsampled
+    assert large['satellite']['size'] == (max_height * 3 // 2, max_height)
+    assert large['detections']['size'] == large['satellite']['size']
+    assert len(large['satellite']['data']) < 2 * len(small['satellite']['data']) + 10_000
+
+
+def test_render_report_file_reads_the_imagery_from_the_analysis_cache(tmp_path):
+    import json
+    from utils.analysis_cache import AnalysisCache, geometry_fingerprint
+    from utils.image_processor import IMAGERY_VERSION
+    from utils.report_generator import render_report_file
+    from utils.result_store import MemoryBackend
+
+    cache = AnalysisCache(MemoryBackend())
+    cache.put(geometry_fingerprint(_FIGURE_PROJECT['coordinates']), 'imagery', IMAGERY_VERSION,
+              _georeferenced_scene(300, 200, _FIGURE_PROJECT['coordinates']))
+    results = json.dumps({'objects': _FIGURE_OBJECTS})
+
+    with_imagery = render_report_file(1, _FIGURE_PROJECT, results, str(tmp_path / 'a.pdf'), cache)
+    without = render_report_file(2, _FIGURE_PROJECT, results, str(tmp_path / 'b.pdf'))
+    assert with_imagery['bytes'] > without['bytes']
+
+
+def test_appendix_figures_fill_an_empty_encoder_they_are_given():
+    from utils.report_generator import appendix_figures
+    from utils.report_images import ImageEncoder
+
+    encoder = ImageEncoder()
+    assert len(encoder) == 0 and not encoder  # empty, hence falsy
+    appendix_figures(_FIGURE_PROJECT, {'objects': _FIGURE_OBJECTS},
+                     imagery=_georeferenced_scene(300, 200, _FIGURE_PROJECT['coordinates']), encoder=encoder)
+    assert len(encoder) > 0
@@ -0,0 +1,85 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from utils.report_images import (ImageEncoder, blend, draw_boxes, draw_polylines, fit_size, print_pixels,
+                                 resample_area, resample_nearest)
+
+
+def test_print_pixels_and_fit_size():
+    assert print_pixels(25.4, 50.8, dpi=100) == (100, 200)
+    assert fit_size(600, 400, 1000, 1000) == (600, 400)  # never upsampled
+    assert fit_size(6000, 4000, 1122, 708) == (1062, 708)
+    assert fit_size(3, 2, 300, 300, upscale=True) == (300, 200)
+
+
+def test_resample_area_averages_the_pixels_under_each_output_pixel():
+    image = np.arange(16, dtype=np.uint8).reshape(4, 4) * 10
+    # Blocks of 2x2: (0, 10, 40, 50) -> 25 and so on
+    assert resample_area(image, (2, 2)).tolist() == [[25, 45], [105, 125]]
+    rgb = np.dstack([image] * 3)
+    assert resample_area(rgb, (2, 2))[..., 2].tolist() == [[25, 45], [105, 125]]
+    with pytest.raises(ValueError):
+        resample_area(image, (8, 8))
+
+
+def test_resample_area_of_a_large_source_keeps_the_content():
+    # Far larger than the output, so the source is read at a stride first
+    source = np.zeros((4000, 6000, 3), dtype=np.uint8)
+    source[:2000] = (200, 100, 50)
+    small = resample_area(source, (60, 40))
+    assert small.shape == (40, 60, 3)
+    assert (small[:20] == (200, 100, 50)).all() and (small[20:] == 0).all()
+
+
+def test_resample_nearest_picks_source_pixels():
+    codes = np.array([[0, 1], [2, 3]], dtype=np.uint8)
+    assert resample_nearest(codes, (4, 2)).tolist() == [[0, 0, 1, 1], [2, 2, 3, 3]]
+
+
+def test_blend_weights_the_overlay():
+    base = np.zeros((1, 1, 3), dtype=np.uint8)
+    overlay = np.full((1, 1, 3), 200, dtype=np.uint8)
+    assert blend(base, overlay, 0.5).tolist() == [[[100, 100, 100]]]
+    assert blend(base, overlay, 0).tolist() == [[[0, 0, 0]]]
+
+
+def test_draw_boxes_outlines_every_box():
+    canvas = np.zeros((20, 20, 3), dtype=np.uint8)
+    draw_boxes(canvas, [[2, 2, 8, 8], [5, 5, 12, 12], [15, 15, 15, 15], [30, 30, 40, 40], [np.nan] * 4],
+               (255, 0, 0))
+    red = canvas[..., 0] == 255
+    assert red[2, 2:9].all() and red[8, 2:9].all() and red[2:9, 2].all()
+    assert not red[3, 3] and not red[10, 10]  # interiors stay clear
+    assert red[8, 6] and red[5, 7] and red[12, 12]  # overlapping outlines are both drawn
+    assert red[15, 15]  # a point shows as a dot
+    assert red.sum() == 24 + 28 - 2 + 1  # the outlines cross twice
+
+
+def test_draw_polylines_samples_every_pixel_of_a_segment():
+    canvas = np.zeros((10, 10, 3), dtype=np.uint8)
+    draw_polylines(canvas, [[0, 0], [9, 9], [0, 9], [3, 9], [3, 6], [7, 1]], (0, 255, 0), counts=[2, 3, 1])
+    green = canvas[..., 1] == 255
+    assert all(green[i, i] for i in range(10))
+    assert green[9, 0:4].all() and green[6:10, 3].all()
+    assert green[1, 7]
+    assert green.sum() == 10 + 4 + 3 + 1
+    draw_polylines(canvas, [[0, 5], [9, 5]], (0, 0, 255))
+    assert (canvas[5, :, 2] == 255).all()
+
+
+def test_image_encoder_encodes_each_raster_once():
+    encoder = ImageEncoder()
+    image = np.zeros((10, 20, 3), dtype=np.uint8)
+    first = encoder.encode(image)
+    assert first.startswith(b'\xff\xd8')  # JPEG
+    assert encoder.encode(image.copy()) is first
+    assert encoder.hits == 1 and len(encoder) == 1
+    image[:5, :10] = (255, 0, 0)
+    png = encoder.encode(image, 'PNG')
+    assert png.startswith(b'\x89PNG') and len(encoder) == 2
+    assert (np.asarray(Image.open(io.BytesIO(png)).convert('RGB')) == image).all()  # flat colours stay exact
+    with pytest.raises(ValueError):
+        encoder.encode(image, 'GIF')
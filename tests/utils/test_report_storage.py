@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from utils.analysis_pipeline import build_analysis_results
+from utils.land_cover import classify_land_cover
+from utils.object_detection import detect_objects
+from utils.report_storage import LazyResults, encode_results, summarize_results, to_plain
+
+
+@pytest.fixture
+def results(scene_imagery):
+    land_cover = classify_land_cover(scene_imagery)
+    land_cover['map_data'] = {'width': 1000, 'height': 100, 'classes': [i % 4 for i in range(100_000)]}
+    return build_analysis_results(land_cover, detect_objects(scene_imagery))
+
+
+def test_round_trip(results):
+    stored = LazyResults(encode_results(results))
+    assert to_plain(stored) == json.loads(json.dumps(results))
+    assert set(stored) == set(results)
+    assert len(stored) == len(results)
+
+
+def test_sections_decode_lazily(results):
+    stored = LazyResults(encode_results(results))
+    assert stored.decoded_sections == set()
+    assert stored['land_cover']['classifications']['water']['percentage'] == 8.0
+    assert stored.decoded_sections == {'land_cover'}
+    assert 'map_data' in stored['land_cover']
+    assert stored.decoded_sections == {'land_cover'}
+    assert len(stored['land_cover']['map_data']['classes']) == 100_000
+    assert stored.decoded_sections == {'land_cover', 'land_cover.map_data'}
+    with pytest.raises(KeyError):
+        stored['not_a_section']
+
+
+def test_blob_is_much_smaller_than_json(results):
+    assert len(encode_results(results)) * 10 < len(json.dumps(results))
+
+
+def test_rejects_foreign_blobs():
+    with pytest.raises(ValueError):
+        LazyResults(b'\x00' * 16)
+
+
+def test_summarize_results(results):
+    summary = summarize_results(results)
+    assert summary == {
+        'dominant_land_cover': 'vegetation',
+        'dominant_land_cover_pct': 45.0,
+        'object_count': 6,
+        'confidence_score': 1.0
+    }
+    assert summarize_results({}) == {'dominant_land_cover': None, 'dominant_land_cover_pct': None,
+                                     'object_count': 0, 'confidence_score': None}
+    # Unclassified land cover (no imagery) has no dominant class
+    unclassified = summarize_results({'land_cover': classify_land_cover({})})
+    assert (unclassified['dominant_land_cover'], unclassified['dominant_land_cover_pct']) == (None, None)
@@ -0,0 +1,90 @@
+import os
+import time
+import pytest
+from utils.result_store import (
+    ResultStore, MemoryBackend, DirectoryBackend, create_backend
+)
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'directory'])
+def backend_factory(request, tmp_path):
+    def factory(**options):
+        path = str(tmp_path / 'store.sqlite') if request.param == 'sqlite' else str(tmp_path / 'spool')
+        return create_backend(request.param, path=path, **options)
+    return factory
+
+
+def test_round_trip(backend_factory):
+    store = ResultStore(backend_factory())
+    results = {'land_cover': {'classifications': {'water': {'percentage': 12.5}}}, 'objects': {'buildings': []}}
+    result_id = store.put(results)
+    assert store.get(result_id) == results
+    assert store.get_json(result_id) == '{"land_cover": {"classifications": {"water": {"percentage": 12.5}}}, "objects": {"buildings": []}}'
+
+
+def test_missing_ids_return_none(backend_factory):
+    store = ResultStore(backend_factory())
+    assert store.get('unknown') is None
+    assert store.get(None) is None
+    assert store.get_json('') is None
+
+
+def test_ttl_expiry(backend_factory):
+    backend = backend_factory(ttl=0.05)
+    store = ResultStore(backend)
+    result_id = store.put({'a': 1})
+    time.sleep(0.1)
+    assert store.get(result_id) is None
+
+
+def test_item_cap_evicts_least_recently_used(backend_factory):
+    backend = backend_factory(max_items=2)
+    backend.put('first', b'1')
+    time.sleep(0.01)
+    backend.put('second', b'2')
+    time.sleep(0.01)
+    assert backend.get('first') == b'1'  # touch so 'second' becomes least recently used
+    time.sleep(0.01)
+    backend.put('third', b'3')
+    assert backend.get('second') is None
+    assert backend.get('first') == b'1'
+    assert backend.get('third') == b'3'
+    assert len(backend) == 2
+
+
+def test_byte_cap(backend_factory):
+    backend = backend_factory(max_bytes=10)
+    backend.put('a', b'x' * 6)
+    time.sleep(0.01)
+    backend.put('b', b'y' * 6)
+    assert backend.get('a') is None
+    assert backend.get('b') == b'y' * 6
+
+
+def test_delete_and_purge(backend_factory):
+    backend = backend_factory(ttl=0.05)
+    backend.put('keep', b'1')
+    backend.delete('keep')
+    assert backend.get('keep') is None
+    backend.put('old', b'1')
+    time.sleep(0.1)
+    assert backend.purge_expired() == 1
+    assert len(backend) == 0
+
+
+def test_invalid_keys_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        DirectoryBackend(str(tmp_path)).put('../escape', b'1')
+    with pytest.raises(ValueError):
+        MemoryBackend().put('bad key', b'1')
+
+
+def test_directory_backend_leaves_no_temp_files(tmp_path):
+    backend = DirectoryBackend(str(tmp_path))
+    backend.put('entry', b'payload')
+    assert os.listdir(tmp_path) == ['entry.entry']
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        create_backend('redis')
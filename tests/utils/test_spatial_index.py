@@ -0,0 +1,143 @@
+import numpy as np
+import pytest
+
+from utils.spatial_index import (DetectionIndex, ProjectIndex, SpatialIndex, STRTree, box_segment_distances,
+                                 detection_index, points_in_polygon)
+
+
+def _random_boxes(count, seed=0):
+    rng = np.random.default_rng(seed)
+    corners = rng.uniform(0, 1000, size=(count, 2))
+    return np.hstack([corners, corners + rng.uniform(1, 20, size=(count, 2))])
+
+
+def _distances(boxes, point):
+    dx = np.maximum(np.maximum(boxes[:, 0] - point[0], point[0] - boxes[:, 2]), 0)
+    dy = np.maximum(np.maximum(boxes[:, 1] - point[1], point[1] - boxes[:, 3]), 0)
+    return np.hypot(dx, dy)
+
+
+@pytest.mark.parametrize('count', [0, 1, 15, 2000])
+def test_bbox_queries_match_a_linear_scan(count):
+    boxes = _random_boxes(count)
+    tree = STRTree(boxes, node_capacity=8)
+    rng = np.random.default_rng(1)
+    for _ in range(20):
+        x, y = rng.uniform(0, 1000, size=2)
+        query = [x, y, x + rng.uniform(0, 300), y + rng.uniform(0, 300)]
+        expected = np.flatnonzero((boxes[:, 0] <= query[2]) & (boxes[:, 2] >= query[0])
+                                  & (boxes[:, 1] <= query[3]) & (boxes[:, 3] >= query[1]))
+        assert tree.query_bbox(query).tolist() == expected.tolist()
+
+
+def test_radius_and_nearest_queries_are_exact():
+    boxes = _random_boxes(3000)
+    tree = STRTree(boxes)
+    point = (480.0, 515.0)
+    distances = _distances(boxes, point)
+    assert tree.query_radius(point, 40).tolist() == np.flatnonzero(distances <= 40).tolist()
+    indices, found = tree.nearest(point, k=10)
+    assert np.allclose(found, np.sort(distances)[:10])
+    assert np.allclose(distances[indices], found)
+    assert len(tree.nearest(point, k=5000)[0]) == 3000
+    assert STRTree(np.empty((0, 4))).nearest(point, 3)[0].size == 0
+
+
+def test_line_queries_measure_to_each_segment():
+    boxes = np.array([[0, 0, 10, 10], [100, 48, 110, 52], [200, 200, 210, 210], [500, 0, 510, 10]], dtype=float)
+    tree = STRTree(boxes, node_capacity=2)
+    line = [[0, 60], [300, 60], [300, 300]]
+    assert tree.query_line(line, 10).tolist() == [1]
+    assert tree.query_line(line, 90).tolist() == [0, 1, 2]
+    # A segment through a box without an end point inside it is at distance 0
+    assert box_segment_distances(boxes[[0]], np.array([[-5.0, 5.0]]), np.array([[15.0, 5.0]]))[0] == 0.0
+    assert box_segment_distances(boxes[[0]], np.array([[20.0, 20.0]]), np.array([[30.0, 30.0]]))[0] == \
+        pytest.approx(np.hypot(10, 10))
+
+
+def test_points_in_polygon():
+    ring = [[0, 0], [10, 0], [10, 10], [5, 5], [0, 10]]
+    inside = points_in_polygon([[2, 2], [5, 8], [8, 6], [20, 5]], ring)
+    assert inside.tolist() == [True, False, True, False]
+
+
+def test_spatial_index_handles_inserts_and_removals():
+    boxes = _random_boxes(500)
+    index = SpatialIndex(node_capacity=4)
+    for entry_id in range(500):
+        index.insert([f'p{entry_id}'], [boxes[entry_id]])
+    assert len(index) == 500
+    assert 0 < index.rebuilds < 50  # repacked in batches, not on every insert
+
+    index.remove(['p0', 'p1'])
+    index.insert(['p2'], [[-100, -100, -90, -90]])  # moved
+    whole = index.query_bbox([0, 0, 1100, 1100])
+    assert len(whole) == 497 and 'p0' not in whole and 'p2' not in whole
+    assert index.query_radius((-95, -95), 1) == ['p2']
+    assert index.nearest((-95, -95), k=1) == [('p2', 0.0)]
+    assert [entry_id for entry_id, _ in index.nearest((-95, -95), k=3)][0] == 'p2'
+
+
+def _detections():
+    return {
+        'buildings': [
+            {'type': 'Building', 'geo_bbox': [20.0000, 78.0000, 20.0001, 78.0001]},  # on the line
+            {'type': 'Building', 'geo_bbox': [20.0003, 78.0010, 20.0004, 78.0011]},  # ~35 m north, ~100 m east
+            {'type': 'Building', 'geo_bbox': [20.0100, 78.0010, 20.0101, 78.0011]},  # ~1.1 km north
+            {'type': 'Building', 'bbox': [0, 0, 10, 10]},  # not georeferenced
+        ],
+        'roads': [{'type': 'Paved Road', 'lat_lngs': [[19.999, 78.0], [19.999, 78.01]]}],
+        'analysis_date': '2024-01-01'
+    }
+
+
+def test_detection_index_answers_in_ground_metres():
+    index = DetectionIndex(_detections())
+    assert len(index) == 4
+    alignment = [[20.0, 77.99], [20.0, 78.02]]
+    assert len(index.within_line(alignment, 10, categories=('buildings',))) == 1
+    assert len(index.within_line(alignment, 50, categories=('buildings',))) == 2
+    assert len(index.within_line(alignment, 150)) == 3  # the road 110 m south joins
+    assert [item['geo_bbox'][0] for _, item in index.nearest([20.0101, 78.0011], k=1)] == [20.0100]
+    assert len(index.within_radius([20.0, 78.0], 50)) == 1
+    assert len(index.within_radius([20.0, 78.0], 150)) == 3  # the second building ~110 m away and the road
+    assert len(index.in_bounds({'north': 20.02, 'south': 20.005, 'east': 78.1, 'west': 78.0})) == 1
+    square = [[19.9995, 77.9995], [19.9995, 78.002], [20.0005, 78.002], [20.0005, 77.9995]]
+    assert len(index.within_polygon(square, categories=('buildings',))) == 2
+
+
+def test_detection_index_is_cached_per_key():
+    detections = _detections()
+    first = detection_index(detections, cache_key='project-1')
+    assert detection_index(detections, cache_key='project-1') is first
+    detections['buildings'].pop(0)
+    second = detection_index(detections, cache_key='project-1')
+    assert second is not first
+    # Same extents, different confidence: the cached items would be stale
+    detections = _detections()
+    detections['buildings'].pop(0)
+    detections['buildings'][0]['confidence'] = 0.4
+    third = detection_index(detections, cache_key='project-1')
+    assert third is not second and third.entries[0][1]['confidence'] == 0.4
+
+
+def test_project_index_queries():
+    index = ProjectIndex()
+    index.add([(1, [[20.0, 78.0], [20.01, 78.01]]), (2, [[21.0, 79.0], [21.01, 79.01]]), (3, None)])
+    assert len(index) == 2 and index.last_id == 3
+    assert index.in_bounds({'north': 20.5, 'south': 19.5, 'east': 78.5, 'west': 77.5}) == [1]
+    assert index.within_radius([20.02, 78.0], 2000) == [1]
+    nearest = index.nearest([20.0, 78.02], k=2)
+    assert [project_id for project_id, _ in nearest] == [1, 2]
+    assert nearest[0][1] == pytest.approx(1046, rel=0.01)  # 0.01 degrees of longitude at 20 N
+
+
+def test_intersects_bounds_is_exact():
+    from utils.spatial_index import intersects_bounds
+    viewport = {'north': 20.2, 'south': 20.1, 'east': 78.7, 'west': 78.6}
+    assert not intersects_bounds([[21.0, 78.0], [20.0, 79.0]], viewport)  # passes the corner
+    assert intersects_bounds([[21.0, 77.8], [20.0, 78.8]], viewport)
+    ring = [[19.0, 78.0], [19.0, 80.0], [21.0, 80.0], [21.0, 78.0]]
+    assert intersects_bounds(ring, viewport, closed=True)  # the viewport is inside the polygon
+    assert not intersects_bounds(ring, viewport, closed=False)
+    assert intersects_bounds([[20.15, 78.65]], viewport) and not intersects_bounds([], viewport)
@@ -0,0 +1,99 @@
+import time
+
+import pytest
+
+from utils.stage_graph import StageError, StageGraph, StageTimeoutError
+
+
+def _square(value):
+    # Module-level so a process pool can run it
+    return value * value
+
+
+def _sleep_then(seconds, value):
+    def stage(*_):
+        time.sleep(seconds)
+        return value
+    return stage
+
+
+def test_outputs_flow_to_dependants():
+    graph = (StageGraph()
+             .add('a', lambda: 2)
+             .add('b', lambda a: a + 1, requires=('a',))
+             .add('c', lambda a, b: a * b, requires=('a', 'b')))
+    run = graph.run()
+    assert run['results'] == {'a': 2, 'b': 3, 'c': 6}
+    assert run['status'] == {'a': 'done', 'b': 'done', 'c': 'done'}
+    assert set(run['timings']) == {'a', 'b', 'c'} and run['errors'] == {}
+
+
+def test_independent_stages_overlap():
+    graph = StageGraph().add('source', lambda: None)
+    for name in ('one', 'two', 'three'):
+        graph.add(name, _sleep_then(0.15, name), requires=('source',))
+    run = graph.run()
+    assert all(run['timings'][name] >= 0.15 for name in ('one', 'two', 'three'))
+    assert run['total'] < 0.35  # not 0.45: the slowest stage, not the sum
+
+
+def test_fatal_failure_cancels_the_rest():
+    def broken():
+        raise RuntimeError('boom')
+    graph = (StageGraph()
+             .add('slow', _sleep_then(0.3, 'late'))
+             .add('broken', broken)
+             .add('after', lambda value: value, requires=('broken',)))
+    started = time.perf_counter()
+    with pytest.raises(StageError, match="Stage 'broken' failed: boom") as raised:
+        graph.run()
+    assert time.perf_counter() - started < 0.25  # did not wait for 'slow'
+    run = raised.value.run
+    assert run['status'] == {'slow': 'cancelled', 'broken': 'failed', 'after': 'cancelled'}
+    assert isinstance(raised.value.__cause__, RuntimeError)
+
+
+def test_non_fatal_failure_skips_dependants_only():
+    def broken():
+        raise ValueError('bad input')
+    run = (StageGraph()
+           .add('optional', broken, fatal=False)
+           .add('dependant', lambda value: value, requires=('optional',))
+           .add('other', lambda: 'ok')
+           .run())
+    assert run['status'] == {'optional': 'failed', 'dependant': 'skipped', 'other': 'done'}
+    assert run['results'] == {'other': 'ok'}
+    assert 'bad input' in run['errors']['optional']
+
+
+def test_timeouts():
+    graph = StageGraph().add('stuck', _sleep_then(1.0, None), timeout=0.05)
+    started = time.perf_counter()
+    with pytest.raises(StageTimeoutError) as raised:
+        graph.run()
+    assert time.perf_counter() - started < 0.5
+    assert raised.value.run['status'] == {'stuck': 'timed_out'}
+
+    run = (StageGraph()
+           .add('stuck', _sleep_then(1.0, None), timeout=0.05, fatal=False)
+           .add('quick', lambda: 1, timeout=1.0)
+           .run())
+    assert run['status'] == {'stuck': 'timed_out', 'quick': 'done'}
+
+
+def test_process_pool():
+    run = (StageGraph()
+           .add('base', int)
+           .add('squared', _square, requires=('base',))
+           .run(executor_type='process', max_workers=1))
+    assert run['results'] == {'base': 0, 'squared': 0}
+
+
+def test_invalid_declarations():
+    graph = StageGraph().add('a', int)
+    with pytest.raises(ValueError):
+        graph.add('a', int)
+    with pytest.raises(ValueError):
+        graph.add('b', int, requires=('missing',))
+    with pytest.raises(ValueError):
+        graph.run(executor_type='fibre')
@@ -0,0 +1,21 @@
+import numpy as np
+from utils.static_map import decode_polyline, encode_polyline
+
+
+def _dense_ring(count, radius=0.05):
+    angles = np.linspace(0, 2 * np.pi, count, endpoint=False)
+    wobble = 1 + 0.05 * np.sin(angles * 17)
+    return np.column_stack([20 + radius * wobble * np.sin(angles), 78 + radius * wobble * np.cos(angles)])
+
+
+def test_encode_polyline_reference_example():
+    # Example from Google's encoded polyline algorithm documentation
+    points = [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]]
+    assert encode_polyline(points) == '_p~iF~ps|U_ulLnnqC_mqNvxq`@'
+
+
+def test_encode_decode_round_trip():
+    points = _dense_ring(500)
+    assert np.allclose(decode_polyline(encode_polyline(points)), np.round(points, 5))
+    assert encode_polyline([]) == ''
+
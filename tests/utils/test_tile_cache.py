@@ -0,0 +1,103 @@
+import os
+import pickle
+import threading
+import time
+
+from utils.tile_cache import CachedTile, TileCache, tile_key
+
+URL = "https://maps.googleapis.com/maps/api/staticmap"
+
+
+def test_tile_key_ignores_credentials_and_parameter_order():
+    a = tile_key(URL, {'size': '600x400', 'maptype': 'satellite', 'path': 'enc:abc', 'key': 'one'})
+    b = tile_key(URL, {'key': 'two', 'path': 'enc:abc', 'maptype': 'satellite', 'size': '600x400'})
+    assert a == b
+    assert a != tile_key(URL, {'size': '640x640', 'maptype': 'satellite', 'path': 'enc:abc'})
+    assert tile_key(URL, {'center': 1.00000001}) == tile_key(URL, {'center': 1.0})
+
+
+def test_round_trip_is_memory_mapped(tmp_path):
+    cache = TileCache(str(tmp_path))
+    key = tile_key(URL, {'size': '600x400'})
+    assert cache.get(key) is None
+    cache.put(key, b'\x89PNG image bytes', 'image/png')
+
+    tile = cache.get(key)
+    assert isinstance(tile, CachedTile)
+    assert isinstance(tile.data, memoryview)
+    assert tile.data.readonly
+    assert tile.data.tobytes() == b'\x89PNG image bytes'
+    assert tile.content_type == 'image/png'
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['writes']) == (1, 1, 1)
+    assert stats['bytes_served'] == len(b'\x89PNG image bytes')
+
+
+def test_mapping_survives_eviction(tmp_path):
+    cache = TileCache(str(tmp_path))
+    cache.put('a' * 64, b'first', 'image/png')
+    tile = cache.get('a' * 64)
+    os.remove(cache._path('a' * 64))
+    assert tile.data.tobytes() == b'first'
+
+
+def test_least_recently_used_tiles_are_evicted(tmp_path):
+    cache = TileCache(str(tmp_path), max_bytes=3 * 1100)
+    keys = [f"{i:064x}" for i in range(3)]
+    for offset, key in enumerate(keys):
+        cache.put(key, b'x' * 1000, 'image/png')
+        past = time.time() - 100 + offset
+        os.utime(cache._path(key), (past, past))
+    assert cache.get(keys[0]) is not None  # Refreshes the access time
+
+    cache.put(f"{3:064x}", b'x' * 1000, 'image/png')
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert len(cache) == 3
+    assert cache.size_bytes() <= cache.max_bytes
+    assert cache.stats()['evictions'] == 1
+
+
+def test_concurrent_writers_never_expose_partial_entries(tmp_path):
+    cache = TileCache(str(tmp_path))
+    key = 'b' * 64
+    payloads = [bytes([i]) * 200_000 for i in range(1, 5)]
+    errors = []
+
+    def writer(payload):
+        for _ in range(5):
+            cache.put(key, payload, 'image/png')
+
+    def reader():
+        for _ in range(50):
+            tile = cache.get(key)
+            if tile is not None and tile.data.tobytes() not in payloads:
+                errors.append('partial read')
+
+    threads = [threading.Thread(target=writer, args=(p,)) for p in payloads]
+    threads += [threading.Thread(target=reader) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert not [name for name in os.listdir(tmp_path / 'bb') if name.endswith('.tmp')]
+
+
+def test_corrupt_entries_are_discarded(tmp_path):
+    cache = TileCache(str(tmp_path))
+    key = 'c' * 64
+    os.makedirs(os.path.dirname(cache._path(key)))
+    with open(cache._path(key), 'wb') as f:
+        f.write(b'not a tile')
+    assert cache.get(key) is None
+    assert not os.path.exists(cache._path(key))
+
+
+def test_pickled_cache_shares_directory_but_not_counters(tmp_path):
+    cache = TileCache(str(tmp_path))
+    cache.put('d' * 64, b'img', 'image/png')
+    cache.get('d' * 64)
+    copy = pickle.loads(pickle.dumps(cache))
+    assert copy.stats()['hits'] == 0
+    assert copy.get('d' * 64).data.tobytes() == b'img'
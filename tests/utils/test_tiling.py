@@ -0,0 +1,193 @@
+import numpy as np
+import pytest
+
+from utils.tiling import (LandCoverMerger, ObjectMerger, clipped_line_length, clipped_polygon_area,
+                          ground_resolution_m, lat_lng_to_pixels, pixels_to_lat_lng, plan_tiles,
+                          zoom_for_resolution)
+
+
+def test_mercator_round_trip():
+    coords = np.array([[0.0, 0.0], [20.5, 78.9], [-33.9, 151.2], [60.0, -120.0]])
+    pixels = lat_lng_to_pixels(coords, 15)
+    assert np.allclose(pixels_to_lat_lng(pixels, 15), coords, atol=1e-9)
+    # Zoom 0 maps the whole world onto 256 pixels, centred on (0, 0)
+    assert np.allclose(lat_lng_to_pixels([[0.0, 0.0]], 0), [[128.0, 128.0]])
+
+
+def test_zoom_for_resolution_meets_target():
+    zoom = zoom_for_resolution(1.2, 20.0)
+    assert ground_resolution_m(20.0, zoom) <= 1.2
+    assert ground_resolution_m(20.0, zoom - 1) > 1.2
+
+
+def test_clipped_polygon_area():
+    square = np.array([[0, 0], [10, 0], [10, 10], [0, 10]], dtype=float)
+    assert clipped_polygon_area(square, (0, 0, 10, 10)) == pytest.approx(100)
+    assert clipped_polygon_area(square, (5, 5, 20, 20)) == pytest.approx(25)
+    assert clipped_polygon_area(square, (20, 20, 30, 30)) == 0.0
+    triangle = np.array([[0, 0], [10, 0], [0, 10]], dtype=float)
+    assert clipped_polygon_area(triangle, (0, 0, 5, 5)) == pytest.approx(25)
+
+
+def test_clipped_line_length():
+    line = np.array([[0, 0], [10, 0], [10, 10]], dtype=float)
+    assert clipped_line_length(line, (-1, -1, 20, 20)) == pytest.approx(20)
+    assert clipped_line_length(line, (5, -1, 20, 5)) == pytest.approx(10)
+    assert clipped_line_length(line, (20, 20, 30, 30)) == 0.0
+
+
+def test_plan_discards_tiles_outside_polygon():
+    # A right triangle: roughly half the grid cells lie outside it
+    triangle = [[20.0, 78.0], [20.0, 78.1], [20.1, 78.0]]
+    plan = plan_tiles(triangle, target_resolution_m=5.0, max_tiles=1000)
+    assert plan['discarded'] > 0
+    assert len(plan['tiles']) + plan['discarded'] == plan['candidates']
+    # The owned cells partition the polygon, so the weights add up to its pixel area
+    pixels = lat_lng_to_pixels(triangle, plan['zoom'])
+    assert sum(t['weight'] for t in plan['tiles']) == pytest.approx(
+        clipped_polygon_area(pixels, (-1e12, -1e12, 1e12, 1e12)), rel=1e-6)
+    for tile in plan['tiles']:
+        assert tile['bounds']['south'] < tile['center'][0] < tile['bounds']['north']
+        assert tile['bounds']['west'] < tile['center'][1] < tile['bounds']['east']
+
+
+def test_plan_coarsens_to_respect_max_tiles():
+    square = [[20.0, 78.0], [20.0, 78.2], [20.2, 78.2], [20.2, 78.0]]
+    fine = plan_tiles(square, target_resolution_m=1.2, max_tiles=10000, max_candidates=100000)
+    capped = plan_tiles(square, target_resolution_m=1.2, max_tiles=16)
+    assert len(capped['tiles']) <= 16
+    assert capped['zoom'] < fine['zoom']
+    assert capped['resolution_m'] > fine['resolution_m']
+
+
+def test_plan_for_diagonal_line_keeps_only_crossed_tiles():
+    line = [[20.0, 78.0], [20.3, 78.3]]
+    plan = plan_tiles(line, target_resolution_m=10.0, max_tiles=1000)
+    columns = max(t['column'] for t in plan['tiles']) + 1
+    rows = max(t['row'] for t in plan['tiles']) + 1
+    assert len(plan['tiles']) < columns * rows / 2
+    assert all(t['weight'] > 0 for t in plan['tiles'])
+
+
+def test_plan_for_single_point_has_one_tile():
+    plan = plan_tiles([[20.0, 78.0]])
+    assert len(plan['tiles']) == 1
+
+
+def test_land_cover_merge_is_area_weighted():
+    merger = LandCoverMerger()
+    merger.add({'classifications': {'water': {'percentage': 100.0, 'details': {'ponds': 100.0}},
+                                    'vegetation': {'percentage': 0.0, 'details': {}}},
+                'confidence_score': 0.9, 'map_data': {'width': 1}}, weight=3)
+    merger.add({'classifications': {'water': {'percentage': 0.0, 'details': {'ponds': 0.0}},
+                                    'vegetation': {'percentage': 100.0, 'details': {}}},
+                'confidence_score': 0.5}, weight=1)
+    merged = merger.result()
+    assert merged['classifications']['water']['percentage'] == 75.0
+    assert merged['classifications']['water']['details']['ponds'] == 75.0
+    assert merged['classifications']['vegetation']['percentage'] == 25.0
+    assert merged['confidence_score'] == 0.8
+    assert 'map_data' not in merged and merged['map_status']
+
+
+def test_land_cover_merge_places_tile_maps_on_one_mosaic(monkeypatch):
+    from utils import tiling
+    from utils.raster import ClassMap
+
+    monkeypatch.setattr(tiling, 'MAP_DATA_MAX_SIDE', 60)
+    # A row of three 64 px tiles overlapping by 8 px; the last one is never analysed
+    tiles = [{'pixel_box': [1000 + 56 * i, 500, 1064 + 56 * i, 564],
+              'cell_box': [1000 + 56 * i, 500, 1056 + 56 * i if i < 2 else 1176, 564]} for i in range(3)]
+    water, vegetation = np.ones((32, 32), dtype=np.uint8), np.zeros((32, 32), dtype=np.uint8)
+    merger = LandCoverMerger(tiles)
+    merger.add({'classifications': {}, 'map_data': ClassMap(water).to_json()}, 1, tiles[0])
+    merger.add({'classifications': {}, 'map_data': ClassMap(vegetation).to_json()}, 1, tiles[1])
+    merged = merger.result()
+    mosaic = ClassMap.from_json(merged['map_data'])
+    # 176 px of extent fit in 60 mosaic pixels at 3 px each
+    assert (mosaic.width, mosaic.height) == (59, 22)
+    assert mosaic.classes[-1] == 'not_analysed'
+    # Each tile fills the cell it owns; the seam is where the second cell starts
+    assert set(np.unique(mosaic.codes[:, :19])) == {1}
+    assert set(np.unique(mosaic.codes[:, 19:37])) == {0}
+    assert set(np.unique(mosaic.codes[:, 37:])) == {4}
+
+
+def test_object_merge_removes_seam_duplicates():
+    merger = ObjectMerger(origin_px=[1000, 2000])
+    left = {'pixel_box': [1000, 2000, 1640, 2640]}
+    right = {'pixel_box': [1608, 2000, 2248, 2640]}
+    # The same building straddles the seam and is seen by both tiles
+    merger.add({'buildings': [{'type': 'Residential', 'confidence': 0.8, 'bbox': [610, 100, 630, 120]}],
+                'detection_model': 'm'}, left)
+    merger.add({'buildings': [{'type': 'Residential', 'confidence': 0.9, 'bbox': [2, 100, 22, 120]},
+                              {'type': 'Residential', 'confidence': 0.7, 'bbox': [300, 300, 320, 320]}],
+                'roads': [{'type': 'Paved Road', 'points': [[0, 0], [10, 10]]}],
+                'detection_model': 'm'}, right)
+    merged = merger.result()
+    assert merged['duplicates_removed'] == 1
+    assert len(merged['buildings']) == 2
+    assert merged['buildings'][0]['confidence'] == 0.9
+    assert merged['buildings'][0]['bbox'] == [610.0, 100.0, 630.0, 120.0]
+    assert merged['roads'][0]['points'] == [[608.0, 0.0], [618.0, 10.0]]
+    assert merged['detection_model'] == 'm'
+
+
+def test_object_merger_deduplicates_a_dense_seam():
+    merger = ObjectMerger(origin_px=[0, 0])
+    left = {'pixel_box': [0, 0, 640, 640]}
+    right = {'pixel_box': [600, 0, 1240, 640]}
+    # 400 buildings inside the 40 px overlap, each seen by both tiles
+    seam = [(x, y) for x in range(600, 640, 2) for y in range(0, 640, 32)]
+    merger.add({'buildings': [{'type': 'Residential', 'confidence': 0.6, 'bbox': [x, y, x + 2, y + 20]}
+                              for x, y in seam]}, left)
+    merger.add({'buildings': [{'type': 'Residential', 'confidence': 0.7, 'bbox': [x - 600, y, x - 598, y + 20]}
+                              for x, y in seam]
+                             + [{'type': 'Commercial', 'confidence': 0.5, 'bbox': [0, 0, 2, 20]}]}, right)
+    merged = merger.result()
+    assert merged['duplicates_removed'] == len(seam)
+    assert len(merged['buildings']) == len(seam) + 1
+    assert all(item['confidence'] in (0.7, 0.5) for item in merged['buildings'])
+    # result() can be called again without counting the duplicates twice
+    assert merger.result()['duplicates_removed'] == len(seam)
+
+
+def test_line_box_distance():
+    from utils.tiling import line_box_distance
+
+    line = np.array([[0, 0], [10, 0]], dtype=float)
+    assert line_box_distance(line, (2, -1, 4, 1)) == 0.0
+    assert line_box_distance(line, (2, 3, 4, 5)) == pytest.approx(3.0)
+    assert line_box_distance(line, (13, 4, 20, 20)) == pytest.approx(5.0)
+
+
+def test_corridor_plan_keeps_far_fewer_pixels_on_diagonal_routes():
+    from utils.tiling import corridor_mask
+
+    route = [[20.0, 78.0], [20.25, 78.25], [20.5, 78.5]]
+    plan = plan_tiles(route, target_resolution_m=5.0, max_tiles=1000, max_candidates=100000,
+                      closed=False, corridor_m=60)
+    assert plan['corridor']['half_width_px'] == pytest.approx(30 / ground_resolution_m(20.25, plan['zoom']), rel=1e-3)
+    assert len(plan['tiles']) * 5 < plan['candidates']
+
+    masks = [corridor_mask(tile, plan) for tile in plan['tiles']]
+    assert all(mask.shape == (640, 640) for mask in masks)
+    corridor_pixels = sum(int(mask.sum()) for mask in masks)
+    bbox_pixels = plan['candidates'] * 640 * 640
+    assert corridor_pixels * 10 < bbox_pixels
+
+
+def test_corridor_mask_follows_the_alignment():
+    from utils.tiling import corridor_mask
+
+    line = [[20.0, 78.0], [20.0, 78.01]]  # Due east
+    plan = plan_tiles(line, target_resolution_m=2.0, closed=False, corridor_m=40)
+    tile = plan['tiles'][0]
+    mask = corridor_mask(tile, plan)
+    origin = np.asarray(plan['origin_px'])
+    line_y = plan['corridor']['line_px'][0][1] + origin[1] - tile['pixel_box'][1]
+    half = plan['corridor']['half_width_px']
+    column = 300
+    inside_rows = np.flatnonzero(mask[:, column])
+    assert inside_rows.min() == pytest.approx(line_y - half, abs=1.5)
+    assert inside_rows.max() == pytest.approx(line_y + half, abs=1.5)
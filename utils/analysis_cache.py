@@ -0,0 +1,138 @@
+import hashlib
+import logging
+import pickle
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Pipeline stages that can be memoized, in execution order
+STAGES = ('imagery', 'land_cover', 'objects')
+
+
+def canonical_geometry(coordinates, precision=6, closed=None):
+    """
+    Normalizes a geometry so that equivalent drawings compare equal.
+
+    Coordinates are rounded to `precision` decimals and consecutive duplicate
+    vertices are dropped. Rings (closed=True) lose their repeated closing
+    vertex, are wound counter-clockwise and start at their smallest vertex.
+    Open lines are oriented so that the lexicographically smaller direction
+    comes first.
+
+    Args:
+        coordinates (list): [lat, lng] pairs
+        precision (int): Decimal places kept (6 is roughly 0.1 m)
+        closed (bool): Treat as a ring; inferred as len(coordinates) > 2 when None
+
+    Returns:
+        numpy.ndarray: (N, 2) float64 array in canonical order
+    """
+    points = np.round(np.asarray(coordinates, dtype=np.float64).reshape(-1, 2), precision) + 0.0
+    if closed is None:
+        closed = len(points) > 2
+
+    if len(points) > 1:
+        keep = np.any(np.diff(points, axis=0) != 0, axis=1)
+        points = points[np.concatenate(([True], keep))]
+    if closed and len(points) > 1 and np.array_equal(points[0], points[-1]):
+        points = points[:-1]
+    if len(points) < 2:
+        return points
+
+    if closed:
+        # Shoelace sign on (lng, lat): positive means counter-clockwise
+        x, y = points[:, 1], points[:, 0]
+        signed_area = np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y)
+        if signed_area < 0:
+            points = points[::-1]
+        start = np.lexsort((points[:, 1], points[:, 0]))[0]
+        return np.roll(points, -start, axis=0)
+
+    reversed_points = points[::-1]
+    for forward, backward in zip(points.ravel(), reversed_points.ravel()):
+        if forward != backward:
+            return points if forward < backward else reversed_points.copy()
+    return points
+
+
+def geometry_fingerprint(coordinates, precision=6, closed=None):
+    """
+    Returns a stable SHA-256 hex digest of the canonical form of a geometry.
+
+    Two drawings of the same shape (different starting vertex, opposite
+    winding, with or without the closing vertex) share a fingerprint.
+    """
+    points = canonical_geometry(coordinates, precision=precision, closed=closed)
+    if closed is None:
+        closed = len(coordinates) > 2
+    digest = hashlib.sha256()
+    digest.update(f"{'ring' if closed else 'line'}:{precision}:".encode('ascii'))
+    digest.update(np.ascontiguousarray(points, dtype='<f8').tobytes())
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """
+    Memoizes pipeline stage outputs per geometry fingerprint.
+
+    Entries are stored on a result store backend (see utils.result_store), which
+    provides TTL expiry and LRU eviction; a persistent backend (sqlite or
+    directory) keeps entries across restarts. Every entry records the version
+    string of the stage that produced it, and a lookup with a different version
+    is treated as a miss and drops the stale entry.
+
+    Args:
+        backend: A utils.result_store backend
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._counters = {stage: {'hits': 0, 'misses': 0} for stage in STAGES}
+
+    def __getstate__(self):
+        # Counters are per process; a pickled copy (process pool) starts fresh
+        return {'backend': self.backend}
+
+    def __setstate__(self, state):
+        self.__init__(state['backend'])
+
+    @staticmethod
+    def _key(fingerprint, stage):
+        return f"{fingerprint}.{stage}"
+
+    def _count(self, stage, outcome):
+        with self._lock:
+            self._counters.setdefault(stage, {'hits': 0, 'misses': 0})[outcome] += 1
+
+    def get(self, fingerprint, stage, version):
+        """Returns the cached value for a stage, or None on a miss."""
+        key = self._key(fingerprint, stage)
+        raw = self.backend.get(key)
+        if raw is not None:
+            try:
+                cached_version, value = pickle.loads(raw)
+            except Exception as e:
+                logger.warning(f"Discarding unreadable cache entry {key}: {e}")
+                cached_version, value = None, None
+            if cached_version == version:
+                self._count(stage, 'hits')
+                return value
+            self.backend.delete(key)
+        self._count(stage, 'misses')
+        return None
+
+    def put(self, fingerprint, stage, version, value):
+        self.backend.put(self._key(fingerprint, stage),
+                         pickle.dumps((version, value), protocol=pickle.HIGHEST_PROTOCOL))
+
+    def invalidate(self, fingerprint, stages=STAGES):
+        for stage in stages:
+            self.backend.delete(self._key(fingerprint, stage))
+
+    def stats(self):
+        """Returns hit/miss counters per stage for this process."""
+        with self._lock:
+            return {stage: dict(counts) for stage, counts in self._counters.items()}
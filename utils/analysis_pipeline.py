@@ -0,0 +1,364 @@
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+from utils.analysis_cache import geometry_fingerprint
+from utils.georef import GeoTransform, ring_mask
+from utils.image_buffer import close_image, image_array, with_image
+from utils.image_processor import fetch_tile, preprocess_imagery, IMAGERY_VERSION
+from utils.land_cover import classify_land_cover, LAND_COVER_MODEL
+from utils.object_detection import detect_objects, DETECTION_MODEL
+from utils.stage_graph import StageError, StageGraph
+from utils.tiling import LandCoverMerger, ObjectMerger, corridor_mask, plan_tiles
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def _timed_stage(timings, stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = round(time.perf_counter() - started, 4)
+
+
+def _picklable_imagery(imagery_data):
+    # Tile cache hits hold a memoryview over an mmap, which cannot be pickled,
+    # and the decoded buffer is rebuilt from the encoded bytes on a cache hit
+    imagery_data = {key: value for key, value in imagery_data.items() if key != 'image'}
+    image = imagery_data.get('processed_data')
+    if isinstance(image, memoryview):
+        imagery_data['processed_data'] = image.tobytes()
+    return imagery_data
+
+
+def describe_terrain(imagery_data=None):
+    # Placeholder until a terrain analyser exists
+    return {
+        'type': 'Mostly flat with slight undulation',
+        'confidence': 0.85
+    }
+
+
+def describe_vegetation(imagery_data=None):
+    # Placeholder until a vegetation analyser exists
+    return {
+        'density': 'Moderate',
+        'types': ['Trees', 'Shrubs'],
+        'confidence': 0.78
+    }
+
+
+def describe_water_bodies(imagery_data=None):
+    # Placeholder until a water body analyser exists
+    return ['Small stream detected', 'Potential seasonal drainage']
+
+
+# Report sections derived from the imagery independently of each other and
+# of the land cover and object stages
+SECTION_STAGES = {
+    'terrain': describe_terrain,
+    'vegetation': describe_vegetation,
+    'water_bodies': describe_water_bodies,
+}
+
+
+def build_analysis_results(land_cover_results, objects_detected, sections=None):
+    """
+    Combines the stage outputs into the results dict consumed by the UI and reports.
+
+    Terrain, vegetation and water bodies come from `sections` (the outputs of
+    the SECTION_STAGES), falling back to calling the stage functions for any
+    that are missing. They, access roads and constraints are still
+    placeholder values until dedicated analysers exist for them.
+    """
+    sections = sections or {}
+    results = {
+        'land_cover': land_cover_results,
+        'objects': objects_detected,
+    }
+    for name, describe in SECTION_STAGES.items():
+        results[name] = sections[name] if name in sections else describe()
+    results['access_roads'] = ['Primary access from north', 'Secondary dirt track from east']
+    results['constraints'] = ['Stream crossing required', 'Dense vegetation in southern section']
+    return results
+
+
+def _project_mask(imagery_data, coordinates):
+    # Pixels of the imagery inside the project ring, or None when the image
+    # cannot be read or placed on the ground
+    image = image_array(imagery_data)
+    if image is None:
+        return None
+    transform = GeoTransform.for_imagery(imagery_data, image.shape)
+    if transform is None:
+        return None
+    return ring_mask(coordinates, transform, image.shape)
+
+
+def _analyse_tile(tile, plan, coordinates):
+    # Fetch and analyse one tile; only the small stage outputs leave this
+    # function, so the tile's image is released as soon as it returns
+    imagery_data = fetch_tile(tile)
+    if imagery_data.get('error'):
+        return tile, imagery_data, None, None, 0, 0
+    imagery_data = with_image(imagery_data)
+    try:
+        return _analyse_fetched_tile(tile, plan, imagery_data, coordinates)
+    finally:
+        close_image(imagery_data)
+
+
+def _analyse_fetched_tile(tile, plan, imagery_data, coordinates):
+    weight = tile['weight']
+    if plan['corridor'] is not None:
+        # Restrict both stages to the right-of-way
+        mask = corridor_mask(tile, plan)
+    elif plan['closed']:
+        # Restrict both stages to the ground inside the polygon
+        mask = _project_mask(imagery_data, coordinates)
+    else:
+        mask = None
+    if mask is not None:
+        # The merge weight is the masked area inside the cell this tile owns
+        imagery_data['mask'] = mask
+        x0, y0 = tile['pixel_box'][:2]
+        cx0, cy0, cx1, cy1 = (int(round(v - o)) for v, o in zip(tile['cell_box'], (x0, y0, x0, y0)))
+        weight = max(float(mask[cy0:cy1, cx0:cx1].sum()), 1.0)
+        pixels = int(mask.sum())
+    else:
+        pixels = int(round((tile['pixel_box'][2] - tile['pixel_box'][0])
+                           * (tile['pixel_box'][3] - tile['pixel_box'][1])))
+    return (tile, None, classify_land_cover(imagery_data), detect_objects(imagery_data),
+            weight, pixels)
+
+
+def run_tiled_stages(coordinates, workers=4, **plan_options):
+    """
+    Runs the imagery, land cover and object stages tile by tile.
+
+    The geometry is cut into web-mercator tiles (utils.tiling.plan_tiles) and
+    tiles are fetched and analysed on a thread pool with at most `workers`
+    tiles in flight. Outputs are folded into area-weighted land cover and
+    seam-deduplicated objects as each tile finishes, so no full-resolution
+    mosaic is ever held in memory; the merged class map is a coarse one. Polygons are analysed only inside their ring, and with a
+    `corridor_m` plan option, open lines only inside a right-of-way corridor
+    of that width (see plan_tiles). When every
+    tile fails, the stages run once on the failed imagery payload, as in the
+    single-image path.
+
+    Args:
+        coordinates (list): Project geometry as [lat, lng] pairs
+        workers (int): Concurrent tiles
+        **plan_options: Passed to plan_tiles
+
+    Returns:
+        tuple: (land cover results, detected objects, number of failed tiles)
+    """
+    plan = plan_tiles(coordinates, **plan_options)
+    tiles = iter(plan['tiles'])
+    land_cover = LandCoverMerger(plan['tiles'])
+    objects = ObjectMerger(plan['origin_px'])
+    failed, last_error, pixels_analysed = 0, None, 0
+    logger.info(f"Analysing {len(plan['tiles'])} tile(s) at zoom {plan['zoom']} "
+                f"({plan['discarded']} outside the geometry skipped)")
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tile') as pool:
+        pending = set()
+        while True:
+            for tile in tiles:
+                pending.add(pool.submit(_analyse_tile, tile, plan, coordinates))
+                if len(pending) >= workers:
+                    break
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                tile, error_payload, tile_land_cover, tile_objects, weight, pixels = future.result()
+                if error_payload is not None:
+                    failed += 1
+                    last_error = error_payload
+                    continue
+                pixels_analysed += pixels
+                land_cover.add(tile_land_cover, weight, tile)
+                objects.add(tile_objects, tile)
+
+    if land_cover.tiles == 0:
+        logger.warning(f"All {failed} tile(s) failed: {last_error['error']}")
+        return classify_land_cover(last_error), detect_objects(last_error), failed
+
+    merged_land_cover = land_cover.result(plan)
+    merged_land_cover['tiling'].update(
+        discarded=plan['discarded'],
+        failed=failed,
+        pixels_analysed=pixels_analysed,
+        corridor_m=plan['corridor']['width_m'] if plan['corridor'] else None
+    )
+    return merged_land_cover, objects.result(), failed
+
+
+def _cache_report_imagery(coordinates, cache, fingerprint):
+    # Reports are illustrated with one fit-view image, which a tiled analysis
+    # does not fetch; fetch it here, on the analysis worker, so rendering only
+    # reads local bytes back from the cache. The image is not decoded.
+    if cache.get(fingerprint, 'imagery', IMAGERY_VERSION) is not None:
+        return
+    imagery_data = preprocess_imagery(coordinates, decode=False)
+    if imagery_data.get('error'):
+        logger.info(f"Reports of this analysis will have no imagery: {imagery_data['error']}")
+        return
+    cache.put(fingerprint, 'imagery', IMAGERY_VERSION, _picklable_imagery(imagery_data))
+
+
+def _stage_timeout():
+    # Seconds each stage of a single-image analysis may take (0 disables the limit)
+    timeout = float(os.environ.get('ANALYSIS_STAGE_TIMEOUT', '120'))
+    return timeout if timeout > 0 else None
+
+
+def _tiling_signature(tiling):
+    # Tiled and single-image results are cached under different stage versions
+    options = {key: value for key, value in sorted(tiling.items()) if key != 'workers'}
+    return 'tiled:' + ','.join(f"{key}={value}" for key, value in options.items())
+
+
+def cached_imagery(coordinates, cache, closed=None):
+    """
+    The imagery payload a single-image analysis of the geometry left in the
+    cache (without its decoded buffer), or None. Tiled analyses leave the
+    same fit-view map here for reports, next to their tiled results.
+    `closed` must be what the analysis was run with.
+    """
+    if cache is None or not coordinates:
+        return None
+    return cache.get(geometry_fingerprint(coordinates, closed=closed), 'imagery', IMAGERY_VERSION)
+
+
+def run_analysis(coordinates, cache=None, tiling=None, closed=None):
+    """
+    Runs the full imagery analysis pipeline for a project geometry.
+
+    This is a plain module-level function so it can be executed on either a
+    thread or a process pool. With a cache, each stage is looked up by the
+    geometry fingerprint and stage version first; when both the land cover and
+    object stages hit, imagery is not fetched at all. Stage outputs are only
+    cached when the imagery fetch succeeded.
+
+    A single-image analysis runs as a StageGraph: once the imagery is loaded,
+    land cover, objects and the report sections run concurrently, each
+    limited to ANALYSIS_STAGE_TIMEOUT seconds. A failing stage cancels the
+    rest and raises StageError.
+
+    Args:
+        coordinates (list): Project geometry as [lat, lng] pairs
+        cache (AnalysisCache): Optional stage cache
+        tiling (dict): Options for run_tiled_stages; None analyses a single image
+        closed (bool): Whether the geometry is a ring (an area) rather than an
+            open line; keys the cache, so a road drawn through three points is
+            not confused with a rotation of the same points. Inferred from the
+            number of points when None
+
+    Returns:
+        dict: {'results': analysis results, 'timings': seconds spent per stage
+               and the wall-clock 'total', 'cache': 'hit'/'miss'/'skipped' per
+               stage, or None without a cache}
+    """
+    logger.debug(f"Running analysis pipeline for {len(coordinates)} points")
+    started = time.perf_counter()
+    timings = {}
+    sections = None
+    cache_status = None
+    land_cover_results = objects_detected = None
+    land_cover_version, detection_version = LAND_COVER_MODEL, DETECTION_MODEL
+    if tiling is not None:
+        land_cover_version += '|' + _tiling_signature(tiling)
+        detection_version += '|' + _tiling_signature(tiling)
+
+    if cache is not None:
+        fingerprint = geometry_fingerprint(coordinates, closed=closed)
+        cache_status = {}
+        with _timed_stage(timings, 'cache_lookup'):
+            land_cover_results = cache.get(fingerprint, 'land_cover', land_cover_version)
+            objects_detected = cache.get(fingerprint, 'objects', detection_version)
+        cache_status['land_cover'] = 'hit' if land_cover_results is not None else 'miss'
+        cache_status['objects'] = 'hit' if objects_detected is not None else 'miss'
+
+    if (land_cover_results is None or objects_detected is None) and tiling is not None:
+        # Tiles come from the imagery tile cache, so the imagery stage is not memoized here
+        with _timed_stage(timings, 'tiles'):
+            tiled_land_cover, tiled_objects, failed = run_tiled_stages(coordinates, **tiling)
+        if cache_status is not None:
+            cache_status['imagery'] = 'tiled'
+            with _timed_stage(timings, 'report_imagery'):
+                _cache_report_imagery(coordinates, cache, fingerprint)
+        if land_cover_results is None:
+            land_cover_results = tiled_land_cover
+            if cache is not None and not failed:
+                cache.put(fingerprint, 'land_cover', land_cover_version, land_cover_results)
+        if objects_detected is None:
+            objects_detected = tiled_objects
+            if cache is not None and not failed:
+                cache.put(fingerprint, 'objects', detection_version, objects_detected)
+    elif land_cover_results is None or objects_detected is None:
+        polygon = closed if closed is not None else len(coordinates) > 2
+
+        def load_imagery():
+            imagery_data = cache.get(fingerprint, 'imagery', IMAGERY_VERSION) if cache is not None else None
+            if cache is not None:
+                cache_status['imagery'] = 'hit' if imagery_data is not None else 'miss'
+            if imagery_data is None:
+                imagery_data = preprocess_imagery(coordinates)
+                if cache is not None and not imagery_data.get('error'):
+                    cache.put(fingerprint, 'imagery', IMAGERY_VERSION, _picklable_imagery(imagery_data))
+            # Every stage reads one decoded image buffer, released once the graph is done
+            imagery_data = with_image(imagery_data)
+            if polygon:
+                # Land cover and objects count only the ground inside the polygon
+                mask = _project_mask(imagery_data, coordinates)
+                if mask is not None:
+                    imagery_data = {**imagery_data, 'mask': mask}
+            return imagery_data
+
+        # Everything after the imagery is independent, so those stages run concurrently
+        stage_timeout = _stage_timeout()
+        graph = StageGraph().add('imagery', load_imagery, timeout=stage_timeout)
+        if land_cover_results is None:
+            graph.add('land_cover', classify_land_cover, requires=('imagery',), timeout=stage_timeout)
+        if objects_detected is None:
+            graph.add('objects', detect_objects, requires=('imagery',), timeout=stage_timeout)
+        for name, describe in SECTION_STAGES.items():
+            graph.add(name, describe, requires=('imagery',), timeout=stage_timeout)
+
+        run = None
+        try:
+            run = graph.run()
+        except StageError as e:
+            run = e.run
+            raise
+        finally:
+            if run is not None:
+                close_image(run['results'].get('imagery'))
+        timings.update(run['timings'])
+        sections = {name: run['results'][name] for name in SECTION_STAGES}
+
+        cacheable = cache is not None and not run['results']['imagery'].get('error')
+        if land_cover_results is None:
+            land_cover_results = run['results']['land_cover']
+            if cacheable:
+                cache.put(fingerprint, 'land_cover', land_cover_version, land_cover_results)
+        if objects_detected is None:
+            objects_detected = run['results']['objects']
+            if cacheable:
+                cache.put(fingerprint, 'objects', detection_version, objects_detected)
+    elif cache_status is not None:
+        cache_status['imagery'] = 'skipped'
+
+    timings['total'] = round(time.perf_counter() - started, 4)
+    return {
+        'results': build_analysis_results(land_cover_results, objects_detected, sections),
+        'timings': timings,
+        'cache': cache_status
+    }
@@ -0,0 +1,326 @@
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Mean radius of the Earth in km
+EARTH_RADIUS_KM = 6371.0
+
+LINEAR_PROJECT_TYPES = ('Pipeline', 'Transmission Line')
+
+
+def is_linear_project(project_type):
+    """Returns True for project types drawn as an alignment (roads, pipelines, lines)."""
+    project_type = project_type or ''
+    return 'Road' in project_type or project_type in LINEAR_PROJECT_TYPES
+
+
+def as_points(coordinates):
+    """
+    Converts [lat, lng] pairs into an (N, 2) float64 array without copying
+    when the input already is one.
+    """
+    points = np.asarray(coordinates, dtype=np.float64)
+    if points.size == 0:
+        return points.reshape(0, 2)
+    if points.ndim != 2 or points.shape[1] < 2:
+        raise ValueError(f"Expected an (N, 2) array of [lat, lng] pairs, got shape {points.shape}")
+    return points[:, :2]
+
+
+def _edge_area_terms(lat, lng, lat_next, lng_next):
+    # Spherical-excess terms of each edge: a ring encloses
+    # R^2 / 2 * |sum((lng' - lng) * (2 + sin(lat) + sin(lat')))| on the sphere,
+    # wherever it lies. Longitude steps are wrapped into [-pi, pi), so rings
+    # crossing the antimeridian measure correctly.
+    step = (lng_next - lng + np.pi) % (2 * np.pi) - np.pi
+    return step * (2 + np.sin(lat) + np.sin(lat_next))
+
+
+def _haversine(lat, lng, lat_next, lng_next):
+    # Great-circle distance in km between radian coordinate arrays
+    a = (np.sin((lat_next - lat) / 2) ** 2
+         + np.cos(lat) * np.cos(lat_next) * np.sin((lng_next - lng) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def polygon_area_sqkm(coordinates):
+    """
+    Geodesic area of a polygon ring on the sphere in square kilometres.
+
+    Args:
+        coordinates: (N, 2) array-like of [lat, lng] in degrees; the ring is
+            closed implicitly
+
+    Returns:
+        float: Area in sq km (0.0 for fewer than three vertices)
+    """
+    points = as_points(coordinates)
+    if len(points) < 3:
+        return 0.0
+    lat, lng = np.radians(points[:, 0]), np.radians(points[:, 1])
+    terms = _edge_area_terms(lat, lng, np.roll(lat, -1), np.roll(lng, -1))
+    return float(abs(terms.sum()) * EARTH_RADIUS_KM ** 2 / 2.0)
+
+
+def path_length_km(coordinates, closed=False):
+    """
+    Great-circle length of a polyline (or ring perimeter when closed) in km.
+    """
+    points = as_points(coordinates)
+    if len(points) < 2:
+        return 0.0
+    lat, lng = np.radians(points[:, 0]), np.radians(points[:, 1])
+    if closed:
+        return float(_haversine(lat, lng, np.roll(lat, -1), np.roll(lng, -1)).sum())
+    return float(_haversine(lat[:-1], lng[:-1], lat[1:], lng[1:]).sum())
+
+
+def bounds(coordinates):
+    """Returns the {'north', 'south', 'east', 'west'} extent of a geometry."""
+    points = as_points(coordinates)
+    if len(points) == 0:
+        return {'north': 0, 'south': 0, 'east': 0, 'west': 0}
+    mins = points.min(axis=0)
+    maxs = points.max(axis=0)
+    return {'north': float(maxs[0]), 'south': float(mins[0]),
+            'east': float(maxs[1]), 'west': float(mins[1])}
+
+
+def measure(coordinates, closed=None):
+    """
+    Computes every metric of a geometry in one pass over its vertex array.
+
+    Args:
+        coordinates: (N, 2) array-like of [lat, lng] in degrees
+        closed (bool): Treat as a polygon ring; inferred as N > 2 when None
+
+    Returns:
+        dict: area_sqkm, perimeter_km (ring), length_km (open path),
+              centroid [lat, lng], bounds and vertex_count
+    """
+    points = as_points(coordinates)
+    n = len(points)
+    if closed is None:
+        closed = n > 2
+    result = {
+        'area_sqkm': 0.0,
+        'perimeter_km': 0.0,
+        'length_km': 0.0,
+        'centroid': None,
+        'bounds': bounds(points),
+        'vertex_count': n
+    }
+    if n == 0:
+        return result
+
+    lat, lng = np.radians(points[:, 0]), np.radians(points[:, 1])
+    lat_next, lng_next = np.roll(lat, -1), np.roll(lng, -1)
+    segments = _haversine(lat, lng, lat_next, lng_next)
+    result['length_km'] = float(segments[:-1].sum())
+    result['centroid'] = points.mean(axis=0).tolist()
+
+    if closed and n >= 3:
+        result['perimeter_km'] = float(segments.sum())
+        terms = _edge_area_terms(lat, lng, lat_next, lng_next)
+        signed = terms.sum()
+        result['area_sqkm'] = float(abs(signed) * EARTH_RADIUS_KM ** 2 / 2.0)
+
+        # Area-weighted centroid of the ring in degree space
+        y, x = points[:, 0], points[:, 1]
+        y_next, x_next = np.roll(y, -1), np.roll(x, -1)
+        cross = x * y_next - x_next * y
+        planar_area = cross.sum() / 2.0
+        if abs(planar_area) > 1e-15:
+            cx = ((x + x_next) * cross).sum() / (6.0 * planar_area)
+            cy = ((y + y_next) * cross).sum() / (6.0 * planar_area)
+            result['centroid'] = [float(cy), float(cx)]
+    return result
+
+
+def pack_ragged(geometries):
+    """
+    Packs a sequence of geometries into one (M, 2) vertex array plus offsets.
+
+    Returns:
+        tuple: (points, offsets) where geometry i is points[offsets[i]:offsets[i+1]]
+    """
+    arrays = [as_points(g) for g in geometries]
+    counts = np.fromiter((len(a) for a in arrays), dtype=np.int64, count=len(arrays))
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    points = np.concatenate(arrays) if arrays else np.empty((0, 2))
+    return points, offsets
+
+
+def batch_measure(geometries=None, points=None, offsets=None, closed=True):
+    """
+    Measures many geometries at once for portfolio-level screening.
+
+    Accepts either a sequence of geometries or a pre-packed (points, offsets)
+    pair (see pack_ragged). Every metric is computed with whole-array
+    operations and segment reductions, with no per-geometry Python loop.
+
+    Args:
+        geometries: Sequence of (N_i, 2) [lat, lng] arrays
+        points (numpy.ndarray): Packed (M, 2) vertices
+        offsets (numpy.ndarray): (G + 1,) start offsets into points
+        closed (bool): Treat every geometry as a ring
+
+    Returns:
+        dict of numpy arrays, one entry per geometry: area_sqkm, perimeter_km,
+        length_km, centroid (G, 2), north, south, east, west, vertex_count
+    """
+    if points is None:
+        points, offsets = pack_ragged(geometries)
+    points = as_points(points)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    counts = np.diff(offsets)
+    if np.any(counts < 1):
+        raise ValueError("batch_measure requires every geometry to have at least one vertex")
+
+    starts = offsets[:-1]
+    owner = np.repeat(np.arange(len(counts)), counts)
+    # Index of each vertex's successor, wrapping to the first vertex of its ring
+    successor = np.arange(len(points)) + 1
+    successor[offsets[1:] - 1] = starts
+
+    lat, lng = np.radians(points[:, 0]), np.radians(points[:, 1])
+    lat_next, lng_next = lat[successor], lng[successor]
+    segments = _haversine(lat, lng, lat_next, lng_next)
+    closing = segments[offsets[1:] - 1]
+
+    perimeter = np.add.reduceat(segments, starts)
+    length = perimeter - closing
+    area = np.abs(np.add.reduceat(_edge_area_terms(lat, lng, lat_next, lng_next), starts)) * EARTH_RADIUS_KM ** 2 / 2.0
+    if closed:
+        degenerate = counts < 3
+        area[degenerate] = 0.0
+        perimeter[degenerate] = 0.0
+    else:
+        area[:] = 0.0
+        perimeter[:] = 0.0
+
+    centroid = np.column_stack([
+        np.bincount(owner, weights=points[:, 0], minlength=len(counts)),
+        np.bincount(owner, weights=points[:, 1], minlength=len(counts))
+    ]) / counts[:, None]
+    if closed:
+        # Area-weighted ring centroid where the ring has a non-zero area
+        y, x = points[:, 0], points[:, 1]
+        y_next, x_next = y[successor], x[successor]
+        cross = x * y_next - x_next * y
+        planar_area = np.add.reduceat(cross, starts) / 2.0
+        valid = (np.abs(planar_area) > 1e-15) & (counts >= 3)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cy = np.add.reduceat((y + y_next) * cross, starts) / (6.0 * planar_area)
+            cx = np.add.reduceat((x + x_next) * cross, starts) / (6.0 * planar_area)
+        centroid[valid, 0] = cy[valid]
+        centroid[valid, 1] = cx[valid]
+
+    return {
+        'area_sqkm': area,
+        'perimeter_km': perimeter,
+        'length_km': length,
+        'centroid': centroid,
+        'north': np.maximum.reduceat(points[:, 0], starts),
+        'south': np.minimum.reduceat(points[:, 0], starts),
+        'east': np.maximum.reduceat(points[:, 1], starts),
+        'west': np.minimum.reduceat(points[:, 1], starts),
+        'vertex_count': counts
+    }
+
+
+def project_to_metres(coordinates, origin=None):
+    """
+    Projects [lat, lng] degrees onto a local equirectangular plane in metres.
+
+    Args:
+        coordinates: (N, 2) array-like of [lat, lng]
+        origin: [lat, lng] of the projection origin; defaults to the vertex mean
+
+    Returns:
+        numpy.ndarray: (N, 2) array of [x (east), y (north)] in metres
+    """
+    points = as_points(coordinates)
+    if origin is None:
+        origin = points.mean(axis=0) if len(points) else np.zeros(2)
+    scale = EARTH_RADIUS_KM * 1000.0 * np.pi / 180.0
+    x = (points[:, 1] - origin[1]) * scale * np.cos(np.radians(origin[0]))
+    y = (points[:, 0] - origin[0]) * scale
+    return np.column_stack([x, y])
+
+
+def _segment_distances(xy, start, end):
+    # Distances (metres) from xy[start+1:end] to the segment xy[start]-xy[end]
+    a, b = xy[start], xy[end]
+    inner = xy[start + 1:end]
+    ab = b - a
+    length_sq = ab @ ab
+    if length_sq == 0.0:
+        return np.hypot(*(inner - a).T)
+    t = np.clip(((inner - a) @ ab) / length_sq, 0.0, 1.0)
+    return np.hypot(*(inner - (a + t[:, None] * ab)).T)
+
+
+def _douglas_peucker(xy, tolerance):
+    keep = np.zeros(len(xy), dtype=bool)
+    keep[[0, -1]] = True
+    max_deviation = 0.0
+    stack = [(0, len(xy) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        distances = _segment_distances(xy, start, end)
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance:
+            split = start + 1 + index
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+        else:
+            max_deviation = max(max_deviation, float(distances[index]))
+    return keep, max_deviation
+
+
+def simplify(coordinates, tolerance_m, closed=None):
+    """
+    Douglas-Peucker simplification with a tolerance in metres.
+
+    Each pass measures all candidate vertices of a segment with array
+    operations. Rings are split at the vertex farthest from the first one so
+    that both halves keep their extreme points.
+
+    Args:
+        coordinates: (N, 2) array-like of [lat, lng]
+        tolerance_m (float): Maximum allowed deviation in metres
+        closed (bool): Treat as a ring; inferred as N > 2 when None
+
+    Returns:
+        tuple: (simplified (K, 2) array, kept vertex indices, max deviation in metres)
+    """
+    points = as_points(coordinates)
+    n = len(points)
+    if closed is None:
+        closed = n > 2
+    if n < 3 or tolerance_m <= 0:
+        return points.copy(), np.arange(n), 0.0
+
+    xy = project_to_metres(points)
+    if closed:
+        far = int(np.argmax(np.hypot(*(xy - xy[0]).T)))
+        if far == 0:
+            return points[:1].copy(), np.array([0]), float(np.hypot(*(xy - xy[0]).T).max())
+        first, first_dev = _douglas_peucker(xy[:far + 1], tolerance_m)
+        ring_tail = np.concatenate([xy[far:], xy[:1]])
+        second, second_dev = _douglas_peucker(ring_tail, tolerance_m)
+        keep = np.zeros(n, dtype=bool)
+        keep[:far + 1] = first
+        keep[far:] |= second[:-1]
+        deviation = max(first_dev, second_dev)
+    else:
+        keep, deviation = _douglas_peucker(xy, tolerance_m)
+
+    indices = np.flatnonzero(keep)
+    return points[indices], indices, deviation
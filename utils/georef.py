@@ -0,0 +1,254 @@
+import logging
+import math
+
+import numpy as np
+
+from utils.geometry import as_points
+from utils.tiling import EQUATOR_RESOLUTION_M, MAX_ZOOM, lat_lng_to_pixels, pixels_to_lat_lng
+
+logger = logging.getLogger(__name__)
+
+# Margin kept between the project geometry and the image edge when fitting a view
+DEFAULT_PADDING_PX = 20
+
+
+def fit_view(coordinates, size, padding_px=DEFAULT_PADDING_PX, max_zoom=MAX_ZOOM):
+    """
+    Chooses the centre and zoom of a static map showing a whole geometry.
+
+    The centre is the middle of the geometry's web-mercator bounding box and
+    the zoom the highest at which the box fits the image with `padding_px`
+    to spare on every side, so the image extent is known exactly rather than
+    left to the imagery provider's auto-fit.
+
+    Args:
+        coordinates: (N, 2) array-like of [lat, lng]
+        size (tuple): (width, height) of the image in pixels
+        padding_px (int): Margin around the geometry
+        max_zoom (int): Upper bound on the zoom level
+
+    Returns:
+        tuple: ([lat, lng] centre, zoom)
+    """
+    points = as_points(coordinates)
+    if len(points) == 0:
+        raise ValueError("Cannot fit a view to an empty geometry")
+    world = lat_lng_to_pixels(points, 0)
+    low, high = world.min(axis=0), world.max(axis=0)
+    centre = pixels_to_lat_lng((low + high) / 2, 0)[0]
+    span = np.maximum(high - low, 1e-12)
+    room = np.maximum(np.asarray(size, dtype=np.float64) - 2 * padding_px, 1.0)
+    zoom = int(min(max_zoom, max(0, math.floor(math.log2(float((room / span).min()))))))
+    return [round(float(centre[0]), 7), round(float(centre[1]), 7)], zoom
+
+
+class GeoTransform:
+    """
+    Maps image pixels to geographic coordinates and back for web-mercator imagery.
+
+    Static map imagery is a web-mercator projection, so an image pixel is an
+    affine function of the global mercator pixel: global = origin + pixel *
+    scale, with global pixels taken at zoom 0. Every conversion goes through
+    that affine step and the vectorized projection in utils.tiling, so whole
+    arrays of points, boxes or polylines are converted in one call.
+
+    The transform is attached to imagery payloads as to_dict() under
+    'georef' and rebuilt with for_imagery().
+
+    Args:
+        origin: [x, y] zoom-0 global pixel of the image's top-left corner
+        scale: [x, y] zoom-0 global pixels per image pixel
+    """
+
+    def __init__(self, origin, scale):
+        self.origin = np.asarray(origin, dtype=np.float64).reshape(2)
+        self.scale = np.broadcast_to(np.asarray(scale, dtype=np.float64), (2,)).copy()
+        if (self.scale <= 0).any():
+            raise ValueError(f"Pixel scale must be positive, got {self.scale.tolist()}")
+
+    @classmethod
+    def from_view(cls, centre, zoom, size):
+        """Transform of a static map requested by centre, zoom and (width, height)."""
+        scale = 1.0 / 2 ** zoom
+        centre_px = lat_lng_to_pixels([centre], 0)[0]
+        return cls(centre_px - np.asarray(size, dtype=np.float64) / 2 * scale, scale)
+
+    @classmethod
+    def from_tile(cls, tile):
+        """Transform of a tile from utils.tiling.plan_tiles (its pixel_box is in zoom-level pixels)."""
+        scale = 1.0 / 2 ** tile['zoom']
+        return cls(np.asarray(tile['pixel_box'][:2], dtype=np.float64) * scale, scale)
+
+    @classmethod
+    def from_bounds(cls, bounds, size):
+        """Transform stretching an image of (width, height) pixels over a bounds dict."""
+        corners = lat_lng_to_pixels([[bounds['north'], bounds['west']], [bounds['south'], bounds['east']]], 0)
+        return cls(corners[0], (corners[1] - corners[0]) / np.asarray(size, dtype=np.float64))
+
+    @classmethod
+    def for_imagery(cls, imagery_data, shape=None):
+        """
+        Transform of an imagery payload.
+
+        Uses the payload's 'georef' when it has one and otherwise stretches
+        the image over its 'bounds'. With `shape` (the decoded image's
+        (height, width, ...)), a georef recorded for another size, e.g. a
+        high-DPI image, is rescaled to the decoded pixels.
+
+        Returns:
+            GeoTransform: The transform, or None when the payload has neither
+        """
+        georef = imagery_data.get('georef')
+        if georef:
+            transform = cls.from_dict(georef)
+            if shape is not None and georef.get('size'):
+                transform = transform.resized(georef['size'], (shape[1], shape[0]))
+            return transform
+        bounds = imagery_data.get('bounds')
+        if bounds and shape is not None:
+            return cls.from_bounds(bounds, (shape[1], shape[0]))
+        return None
+
+    def resized(self, size, new_size):
+        """The same extent sampled at new_size (width, height) pixels instead of size."""
+        return GeoTransform(self.origin, self.scale * np.asarray(size, dtype=np.float64) / np.asarray(new_size))
+
+    def to_dict(self, size=None):
+        """JSON-safe form; `size` records the (width, height) the transform was made for."""
+        georef = {'crs': 'web-mercator', 'origin': self.origin.tolist(), 'scale': self.scale.tolist()}
+        if size is not None:
+            georef['size'] = [int(size[0]), int(size[1])]
+        return georef
+
+    @classmethod
+    def from_dict(cls, georef):
+        return cls(georef['origin'], georef['scale'])
+
+    def pixels_to_lat_lng(self, pixels):
+        """(N, 2) image [x, y] pixels to (N, 2) [lat, lng] degrees."""
+        pixels = np.asarray(pixels, dtype=np.float64).reshape(-1, 2)
+        return pixels_to_lat_lng(self.origin + pixels * self.scale, 0)
+
+    def lat_lng_to_pixels(self, coordinates):
+        """(N, 2) [lat, lng] degrees to (N, 2) image [x, y] pixels."""
+        return (lat_lng_to_pixels(coordinates, 0) - self.origin) / self.scale
+
+    def boxes_to_lat_lng(self, boxes):
+        """
+        Converts (N, 4) [x1, y1, x2, y2] pixel boxes.
+
+        Returns:
+            tuple: (N, 2) [lat, lng] box centres and (N, 4) [south, west, north, east] extents
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        # Both corners and the centre of every box in a single projection
+        corners = self.pixels_to_lat_lng(np.concatenate([
+            boxes[:, :2], boxes[:, 2:], (boxes[:, :2] + boxes[:, 2:]) / 2]))
+        top_left, bottom_right, centres = np.split(corners, 3)
+        extents = np.column_stack([bottom_right[:, 0], top_left[:, 1], top_left[:, 0], bottom_right[:, 1]])
+        return centres, extents
+
+    def lat_lng_to_boxes(self, extents):
+        """Inverse of boxes_to_lat_lng: (N, 4) [south, west, north, east] to pixel boxes."""
+        extents = np.asarray(extents, dtype=np.float64).reshape(-1, 4)
+        corners = self.lat_lng_to_pixels(np.concatenate([extents[:, [2, 1]], extents[:, [0, 3]]]))
+        top_left, bottom_right = np.split(corners, 2)
+        return np.hstack([top_left, bottom_right])
+
+    def ground_resolution_m(self, latitude):
+        """Metres per image pixel (horizontally) at a latitude."""
+        return EQUATOR_RESOLUTION_M * math.cos(math.radians(latitude)) * float(self.scale[0])
+
+    def polylines_to_lat_lng(self, polylines):
+        """Converts a list of pixel polylines ([[x, y], ...] each) to [lat, lng] polylines at once."""
+        return self._convert_polylines(polylines, self.pixels_to_lat_lng)
+
+    def lat_lng_to_polylines(self, polylines):
+        """Inverse of polylines_to_lat_lng."""
+        return self._convert_polylines(polylines, self.lat_lng_to_pixels)
+
+    @staticmethod
+    def _convert_polylines(polylines, convert):
+        arrays = [np.asarray(line, dtype=np.float64).reshape(-1, 2) for line in polylines]
+        if not arrays:
+            return []
+        converted = convert(np.concatenate(arrays))
+        return np.split(converted, np.cumsum([len(line) for line in arrays])[:-1])
+
+    def __repr__(self):
+        return f'<GeoTransform origin={self.origin.tolist()} scale={self.scale.tolist()}>'
+
+
+def ring_mask(coordinates, transform, shape):
+    """
+    Rasterizes a [lat, lng] ring into a boolean mask of an image's pixels.
+
+    A pixel is inside when its centre is (even-odd rule). Every edge is
+    intersected with every pixel-row centre line at once; each crossing
+    flips the parity of the pixels to its right, so the mask is one
+    cumulative sum over the crossings rather than a test per pixel.
+
+    Args:
+        coordinates: (N, 2) array-like of [lat, lng]; the ring closes itself
+        transform (GeoTransform): Transform of the image
+        shape (tuple): (height, width, ...) of the image
+
+    Returns:
+        numpy.ndarray: (height, width) mask, True inside the ring
+    """
+    height, width = int(shape[0]), int(shape[1])
+    ring = transform.lat_lng_to_pixels(as_points(coordinates))
+    if len(ring) < 3:
+        return np.zeros((height, width), dtype=bool)
+    start, end = ring, np.roll(ring, -1, axis=0)
+    rows = np.arange(height) + 0.5
+    # Half-open in y, so a vertex on a row centre line is crossed once
+    crosses = (((start[:, 1, None] <= rows) & (rows < end[:, 1, None]))
+               | ((end[:, 1, None] <= rows) & (rows < start[:, 1, None])))
+    edge, row = np.nonzero(crosses)
+    dy = end[edge, 1] - start[edge, 1]
+    x = start[edge, 0] + (rows[row] - start[edge, 1]) * (end[edge, 0] - start[edge, 0]) / dy
+    # First pixel whose centre lies right of the crossing
+    column = np.clip(np.ceil(x - 0.5), 0, width).astype(np.int64)
+    flips = np.zeros((height, width + 1), dtype=np.int64)
+    np.add.at(flips, (row, column), 1)
+    return (np.cumsum(flips[:, :width], axis=1) % 2).astype(bool)
+
+
+def georeference_detections(detections, transform, decimals=7):
+    """
+    Adds geographic coordinates to object detections in place.
+
+    Items with a pixel 'bbox' get 'lat_lng' (the box centre) and 'geo_bbox'
+    ([south, west, north, east]); items with pixel 'points' get 'lat_lngs'.
+    All boxes and all polyline vertices are each converted in one call, so
+    the cost does not grow with per-object Python work beyond building the
+    output lists.
+
+    Args:
+        detections (dict): Category name -> list of detections
+        transform (GeoTransform): Transform of the analysed image
+        decimals (int): Decimal places kept in the coordinates
+
+    Returns:
+        dict: The same detections
+    """
+    boxed, lined = [], []
+    for items in detections.values():
+        if isinstance(items, list):
+            for item in items:
+                if 'bbox' in item:
+                    boxed.append(item)
+                elif 'points' in item:
+                    lined.append(item)
+
+    if boxed:
+        centres, extents = transform.boxes_to_lat_lng([item['bbox'] for item in boxed])
+        for item, centre, extent in zip(boxed, centres.round(decimals).tolist(), extents.round(decimals).tolist()):
+            item['lat_lng'] = centre
+            item['geo_bbox'] = extent
+    if lined:
+        lines = transform.polylines_to_lat_lng([item['points'] for item in lined])
+        for item, line in zip(lined, lines):
+            item['lat_lngs'] = line.round(decimals).tolist()
+    return detections
@@ -0,0 +1,270 @@
+import io
+import logging
+import os
+import tempfile
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# Decoded images at least this large are backed by a memory-mapped temp file
+DEFAULT_MEMMAP_BYTES = 64 * 1024 * 1024
+
+# Rows copied out of the decoder per step, bounding the transient copy
+_COPY_ROWS = 256
+
+
+def _memmap_threshold():
+    return int(os.environ.get('IMAGE_BUFFER_MEMMAP_BYTES', str(DEFAULT_MEMMAP_BYTES)))
+
+
+def _copy_rows(image, out):
+    # Copies a decoded RGB image into `out` band by band, so the only full
+    # copies alive at once are the decoder's and the buffer itself
+    width, height = image.size
+    for top in range(0, height, _COPY_ROWS):
+        band = image.crop((0, top, width, min(height, top + _COPY_ROWS)))
+        out[top:top + band.height] = np.frombuffer(band.tobytes(), dtype=np.uint8).reshape(band.height, width, 3)
+
+
+class _BufferReader(io.RawIOBase):
+    # Seekable read-only file over a bytes-like object. io.BytesIO copies
+    # anything but bytes up front; this reads straight from the buffer, so a
+    # tile cache mmap view is decoded without a copy of the encoded image.
+
+    def __init__(self, data):
+        super().__init__()
+        self._view = memoryview(data).cast('B')
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        chunk = self._view[self._position:self._position + len(buffer)]
+        memoryview(buffer).cast('B')[:len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._view)}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        # Let go of the buffer, so a tile cache mmap can be closed after decoding
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+
+def _attach_shared(name):
+    # Attach without tracking the segment: the owner unlinks it. Before Python
+    # 3.13 attaching always registers it, which is harmless for pool workers
+    # because they report to their parent's resource tracker.
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def _release(resources, owner):
+    segment = resources.pop('shared', None)
+    if segment is not None:
+        try:
+            segment.close()
+        except BufferError:
+            pass  # Views are still alive; the mapping goes away with them
+        if owner:
+            try:
+                segment.unlink()
+            except FileNotFoundError:
+                pass
+    path = resources.pop('path', None)
+    if path is not None and owner:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class ImageBuffer:
+    """
+    A decoded RGB image shared read-only by every analysis stage.
+
+    The image is decoded once into a (height, width, 3) uint8 array. Images of
+    at least `memmap_threshold` bytes are decoded into a memory-mapped temp
+    file, so the pages are reclaimable by the OS, smaller ones live in memory.
+    Stages read `array`, a read-only view, and never copy it.
+
+    Pickling (e.g. submitting to a process pool) sends a reference rather
+    than the pixels: the temp file path for memory-mapped buffers, otherwise
+    the name of a shared memory segment the pixels are moved into on first
+    use. The unpickled buffer maps the same memory. Only the decoding process
+    owns the backing storage and removes it on close(); closing is also done
+    when the buffer is garbage collected.
+
+    Args:
+        array (numpy.ndarray): The decoded image
+        path (str): Temp file backing a memory-mapped array
+        shared (SharedMemory): Segment backing the array
+        owner (bool): Whether close() removes the backing storage
+    """
+
+    def __init__(self, array, path=None, shared=None, owner=True):
+        array = array.view()
+        array.flags.writeable = False
+        self._array = array
+        self._resources = {'path': path, 'shared': shared}
+        self._owner = owner
+        self._finalizer = weakref.finalize(self, _release, self._resources, owner)
+
+    @classmethod
+    def decode(cls, data, memmap_threshold=None, directory=None):
+        """
+        Decodes encoded image bytes (PNG, JPEG, ...).
+
+        Args:
+            data: bytes or a bytes-like object such as a tile cache memoryview
+            memmap_threshold (int): Decoded size from which a memory-mapped temp
+                                    file is used; IMAGE_BUFFER_MEMMAP_BYTES when None
+            directory (str): Directory for the temp file; the system default when None
+
+        Returns:
+            ImageBuffer: The decoded image, or None when the data is not a readable image
+        """
+        if data is None or len(data) == 0:
+            return None
+        if memmap_threshold is None:
+            memmap_threshold = _memmap_threshold()
+        path = None
+        try:
+            # io.BytesIO shares a bytes object; any other buffer is read in place
+            source = io.BytesIO(data) if isinstance(data, bytes) else _BufferReader(data)
+            with source, Image.open(source) as image:
+                if image.mode != 'RGB':
+                    image = image.convert('RGB')
+                width, height = image.size
+                shape = (height, width, 3)
+                if width * height * 3 >= memmap_threshold:
+                    fd, path = tempfile.mkstemp(prefix='geosight-image-', suffix='.rgb', dir=directory)
+                    os.close(fd)
+                    out = np.memmap(path, dtype=np.uint8, mode='w+', shape=shape)
+                    _copy_rows(image, out)
+                    out.flush()
+                    del out
+                    array = np.memmap(path, dtype=np.uint8, mode='r', shape=shape)
+                else:
+                    array = np.empty(shape, dtype=np.uint8)
+                    _copy_rows(image, array)
+        except (UnidentifiedImageError, OSError) as e:
+            logger.warning(f"Could not decode imagery ({len(data)} bytes): {e}")
+            if path is not None:
+                os.remove(path)
+            return None
+        return cls(array, path=path)
+
+    @property
+    def array(self):
+        """Read-only (height, width, 3) uint8 view of the image."""
+        if self._array is None:
+            raise ValueError("Image buffer is closed")
+        return self._array
+
+    @property
+    def shape(self):
+        return self.array.shape
+
+    @property
+    def nbytes(self):
+        return self.array.nbytes
+
+    @property
+    def memory_mapped(self):
+        return self._resources.get('path') is not None
+
+    def share(self):
+        """
+        Returns a picklable reference to the pixels, moving in-memory pixels
+        into a shared memory segment the first time.
+        """
+        array = self.array
+        if self._resources.get('path') is not None:
+            return {'path': self._resources['path'], 'shape': array.shape}
+        if self._resources.get('shared') is None:
+            segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            shared = np.ndarray(array.shape, dtype=np.uint8, buffer=segment.buf)
+            shared[...] = array
+            shared.flags.writeable = False
+            # Keep a single copy: this buffer now reads from the segment too
+            self._resources['shared'] = segment
+            self._array = shared
+        return {'shared': self._resources['shared'].name, 'shape': array.shape}
+
+    @classmethod
+    def attach(cls, reference):
+        """Maps the pixels behind a share() reference without copying them."""
+        shape = tuple(reference['shape'])
+        if 'path' in reference:
+            return cls(np.memmap(reference['path'], dtype=np.uint8, mode='r', shape=shape), owner=False)
+        segment = _attach_shared(reference['shared'])
+        return cls(np.ndarray(shape, dtype=np.uint8, buffer=segment.buf), shared=segment, owner=False)
+
+    def __reduce__(self):
+        return ImageBuffer.attach, (self.share(),)
+
+    def close(self):
+        """Releases the buffer; the owner also removes the backing file or segment."""
+        self._array = None
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        if self._array is None:
+            return '<ImageBuffer closed>'
+        backing = 'memmap' if self.memory_mapped else 'shared' if self._resources.get('shared') else 'memory'
+        return f'<ImageBuffer {self._array.shape[1]}x{self._array.shape[0]} {backing}>'
+
+
+def image_array(imagery_data):
+    """
+    Returns the decoded image of an imagery payload as a read-only array.
+
+    Uses the payload's 'image' buffer when the preprocessor attached one, and
+    otherwise decodes 'processed_data' (e.g. imagery loaded from the analysis
+    cache). Returns None when there is no readable image.
+    """
+    image = imagery_data.get('image')
+    if image is None:
+        image = ImageBuffer.decode(imagery_data.get('processed_data'))
+        if image is None:
+            return None
+    return image.array
+
+
+def with_image(imagery_data):
+    """Returns the payload with a decoded 'image' buffer, decoding it if it has none."""
+    if imagery_data.get('image') is not None or not imagery_data.get('processed_data'):
+        return imagery_data
+    return {**imagery_data, 'image': ImageBuffer.decode(imagery_data['processed_data'])}
+
+
+def close_image(imagery_data):
+    """Closes the payload's decoded image buffer, if any."""
+    image = imagery_data.get('image') if imagery_data else None
+    if image is not None:
+        image.close()
@@ -1,42 +1,29 @@
 import logging
-import numpy as np
 from datetime import datetime
 import os
 import requests
 
+from utils.geometry import bounds as geometry_bounds, polygon_area_sqkm
+from utils.georef import GeoTransform, fit_view
+from utils.image_buffer import ImageBuffer
+from utils.imagery_client import CircuitOpenError, get_imagery_client
+from utils.static_map import STATIC_MAP_URL
+from utils.tile_cache import get_tile_cache, tile_key
+
 logger = logging.getLogger(__name__)
 
+# Identifies how imagery is requested; bump it whenever the request changes
+# (size, map type, styling) so cached imagery is fetched again.
+IMAGERY_VERSION = 'static-map-600x400-satellite-v4'
+
 def calculate_area(coordinates):
-    # This version is slightly more robust for area calculation.
-    if not coordinates or len(coordinates) < 3:
+    # Area in square kilometers, computed in one vectorized pass (see utils.geometry)
+    if coordinates is None or len(coordinates) < 3:
         return 0.0
-    
-    # Shoelace formula
-    area = 0.0
-    n = len(coordinates)
-    for i in range(n):
-        j = (i + 1) % n
-        # Using a simplified conversion for lat/lon to meters for area.
-        # This is a rough approximation. For accurate areas, use geospatial libraries.
-        # Average radius of Earth in km
-        R = 6371.0
-        
-        lat1_rad = np.radians(coordinates[i][0])
-        lon1_rad = np.radians(coordinates[i][1])
-        lat2_rad = np.radians(coordinates[j][0])
-        lon2_rad = np.radians(coordinates[j][1])
-        
-        # Approximation of x, y coordinates on a flat plane
-        x1 = R * lon1_rad * np.cos((lat1_rad + lat2_rad)/2) # More accurate for longitude scaling
-        y1 = R * lat1_rad
-        x2 = R * lon2_rad * np.cos((lat1_rad + lat2_rad)/2)
-        y2 = R * lat2_rad
-        
-        area += (x1 * y2 - x2 * y1)
-        
-    return abs(area / 2.0) # Area in square kilometers
-
-def preprocess_imagery(coordinates):
+    return polygon_area_sqkm(coordinates)
+
+def preprocess_imagery(coordinates, client=None, tile_cache=None, decode=True):
+    # decode=False leaves 'image' unset, for callers that decode the bytes elsewhere (see with_image)
     logger.debug(f"Processing imagery for coordinates: {coordinates}")
     
     default_error_payload = lambda err_msg, src_msg, url=None: {
@@ -45,12 +32,8 @@ def preprocess_imagery(coordinates):
         'resolution': 'N/A',
         'source': src_msg,
         'processed_data': None, # No actual image data
-        'bounds': { # Calculate bounds if possible, even on error
-            'north': max(p[0] for p in coordinates) if coordinates else 0,
-            'south': min(p[0] for p in coordinates) if coordinates else 0,
-            'east': max(p[1] for p in coordinates) if coordinates else 0,
-            'west': min(p[1] for p in coordinates) if coordinates else 0
-        },
+        'image': None,
+        'bounds': geometry_bounds(coordinates), # Calculate bounds if possible, even on error
         'area_sqkm': calculate_area(coordinates) if coordinates else 0,
         'imagery_url': url,
         'content_type': None
@@ -65,75 +48,146 @@ def preprocess_imagery(coordinates):
         logger.warning("No coordinates provided for image processing.")
         return default_error_payload('No coordinates provided', 'Static Map (No Coordinates)')
 
-    base_url = "https://maps.googleapis.com/maps/api/staticmap"
+    base_url = STATIC_MAP_URL
     map_size = "600x400"
     map_type = "satellite"
     
-    path_str_list = [f"{coord[0]},{coord[1]}" for coord in coordinates]
+    # Request an explicit view rather than the provider's auto-fit, so the
+    # image extent (and with it every detection's coordinates) is known exactly
+    size = tuple(int(side) for side in map_size.split('x'))
+    centre, zoom = fit_view(coordinates, size)
+    params = {
+        "center": f"{centre[0]:.7f},{centre[1]:.7f}",
+        "zoom": zoom,
+        "size": map_size,
+        "maptype": map_type,
+        "key": api_key
+    }
     
-    # Close polygon path if it's not already closed
-    is_polygon_like = len(coordinates) > 2
-    if is_polygon_like and (coordinates[0][0] != coordinates[-1][0] or coordinates[0][1] != coordinates[-1][1]):
-        path_str_list.append(f"{coordinates[0][0]},{coordinates[0][1]}")
+    # The analysed image has no overlay, so every pixel shows the ground
+    fetched = _fetch_static_map(base_url, params, client=client, tile_cache=tile_cache)
+    if fetched['error']:
+        return default_error_payload(fetched['error'], fetched['source'], fetched['url'])
 
-    path_str = "|".join(path_str_list)
-    
-    path_param_parts = ["weight:3"]
-    if is_polygon_like:
-        path_param_parts.extend(["fillcolor:0xAA000033", "color:0xFF0000FF"]) # Red fill, red border
-    else: # Line
-        path_param_parts.append("color:0x0000FFFF") # Blue line
-    
-    path_param_parts.append(path_str)
-    final_path_param = "|".join(path_param_parts)
+    return {
+        'error': None,
+        'imagery_date': datetime.now().strftime("%Y-%m-%d"),
+        'resolution': f'Static map ({map_size}), resolution varies',
+        'source': 'Google Maps Static API',
+        'processed_data': fetched['image'], # Image bytes, or a memoryview over the tile cache mmap
+        'image': ImageBuffer.decode(fetched['image']) if decode else None, # Decoded once; every stage reads this buffer
+        'bounds': geometry_bounds(coordinates),
+        'georef': GeoTransform.from_view(centre, zoom, size).to_dict(size), # Pixel <-> lat/lng mapping
+        'area_sqkm': calculate_area(coordinates),
+        'imagery_url': fetched['url'], # URL of the fetched (overlay-free) image
+        'tile_cache': fetched['tile_cache'],
+        'content_type': fetched['content_type'] # e.g., 'image/png'
+    }
+
+def fetch_tile(tile, client=None, tile_cache=None, map_type="satellite"):
+    """
+    Fetches the imagery for one tile of a tiling plan (see utils.tiling).
+
+    Tiles are requested by centre and zoom without an overlay so that every
+    pixel shows the ground, and go through the same pooled client and tile
+    cache as preprocess_imagery.
+
+    Args:
+        tile (dict): A tile from plan_tiles
+        client (ImageryClient): HTTP client; the process-wide client when None
+        tile_cache (TileCache): Imagery cache; the process-wide cache when None
+        map_type (str): Static Maps map type
+
+    Returns:
+        dict: Imagery data in the preprocess_imagery format, bounded by the tile
+    """
+    width, height = (int(round(tile['pixel_box'][2] - tile['pixel_box'][0])),
+                     int(round(tile['pixel_box'][3] - tile['pixel_box'][1])))
+    payload = {
+        'error': None,
+        'imagery_date': datetime.now().strftime("%Y-%m-%d"),
+        'resolution': f'Static map tile ({width}x{height}) at zoom {tile["zoom"]}',
+        'source': 'Google Maps Static API',
+        'processed_data': None,
+        'image': None,
+        'bounds': tile['bounds'],
+        'georef': GeoTransform.from_tile(tile).to_dict((width, height)),
+        'imagery_url': None,
+        'tile_cache': None,
+        'content_type': None,
+        'tile': {key: tile[key] for key in ('index', 'row', 'column', 'zoom', 'pixel_box')}
+    }
+
+    api_key = os.environ.get('GOOGLE_MAPS_API_KEY')
+    if not api_key:
+        payload.update(error='Missing GOOGLE_MAPS_API_KEY', source='Static Map (API Key Missing)')
+        return payload
 
     params = {
-        "size": map_size,
+        "center": f"{tile['center'][0]:.7f},{tile['center'][1]:.7f}",
+        "zoom": tile['zoom'],
+        "size": f"{width}x{height}",
         "maptype": map_type,
-        "path": final_path_param,
         "key": api_key
     }
-    
+    fetched = _fetch_static_map(STATIC_MAP_URL, params, client=client, tile_cache=tile_cache)
+    payload['imagery_url'] = fetched['url']
+    if fetched['error']:
+        payload.update(error=fetched['error'], source=fetched['source'])
+    else:
+        payload.update(processed_data=fetched['image'], image=ImageBuffer.decode(fetched['image']),
+                       content_type=fetched['content_type'], tile_cache=fetched['tile_cache'])
+    return payload
+
+def _fetch_static_map(base_url, params, client=None, tile_cache=None):
+    # Fetches one Static Maps image through the tile cache and the pooled client.
+    # Returns {'error', 'source', 'url', 'image', 'content_type', 'tile_cache'}.
+    # Prepare once: the same request is measured, logged and sent
     prepared_request = requests.Request('GET', base_url, params=params).prepare()
     imagery_url = prepared_request.url
+    failed = lambda err_msg, src_msg: {'error': err_msg, 'source': src_msg, 'url': imagery_url,
+                                       'image': None, 'content_type': None, 'tile_cache': None}
+    fetched = lambda image_data, content_type, cache_status: {
+        'error': None, 'source': 'Google Maps Static API', 'url': imagery_url,
+        'image': image_data, 'content_type': content_type, 'tile_cache': cache_status}
+
+    # Identical requests (same bounds, size, map type and overlay) are served from disk
+    if tile_cache is None:  # An empty TileCache is falsy (len 0)
+        tile_cache = get_tile_cache()
+    cache_key = tile_key(base_url, params)
+    if tile_cache is not None:
+        tile = tile_cache.get(cache_key)
+        if tile is not None:
+            logger.info(f"Static map served from tile cache ({len(tile)} bytes)")
+            return fetched(tile.data, tile.content_type, 'hit')
 
-    if len(imagery_url) > 2048: # Google Static Maps API URL length limit
-        logger.error(f"Constructed URL for Static Map API is too long ({len(imagery_url)} chars).")
-        return default_error_payload('Generated map URL is too long. Project area may be too complex.', 
-                                     'Static Map (URL Length Error)', imagery_url)
-    
     logger.info(f"Fetching static map. URL length: {len(imagery_url)}")
 
+    client = client or get_imagery_client()
     try:
-        response = requests.get(base_url, params=params, timeout=20) # Increased timeout
-        response.raise_for_status() # Raises HTTPError for bad responses (4XX or 5XX)
-
-        bounds_calc = {
-            'north': max(point[0] for point in coordinates),
-            'south': min(point[0] for point in coordinates),
-            'east': max(point[1] for point in coordinates),
-            'west': min(point[1] for point in coordinates)
-        }
-        
-        return {
-            'error': None,
-            'imagery_date': datetime.now().strftime("%Y-%m-%d"),
-            'resolution': f'Static map ({map_size}), resolution varies',
-            'source': 'Google Maps Static API',
-            'processed_data': response.content, # Image bytes
-            'bounds': bounds_calc,
-            'area_sqkm': calculate_area(coordinates),
-            'imagery_url': imagery_url, # URL of the fetched image
-            'content_type': response.headers.get('Content-Type', 'image/png') # e.g., 'image/png'
-        }
+        # Pooled session with retries on 429/5xx; raises HTTPError once retries are exhausted
+        response = client.send(prepared_request)
+        content_type = response.headers.get('Content-Type', 'image/png')
+
+        if tile_cache is None:
+            return fetched(response.content, content_type, None)
+        if content_type.startswith('image/'):
+            try:
+                tile_cache.put(cache_key, response.content, content_type)
+            except OSError as e:
+                logger.warning(f"Could not write imagery to tile cache: {e}")
+        return fetched(response.content, content_type, 'miss')
 
+    except CircuitOpenError:
+        logger.error("Static map upstream unavailable, circuit breaker open")
+        return failed('Imagery service temporarily unavailable.', 'Static Map (Circuit Open)')
     except requests.exceptions.Timeout:
         logger.error(f"Timeout fetching static map: {imagery_url}")
-        return default_error_payload('Timeout fetching map imagery.', 'Static Map (Timeout)', imagery_url)
+        return failed('Timeout fetching map imagery.', 'Static Map (Timeout)')
     except requests.exceptions.HTTPError as e:
         err_msg = f'HTTP error {e.response.status_code} fetching map.'
         logger.error(f"{err_msg} Response: {e.response.text[:200] if e.response else 'N/A'}. URL: {imagery_url}")
-        return default_error_payload(err_msg, 'Static Map (HTTP Error)', imagery_url)
+        return failed(err_msg, 'Static Map (HTTP Error)')
     except requests.exceptions.RequestException as e:
         logger.error(f"Generic error fetching static map: {e}. URL: {imagery_url}")
-        return default_error_payload(f'Failed to fetch map: {str(e)}', 'Static Map (Request Error)', imagery_url)
+        return failed(f'Failed to fetch map: {str(e)}', 'Static Map (Request Error)')
@@ -0,0 +1,238 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Upstream responses worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without contacting the upstream while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Fails fast after repeated upstream failures.
+
+    The breaker opens after `failure_threshold` consecutive failed requests.
+    While open every call is rejected; after `reset_timeout` seconds a single
+    trial request is let through (half-open) and its outcome closes or reopens
+    the circuit.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial_in_flight:
+                    logger.warning(f"Imagery circuit breaker opened after {self._failures} failure(s)")
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class LatencyStats:
+    """Rolling request latency and outcome counters."""
+
+    def __init__(self, window=500):
+        self._latencies = deque(maxlen=window)
+        self._counters = {'requests': 0, 'failures': 0, 'retries': 0, 'rejected': 0}
+        self._lock = threading.Lock()
+
+    def record(self, seconds, ok):
+        with self._lock:
+            self._latencies.append(seconds)
+            self._counters['requests'] += 1
+            if not ok:
+                self._counters['failures'] += 1
+
+    def count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def summary(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            summary = dict(self._counters)
+        if latencies:
+            summary.update({
+                'latency_p50_ms': round(latencies[len(latencies) // 2] * 1000, 1),
+                'latency_p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 1),
+                'latency_max_ms': round(latencies[-1] * 1000, 1),
+            })
+        return summary
+
+
+class ImageryClient:
+    """
+    Shared HTTP client for imagery fetches.
+
+    Keeps a pooled keep-alive requests.Session, bounds the number of concurrent
+    upstream requests, retries 429/5xx responses and connection errors with
+    exponential backoff and full jitter, and trips a circuit breaker while the
+    upstream is unhealthy. Latency of every attempt is recorded.
+
+    Args:
+        pool_size (int): Connections kept alive per host
+        max_concurrency (int): Concurrent in-flight requests
+        max_retries (int): Retries after the first attempt
+        backoff_base (float): Initial backoff ceiling in seconds
+        backoff_max (float): Maximum backoff in seconds
+        timeout (float): Per-attempt timeout in seconds
+        failure_threshold (int): Failed requests before the circuit opens
+        reset_timeout (float): Seconds the circuit stays open before a trial
+    """
+
+    def __init__(self, pool_size=10, max_concurrency=4, max_retries=3, backoff_base=0.5,
+                 backoff_max=8.0, timeout=20.0, failure_threshold=5, reset_timeout=30.0):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.stats = LatencyStats()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def _backoff(self, attempt, response=None):
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), self.backoff_max))
+        return delay
+
+    def send(self, prepared_request):
+        """
+        Sends a prepared GET request and returns the successful response.
+
+        Raises:
+            CircuitOpenError: If the circuit breaker is open
+            requests.exceptions.HTTPError: For non-retryable or exhausted 4xx/5xx responses
+            requests.exceptions.RequestException: For exhausted connection errors/timeouts
+        """
+        if not self.breaker.allow():
+            self.stats.count('rejected')
+            raise CircuitOpenError("Imagery upstream is unavailable (circuit open)")
+
+        # Every admitted call records exactly one outcome, so a half-open trial
+        # is always released; anything unexpected (e.g. an error while reading
+        # the response) counts as a failed request
+        recorded = False
+        try:
+            attempt = 0
+            while True:
+                response = error = None
+                started = time.perf_counter()
+                with self._slots:
+                    try:
+                        response = self.session.send(prepared_request, timeout=self.timeout)
+                    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                        error = e
+                retryable = error is not None or response.status_code in RETRYABLE_STATUS_CODES
+                self.stats.record(time.perf_counter() - started, ok=not retryable)
+
+                if not retryable:
+                    # The upstream answered; client errors do not count against its health
+                    recorded = True
+                    self.breaker.record_success()
+                    response.raise_for_status()
+                    return response
+                if attempt >= self.max_retries:
+                    recorded = True
+                    self.breaker.record_failure()
+                    if error is not None:
+                        raise error
+                    response.raise_for_status()
+
+                delay = self._backoff(attempt, response)
+                logger.warning(f"Imagery request failed ({error or response.status_code}); "
+                               f"retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+                self.stats.count('retries')
+                if response is not None:
+                    response.close()
+                time.sleep(delay)
+                attempt += 1
+        finally:
+            if not recorded:
+                self.breaker.record_failure()
+
+    def get(self, url, params=None):
+        """Prepares and sends a GET request (see send)."""
+        return self.send(requests.Request('GET', url, params=params).prepare())
+
+    def metrics(self):
+        summary = self.stats.summary()
+        summary['circuit'] = self.breaker.state
+        return summary
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_imagery_client():
+    """
+    Returns the process-wide imagery client, creating it on first use from the
+    IMAGERY_* environment variables.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ImageryClient(
+                pool_size=int(os.environ.get('IMAGERY_POOL_SIZE', '10')),
+                max_concurrency=int(os.environ.get('IMAGERY_MAX_CONCURRENCY', '4')),
+                max_retries=int(os.environ.get('IMAGERY_MAX_RETRIES', '3')),
+                timeout=float(os.environ.get('IMAGERY_TIMEOUT', '20')),
+                failure_threshold=int(os.environ.get('IMAGERY_BREAKER_THRESHOLD', '5')),
+                reset_timeout=float(os.environ.get('IMAGERY_BREAKER_RESET', '30'))
+            )
+        return _client
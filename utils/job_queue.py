@@ -0,0 +1,199 @@
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs whose durations feed the stats() summaries
+DURATION_WINDOW = 256
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+def _timed_call(fn, args, kwargs):
+    # Runs inside the worker (thread or process), so the start time reflects
+    # when the job actually left the queue rather than when it was submitted.
+    started = time.time()
+    result = fn(*args, **kwargs)
+    return result, started, time.time()
+
+
+def _summarize(seconds):
+    if not seconds:
+        return {'count': 0, 'mean': None, 'max': None}
+    return {'count': len(seconds), 'mean': round(sum(seconds) / len(seconds), 4), 'max': round(max(seconds), 4)}
+
+
+class JobQueue:
+    """
+    Bounded worker pool that runs jobs in the background and keeps their status.
+
+    Jobs are tracked in memory by an opaque id so that a request handler can hand
+    the id back to the client and return immediately. Each worker process of the
+    web server owns its own queue.
+
+    Args:
+        max_workers (int): Number of workers in the pool
+        max_pending (int): Maximum number of queued or running jobs before
+            submissions are rejected with QueueFullError
+        executor (str): 'thread' or 'process'
+        result_ttl (float): Seconds a finished job is kept before being pruned
+        result_handler (callable): Optional function applied to each job's
+            return value in the submitting process; its return value is what
+            the job record keeps
+    """
+
+    def __init__(self, max_workers=2, max_pending=16, executor='thread', result_ttl=3600,
+                 result_handler=None):
+        if executor not in ('thread', 'process'):
+            raise ValueError(f"Unknown executor type: {executor}")
+        self.max_workers = max(1, int(max_workers))
+        self.max_pending = max(1, int(max_pending))
+        self.executor_type = executor
+        self.result_ttl = result_ttl
+        self.result_handler = result_handler
+        self._executor = None
+        self._jobs = {}
+        self._durations = deque(maxlen=DURATION_WINDOW)  # (queued, run) seconds of completed jobs
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Created lazily so that forking servers (gunicorn) do not inherit
+        # a pool that was started in the master process.
+        if self._executor is None:
+            if self.executor_type == 'process':
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='job-worker')
+        return self._executor
+
+    def _pending_count(self):
+        return sum(1 for job in self._jobs.values() if job['status'] in ('queued', 'running'))
+
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job['finished_at'] is not None and job['finished_at'] < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queues fn(*args, **kwargs) and returns the new job id.
+
+        Raises:
+            QueueFullError: If max_pending jobs are already queued or running
+        """
+        with self._lock:
+            self._prune()
+            if self._pending_count() >= self.max_pending:
+                raise QueueFullError(f"Job queue is full ({self.max_pending} pending jobs)")
+
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                'id': job_id,
+                'status': 'queued',
+                'submitted_at': time.time(),
+                'started_at': None,
+                'finished_at': None,
+                'result': None,
+                'error': None,
+            }
+            future = self._get_executor().submit(_timed_call, fn, args, kwargs)
+            self._jobs[job_id]['future'] = future
+
+        future.add_done_callback(lambda f: self._on_done(job_id, f))
+        logger.debug(f"Queued job {job_id} ({fn.__name__})")
+        return job_id
+
+    def _on_done(self, job_id, future):
+        error = None
+        if not future.cancelled():
+            error = future.exception()
+            if error is None:
+                result, started, finished = future.result()
+                if self.result_handler is not None:
+                    try:
+                        result = self.result_handler(result)
+                    except Exception as e:
+                        error = e
+
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.pop('future', None)
+            job['finished_at'] = time.time()
+            if future.cancelled():
+                job['status'] = 'cancelled'
+                return
+            if error is not None:
+                logger.error(f"Job {job_id} failed: {error}")
+                job['status'] = 'failed'
+                job['error'] = str(error)
+                return
+            job['status'] = 'completed'
+            job['result'] = result
+            job['started_at'] = started
+            job['finished_at'] = finished
+            self._durations.append((started - job['submitted_at'], finished - started))
+
+    def get(self, job_id):
+        """
+        Returns a snapshot of the job record, or None if the id is unknown.
+
+        The snapshot includes 'queued_seconds' and 'run_seconds' once known.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            snapshot = {k: v for k, v in job.items() if k != 'future'}
+            future = job.get('future')
+
+        if snapshot['status'] == 'queued' and future is not None and future.running():
+            snapshot['status'] = 'running'
+        if snapshot['started_at'] is not None:
+            snapshot['queued_seconds'] = snapshot['started_at'] - snapshot['submitted_at']
+            snapshot['run_seconds'] = snapshot['finished_at'] - snapshot['started_at']
+        return snapshot
+
+    def stats(self):
+        """
+        Returns counts of jobs by status along with the pool configuration.
+
+        Also reports the queue depth (jobs waiting for a worker), the running
+        jobs, pool saturation (running / max_workers) and summaries of the
+        queued and run seconds of the last DURATION_WINDOW completed jobs.
+        """
+        with self._lock:
+            counts = {}
+            running = 0
+            for job in self._jobs.values():
+                counts[job['status']] = counts.get(job['status'], 0) + 1
+                future = job.get('future')
+                if job['status'] == 'queued' and future is not None and future.running():
+                    running += 1
+            durations = list(self._durations)
+        return {
+            'executor': self.executor_type,
+            'max_workers': self.max_workers,
+            'max_pending': self.max_pending,
+            'jobs': counts,
+            'queue_depth': counts.get('queued', 0) - running,
+            'running': running,
+            'saturation': round(running / self.max_workers, 4),
+            'queued_seconds': _summarize([queued for queued, _ in durations]),
+            'run_seconds': _summarize([run for _, run in durations]),
+        }
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
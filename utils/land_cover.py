@@ -1,15 +1,160 @@
 import logging
+import math
 import numpy as np
 from datetime import datetime
 
+from utils.image_buffer import image_array
+from utils.raster import LAND_COVER_CLASSES, ClassMap
+
 logger = logging.getLogger(__name__)
 
+# Identifies the classifier that produced a result; bump it whenever
+# classification behaviour changes so cached results are recomputed.
+LAND_COVER_MODEL = 'Spectral Index Classifier v1'
+
+# Sub-classes reported under each land cover class
+SUBCLASSES = {
+    'vegetation': ('trees', 'shrubs', 'grass'),
+    'water': ('streams', 'ponds'),
+    'built_up': ('buildings', 'roads'),
+    'barren_land': ('soil', 'rocks'),
+}
+
+# Every pixel gets a detail (sub-class) code; the class code follows from it.
+# Sub-classes of one class have consecutive codes, which classify_pixels
+# relies on when it offsets a code by comparison results.
+TREES, SHRUBS, GRASS, STREAMS, PONDS, BUILDINGS, ROADS, SOIL, ROCKS = (np.uint8(code) for code in range(9))
+_DETAIL_NAMES = [(name, sub) for name in LAND_COVER_CLASSES for sub in SUBCLASSES[name]]
+_DETAIL_CLASS = np.array([LAND_COVER_CLASSES.index(name) for name, _ in _DETAIL_NAMES], dtype=np.uint8)
+
+# Thresholds on 8-bit channels. Brightness is the channel sum (0-765),
+# excess green is 2G - R - B and saturation is the max - min channel spread.
+VEGETATION_MIN_EXG = 20
+AMBIGUOUS_EXG_MARGIN = 8
+WATER_MAX_BRIGHTNESS = 390
+WATER_MIN_BLUE_EXCESS = 10  # blue over red
+BUILT_MAX_SATURATION = 30
+BUILT_MIN_BRIGHTNESS = 240
+ROOF_MIN_BRIGHTNESS = 630
+TREES_MAX_BRIGHTNESS = 200
+SHRUBS_MAX_BRIGHTNESS = 300
+ROADS_MAX_BRIGHTNESS = 420
+SOIL_MIN_RED_EXCESS = 15  # red over blue
+POND_SHORE_DISTANCE = 2  # water pixels with water this many pixels away on every side are ponds
+
+# Rows classified per step; keeps the int16 temporaries in cache
+CHUNK_ROWS = 64
+# Longest side of the class map stored with the results
+MAP_DATA_MAX_SIDE = 1024
+
+
+def classify_pixels(rgb, chunk_rows=CHUNK_ROWS):
+    """
+    Assigns a sub-class code (TREES ... ROCKS) to every pixel of an RGB image.
+
+    Rules are evaluated on spectral indices computed in int16 over blocks of
+    rows, lowest priority first: barren land, then built-up, vegetation and
+    water each overwrite the codes where they apply. Water is split into
+    ponds and streams afterwards by how far it extends from its shore.
+
+    Args:
+        rgb (numpy.ndarray): (height, width, 3) uint8 image
+        chunk_rows (int): Rows per block
+
+    Returns:
+        tuple: (detail codes as a (height, width) uint8 array,
+                boolean array of pixels close to the vegetation threshold)
+    """
+    height, width = rgb.shape[:2]
+    detail = np.empty((height, width), dtype=np.uint8)
+    ambiguous = np.empty((height, width), dtype=bool)
+    for start in range(0, height, chunk_rows):
+        # Contiguous per-channel planes; the interleaved layout makes every operation strided
+        block = rgb[start:start + chunk_rows]
+        r, g, b = (block[..., channel].astype(np.int16) for channel in range(3))
+        brightness = r + g + b
+        exg = 2 * g - r - b
+        saturation = np.maximum(np.maximum(r, g), b) - np.minimum(np.minimum(r, g), b)
+
+        # Codes are combined arithmetically (uint8, wrapping) rather than with np.where,
+        # which is several times slower on noisy masks
+        codes = ROCKS - _bits(r - b > SOIL_MIN_RED_EXCESS)
+        built = (((saturation < BUILT_MAX_SATURATION) & (brightness >= BUILT_MIN_BRIGHTNESS))
+                 | (brightness >= ROOF_MIN_BRIGHTNESS))
+        codes = _select(built, BUILDINGS + _bits(brightness < ROADS_MAX_BRIGHTNESS), codes)
+        vegetation = (exg > VEGETATION_MIN_EXG) & (g >= r) & (g >= b)
+        codes = _select(vegetation, GRASS - _bits(brightness < SHRUBS_MAX_BRIGHTNESS)
+                        - _bits(brightness < TREES_MAX_BRIGHTNESS), codes)
+        water = (b >= g) & (b - r > WATER_MIN_BLUE_EXCESS) & (brightness < WATER_MAX_BRIGHTNESS)
+        detail[start:start + chunk_rows] = _select(water, STREAMS, codes)
+        ambiguous[start:start + chunk_rows] = np.abs(exg - VEGETATION_MIN_EXG) < AMBIGUOUS_EXG_MARGIN
+
+    detail[...] = _select(_erode(detail == STREAMS, POND_SHORE_DISTANCE), PONDS, detail)
+    return detail, ambiguous
+
+
+def _bits(condition):
+    return condition.view(np.uint8)
+
+
+def _select(condition, value, codes):
+    # Branch-free np.where(condition, value, codes) for uint8 codes
+    return codes + _bits(condition) * (value - codes)
+
+
+def _erode(mask, distance):
+    # Keeps pixels whose neighbours up to `distance` pixels away along both axes
+    # are all set; beyond the image edge the mask counts as set
+    eroded = mask.copy()
+    for step in range(1, distance + 1):
+        eroded[step:] &= mask[:-step]
+        eroded[:-step] &= mask[step:]
+        eroded[:, step:] &= mask[:, :-step]
+        eroded[:, :-step] &= mask[:, step:]
+    return eroded
+
+
+def _resample_mask(mask, shape):
+    # Nearest-neighbour resize, for imagery delivered at a different scale than the mask
+    rows = np.arange(shape[0]) * mask.shape[0] // shape[0]
+    columns = np.arange(shape[1]) * mask.shape[1] // shape[1]
+    return mask[rows[:, None], columns]
+
+
+def _percent(count, total):
+    return round(float(count) / total * 100.0, 2) if total else 0.0
+
+
+def _results(detail_counts, confidence, status=None):
+    total = int(detail_counts.sum())
+    class_counts = np.bincount(_DETAIL_CLASS, weights=detail_counts, minlength=len(LAND_COVER_CLASSES))
+    classifications = {name: {'percentage': _percent(class_counts[code], total), 'details': {}}
+                       for code, name in enumerate(LAND_COVER_CLASSES)}
+    for (name, sub), count in zip(_DETAIL_NAMES, detail_counts):
+        classifications[name]['details'][sub] = _percent(count, total)
+    results = {
+        'classifications': classifications,
+        'confidence_score': confidence,
+        'analysis_date': datetime.now().strftime("%Y-%m-%d"),
+        'pixels_classified': total
+    }
+    if status:
+        results['status'] = status
+    return results
+
+
 def classify_land_cover(imagery_data):
     """
     Classifies land cover types in the provided imagery.
     
-    In a real implementation, this would use a trained model for semantic segmentation
-    to classify different land cover types like vegetation, water, built-up areas, etc.
+    Reads the decoded image buffer shared by the pipeline stages (see
+    utils.image_buffer) and classifies every pixel from spectral indices
+    (see classify_pixels).
+    Class and sub-class percentages are pixel shares counted with np.bincount.
+    
+    When the imagery carries a boolean 'mask' (the project polygon, or the
+    corridor of a linear project), only pixels inside the mask are counted. Without decodable
+    imagery every class is reported at 0% with a 'status' explaining why.
     
     Args:
         imagery_data (dict): Preprocessed imagery data
@@ -18,53 +163,30 @@ def classify_land_cover(imagery_data):
         dict: Land cover classification results
     """
     logger.debug("Classifying land cover")
-    
-    # In a real implementation, this would:
-    # 1. Use a pre-trained semantic segmentation model (e.g., U-Net, DeepLab)
-    # 2. Process the satellite imagery to identify different land types
-    # 3. Calculate percentages and create a classification map
-    
-    # Simplified mock results for this implementation
-    return {
-        'classifications': {
-            'vegetation': {
-                'percentage': 45.3,
-                'details': {
-                    'trees': 28.7,
-                    'shrubs': 11.2,
-                    'grass': 5.4
-                }
-            },
-            'water': {
-                'percentage': 8.2,
-                'details': {
-                    'streams': 5.1,
-                    'ponds': 3.1
-                }
-            },
-            'built_up': {
-                'percentage': 12.7,
-                'details': {
-                    'buildings': 7.3,
-                    'roads': 5.4
-                }
-            },
-            'barren_land': {
-                'percentage': 33.8,
-                'details': {
-                    'soil': 29.6,
-                    'rocks': 4.2
-                }
-            }
-        },
-        'confidence_score': 0.82,
-        'analysis_date': datetime.now().strftime("%Y-%m-%d"),
-        'map_data': {
-            'width': 100,
-            'height': 100,
-            'classes': [0, 1, 2, 3, 0, 1, 2, 0, 1, 3]  # Would be a full classification map
-        }
-    }
+    empty = np.zeros(len(_DETAIL_NAMES), dtype=np.int64)
+    rgb = image_array(imagery_data)
+    if rgb is None:
+        return _results(empty, 0.0, status='No imagery available; land cover was not classified.')
+
+    detail, ambiguous = classify_pixels(rgb)
+    mask = imagery_data.get('mask')
+    if mask is not None and mask.shape != detail.shape:
+        mask = _resample_mask(mask, detail.shape)
+    if mask is not None:
+        detail_counts = np.bincount(detail[mask], minlength=len(_DETAIL_NAMES))
+        ambiguous_count = np.count_nonzero(ambiguous[mask])
+    else:
+        detail_counts = np.bincount(detail.ravel(), minlength=len(_DETAIL_NAMES))
+        ambiguous_count = np.count_nonzero(ambiguous)
+
+    total = int(detail_counts.sum())
+    if total == 0:
+        return _results(empty, 0.0, status='No imagery pixels inside the analysis mask.')
+    # Confidence is the share of pixels not sitting on the vegetation decision boundary
+    results = _results(detail_counts, round(1.0 - ambiguous_count / total, 3))
+    step = max(1, math.ceil(max(detail.shape) / MAP_DATA_MAX_SIDE))
+    results['map_data'] = ClassMap(_DETAIL_CLASS[detail[::step, ::step]]).to_json()
+    return results
 
 def get_dominant_land_cover(land_cover_data):
     """
@@ -1,86 +1,369 @@
 import logging
+import os
+import numpy as np
 from datetime import datetime
 
+from utils.georef import GeoTransform, georeference_detections
+from utils.image_buffer import image_array
+from utils.land_cover import BUILDINGS, PONDS, ROADS, STREAMS, TREES, _resample_mask, classify_pixels
+
 logger = logging.getLogger(__name__)
 
-def detect_objects(imagery_data):
+# Identifies the detector that produced a result; bump it whenever detection
+# behaviour changes so cached detections are recomputed.
+DETECTION_MODEL = 'Sliding Window Spectral Detector v1'
+
+# Result categories, always present in the output
+CATEGORIES = ('buildings', 'roads', 'infrastructure', 'obstacles')
+
+# (category, type) of each detector class, in score column order
+DETECTION_CLASSES = (
+    ('buildings', 'Building'),
+    ('roads', 'Paved Road'),
+    ('infrastructure', 'Bridge'),
+    ('obstacles', 'Large Tree'),
+    ('obstacles', 'Water Crossing'),
+)
+
+DEFAULT_WINDOW = 48
+DEFAULT_STRIDE = 24
+DEFAULT_BATCH_SIZE = 256
+SCORE_THRESHOLD = 0.35
+# Roads are thin: a window a third covered by road is full evidence of one
+ROAD_SHARE_FOR_FULL_SCORE = 1 / 3
+IOU_THRESHOLD = 0.3
+
+
+class SpectralWindowScorer:
+    """
+    Default scoring backend: class evidence from the share of each spectral
+    sub-class (utils.land_cover.classify_pixels) inside a window.
+
+    A scoring backend only needs a `classes` sequence of (category, type)
+    pairs and a score(windows) method mapping a (batch, height, width, 3)
+    uint8 array to a (batch, len(classes)) array of scores in [0, 1], so a
+    learned model can replace this one without touching the detector.
+    """
+
+    classes = DETECTION_CLASSES
+
+    def score(self, windows):
+        return self.score_with_detail(windows)[0]
+
+    def score_with_detail(self, windows):
+        # Also returns the (batch, height, width) sub-class codes of the windows,
+        # so the detector can trace roads without classifying the image again
+        batch, height, width, _ = windows.shape
+        # Classify the whole batch as one tall image, then count codes per window
+        detail, _ = classify_pixels(windows.reshape(batch * height, width, 3))
+        window_of_pixel = np.repeat(np.arange(batch) * 16, height * width)
+        shares = np.bincount(window_of_pixel + detail.ravel(), minlength=batch * 16).reshape(batch, 16)
+        shares = shares / float(height * width)
+        built, road, trees = shares[:, BUILDINGS], shares[:, ROADS], shares[:, TREES]
+        water = shares[:, STREAMS] + shares[:, PONDS]
+        scores = np.stack([
+            built,
+            road / ROAD_SHARE_FOR_FULL_SCORE,
+            2.0 * np.minimum(built + road, water),  # a deck across water
+            trees,
+            4.0 * water * (1.0 - water),  # strongest where a window straddles the bank
+        ], axis=1).clip(0.0, 1.0)
+        return scores, detail.reshape(batch, height, width)
+
+
+def _detector_settings(window, stride, batch_size):
+    # Explicit arguments win over the DETECTION_* environment variables
+    return (
+        int(window or os.environ.get('DETECTION_WINDOW', DEFAULT_WINDOW)),
+        int(stride or os.environ.get('DETECTION_STRIDE', DEFAULT_STRIDE)),
+        int(batch_size or os.environ.get('DETECTION_BATCH_SIZE', DEFAULT_BATCH_SIZE)),
+    )
+
+
+def _positions(length, window, stride):
+    # Window offsets along one axis; the last window is aligned to the edge
+    positions = np.arange(0, length - window + 1, stride)
+    if positions[-1] != length - window:
+        positions = np.append(positions, length - window)
+    return positions
+
+
+def sliding_windows(height, width, window=DEFAULT_WINDOW, stride=DEFAULT_STRIDE):
+    """
+    Returns the (N, 4) int array of [x1, y1, x2, y2] windows covering an image,
+    row by row. Windows are clipped to the image size.
+    """
+    window_y, window_x = min(window, height), min(window, width)
+    ys, xs = _positions(height, window_y, stride), _positions(width, window_x, stride)
+    y1, x1 = np.repeat(ys, len(xs)), np.tile(xs, len(ys))
+    return np.stack([x1, y1, x1 + window_x, y1 + window_y], axis=1)
+
+
+def box_iou(boxes_a, boxes_b):
+    """Element-wise intersection over union of two (N, 4) box arrays."""
+    ix = np.clip(np.minimum(boxes_a[:, 2], boxes_b[:, 2]) - np.maximum(boxes_a[:, 0], boxes_b[:, 0]), 0, None)
+    iy = np.clip(np.minimum(boxes_a[:, 3], boxes_b[:, 3]) - np.maximum(boxes_a[:, 1], boxes_b[:, 1]), 0, None)
+    intersection = ix * iy
+    union = ((boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+             + (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1]) - intersection)
+    return np.divide(intersection, union, out=np.zeros(len(intersection)), where=union > 0)
+
+
+def _overlapping_pairs(boxes, classes):
+    # Candidate pairs (i, j) of same-class boxes that may overlap. Grid cells
+    # are as large as a typical box (the 90th percentile extent) and every
+    # box is entered in each cell it covers, so overlapping boxes always
+    # share a cell; one large box costs a few extra entries instead of
+    # making every cell large. Pairs sharing several cells are kept once.
+    extents = (boxes[:, 2:] - boxes[:, :2]).max(axis=1)
+    size = max(float(np.percentile(extents, 90)), 1.0)
+    origin = boxes[:, :2].min(axis=0)
+    low = np.floor((boxes[:, :2] - origin) / size).astype(np.int64)
+    high = np.floor((boxes[:, 2:] - origin) / size).astype(np.int64)
+    spans = high - low + 1
+    counts = spans[:, 0] * spans[:, 1]
+    box = np.repeat(np.arange(len(boxes)), counts)
+    offsets = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+    columns = int(high[:, 0].max()) + 1
+    rows = int(high[:, 1].max()) + 1
+    cell_x = low[box, 0] + offsets % spans[box, 0]
+    cell_y = low[box, 1] + offsets // spans[box, 0]
+    keys = (classes.astype(np.int64)[box] * rows + cell_y) * columns + cell_x
+
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    position = np.arange(len(keys))
+    # Every entry pairs with the later entries of its cell
+    end = np.searchsorted(sorted_keys, sorted_keys, 'right')
+    later = end - position - 1
+    total = int(later.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    first = np.repeat(position, later)
+    second = first + 1 + np.arange(total) - np.repeat(np.cumsum(later) - later, later)
+    first, second = box[order[first]], box[order[second]]
+    pairs = np.unique(np.minimum(first, second) * len(boxes) + np.maximum(first, second))
+    return pairs // len(boxes), pairs % len(boxes)
+
+
+def _suppressing_pairs(boxes, first, second, iou_threshold):
+    # The candidate pairs whose IoU exceeds the threshold. Works on contiguous
+    # coordinate columns and drops pairs apart horizontally before computing
+    # the rest, since most grid neighbours do not actually overlap.
+    x1, y1, x2, y2 = (np.ascontiguousarray(boxes[:, column]) for column in range(4))
+    ix = np.minimum(x2[first], x2[second]) - np.maximum(x1[first], x1[second])
+    touching = np.flatnonzero(ix > 0)
+    first, second, ix = first[touching], second[touching], ix[touching]
+    iy = np.clip(np.minimum(y2[first], y2[second]) - np.maximum(y1[first], y1[second]), 0, None)
+    area = (x2 - x1) * (y2 - y1)
+    intersection = ix * iy
+    union = area[first] + area[second] - intersection
+    iou = np.divide(intersection, union, out=np.zeros(len(intersection)), where=union > 0)
+    overlapping = iou > iou_threshold
+    return first[overlapping], second[overlapping]
+
+
+def non_max_suppression(boxes, scores, classes=None, iou_threshold=IOU_THRESHOLD, max_detections=None):
+    """
+    Class-aware greedy non-maximum suppression, vectorized.
+
+    Gives the same result as the classic loop (keep the best box, drop every
+    box of its class overlapping it by more than `iou_threshold`, repeat) but
+    without a Python loop over boxes: overlapping same-class pairs are found
+    through a grid, every pair's IoU is computed at once, and the greedy
+    decisions are resolved by iterating keep = "no kept better box
+    suppresses me" to its fixed point, which takes as many passes as the
+    longest suppression chain.
+
+    Args:
+        boxes (array-like): (N, 4) [x1, y1, x2, y2] boxes
+        scores (array-like): (N,) scores
+        classes (array-like): (N,) class ids; boxes of different classes never suppress each other
+        iou_threshold (float): Overlap above which the lower-scored box is dropped
+        max_detections (int): Upper bound on kept boxes
+
+    Returns:
+        numpy.ndarray: Indices of the kept boxes, best score first
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float64)
+    classes = np.zeros(len(boxes), dtype=np.int64) if classes is None else np.asarray(classes)
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    ranking = np.argsort(-scores, kind='stable')
+    rank = np.empty(len(boxes), dtype=np.int64)
+    rank[ranking] = np.arange(len(boxes))
+
+    first, second = _overlapping_pairs(boxes, classes)
+    first, second = _suppressing_pairs(boxes, first, second, iou_threshold)
+    first_wins = rank[first] < rank[second]
+    winner = np.where(first_wins, first, second)
+    loser = np.where(first_wins, second, first)
+
+    keep = np.ones(len(boxes), dtype=bool)
+    while True:
+        suppressed = np.zeros(len(boxes), dtype=bool)
+        suppressed[loser[keep[winner]]] = True
+        if np.array_equal(~suppressed, keep):
+            break
+        keep = ~suppressed
+
+    kept = ranking[keep[ranking]]
+    return kept[:max_detections] if max_detections is not None else kept
+
+
+def _mask_coverage(mask, boxes):
+    # Mask pixels inside each box, from a summed-area table
+    table = np.zeros((mask.shape[0] + 1, mask.shape[1] + 1), dtype=np.int64)
+    table[1:, 1:] = mask.cumsum(axis=0).cumsum(axis=1)
+    x1, y1, x2, y2 = boxes.T
+    return table[y2, x2] - table[y1, x2] - table[y2, x1] + table[y1, x1]
+
+
+def _centre_line(road_pixels, x1, y1):
+    # End points of the principal axis of a box's road pixels
+    ys, xs = np.nonzero(road_pixels)
+    if len(xs) < 2:
+        height, width = road_pixels.shape
+        return [[x1, y1 + height / 2], [x1 + width, y1 + height / 2]], 0.0
+    points = np.stack([xs, ys], axis=1).astype(np.float64) + 0.5
+    centre = points.mean(axis=0)
+    _, vectors = np.linalg.eigh(np.cov((points - centre).T))
+    direction = vectors[:, -1]
+    along = (points - centre) @ direction
+    length = float(along.max() - along.min()) or 1.0
+    ends = centre + np.outer([along.min(), along.max()], direction)
+    return [[round(x1 + x, 1), round(y1 + y, 1)] for x, y in ends.tolist()], len(xs) / length
+
+
+def _width_estimate(transform, width_px, image_height):
+    # Road width in metres at the image's mid latitude, else in pixels
+    if transform is None:
+        return f"{width_px:.0f} px"
+    latitude = transform.pixels_to_lat_lng([[0, image_height / 2]])[0, 0]
+    return f"{width_px * transform.ground_resolution_m(latitude):.0f}m"
+
+
+def _empty_detections(status=None):
+    detections = {category: [] for category in CATEGORIES}
+    detections.update({
+        'analysis_date': datetime.now().strftime("%Y-%m-%d"),
+        'detection_model': DETECTION_MODEL
+    })
+    if status:
+        detections['status'] = status
+    return detections
+
+
+def detect_objects(imagery_data, scorer=None, window=None, stride=None, batch_size=None,
+                   score_threshold=SCORE_THRESHOLD, iou_threshold=IOU_THRESHOLD):
     """
     Detects and identifies objects in satellite imagery.
     
-    In a real implementation, this would use deep learning models (like YOLO, 
-    Faster R-CNN) to detect objects like buildings, roads, bridges, etc.
+    The decoded image is scanned in overlapping square windows. Windows are
+    scored in batches by a pluggable backend (SpectralWindowScorer by
+    default), every (window, class) scoring at least `score_threshold` is a
+    candidate, and candidates are merged with class-aware non-maximum
+    suppression. Roads are reported as centre lines, everything else as
+    boxes, in image pixel coordinates; both also get geographic coordinates
+    from the imagery's georeference (see utils.georef).
+    
+    When the imagery carries a boolean 'mask' (the project polygon, or the
+    corridor of a linear project), only windows touching the mask are scored and detections that
+    do not touch the mask are dropped. A mask of another size than the image is resampled to it.
     
     Args:
         imagery_data (dict): Preprocessed imagery data
+        scorer: Scoring backend; SpectralWindowScorer when None
+        window (int): Window size in pixels (DETECTION_WINDOW, default 48)
+        stride (int): Window step in pixels (DETECTION_STRIDE, default 24)
+        batch_size (int): Windows scored per backend call (DETECTION_BATCH_SIZE, default 256)
+        score_threshold (float): Minimum candidate score
+        iou_threshold (float): Overlap above which the weaker candidate is suppressed
     
     Returns:
         dict: Object detection results with locations and confidence scores
     """
     logger.debug("Detecting objects in imagery")
-    
-    # In a real implementation, this would:
-    # 1. Apply an object detection model to the imagery
-    # 2. Identify and classify objects with bounding boxes
-    # 3. Return structured data about the detected objects
-    
-    # Mock detection results for this simplified implementation
-    return {
-        'buildings': [
-            {
-                'type': 'Residential',
-                'confidence': 0.92,
-                'bbox': [23, 45, 56, 78],  # x1, y1, x2, y2 in image coordinates
-                'lat_lng': [imagery_data['bounds']['north'] - 0.01, imagery_data['bounds']['west'] + 0.02]
-            },
-            {
-                'type': 'Commercial',
-                'confidence': 0.87,
-                'bbox': [120, 150, 200, 210],
-                'lat_lng': [imagery_data['bounds']['north'] - 0.02, imagery_data['bounds']['west'] + 0.03]
-            }
-        ],
-        'roads': [
-            {
-                'type': 'Paved Road',
-                'confidence': 0.95,
-                'points': [[10, 20], [30, 40], [50, 60]],  # Line segments in image coordinates
-                'width_estimate': '6m'
-            },
-            {
-                'type': 'Dirt Track',
-                'confidence': 0.82,
-                'points': [[100, 110], [130, 140]],
-                'width_estimate': '3m'
-            }
-        ],
-        'infrastructure': [
-            {
-                'type': 'Power Line',
-                'confidence': 0.76,
-                'points': [[200, 210], [220, 230], [240, 250]]
-            },
-            {
-                'type': 'Bridge',
-                'confidence': 0.89,
-                'bbox': [300, 310, 340, 350]
-            }
-        ],
-        'obstacles': [
-            {
-                'type': 'Large Tree',
-                'confidence': 0.91,
-                'bbox': [400, 410, 420, 430]
-            },
-            {
-                'type': 'Water Crossing',
-                'confidence': 0.88,
-                'bbox': [500, 510, 550, 560]
-            }
-        ],
-        'analysis_date': datetime.now().strftime("%Y-%m-%d"),
-        'detection_model': 'Simplified Mock Model'
+    rgb = image_array(imagery_data)
+    if rgb is None:
+        return _empty_detections('No imagery available; objects were not detected.')
+    scorer = scorer or SpectralWindowScorer()
+    window, stride, batch_size = _detector_settings(window, stride, batch_size)
+    height, width = rgb.shape[:2]
+
+    boxes = sliding_windows(height, width, window, stride)
+    mask = imagery_data.get('mask')
+    if mask is not None and mask.shape != (height, width):
+        mask = _resample_mask(mask, (height, width))
+    if mask is not None:
+        boxes = boxes[_mask_coverage(mask, boxes) > 0]
+    window_y, window_x = min(window, height), min(window, width)
+    # Zero-copy view of every window position; batches gather only the windows they score
+    views = np.lib.stride_tricks.sliding_window_view(rgb, (window_y, window_x), axis=(0, 1))
+    scores = np.empty((len(boxes), len(scorer.classes)), dtype=np.float32)
+    # Road pixels of every scored window, from the codes the spectral scorer computes
+    # anyway; every kept box is a scored window, so its pixels are all filled in
+    with_detail = getattr(scorer, 'score_with_detail', None)
+    road_pixels = np.zeros((height, width), dtype=bool) if with_detail else None
+    for start in range(0, len(boxes), batch_size):
+        batch = boxes[start:start + batch_size]
+        windows = np.ascontiguousarray(views[batch[:, 1], batch[:, 0]].transpose(0, 2, 3, 1))
+        if with_detail is None:
+            scores[start:start + batch_size] = scorer.score(windows)
+            continue
+        scores[start:start + batch_size], detail = with_detail(windows)
+        rows = batch[:, 1, None] + np.arange(window_y)
+        columns = batch[:, 0, None] + np.arange(window_x)
+        road_pixels[rows[:, :, None], columns[:, None, :]] = detail == ROADS
+
+    window_index, class_index = np.nonzero(scores >= score_threshold)
+    candidates = boxes[window_index]
+    kept = non_max_suppression(candidates, scores[window_index, class_index], class_index, iou_threshold)
+
+    detections = _empty_detections()
+    transform = GeoTransform.for_imagery(imagery_data, rgb.shape)
+    for index in kept.tolist():
+        category, object_type = scorer.classes[class_index[index]]
+        x1, y1, x2, y2 = (int(v) for v in candidates[index])
+        item = {'type': object_type, 'confidence': round(float(scores[window_index[index], class_index[index]]), 3)}
+        if category == 'roads':
+            if road_pixels is None:  # A backend that does not expose its pixel codes
+                road_pixels = classify_pixels(rgb)[0] == ROADS
+            item['points'], width_px = _centre_line(road_pixels[y1:y2, x1:x2], x1, y1)
+            item['width_estimate'] = _width_estimate(transform, width_px, height)
+        else:
+            item['bbox'] = [x1, y1, x2, y2]
+        detections[category].append(item)
+    detections['detector'] = {
+        'windows': int(len(boxes)),
+        'window_px': window,
+        'stride_px': stride,
+        'candidates': int(len(candidates))
     }
 
+    if mask is not None:
+        for category, objects in detections.items():
+            if isinstance(objects, list):
+                detections[category] = [obj for obj in objects if _touches_mask(obj, mask)]
+    if transform is not None:
+        georeference_detections(detections, transform)
+    return detections
+
+def _touches_mask(detection, mask):
+    # True when any pixel of the detection's box (or any point of its line) lies inside the mask
+    height, width = mask.shape
+    if 'bbox' in detection:
+        x1, y1, x2, y2 = (int(v) for v in detection['bbox'])
+        x1, x2 = max(x1, 0), min(x2 + 1, width)
+        y1, y2 = max(y1, 0), min(y2 + 1, height)
+        return x1 < x2 and y1 < y2 and bool(mask[y1:y2, x1:x2].any())
+    points = np.asarray(detection.get('points', []), dtype=np.int64).reshape(-1, 2)
+    inside = (points[:, 0] >= 0) & (points[:, 0] < width) & (points[:, 1] >= 0) & (points[:, 1] < height)
+    points = points[inside]
+    return bool(mask[points[:, 1], points[:, 0]].any()) if len(points) else False
+
 def count_objects_by_type(detection_results):
     """
     Counts the number of detected objects by category
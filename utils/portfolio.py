@@ -0,0 +1,598 @@
+import csv
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from utils.analysis_pipeline import SECTION_STAGES, _picklable_imagery, _project_mask, build_analysis_results
+from utils.geometry import is_linear_project
+from utils.image_buffer import close_image, with_image
+from utils.image_processor import preprocess_imagery
+from utils.land_cover import classify_land_cover
+from utils.object_detection import detect_objects
+from utils.report_files import write_chunks
+from utils.report_generator import default_template
+from utils.report_storage import encode_results, summarize_results
+
+logger = logging.getLogger(__name__)
+
+# Characters read from the input per step
+READ_CHUNK_SIZE = 64 * 1024
+
+# Features whose imagery is fetched at once; the imagery client further caps
+# concurrent upstream requests (IMAGERY_MAX_CONCURRENCY)
+DEFAULT_FETCH_WORKERS = 8
+
+# Finished features inserted (and checkpointed) per database transaction
+DEFAULT_BATCH_SIZE = 50
+
+# Seconds between progress lines
+DEFAULT_PROGRESS_INTERVAL = 10
+
+# Input extensions read as one GeoJSON Feature per line rather than as a FeatureCollection
+LINE_DELIMITED_EXTENSIONS = ('.geojsonl', '.geojsons', '.jsonl', '.ndjson')
+
+# Feature properties (or CSV columns) holding the project name and type, in order of preference
+NAME_FIELDS = ('name', 'Name', 'NAME', 'project_name', 'id')
+TYPE_FIELDS = ('project_type', 'type', 'Type', 'TYPE')
+
+# Largest CSV field, in characters (a detailed geometry easily exceeds csv's 128 KiB default)
+MAX_CSV_FIELD = 64 * 1024 * 1024
+
+_WKT_PATTERN = re.compile(r'^\s*(POLYGON|LINESTRING)\s*(?:Z|M|ZM)?\s*\(+([^()]*)\)', re.IGNORECASE)
+
+
+def _ring_area(ring):
+    # Shoelace area in squared degrees; only used to pick the largest part
+    return abs(sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]))) / 2
+
+
+def _lat_lngs(positions):
+    # GeoJSON and WKT positions are [lng, lat(, z)]; projects are stored as [lat, lng]
+    coordinates = []
+    for position in positions:
+        lng, lat = float(position[0]), float(position[1])
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValueError(f"Position out of range: [{lng}, {lat}] (GeoJSON order is [lng, lat])")
+        coordinates.append([lat, lng])
+    return coordinates
+
+
+def geometry_coordinates(geometry):
+    """
+    Converts a GeoJSON geometry into a project's [lat, lng] coordinates.
+
+    Polygons keep their outer ring without the closing position, lines
+    their vertices. Multi-part geometries keep their largest part (by
+    area, or by vertex count for lines), since a project has one geometry.
+
+    Raises:
+        ValueError: For missing, empty or point geometries and invalid positions
+    """
+    if not isinstance(geometry, dict):
+        raise ValueError("Feature has no geometry")
+    geometry_type = geometry.get('type')
+    positions = geometry.get('coordinates') or []
+    if geometry_type == 'MultiPolygon' and positions:
+        positions, geometry_type = max(positions, key=lambda part: _ring_area(part[0]) if part else 0), 'Polygon'
+    elif geometry_type == 'MultiLineString' and positions:
+        positions, geometry_type = max(positions, key=len), 'LineString'
+
+    if geometry_type == 'Polygon':
+        ring = _lat_lngs(positions[0]) if positions else []
+        if len(ring) > 1 and ring[0] == ring[-1]:
+            ring.pop()
+        if len(ring) < 3:
+            raise ValueError("Polygon has fewer than 3 distinct positions")
+        return ring
+    if geometry_type == 'LineString':
+        line = _lat_lngs(positions)
+        if len(line) < 2:
+            raise ValueError("LineString has fewer than 2 positions")
+        return line
+    raise ValueError(f"Unsupported geometry type: {geometry_type} (expected a Polygon or LineString)")
+
+
+def parse_wkt(text):
+    """Converts a WKT POLYGON or LINESTRING (outer ring only) into a GeoJSON geometry."""
+    match = _WKT_PATTERN.match(text)
+    if not match:
+        raise ValueError(f"Unsupported WKT geometry: {text[:40]!r}")
+    positions = [point.split() for point in match.group(2).split(',') if point.strip()]
+    if match.group(1).upper() == 'POLYGON':
+        return {'type': 'Polygon', 'coordinates': [positions]}
+    return {'type': 'LineString', 'coordinates': positions}
+
+
+def _first(fields, names):
+    for name in names:
+        value = fields.get(name)
+        if value not in (None, ''):
+            return str(value)
+    return None
+
+
+class _JSONStream:
+    # Incremental reader of JSON values from a text file: values are decoded
+    # from a buffer that is refilled (and grown, so a very large value costs
+    # amortized linear time) until a complete value has been read
+
+    def __init__(self, f, chunk_size=None):
+        self._f = f
+        self._chunk_size = chunk_size or READ_CHUNK_SIZE
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self, grow=False):
+        if self._eof:
+            return False
+        size = max(self._chunk_size, len(self._buffer) - self._pos) if grow else self._chunk_size
+        chunk = self._f.read(size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character, or '' at the end of the input."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos].isspace():
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, characters):
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError(f"Expected one of {characters!r} in the GeoJSON, found {character or 'the end'!r}")
+        self._pos += 1
+        return character
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # A value ending the buffer may be a cut-off number
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill(grow=True)
+
+
+class FeatureReader:
+    """
+    Streams project features from a GeoJSON or CSV file.
+
+    Nothing is loaded whole: a GeoJSON FeatureCollection is decoded one
+    feature at a time from its "features" array (other members are read
+    and skipped), line-delimited GeoJSON (.geojsonl, .geojsons, .jsonl,
+    .ndjson) one line at a time, and CSV one row at a time. CSV rows carry
+    the geometry in a `geometry` (GeoJSON), `wkt` or `coordinates` ([[lat,
+    lng], ...] as stored by the app) column.
+
+    Each feature is yielded as {'index', 'name', 'type', 'coordinates'},
+    numbered from 0 in input order, or as {'index', 'error'} when it
+    cannot be used, so a bad feature fails on its own.
+
+    Args:
+        path (str): Input file
+        default_type (str): Project type of features that carry none
+    """
+
+    def __init__(self, path, default_type=None):
+        self.path = path
+        self.default_type = default_type
+        self.size = os.path.getsize(path)
+        self._f = None
+
+    @property
+    def fraction(self):
+        """Share of the input read so far (0-1)."""
+        if self._f is None:
+            return 0.0
+        if self._f.closed or not self.size:
+            return 1.0
+        return min(self._f.buffer.tell() / self.size, 1.0)
+
+    def __iter__(self):
+        extension = os.path.splitext(self.path)[1].lower()
+        with open(self.path, encoding='utf-8-sig', newline='') as self._f:
+            if extension == '.csv':
+                records = self._csv_records()
+            elif extension in LINE_DELIMITED_EXTENSIONS:
+                records = self._line_records()
+            else:
+                records = self._collection_records()
+            for index, (fields, geometry) in enumerate(records):
+                yield self._feature(index, fields, geometry)
+
+    def _feature(self, index, fields, geometry):
+        try:
+            if isinstance(geometry, Exception):
+                raise geometry
+            project_type = _first(fields, TYPE_FIELDS) or self.default_type
+            if not project_type:
+                raise ValueError("No project type (set a project_type property or a default type)")
+            return {
+                'index': index,
+                'name': (_first(fields, NAME_FIELDS) or f"Feature {index + 1}")[:100],
+                'type': project_type[:50],
+                'coordinates': geometry_coordinates(geometry),
+            }
+        except (ValueError, TypeError, IndexError) as e:
+            return {'index': index, 'error': str(e)}
+
+    @staticmethod
+    def _geojson_record(feature):
+        if not isinstance(feature, dict):
+            return {}, ValueError(f"Expected a GeoJSON Feature, found {type(feature).__name__}")
+        fields = dict(feature.get('properties') or {})
+        # The Feature's id names the project when no property does
+        if feature.get('id') is not None:
+            fields.setdefault('id', feature['id'])
+        return fields, feature.get('geometry')
+
+    def _collection_records(self):
+        stream = _JSONStream(self._f)
+        stream.expect('{')
+        if stream.peek() == '}':
+            return
+        while True:
+            key = stream.value()
+            stream.expect(':')
+            if key == 'features':
+                stream.expect('[')
+                if stream.peek() != ']':
+                    while True:
+                        yield self._geojson_record(stream.value())
+                        if stream.expect(',]') == ']':
+                            break
+                else:
+                    stream.expect(']')
+            else:
+                stream.value()
+            if stream.expect(',}') == '}':
+                return
+
+    def _line_records(self):
+        for line in self._f:
+            # GeoJSON text sequences prefix each feature with a record separator
+            line = line.strip().lstrip('\x1e')
+            if not line:
+                continue
+            try:
+                feature = json.loads(line)
+            except ValueError as e:
+                yield {}, ValueError(f"Unreadable GeoJSON line: {e}")
+                continue
+            yield self._geojson_record(feature)
+
+    def _csv_records(self):
+        csv.field_size_limit(MAX_CSV_FIELD)
+        for row in csv.DictReader(self._f):
+            try:
+                if row.get('geometry'):
+                    geometry = json.loads(row['geometry'])
+                elif row.get('wkt'):
+                    geometry = parse_wkt(row['wkt'])
+                elif row.get('coordinates'):
+                    # Already [lat, lng], as stored by the app; lines are told apart by the project type
+                    positions = [[point[1], point[0]] for point in json.loads(row['coordinates'])]
+                    if len(positions) < 3 or is_linear_project(_first(row, TYPE_FIELDS) or self.default_type):
+                        geometry = {'type': 'LineString', 'coordinates': positions}
+                    else:
+                        geometry = {'type': 'Polygon', 'coordinates': [positions]}
+                else:
+                    geometry = ValueError("Row has no geometry, wkt or coordinates column")
+            except (ValueError, TypeError, IndexError) as e:
+                geometry = ValueError(f"Unreadable geometry: {e}")
+            yield row, geometry
+
+
+class Checkpoint:
+    """
+    Append-only record of the features a portfolio run has finished.
+
+    One JSON line is appended per feature once its rows are committed (or
+    once it has failed), and flushed to disk with each batch, so a crashed
+    run resumes after the last committed batch. A line cut short by the
+    crash is ignored. The first line records the input file, so a
+    checkpoint is never applied to a different input.
+
+    Args:
+        path (str): Checkpoint file
+        source (str): Input file the run reads
+    """
+
+    def __init__(self, path, source):
+        self.path = path
+        self.source = {'source': os.path.abspath(source), 'bytes': os.path.getsize(source)}
+        self.finished = {}
+        if os.path.exists(path):
+            self._load()
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(self.source) + '\n')
+
+    def _load(self):
+        with open(self.path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        header = json.loads(lines[0]) if lines else None
+        if header != self.source:
+            raise ValueError(f"Checkpoint {self.path} was written for another input "
+                             f"({header and header.get('source')}); use a new checkpoint file")
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                logger.warning(f"Ignoring a torn checkpoint line in {self.path}")
+                continue
+            self.finished[entry['index']] = entry
+
+    def is_finished(self, index, retry_failed=False):
+        entry = self.finished.get(index)
+        return entry is not None and not (retry_failed and entry['status'] == 'failed')
+
+    def record(self, entries):
+        """Appends finished features' entries and flushes them to disk."""
+        if not entries:
+            return
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(entry) + '\n' for entry in entries))
+            f.flush()
+            os.fsync(f.fileno())
+        for entry in entries:
+            self.finished[entry['index']] = entry
+
+    def counts(self):
+        statuses = [entry['status'] for entry in self.finished.values()]
+        return {'done': statuses.count('done'), 'failed': statuses.count('failed')}
+
+
+def _format_seconds(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+class Progress:
+    """
+    Counts finished features and formats throughput and ETA lines.
+
+    The number of features is not known up front (the input is streamed),
+    so it is estimated from the features read so far and the share of the
+    input file they came from.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self.started = clock()
+        self.read = self.done = self.failed = self.skipped = 0
+
+    @property
+    def elapsed(self):
+        return self._clock() - self.started
+
+    @property
+    def rate(self):
+        """Features finished per second in this run."""
+        elapsed = self.elapsed
+        return (self.done + self.failed) / elapsed if elapsed > 0 else 0.0
+
+    def estimated_total(self, fraction=None):
+        if fraction is None or fraction <= 0:
+            return None
+        return max(self.read, int(round(self.read / fraction)))
+
+    def eta(self, fraction=None):
+        """Seconds left at the current rate, or None while it cannot be estimated."""
+        total = self.estimated_total(fraction)
+        if total is None or not self.rate:
+            return None
+        return max(total - self.done - self.failed - self.skipped, 0) / self.rate
+
+    def line(self, fraction=None):
+        """One progress line; `fraction` is the share of the input read so far."""
+        total = self.estimated_total(fraction)
+        if total is None:
+            total = '?'
+        elif fraction < 1:
+            total = f"~{total}"
+        eta = self.eta(fraction)
+        return (f"{self.done + self.failed + self.skipped}/{total} features "
+                f"({self.done} done, {self.failed} failed, {self.skipped} skipped) | "
+                f"{self.rate:.2f} features/s | elapsed {_format_seconds(self.elapsed)} | "
+                f"ETA {_format_seconds(eta) if eta is not None else '?'}")
+
+
+def fetch_imagery(coordinates):
+    """
+    Fetches a feature's imagery; the network-bound stage, run on threads.
+
+    The image is not decoded here: decoding is CPU work that would hold the
+    GIL on the fetch threads, and only the encoded bytes cross to the process.
+
+    Returns:
+        dict: The imagery payload, ready to be sent to a process
+    """
+    return _picklable_imagery(preprocess_imagery(coordinates, decode=False))
+
+
+def analyse_feature(feature, imagery_data, file_path):
+    """
+    Classifies land cover, detects objects and renders the report of one
+    feature; the CPU-bound stage, run on a process pool.
+
+    Features are analysed from their single static map, as /analyze does
+    with ANALYSIS_TILING off: polygons are restricted to the pixels inside
+    them, and linear projects are analysed over the whole image rather than
+    a corridor.
+
+    Args:
+        feature (dict): Feature from FeatureReader
+        imagery_data (dict): Its imagery payload from fetch_imagery
+        file_path (str): Where to write the PDF
+
+    Returns:
+        dict: The feature, file_path, bytes, the Report row's 'summary' and
+              'results_blob', the 'results_json' its content hash is taken
+              over, and per-stage 'timings'
+    """
+    timings = {}
+    started = time.perf_counter()
+    decoded = with_image(imagery_data)
+    try:
+        if not is_linear_project(feature['type']) and len(feature['coordinates']) > 2:
+            mask = _project_mask(decoded, feature['coordinates'])
+            if mask is not None:
+                decoded = {**decoded, 'mask': mask}
+        land_cover = classify_land_cover(decoded)
+        timings['land_cover'] = round(time.perf_counter() - started, 4)
+        started = time.perf_counter()
+        objects = detect_objects(decoded)
+        timings['objects'] = round(time.perf_counter() - started, 4)
+        sections = {name: describe(decoded) for name, describe in SECTION_STAGES.items()}
+    finally:
+        close_image(decoded)
+    results = build_analysis_results(land_cover, objects, sections)
+
+    started = time.perf_counter()
+    project_details = {'name': feature['name'], 'type': feature['type'], 'coordinates': feature['coordinates']}
+    size = write_chunks(file_path, default_template().build(project_details, results,
+                                                            imagery=imagery_data).output())
+    timings['report'] = round(time.perf_counter() - started, 4)
+    return {
+        'feature': feature,
+        'file_path': file_path,
+        'bytes': size,
+        'summary': summarize_results(results),
+        'results_blob': encode_results(results),
+        'results_json': json.dumps(results),
+        'timings': timings,
+    }
+
+
+def report_path(output_dir, index):
+    """Deterministic PDF path of a feature, so a re-run overwrites rather than duplicates it."""
+    return os.path.join(output_dir, f"feature_{index:07d}.pdf")
+
+
+def run_portfolio(features, save_batch, output_dir, checkpoint=None, fetch_workers=DEFAULT_FETCH_WORKERS,
+                  cpu_workers=None, batch_size=DEFAULT_BATCH_SIZE, retry_failed=False,
+                  progress_interval=DEFAULT_PROGRESS_INTERVAL, progress=None, report=print):
+    """
+    Analyses and reports on a stream of features.
+
+    Imagery is fetched on a pool of `fetch_workers` threads; land cover,
+    object detection and the PDF run on a pool of `cpu_workers` processes.
+    At most fetch_workers + 2 * cpu_workers features are in flight, so the
+    input is read only as fast as it is processed. Finished features are
+    handed to `save_batch` `batch_size` at a time and then recorded in the
+    checkpoint; features the checkpoint already holds are skipped. A
+    feature whose geometry, imagery or analysis fails is recorded as
+    failed and the run carries on.
+
+    Args:
+        features (iterable): Features as yielded by FeatureReader; its
+            `fraction` attribute, if any, feeds the ETA
+        save_batch (callable): Stores a list of analyse_feature outputs in
+            one transaction and returns one dict of ids per output
+        output_dir (str): Directory the PDFs are written to
+        checkpoint (Checkpoint): Finished features, or None
+        fetch_workers (int): Concurrent imagery fetches
+        cpu_workers (int): Analysis processes (default: one per CPU)
+        batch_size (int): Features stored per transaction
+        retry_failed (bool): Process features the checkpoint records as failed again
+        progress_interval (float): Seconds between progress lines
+        progress (Progress): Counters to update, or None for new ones
+        report (callable): Receives each progress line
+
+    Returns:
+        Progress: The run's counters
+    """
+    progress = progress or Progress()
+    cpu_workers = cpu_workers or os.cpu_count() or 1
+    in_flight = fetch_workers + 2 * cpu_workers
+    batch, failures = [], []
+    os.makedirs(output_dir, exist_ok=True)
+
+    def fail(feature, error):
+        logger.warning(f"Feature {feature['index']} failed: {error}")
+        failures.append({'index': feature['index'], 'status': 'failed', 'error': str(error)})
+        progress.failed += 1
+
+    def flush():
+        entries = []
+        if batch:
+            for output, ids in zip(batch, save_batch(list(batch))):
+                entries.append({'index': output['feature']['index'], 'status': 'done', **ids})
+            progress.done += len(batch)
+        entries.extend(failures)
+        if checkpoint is not None:
+            checkpoint.record(sorted(entries, key=lambda entry: entry['index']))
+        batch.clear()
+        failures.clear()
+
+    source, features = features, iter(features)
+    fraction = lambda: getattr(source, 'fraction', None)
+    exhausted = False
+    last_report = time.monotonic()
+    with ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix='portfolio-fetch') as fetch_pool, \
+            ProcessPoolExecutor(max_workers=cpu_workers) as cpu_pool:
+        fetching, analysing = {}, {}
+        while True:
+            while not exhausted and len(fetching) + len(analysing) < in_flight:
+                feature = next(features, None)
+                if feature is None:
+                    exhausted = True
+                    break
+                progress.read += 1
+                if checkpoint is not None and checkpoint.is_finished(feature['index'], retry_failed):
+                    progress.skipped += 1
+                elif feature.get('error'):
+                    fail(feature, feature['error'])
+                else:
+                    fetching[fetch_pool.submit(fetch_imagery, feature['coordinates'])] = feature
+            if not fetching and not analysing:
+                break
+
+            done, _ = wait([*fetching, *analysing], timeout=progress_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in fetching:
+                    feature = fetching.pop(future)
+                    try:
+                        imagery_data = future.result()
+                    except Exception as e:
+                        fail(feature, e)
+                        continue
+                    if imagery_data.get('error'):
+                        fail(feature, f"Imagery unavailable: {imagery_data['error']}")
+                        continue
+                    analysis = cpu_pool.submit(analyse_feature, feature, imagery_data,
+                                               report_path(output_dir, feature['index']))
+                    analysing[analysis] = feature
+                else:
+                    feature = analysing.pop(future)
+                    try:
+                        batch.append(future.result())
+                    except Exception as e:
+                        fail(feature, e)
+            if len(batch) + len(failures) >= batch_size:
+                flush()
+            if time.monotonic() - last_report >= progress_interval:
+                report(progress.line(fraction()))
+                last_report = time.monotonic()
+        flush()
+    report(progress.line(1.0 if exhausted else fraction()))
+    return progress
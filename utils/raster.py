@@ -0,0 +1,167 @@
+import base64
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Land cover class codes used in classification maps
+LAND_COVER_CLASSES = ('vegetation', 'water', 'built_up', 'barren_land')
+
+_RUN_LENGTH_DTYPE = np.dtype('<u4')
+
+
+def _bits_for(max_code):
+    # Smallest width in (1, 2, 4, 8) bits that holds every class code
+    for bits in (1, 2, 4, 8):
+        if max_code < 2 ** bits:
+            return bits
+    raise ValueError(f"Class code {max_code} does not fit in a uint8 map")
+
+
+def encode_rle(values):
+    """
+    Run-length encodes a flat uint8 array.
+
+    Returns:
+        bytes: The run values (one byte each) followed by the run lengths
+               (little-endian uint32 each)
+    """
+    values = np.ascontiguousarray(values, dtype=np.uint8).ravel()
+    if len(values) == 0:
+        return b''
+    starts = np.flatnonzero(np.concatenate(([True], values[1:] != values[:-1])))
+    lengths = np.diff(np.append(starts, len(values))).astype(_RUN_LENGTH_DTYPE)
+    return values[starts].tobytes() + lengths.tobytes()
+
+
+def decode_rle(data):
+    """Inverse of encode_rle: returns the flat uint8 array."""
+    runs = len(data) // (1 + _RUN_LENGTH_DTYPE.itemsize)
+    values = np.frombuffer(data, dtype=np.uint8, count=runs)
+    lengths = np.frombuffer(data, dtype=_RUN_LENGTH_DTYPE, count=runs, offset=runs)
+    return np.repeat(values, lengths)
+
+
+def encode_bitpacked(values, bits):
+    """
+    Packs a flat uint8 array at `bits` (1, 2, 4 or 8) bits per value, most
+    significant value first within each byte. The tail is zero-padded.
+    """
+    values = np.ascontiguousarray(values, dtype=np.uint8).ravel()
+    per_byte = 8 // bits
+    padded = np.zeros(-(-len(values) // per_byte) * per_byte, dtype=np.uint8)
+    padded[:len(values)] = values
+    shifts = (bits * np.arange(per_byte - 1, -1, -1)).astype(np.uint8)
+    return np.bitwise_or.reduce(padded.reshape(-1, per_byte) << shifts, axis=1).astype(np.uint8).tobytes()
+
+
+def decode_bitpacked(data, bits, count):
+    """Inverse of encode_bitpacked: returns `count` values as a flat uint8 array."""
+    per_byte = 8 // bits
+    shifts = (bits * np.arange(per_byte - 1, -1, -1)).astype(np.uint8)
+    packed = np.frombuffer(data, dtype=np.uint8)
+    return ((packed[:, None] >> shifts) & np.uint8(2 ** bits - 1)).ravel()[:count]
+
+
+class ClassMap:
+    """
+    A per-pixel land cover classification map.
+
+    The codes live in a (height, width) uint8 NumPy array; `classes` names
+    each code. The array is exposed read-only, so consumers share it without
+    copying. For storage the map is serialized either run-length encoded or
+    bit-packed at the narrowest width that holds every code (four classes fit
+    in 2 bits), whichever is smaller, and wrapped in base64 to stay JSON-safe.
+
+    Args:
+        codes: (height, width) array-like of class codes
+        classes (tuple): Class name for each code
+    """
+
+    def __init__(self, codes, classes=LAND_COVER_CLASSES):
+        codes = np.asarray(codes)
+        if codes.ndim != 2:
+            raise ValueError(f"Expected a 2-D class map, got shape {codes.shape}")
+        if codes.dtype != np.uint8:
+            if codes.size and (codes.min() < 0 or codes.max() > 255):
+                raise ValueError("Class codes must be in the range 0-255")
+            codes = codes.astype(np.uint8)
+        self._codes = codes.view()
+        self._codes.flags.writeable = False
+        self.classes = tuple(classes)
+
+    @property
+    def codes(self):
+        """Read-only (height, width) uint8 view of the map."""
+        return self._codes
+
+    @property
+    def width(self):
+        return self._codes.shape[1]
+
+    @property
+    def height(self):
+        return self._codes.shape[0]
+
+    def counts(self, mask=None):
+        """Pixels per class code (np.bincount), optionally restricted to a boolean mask."""
+        values = self._codes[mask] if mask is not None else self._codes.ravel()
+        return np.bincount(values, minlength=len(self.classes))
+
+    def percentages(self, mask=None, decimals=2):
+        """Share of the (masked) pixels in each class, in percent."""
+        counts = self.counts(mask)
+        total = counts.sum()
+        shares = counts / total * 100.0 if total else np.zeros(len(counts))
+        return {name: round(float(shares[code]), decimals) for code, name in enumerate(self.classes)}
+
+    def to_json(self):
+        """Returns a JSON-safe dict with the map in its most compact encoding."""
+        flat = self._codes.ravel()
+        bits = _bits_for(int(flat.max()) if flat.size else 0)
+        rle = encode_rle(flat)
+        packed = encode_bitpacked(flat, bits)
+        encoding, data = ('rle', rle) if len(rle) < len(packed) else (f'bitpack{bits}', packed)
+        return {
+            'width': self.width,
+            'height': self.height,
+            'class_names': list(self.classes),
+            'encoding': encoding,
+            'data': base64.b64encode(data).decode('ascii')
+        }
+
+    @classmethod
+    def from_json(cls, map_data):
+        """
+        Rebuilds a ClassMap from to_json output. The former list form
+        ({'width', 'height', 'classes': [codes...]}) is also accepted.
+        """
+        width, height = int(map_data['width']), int(map_data['height'])
+        encoding = map_data.get('encoding')
+        if encoding is None:
+            codes = np.asarray(map_data['classes'], dtype=np.uint8)
+            if codes.size != width * height:
+                raise ValueError(f"{codes.size} class codes do not fill a {width}x{height} map")
+            return cls(codes.reshape(height, width))
+
+        data = base64.b64decode(map_data['data'])
+        if encoding == 'rle':
+            flat = decode_rle(data)
+        elif encoding.startswith('bitpack'):
+            bits = int(encoding[len('bitpack'):])
+            if len(data) != -(-width * height * bits // 8):
+                raise ValueError(f"{len(data)} packed bytes do not fill a {width}x{height} map")
+            flat = decode_bitpacked(data, bits, width * height)
+        else:
+            raise ValueError(f"Unknown class map encoding '{encoding}'")
+        if flat.size != width * height:
+            raise ValueError(f"Decoded {flat.size} pixels for a {width}x{height} map")
+        return cls(flat.reshape(height, width), classes=map_data.get('class_names', LAND_COVER_CLASSES))
+
+    def __eq__(self, other):
+        return (isinstance(other, ClassMap) and self.classes == other.classes
+                and np.array_equal(self._codes, other._codes))
+
+    def __repr__(self):
+        return f'<ClassMap {self.width}x{self.height} {len(self.classes)} classes>'
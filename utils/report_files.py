@@ -0,0 +1,122 @@
+import hashlib
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Bytes written to disk per step
+CHUNK_SIZE = 256 * 1024
+
+# Default cap on the bytes of rendered report files kept on disk
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def report_fingerprint(project_details, analysis_results_json, generator_version):
+    """
+    Content hash addressing a rendered report.
+
+    Two requests with the same project name, type and coordinates, the same
+    analysis results JSON and the same generator version render the same
+    PDF, so they share one file and one Report row.
+
+    Args:
+        project_details (dict): Project 'id', 'name', 'type' and 'coordinates'
+        analysis_results_json (str): The analysis results as stored
+        generator_version (str): Version of the PDF layout
+
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    project = json.dumps({key: project_details.get(key) for key in ('id', 'name', 'type', 'coordinates')},
+                         sort_keys=True, separators=(',', ':'))
+    digest = hashlib.sha256()
+    for part in (generator_version, project, analysis_results_json):
+        data = part.encode('utf-8')
+        # Length-prefixed, so no two different inputs concatenate to the same bytes
+        digest.update(len(data).to_bytes(8, 'big'))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def write_chunks(path, data, chunk_size=CHUNK_SIZE):
+    """
+    Writes a bytes-like object to `path` in chunks through a temporary file
+    renamed into place, so readers never see a partial file. The chunks are
+    memoryview slices of `data`, so no copy of the whole document is made.
+
+    Returns:
+        int: Bytes written
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    view = memoryview(data)
+    partial_path = f"{path}.part"
+    try:
+        with open(partial_path, 'wb') as f:
+            for start in range(0, len(view), chunk_size):
+                f.write(view[start:start + chunk_size])
+        os.replace(partial_path, path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    return len(view)
+
+
+def mark_used(path):
+    """Records a download in the file's access time, which eviction orders by."""
+    try:
+        stat = os.stat(path)
+        os.utime(path, (time.time(), stat.st_mtime))
+    except FileNotFoundError:
+        pass
+
+
+def collect_report_files(directory, max_bytes=DEFAULT_MAX_BYTES, keep=()):
+    """
+    Deletes the least recently used report PDFs until the directory holds
+    at most `max_bytes` of them.
+
+    Report rows are kept; a report whose file was collected is rendered
+    again the next time it is requested.
+
+    Args:
+        directory (str): Directory holding the PDFs
+        max_bytes (int): Storage quota
+        keep (iterable): Paths never deleted, e.g. the file just written
+
+    Returns:
+        list: Paths of the deleted files
+    """
+    keep = {os.path.abspath(path) for path in keep}
+    entries = []
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if not entry.name.endswith('.pdf') or not entry.is_file():
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_atime, stat.st_size, os.path.abspath(entry.path)))
+    except FileNotFoundError:
+        return []
+
+    total = sum(size for _, size, _ in entries)
+    removed = []
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path in keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed.append(path)
+    if removed:
+        logger.info(f"Removed {len(removed)} report file(s) to stay within {max_bytes} bytes")
+    return removed
@@ -1,11 +1,34 @@
 import logging
+import os
+import threading
+import time
 from datetime import datetime
 import json
+from itertools import chain
 # import os # Not strictly needed in this function if PDF is returned as bytes
 from fpdf import FPDF # Import FPDF
+from fpdf.enums import MethodReturnValue, XPos, YPos
+import numpy as np
+
+from utils.analysis_pipeline import cached_imagery
+from utils.geometry import as_points, is_linear_project, measure
+from utils.georef import GeoTransform
+from utils.raster import ClassMap
+from utils.report_files import write_chunks
+from utils.report_images import (DEFAULT_COLOUR, DETECTION_COLOURS, LAND_COVER_COLOURS, ImageEncoder, blend,
+                                 colourize, decode_for_print, detection_legend, draw_boxes, draw_polylines,
+                                 fit_size, land_cover_legend, palette, print_pixels, resample_area,
+                                 resample_nearest)
+from utils.report_storage import encode_results, summarize_results
+from utils.spatial_index import detection_index
+from utils.tiling import lat_lng_to_pixels
 
 logger = logging.getLogger(__name__)
 
+# Version of the report layout; part of every report's content hash, so bump it
+# whenever the PDF changes and previously rendered reports are rendered again
+REPORT_GENERATOR_VERSION = 'dpr-layout-v4'
+
 # Helper functions (get_center_coordinates, etc.) should be kept as they are
 # if they are used by the PDF generation logic.
 
@@ -26,17 +49,33 @@ def get_center_coordinates(coordinates):
         return "Error calculating center"
 
 
+def get_project_dimensions(project_details):
+    """
+    Measures the project geometry (see utils.geometry.measure).
+
+    Returns:
+        dict: is_linear plus length_km, area_sqkm and perimeter_km
+    """
+    coords = project_details.get('coordinates') or []
+    is_linear = is_linear_project(project_details.get('type'))
+    metrics = measure(coords, closed=not is_linear and len(coords) > 2)
+    return {
+        'is_linear': is_linear,
+        'length_km': metrics['length_km'],
+        'area_sqkm': metrics['area_sqkm'],
+        'perimeter_km': metrics['perimeter_km']
+    }
+
+
 def calculate_project_length(project_details):
-    # ... (keep existing implementation)
-    if project_details['type'] in ['Road', 'Pipeline', 'Transmission Line']:
+    dimensions = get_project_dimensions(project_details)
+    if dimensions['is_linear']:
         coords = project_details['coordinates']
         if not coords or len(coords) < 2:
             return "Unable to calculate length (insufficient points)"
-        # This is a placeholder for actual geometric calculation
-        return f"Approximately {len(coords) * 0.5} km (Simplified calculation based on point count)"
+        return f"Approximately {dimensions['length_km']:.2f} km (great-circle length of the alignment)"
     else:
-        # This is a placeholder for actual area calculation
-        return f"Project area: approximately {len(project_details['coordinates']) * 0.25} sq km (Simplified calculation based on point count)"
+        return f"Project area: approximately {dimensions['area_sqkm']:.2f} sq km (perimeter {dimensions['perimeter_km']:.2f} km)"
 
 def estimate_clearing_required(project_details, analysis_results):
     vegetation_data = analysis_results.get('vegetation', {})
@@ -63,8 +102,108 @@ def estimate_clearing_required(project_details, analysis_results):
         return f"Clearing requirements to be determined (Vegetation density: {vegetation_data.get('density', 'Unknown')})" # Show original value in message
 
 
-def identify_major_work_items(analysis_results):
-    # ... (keep existing implementation)
+def _corridor_width_m():
+    # Right-of-way width of linear projects, as analysed (see ANALYSIS_CORRIDOR_WIDTH_M)
+    return float(os.environ.get('ANALYSIS_CORRIDOR_WIDTH_M', '60'))
+
+
+# Boilerplate sections, identical in every report (see ReportTemplate)
+GENERAL_DESCRIPTION = (
+    "The project site characteristics detailed in this report are derived from automated analysis of satellite "
+    "imagery. All findings, especially regarding terrain, land cover, and existing infrastructure, require "
+    "comprehensive ground verification and site surveys prior to any detailed engineering design or "
+    "construction activities.")
+KEY_RECOMMENDATIONS = [
+    "Conduct thorough ground truthing and site verification for all aspects identified in this report.",
+    "Undertake detailed geotechnical investigations for foundation and earthworks design.",
+    "Perform comprehensive environmental and social impact assessments (ESIA).",
+    "Engage with local authorities and stakeholders regarding identified constraints and potential impacts."
+]
+RISK_DISCLAIMER = (
+    "This is a high-level, preliminary risk assessment based on automated analysis of satellite imagery. It is "
+    "not exhaustive. A comprehensive risk assessment requires detailed site investigations, engineering "
+    "studies, and expert consultation.")
+APPENDICES = {
+    "Note": "The following are placeholders. In a full DPR, these sections would contain maps and imagery derived from the analysis.",
+    "Appendices List": [
+        'Appendix A: Annotated Project Area Map (showing boundary, key features)',
+        'Appendix B: Land Cover Classification Map',
+        'Appendix C: Detected Objects and Infrastructure Map',
+        'Appendix D: Terrain Profile Map (if applicable)',
+        'Appendix E: Constraints Map (e.g., highlighting water bodies, protected areas)'
+    ]
+}
+CONCLUSION = (
+    "This preliminary DPR provides an initial overview of the project based on automated analysis. "
+    "The findings should be used to guide further detailed investigations, including mandatory ground surveys, "
+    "to validate and expand upon these results for informed decision-making and detailed project planning.")
+
+# Figure illustrating each entry of the appendices list, if any
+APPENDIX_FIGURES = ('satellite', 'land_cover', 'detections', None, None)
+
+# chapter_body content of the boilerplate, as laid out by build_report
+STATIC_SECTIONS = (
+    {"General Description": GENERAL_DESCRIPTION},
+    {"Key Recommendations": KEY_RECOMMENDATIONS, "Disclaimer": RISK_DISCLAIMER},
+    APPENDICES,
+    CONCLUSION,
+)
+
+
+def _large_result_objects():
+    # Detections above which the report summarizes them in tables instead of listing each one
+    return int(os.environ.get('REPORT_LARGE_RESULT_OBJECTS', '100'))
+
+
+def _section_rows():
+    # Rows (or list items) a section shows in the large-result mode before an "N more" row
+    return int(os.environ.get('REPORT_SECTION_ROWS', '25'))
+
+
+def structures_in_footprint(objects_data, project_details):
+    """
+    Counts the detected structures that lie on the project itself.
+
+    Uses a spatial index over the georeferenced detections (cached per
+    project): for linear projects the buildings within half the corridor
+    width of the alignment, for areas the buildings whose centre is inside
+    the polygon.
+
+    Args:
+        objects_data (dict): Object detection results
+        project_details (dict): Project with 'type', 'coordinates' and optionally 'id'
+
+    Returns:
+        dict: 'buildings' and 'other_structures' counts plus a 'scope' phrase,
+              or None when the detections or geometry do not allow it
+    """
+    coordinates = (project_details or {}).get('coordinates') or []
+    if not isinstance(objects_data, dict) or not coordinates:
+        return None
+    if is_linear_project(project_details.get('type')):
+        width = _corridor_width_m()
+        if width <= 0 or len(coordinates) < 2:
+            return None
+        index = detection_index(objects_data, cache_key=project_details.get('id'))
+        found = index.within_line(coordinates, width / 2, categories=('buildings', 'other_structures'))
+        scope = f"within the {width:g} m corridor"
+    elif len(coordinates) > 2:
+        index = detection_index(objects_data, cache_key=project_details.get('id'))
+        found = index.within_polygon(coordinates, categories=('buildings', 'other_structures'))
+        scope = "inside the project footprint"
+    else:
+        return None
+    if not len(index):
+        return None  # Nothing georeferenced to locate
+    return {
+        'buildings': sum(1 for category, _ in found if category == 'buildings'),
+        'other_structures': sum(1 for category, _ in found if category == 'other_structures'),
+        'scope': scope
+    }
+
+
+def identify_major_work_items(analysis_results, project_details=None):
+    # With project_details, structures are counted on the project itself (see structures_in_footprint)
     work_items = []
     water_bodies_data = analysis_results.get('water_bodies', [])
     if isinstance(water_bodies_data, list) and any('stream' in str(item).lower() or 'water' in str(item).lower() or 'river' in str(item).lower() for item in water_bodies_data):
@@ -76,7 +215,11 @@ def identify_major_work_items(analysis_results):
         work_items.append("Significant earthworks likely required for terrain management (cutting/filling)")
 
     objects_data = analysis_results.get('objects', {})
-    if isinstance(objects_data, dict):
+    located = structures_in_footprint(objects_data, project_details)
+    if located is not None:
+        if located['buildings'] > 0 or located['other_structures'] > 0:
+            work_items.append(f"Potential structure relocation/demolition for {located['buildings']} building(s) and {located['other_structures']} other structure(s) {located['scope']}")
+    elif isinstance(objects_data, dict):
         buildings_count = len(objects_data.get('buildings', []))
         other_structures_count = len(objects_data.get('other_structures', []))
         if buildings_count > 0 or other_structures_count > 0:
@@ -86,8 +229,8 @@ def identify_major_work_items(analysis_results):
     if not work_items: work_items.append("N/A or to be determined by detailed ground survey and engineering design.")
     return work_items
 
-def identify_potential_risks(analysis_results):
-    # ... (keep existing implementation)
+def identify_potential_risks(analysis_results, project_details=None):
+    # With project_details, structures are counted on the project itself (see structures_in_footprint)
     risks = []
     terrain_data = analysis_results.get('terrain', {})
     terrain_type = terrain_data.get('type', '').lower()
@@ -105,7 +248,11 @@ def identify_potential_risks(analysis_results):
         risks.append("Dense vegetation may increase clearing costs, project duration, and require specialized equipment.")
 
     objects_data = analysis_results.get('objects', {})
-    if isinstance(objects_data, dict):
+    located = structures_in_footprint(objects_data, project_details)
+    if located is not None:
+        if located['buildings'] > 2:
+            risks.append(f"Proximity to multiple structures ({located['buildings']} buildings {located['scope']}) may introduce social impacts, require detailed surveys, and potential resettlement planning.")
+    elif isinstance(objects_data, dict):
         buildings_count = len(objects_data.get('buildings', []))
         if buildings_count > 2:
              risks.append(f"Proximity to multiple structures ({buildings_count} buildings detected) may introduce social impacts, require detailed surveys, and potential resettlement planning.")
@@ -119,7 +266,315 @@ def identify_potential_risks(analysis_results):
     return risks
 
 
+def summarize_map_data(land_cover):
+    # The encoded class map is for machines; the report shows its dimensions instead
+    if not isinstance(land_cover, dict) or 'map_data' not in land_cover:
+        return land_cover
+    land_cover = {key: land_cover[key] for key in land_cover}
+    map_data = land_cover.pop('map_data') or {}
+    land_cover['classification_map'] = (f"{map_data.get('width', '?')} x {map_data.get('height', '?')} px "
+                                        f"({map_data.get('encoding', 'list')} encoded, stored with the report)")
+    return land_cover
+
+
+def count_detections(objects_data):
+    """Total number of detections across the categories of object detection results."""
+    if not isinstance(objects_data, dict):
+        return 0
+    return sum(len(items) for items in objects_data.values() if isinstance(items, list))
+
+
+def summarize_detections(objects_data):
+    """
+    Aggregates object detections per (category, type).
+
+    The detections are read once into arrays and aggregated with NumPy, so
+    the cost per detection is a single pass over its dict.
+
+    Returns:
+        list: Dicts with 'category', 'type', 'count', 'mean_confidence' (None
+              when no detection of the type has one) and 'extent' ([south,
+              west, north, east] covering every georeferenced detection of the
+              type, or None), most frequent type first
+    """
+    return _summarize_columns(_detection_columns(objects_data))
+
+
+def _confidences(values):
+    # Confidences as floats, NaN where missing; None converts to NaN directly
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return np.asarray([value if isinstance(value, (int, float)) else np.nan for value in values],
+                          dtype=np.float64)
+
+
+def _detection_columns(objects_data):
+    # The detections as columns: the (category, detection) pairs, a code per
+    # (category, type), confidences (NaN when missing) and [south, west, north,
+    # east] extents (NaN rows for detections without coordinates). Each column
+    # is one comprehension per category, converted to an array at once.
+    entries, codes, confidences, groups = [], [], [], {}
+    bbox_rows, bboxes = [], []
+    vertex_rows, vertices, counts = [], [], []
+    for category, items in objects_data.items():
+        if not isinstance(items, list):
+            continue
+        items = [item for item in items if isinstance(item, dict)]
+        offset = len(entries)
+        entries.extend((category, item) for item in items)
+        codes.extend(groups.setdefault((category, object_type), len(groups))
+                     for object_type in [item.get('type', 'Unknown') for item in items])
+        confidences.append(_confidences([item.get('confidence') for item in items]))
+        for row, item in enumerate(items, offset):
+            if item.get('geo_bbox'):
+                bbox_rows.append(row)
+                bboxes.append(item['geo_bbox'])
+            elif item.get('lat_lngs'):
+                vertex_rows.append(row)
+                vertices.extend(item['lat_lngs'])
+                counts.append(len(item['lat_lngs']))
+            elif item.get('lat_lng'):
+                vertex_rows.append(row)
+                vertices.append(item['lat_lng'])
+                counts.append(1)
+
+    extents = np.full((len(entries), 4), np.nan)
+    if bboxes:
+        extents[bbox_rows] = np.fromiter(chain.from_iterable(bboxes), dtype=np.float64,
+                                         count=4 * len(bboxes)).reshape(-1, 4)
+    if vertices:
+        points = np.fromiter(chain.from_iterable(point[:2] for point in vertices), dtype=np.float64,
+                             count=2 * len(vertices)).reshape(-1, 2)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        extents[vertex_rows] = np.column_stack([
+            np.minimum.reduceat(points[:, 0], starts), np.minimum.reduceat(points[:, 1], starts),
+            np.maximum.reduceat(points[:, 0], starts), np.maximum.reduceat(points[:, 1], starts)])
+    return {'entries': entries, 'groups': list(groups), 'codes': np.asarray(codes, dtype=np.int64),
+            'confidences': np.concatenate(confidences) if confidences else np.empty(0), 'extents': extents}
+
+
+def _summarize_columns(columns):
+    codes, confidences, extents = columns['codes'], columns['confidences'], columns['extents']
+    size = len(columns['groups'])
+    counts = np.bincount(codes, minlength=size)
+    scored = ~np.isnan(confidences)
+    scored_counts = np.bincount(codes[scored], minlength=size)
+    confidence_sums = np.bincount(codes[scored], confidences[scored], minlength=size)
+    located = ~np.isnan(extents[:, 0])
+    lows = np.full((size, 2), np.inf)
+    highs = np.full((size, 2), -np.inf)
+    np.minimum.at(lows, codes[located], extents[located, :2])
+    np.maximum.at(highs, codes[located], extents[located, 2:])
+
+    rows = [{
+        'category': category,
+        'type': object_type,
+        'count': int(counts[code]),
+        'mean_confidence': (round(float(confidence_sums[code] / scored_counts[code]), 3)
+                            if scored_counts[code] else None),
+        'extent': ([float(lows[code, 0]), float(lows[code, 1]), float(highs[code, 0]), float(highs[code, 1])]
+                   if np.isfinite(lows[code, 0]) else None)
+    } for code, (category, object_type) in enumerate(columns['groups'])]
+    rows.sort(key=lambda row: (-row['count'], row['category'], str(row['type'])))
+    return rows
+
+
+def _format_location(item):
+    if item.get('lat_lng'):
+        return f"{item['lat_lng'][0]:.5f}, {item['lat_lng'][1]:.5f}"
+    if item.get('lat_lngs'):
+        start, end = item['lat_lngs'][0], item['lat_lngs'][-1]
+        return f"{start[0]:.5f}, {start[1]:.5f} to {end[0]:.5f}, {end[1]:.5f}"
+    if item.get('bbox'):
+        return "px " + ", ".join(str(value) for value in item['bbox'])
+    return "-"
+
+
+def _format_extent(extent):
+    if extent is None:
+        return "-"
+    south, west, north, east = extent
+    return f"{south:.4f}, {west:.4f} to {north:.4f}, {east:.4f}"
+
+
+# Largest printed height of an appendix figure; figures span the text width
+FIGURE_MAX_HEIGHT_MM = 120
+
+# Printed width of the site overview in section 2.0 (the Appendix A image, shown smaller)
+SITE_MAP_WIDTH_MM = 90
+
+# Weight of the land cover colours blended over the satellite image
+LAND_COVER_ALPHA = 0.5
+
+# Project boundary over imagery, and on a plain map
+BOUNDARY_COLOUR = (255, 255, 255)
+PLAIN_BOUNDARY_COLOUR = (66, 66, 66)
+PLAIN_BACKGROUND = 240
+
+
+def _figure(data, array, caption, legend=()):
+    return {'data': data, 'size': (array.shape[1], array.shape[0]), 'caption': caption, 'legend': list(legend)}
+
+
+def _located_detections(objects_data):
+    # Per category: (N, 4) [south, west, north, east] extents of the boxed and
+    # point detections, and the (M, 2) [lat, lng] vertices of the polyline
+    # ones with the vertex count of each polyline
+    located = {}
+    for category, items in objects_data.items():
+        if not isinstance(items, list):
+            continue
+        boxes, lines = [], []
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            if item.get('geo_bbox'):
+                boxes.append(item['geo_bbox'])
+            elif item.get('lat_lngs'):
+                lines.append(item['lat_lngs'])
+            elif item.get('lat_lng'):
+                lat, lng = item['lat_lng'][:2]
+                boxes.append((lat, lng, lat, lng))
+        if boxes or lines:
+            extents = np.fromiter(chain.from_iterable(boxes), dtype=np.float64, count=4 * len(boxes)).reshape(-1, 4)
+            counts = [len(line) for line in lines]
+            vertices = np.fromiter(chain.from_iterable(point[:2] for line in lines for point in line),
+                                   dtype=np.float64, count=2 * sum(counts)).reshape(-1, 2)
+            located[category] = (extents, vertices, counts)
+    return located
+
+
+def _plain_map(boundary, located, max_size):
+    # Blank canvas spanning the project and the detections, for when there
+    # is no georeferenced imagery to draw on
+    points = np.concatenate([boundary.reshape(-1, 2)] + [part for extents, vertices, _ in located.values()
+                                                         for part in (extents[:, :2], extents[:, 2:], vertices)])
+    world = lat_lng_to_pixels(points[np.isfinite(points).all(axis=1)], 0)
+    low, high = world.min(axis=0), world.max(axis=0)
+    margin = np.maximum((high - low) * 0.05, 1e-9)
+    low, high = low - margin, high + margin
+    size = fit_size(*(high - low), *max_size, upscale=True)
+    transform = GeoTransform(low, (high - low) / np.asarray(size, dtype=np.float64))
+    canvas = np.full((size[1], size[0], 3), PLAIN_BACKGROUND, dtype=np.uint8)
+    if len(boundary):
+        draw_polylines(canvas, transform.lat_lng_to_pixels(boundary), PLAIN_BOUNDARY_COLOUR)
+    return canvas, transform
+
+
+def appendix_figures(project_details, analysis_results, imagery=None, width_mm=190,
+                     height_mm=FIGURE_MAX_HEIGHT_MM, encoder=None):
+    """
+    Rasters for the visual appendices, resampled to print resolution and encoded.
+
+    The satellite image of an imagery payload (e.g. from the analysis cache)
+    is decoded at reduced scale where the format allows, area-averaged down
+    to the pixels it is printed at (REPORT_IMAGE_DPI over width_mm x
+    height_mm; it is never upsampled) and the project boundary is drawn on
+    it. The land cover class map is coloured and blended over that image,
+    or shown alone without one. Detections are outlined by category through
+    the image's georeference, or on a plain map of the project extent
+    without imagery.
+
+    No figure exceeds the print resolution, so what they add to the PDF's
+    size and render time is bounded by the pages they fill, not by the
+    resolution of the source imagery.
+
+    Args:
+        project_details (dict): Project type and coordinates
+        analysis_results (dict): Analysis results with 'land_cover' and 'objects'
+        imagery (dict): Imagery payload with 'processed_data' (or a decoded
+                        'image') and 'georef' or 'bounds'; None without imagery
+        width_mm (float): Printed width of a figure
+        height_mm (float): Largest printed height of a figure
+        encoder (ImageEncoder): Encoder shared across figures; a new one when None
+
+    Returns:
+        dict: 'satellite', 'land_cover' and 'detections' -> {'data': encoded
+              image bytes, 'size': (width, height) pixels, 'caption',
+              'legend': [(label, RGB)]}, for the figures there is data for
+    """
+    if encoder is None:  # An empty ImageEncoder is falsy (len 0)
+        encoder = ImageEncoder()
+    max_size = print_pixels(width_mm, height_mm)
+    boundary = as_points(project_details.get('coordinates') or [])
+    if len(boundary) > 2 and not is_linear_project(project_details.get('type')):
+        boundary = np.vstack([boundary, boundary[:1]])
+    figures = {}
+
+    base = site = transform = None
+    decoded = None
+    if imagery and imagery.get('image') is not None:
+        rgb = imagery['image'].array
+        decoded = rgb, (rgb.shape[1], rgb.shape[0])
+    elif imagery and imagery.get('processed_data'):
+        decoded = decode_for_print(imagery['processed_data'], max_size)
+    if decoded is not None:
+        rgb, (source_width, source_height) = decoded
+        size = fit_size(source_width, source_height, *max_size)
+        base = resample_area(rgb, size)
+        source_transform = GeoTransform.for_imagery(imagery, (source_height, source_width))
+        if source_transform is not None:
+            transform = source_transform.resized((source_width, source_height), size)
+        site = base.copy()
+        if transform is not None and len(boundary):
+            draw_polylines(site, transform.lat_lng_to_pixels(boundary), BOUNDARY_COLOUR)
+        figures['satellite'] = _figure(
+            encoder.encode(site), site,
+            f"Satellite imagery ({imagery.get('source') or 'unknown source'}, "
+            f"{imagery.get('imagery_date') or 'undated'}) with the project boundary in white.")
+
+    land_cover = analysis_results.get('land_cover')
+    map_data = land_cover.get('map_data') if isinstance(land_cover, dict) else None
+    if map_data:
+        try:
+            class_map = ClassMap.from_json(map_data)
+        except (KeyError, ValueError) as e:
+            logger.warning(f"Land cover map left out of the report: {e}")
+        else:
+            table = palette(class_map.classes, LAND_COVER_COLOURS)
+            legend = land_cover_legend(class_map.classes)
+            # A tiled analysis maps the tiles' extent, not the extent of the fit-view image
+            if base is not None and 'tiling' not in land_cover:
+                coloured = colourize(resample_nearest(class_map.codes, (base.shape[1], base.shape[0])), table)
+                overlay = blend(base, coloured, LAND_COVER_ALPHA)
+                figures['land_cover'] = _figure(encoder.encode(overlay), overlay,
+                                                "Land cover classification over the satellite imagery.", legend)
+            else:
+                coloured = colourize(resample_nearest(
+                    class_map.codes, fit_size(class_map.width, class_map.height, *max_size)), table)
+                figures['land_cover'] = _figure(encoder.encode(coloured, 'PNG'), coloured,
+                                                "Land cover classification.", legend)
+
+    objects_data = analysis_results.get('objects')
+    located = _located_detections(objects_data) if isinstance(objects_data, dict) else {}
+    if located:
+        if transform is not None:
+            canvas, image_format = site.copy(), 'JPEG'
+        else:
+            (canvas, transform), image_format = _plain_map(boundary, located, max_size), 'PNG'
+        for category, (extents, vertices, counts) in located.items():
+            colour = DETECTION_COLOURS.get(category, DEFAULT_COLOUR)
+            if len(extents):
+                draw_boxes(canvas, transform.lat_lng_to_boxes(extents), colour)
+            if counts:
+                draw_polylines(canvas, transform.lat_lng_to_pixels(vertices), colour, counts)
+        total = sum(len(extents) + len(counts) for extents, _, counts in located.values())
+        figures['detections'] = _figure(encoder.encode(canvas, image_format), canvas,
+                                        f"{total:,} located detections, outlined by category.",
+                                        detection_legend(located))
+    return figures
+
+
 class PDF(FPDF):
+    def __init__(self, *args, max_list_items=None, template=None, **kwargs):
+        # With max_list_items, chapter_body shows at most that many items of a list; with a
+        # ReportTemplate, paragraphs it has laid out before are not line-broken again
+        super().__init__(*args, **kwargs)
+        self.max_list_items = max_list_items
+        self.template = template
+        self.line_recorder = None  # dict collecting the lines of each paragraph (see ReportTemplate)
+
     def header(self):
         self.set_font('Arial', 'B', 12)
         self.cell(0, 10, 'GeoSight - Preliminary DPR', 0, 1, 'C')
@@ -130,6 +585,31 @@ class PDF(FPDF):
         self.set_font('Arial', 'I', 8)
         self.cell(0, 10, f'Page {self.page_no()}/{self.alias_nb_pages()}', 0, 0, 'C')
 
+    def multi_cell(self, w, h=None, text='', *args, **kwargs):
+        # fpdf2 leaves the cursor at the right edge after a multi_cell, so a following
+        # full-width cell would have no room; continue from the left margin instead
+        kwargs.setdefault('new_x', XPos.LMARGIN)
+        kwargs.setdefault('new_y', YPos.NEXT)
+        if args or set(kwargs) != {'new_x', 'new_y'} or (kwargs['new_x'], kwargs['new_y']) != (XPos.LMARGIN, YPos.NEXT):
+            return super().multi_cell(w, h, text, *args, **kwargs)
+
+        # Plain paragraphs are left-aligned, so their broken lines can be replayed as cells
+        key = self._paragraph_key(w, h, text)
+        lines = self.template.paragraph_lines(key) if self.template is not None else None
+        if lines is None:
+            if self.line_recorder is not None:
+                self.line_recorder[key] = super().multi_cell(w, h, text, align='L', dry_run=True,
+                                                             output=MethodReturnValue.LINES, **kwargs)
+            return super().multi_cell(w, h, text, align='L', **kwargs)
+        for line in lines:
+            self.cell(w, h, line, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        return True
+
+    def _paragraph_key(self, w, h, text):
+        # Everything line breaking depends on: font, horizontal geometry and the text
+        return (self.font_family, self.font_style, self.font_size_pt, self.w, self.l_margin, self.r_margin,
+                round(self.x, 3), w, h, text)
+
     def chapter_title(self, title):
         self.set_font('Arial', 'B', 12)
         self.set_fill_color(200, 220, 255) # Light blue background
@@ -141,7 +621,7 @@ class PDF(FPDF):
         if isinstance(body_content, str):
             self.multi_cell(0, 6, body_content)
         elif isinstance(body_content, list):
-            for item in body_content:
+            for item in self._capped(body_content, ""):
                 if isinstance(item, str):
                     self.multi_cell(0, 6, f"- {item}")
                 else: # Attempt to print non-string list items reasonably
@@ -162,7 +642,7 @@ class PDF(FPDF):
                                 self.multi_cell(0, 6, f"    {formatted_s_sub_key}: {s_sub_value}")
                         elif isinstance(sub_value, list):
                             self.multi_cell(0, 6, f"  {formatted_sub_key}:")
-                            for item in sub_value:
+                            for item in self._capped(sub_value, "    "):
                                 self.multi_cell(0, 6, f"    - {item}")
                         else:
                             self.multi_cell(0, 6, f"  {formatted_sub_key}: {sub_value}")
@@ -172,7 +652,7 @@ class PDF(FPDF):
                     self.multi_cell(0,6, f"{formatted_key}:")
                     self.set_font('Arial', '', 10)
                     if not value: self.multi_cell(0,6, "  - None specified or detected.")
-                    for item in value:
+                    for item in self._capped(value, "  "):
                         if isinstance(item, str):
                             self.multi_cell(0, 6, f"  - {item}")
                         else: # Attempt to print non-string list items reasonably
@@ -182,15 +662,161 @@ class PDF(FPDF):
                     self.multi_cell(0, 6, f"{formatted_key}: {value}")
         self.ln()
 
-def generate_report(project_details, analysis_results):
+    def _capped(self, items, indent):
+        # Yields the items to show; past max_list_items, ends with an "N more" line instead
+        limit = self.max_list_items
+        if limit is None or len(items) <= limit:
+            yield from items
+            return
+        yield from items[:limit]
+        self.multi_cell(0, 6, f"{indent}... {len(items) - limit:,} more")
+
+    def table(self, header, rows, widths, more=0):
+        """
+        Renders rows of short values as a grid of fixed-width cells.
+
+        Cells are single lines, with text cut to the column width, so a row
+        costs one cell() per column and no line breaking. `more` adds a
+        final row counting the rows left out.
+        """
+        line_height = 6
+        self.set_font('Arial', 'B', 9)
+        self.set_fill_color(230, 230, 230)
+        for text, width in zip(header, widths):
+            self.cell(width, line_height, self._fit(text, width), border=1, fill=True)
+        self.ln(line_height)
+        self.set_font('Arial', '', 9)
+        for row in rows:
+            for text, width in zip(row, widths):
+                self.cell(width, line_height, self._fit(str(text), width), border=1)
+            self.ln(line_height)
+        if more:
+            self.set_font('Arial', 'I', 9)
+            self.cell(sum(widths), line_height, f"... {more:,} more", border=1)
+            self.ln(line_height)
+        self.set_font('Arial', '', 10)
+        self.ln(2)
+
+    def _fit(self, text, width):
+        # Cuts text to fit a cell of the given width, with a little padding
+        room = width - 2 * self.c_margin
+        if self.get_string_width(text) <= room:
+            return text
+        while text and self.get_string_width(text + '...') > room:
+            text = text[:-1]
+        return text + '...'
+
+    def figure(self, figure, width, caption=None):
+        """
+        Places an appendix_figures() figure `width` mm wide, centred, with
+        its colour legend and caption below. Placing the same figure again
+        reuses the embedded image.
+        """
+        image_width, image_height = figure['size']
+        self.image(figure['data'], x=self.l_margin + (self.epw - width) / 2, w=width,
+                   h=width * image_height / image_width)
+        self.ln(1)
+        if figure['legend']:
+            self.set_font('Arial', '', 8)
+            for label, colour in figure['legend']:
+                self.set_fill_color(*colour)
+                self.cell(4, 4, '', border=1, fill=True)
+                self.cell(self.get_string_width(label) + 6, 4, f" {label}")
+            self.ln(5)
+        self.set_font('Arial', 'I', 9)
+        self.multi_cell(0, 5, caption or figure['caption'])
+        self.set_font('Arial', '', 10)
+        self.ln(2)
+
+    def detection_tables(self, title, objects_data, row_limit):
+        """
+        Renders object detections as a per-type summary table and a table of
+        the highest-confidence detections, each capped at row_limit rows.
+        Used instead of chapter_body when there are too many detections to
+        list one by one.
+        """
+        details = {key: value for key, value in objects_data.items() if not isinstance(value, list)}
+        self.chapter_body({title: details} if details else f"{title}:")
+        self.set_font('Arial', '', 10)
+        width = self.epw
+
+        columns = _detection_columns(objects_data)
+        summary = _summarize_columns(columns)
+        total = len(columns['entries'])
+        self.multi_cell(0, 6, f"{total:,} detections of {len(summary)} object types, by type:")
+        self.table(
+            ['Category', 'Type', 'Count', 'Mean confidence', 'Extent (S, W to N, E)'],
+            [[row['category'].replace('_', ' ').title(), row['type'], f"{row['count']:,}",
+              '-' if row['mean_confidence'] is None else f"{row['mean_confidence']:.3f}",
+              _format_extent(row['extent'])] for row in summary[:row_limit]],
+            [width * 0.15, width * 0.2, width * 0.1, width * 0.15, width * 0.4],
+            more=max(0, len(summary) - row_limit))
+
+        # Stable sort, so equally confident detections keep their detection order
+        order = np.argsort(-np.nan_to_num(columns['confidences'], nan=0.0), kind='stable')[:row_limit]
+        top = [columns['entries'][index] for index in order.tolist()]
+        if top:
+            self.multi_cell(0, 6, "Highest-confidence detections:")
+            self.table(
+                ['Category', 'Type', 'Confidence', 'Location'],
+                [[category.replace('_', ' ').title(), item.get('type', 'Unknown'),
+                  '-' if item.get('confidence') is None else f"{item['confidence']:.3f}",
+                  _format_location(item)] for category, item in top],
+                [width * 0.15, width * 0.25, width * 0.15, width * 0.45],
+                more=max(0, total - len(top)))
+
+        # Lists of plain values (e.g. names) are listed, capped like any other list
+        plain = {key: value for key, value in objects_data.items()
+                 if isinstance(value, list) and value and not all(isinstance(item, dict) for item in value)}
+        if plain:
+            limit, self.max_list_items = self.max_list_items, row_limit
+            self.chapter_body({key: [item for item in value if not isinstance(item, dict)]
+                               for key, value in plain.items()})
+            self.max_list_items = limit
+
+
+def generate_report(project_details, analysis_results, imagery=None):
     logger.debug(f"Generating PDF report for project: {project_details.get('name', 'Unnamed Project')}")
     if not project_details or not analysis_results:
         logger.error("Missing project_details or analysis_results for PDF generation.")
         return b"Error: Missing data for report generation."
 
-    pdf = PDF()
+    pdf = build_report(project_details, analysis_results, template=default_template(), imagery=imagery)
+    try:
+        # fpdf2 returns the document as a bytearray
+        pdf_bytes = bytes(pdf.output())
+        logger.info(f"PDF report generated successfully for {project_details.get('name', 'N/A')}. Size: {len(pdf_bytes)} bytes.")
+        return pdf_bytes
+    except Exception as e:
+        logger.error(f"Failed to output PDF for {project_details.get('name', 'N/A')}: {e}")
+        return b"Error: Failed to generate PDF output."
+
+def build_report(project_details, analysis_results, large=None, template=None, imagery=None):
+    """
+    Lays out the report and returns the FPDF document, not yet output.
+
+    In the large-result mode, used when there are more than
+    REPORT_LARGE_RESULT_OBJECTS detections unless `large` says otherwise,
+    detections are summarized in tables and every list is cut to
+    REPORT_SECTION_ROWS items, so the report stays a few pages long
+    however many objects were detected.
+
+    With a ReportTemplate, the boilerplate paragraphs it has laid out
+    already are replayed line by line instead of being line-broken again.
+
+    The visual appendices show the figures of appendix_figures(): the
+    satellite `imagery` (also shown smaller in section 2.0), the land cover
+    map and the detections. Without any, the appendices stay a list of
+    placeholders.
+    """
+    objects_data = analysis_results.get('objects', {"status": "No data available or error in analysis."})
+    if large is None:
+        large = count_detections(objects_data) > _large_result_objects()
+    row_limit = _section_rows()
+    pdf = PDF(max_list_items=row_limit if large else None, template=template)
     pdf.alias_nb_pages() # Add this line to enable total page count
     pdf.add_page()
+    figures = appendix_figures(project_details, analysis_results, imagery, width_mm=pdf.epw)
 
     # Report Title
     pdf.set_font('Arial', 'B', 16)
@@ -212,16 +838,22 @@ def generate_report(project_details, analysis_results):
     pdf.chapter_title('2.0 Project Site Location & Description')
     site_desc_content = {
         "Geographic Coordinates": f"Center: {get_center_coordinates(project_details.get('coordinates', []))}. Full boundary coordinates are on record.",
-        "General Description": "The project site characteristics detailed in this report are derived from automated analysis of satellite imagery. All findings, especially regarding terrain, land cover, and existing infrastructure, require comprehensive ground verification and site surveys prior to any detailed engineering design or construction activities."
+        "General Description": GENERAL_DESCRIPTION
     }
-    # Future: "Map Reference": "Visual map to be included in future versions if static map generation is integrated."
     pdf.chapter_body(site_desc_content)
+    if 'satellite' in figures:
+        # The Appendix A image printed smaller; the PDF embeds it once
+        pdf.figure(figures['satellite'], SITE_MAP_WIDTH_MM, "Site overview (full size in Appendix A).")
+        pdf.ln()
 
 
     # 3.0 Existing Site Conditions (from analysis_results)
     pdf.chapter_title('3.0 Existing Site Conditions based on Imagery Analysis')
-    pdf.chapter_body({"Land Cover Analysis": analysis_results.get('land_cover', {"status": "No data available or error in analysis."})})
-    pdf.chapter_body({"Detected Objects and Infrastructure": analysis_results.get('objects', {"status": "No data available or error in analysis."})})
+    pdf.chapter_body({"Land Cover Analysis": summarize_map_data(analysis_results.get('land_cover', {"status": "No data available or error in analysis."}))})
+    if large and isinstance(objects_data, dict):
+        pdf.detection_tables("Detected Objects and Infrastructure", objects_data, row_limit)
+    else:
+        pdf.chapter_body({"Detected Objects and Infrastructure": objects_data})
     pdf.chapter_body({"Terrain Profile": analysis_results.get('terrain', {"status": "No data available or error in analysis."})})
     pdf.chapter_body({"Vegetation Overview": analysis_results.get('vegetation', {"status": "No data available or error in analysis."})})
     pdf.chapter_body({"Water Bodies Identified": analysis_results.get('water_bodies', ["No specific water bodies identified or data not available."])})
@@ -234,52 +866,139 @@ def generate_report(project_details, analysis_results):
     scope_content = {
         "Approximate Project Length/Area": calculate_project_length(project_details),
         "Estimated Clearing Requirements": estimate_clearing_required(project_details, analysis_results),
-        "Potential Major Work Items": identify_major_work_items(analysis_results)
+        "Potential Major Work Items": identify_major_work_items(analysis_results, project_details)
     }
     pdf.chapter_body(scope_content)
 
     # 5.0 Preliminary Risk Assessment
     pdf.chapter_title('5.0 Preliminary Risk Assessment & Recommendations')
     pdf.chapter_body({
-        "Identified Potential Risks": identify_potential_risks(analysis_results),
-        "Key Recommendations": [
-            "Conduct thorough ground truthing and site verification for all aspects identified in this report.",
-            "Undertake detailed geotechnical investigations for foundation and earthworks design.",
-            "Perform comprehensive environmental and social impact assessments (ESIA).",
-            "Engage with local authorities and stakeholders regarding identified constraints and potential impacts."
-        ],
-        "Disclaimer": "This is a high-level, preliminary risk assessment based on automated analysis of satellite imagery. It is not exhaustive. A comprehensive risk assessment requires detailed site investigations, engineering studies, and expert consultation."
+        "Identified Potential Risks": identify_potential_risks(analysis_results, project_details),
+        "Key Recommendations": KEY_RECOMMENDATIONS,
+        "Disclaimer": RISK_DISCLAIMER
     })
     
-    # 6.0 Visual Appendices (Placeholder)
-    pdf.chapter_title('6.0 Visual Appendices (Illustrative)')
-    pdf.chapter_body({
-        "Note": "The following are placeholders. In a full DPR, these sections would contain maps and imagery derived from the analysis.",
-        "Appendices List": [
-            'Appendix A: Annotated Project Area Map (showing boundary, key features)',
-            'Appendix B: Land Cover Classification Map',
-            'Appendix C: Detected Objects and Infrastructure Map',
-            'Appendix D: Terrain Profile Map (if applicable)',
-            'Appendix E: Constraints Map (e.g., highlighting water bodies, protected areas)'
-        ]
-    })
+    # 6.0 Visual Appendices
+    if figures:
+        pdf.chapter_title('6.0 Visual Appendices')
+        for title, name in zip(APPENDICES["Appendices List"], APPENDIX_FIGURES):
+            pdf.set_font('Arial', 'B', 10)
+            pdf.multi_cell(0, 6, title)
+            if name in figures:
+                pdf.figure(figures[name], pdf.epw)
+            else:
+                pdf.set_font('Arial', 'I', 9)
+                pdf.multi_cell(0, 5, "Not available for this analysis.")
+                pdf.ln(2)
+        pdf.ln()
+    else:
+        pdf.chapter_title('6.0 Visual Appendices (Illustrative)')
+        pdf.chapter_body(APPENDICES)
     
     # 7.0 Conclusion
     pdf.chapter_title('7.0 Conclusion')
-    pdf.chapter_body(
-        "This preliminary DPR provides an initial overview of the project based on automated analysis. "
-        "The findings should be used to guide further detailed investigations, including mandatory ground surveys, "
-        "to validate and expand upon these results for informed decision-making and detailed project planning."
-    )
+    pdf.chapter_body(CONCLUSION)
 
-    try:
-        # Return PDF as bytes
-        pdf_bytes = pdf.output(dest='S').encode('latin-1')
-        logger.info(f"PDF report generated successfully for {project_details.get('name', 'N/A')}. Size: {len(pdf_bytes)} bytes.")
-        return pdf_bytes
-    except Exception as e:
-        logger.error(f"Failed to output PDF for {project_details.get('name', 'N/A')}: {e}")
-        return b"Error: Failed to generate PDF output."
+    return pdf
+
+
+class ReportTemplate:
+    """
+    The report layout with its boilerplate laid out once.
+
+    Most of a report's line-breaking work is spent on paragraphs that are
+    the same in every report: the general description, recommendations,
+    disclaimer, appendices list and conclusion (STATIC_SECTIONS). Building
+    the template runs them through FPDF's line breaking once, as a dry run,
+    and keeps the broken lines; reports built with it emit those lines as
+    single-line cells, so only the project-specific text is laid out per
+    report. The core fonts the report uses need no loading.
+
+    A built template is read-only and can be shared between threads;
+    default_template() holds one per process.
+    """
+
+    def __init__(self):
+        self._paragraphs = {}
+        pdf = PDF()
+        pdf.line_recorder = self._paragraphs
+        pdf.add_page()
+        for section in STATIC_SECTIONS:
+            pdf.chapter_body(section)
+
+    def __len__(self):
+        return len(self._paragraphs)
+
+    def paragraph_lines(self, key):
+        """The broken lines of a pre-laid-out paragraph (see PDF._paragraph_key), or None."""
+        return self._paragraphs.get(key)
+
+    def build(self, project_details, analysis_results, large=None, imagery=None):
+        """build_report() with this template."""
+        return build_report(project_details, analysis_results, large=large, template=self, imagery=imagery)
+
+    def render(self, project_details, analysis_results, large=None, imagery=None):
+        """The report PDF as bytes."""
+        return bytes(self.build(project_details, analysis_results, large=large, imagery=imagery).output())
+
+
+_default_template = None
+_default_template_lock = threading.Lock()
+
+
+def default_template():
+    """The process-wide ReportTemplate, built on first use."""
+    global _default_template
+    with _default_template_lock:
+        if _default_template is None:
+            _default_template = ReportTemplate()
+        return _default_template
+
+def render_report_file(report_id, project_details, analysis_results_json, file_path, cache=None):
+    """
+    Renders a report PDF to disk; the job run by the report worker pool.
+
+    Everything CPU-bound happens here rather than on the request thread:
+    parsing the analysis results, laying out the PDF and encoding the
+    results for the Report row. The file is written in chunks next to its
+    final path and renamed into place, so it never appears half-written.
+    The satellite image for the appendices is read from the analysis cache
+    the analysis left it in (single-image and tiled analyses alike), if it
+    is still there; rendering never fetches imagery.
+
+    Args:
+        report_id (int): Report row the output belongs to
+        project_details (dict): Project name, type and coordinates
+        analysis_results_json (str): The analysis results as JSON
+        file_path (str): Where to write the PDF
+        cache (AnalysisCache): Analysis cache holding the project's imagery, or None
+
+    Returns:
+        dict: report_id, file_path, bytes, render_seconds, plus the row's
+              'summary' columns and compressed 'results_blob'
+
+    Raises:
+        RuntimeError: If there is nothing to report on
+    """
+    started = time.perf_counter()
+    analysis_results = json.loads(analysis_results_json)
+    if not project_details or not analysis_results:
+        raise RuntimeError("Missing project details or analysis results for the report")
+    imagery = cached_imagery(project_details.get('coordinates'), cache,
+                             closed=not is_linear_project(project_details.get('type')))
+    # Written straight from fpdf2's output buffer, without a bytes copy of the document
+    size = write_chunks(file_path, default_template().build(project_details, analysis_results,
+                                                            imagery=imagery).output())
+    logger.info(f"Rendered report {report_id} to {file_path} ({size} bytes)")
+
+    return {
+        'report_id': report_id,
+        'file_path': file_path,
+        'bytes': size,
+        'render_seconds': round(time.perf_counter() - started, 4),
+        'summary': summarize_results(analysis_results),
+        'results_blob': encode_results(analysis_results)
+    }
 
 # Example Usage (for testing purposes, not part of the final utils file usually)
 if __name__ == '__main__':
@@ -0,0 +1,293 @@
+import hashlib
+import io
+import logging
+import os
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+from utils.raster import LAND_COVER_CLASSES
+
+logger = logging.getLogger(__name__)
+
+# Resolution images are resampled to for the size they are printed at
+DEFAULT_PRINT_DPI = 150
+
+JPEG_QUALITY = 85
+
+# Palette size of PNG-encoded (flat-coloured) figures
+PNG_COLOURS = 64
+
+MM_PER_INCH = 25.4
+
+# Colour of each land cover class (see utils.raster.LAND_COVER_CLASSES)
+LAND_COVER_COLOURS = {
+    'vegetation': (67, 160, 71),
+    'water': (30, 136, 229),
+    'built_up': (229, 57, 53),
+    'barren_land': (215, 180, 130),
+}
+
+# Outline colour of each object detection category
+DETECTION_COLOURS = {
+    'buildings': (255, 214, 0),
+    'roads': (0, 229, 255),
+    'infrastructure': (255, 112, 67),
+    'obstacles': (236, 64, 122),
+}
+
+# Unknown classes and categories
+DEFAULT_COLOUR = (158, 158, 158)
+
+
+def print_dpi():
+    return int(os.environ.get('REPORT_IMAGE_DPI', str(DEFAULT_PRINT_DPI)))
+
+
+def print_pixels(width_mm, height_mm, dpi=None):
+    """(width, height) in pixels of an image printed at width_mm x height_mm."""
+    dpi = dpi or print_dpi()
+    return (max(1, int(width_mm / MM_PER_INCH * dpi)), max(1, int(height_mm / MM_PER_INCH * dpi)))
+
+
+def fit_size(width, height, max_width, max_height, upscale=False):
+    """
+    The largest (width, height) with the aspect of width x height that fits
+    in max_width x max_height; never larger than the source unless `upscale`.
+    """
+    scale = min(max_width / width, max_height / height)
+    if not upscale:
+        scale = min(scale, 1.0)
+    return max(1, int(round(width * scale))), max(1, int(round(height * scale)))
+
+
+def decode_for_print(data, max_size):
+    """
+    Decodes encoded image bytes for printing within max_size (width, height).
+
+    JPEG sources are decoded by libjpeg at the smallest of its reduced
+    scales (1/2 to 1/8) that still covers the printed size, so a large
+    source costs little more to read than a small one; other formats are
+    decoded in full.
+
+    Returns:
+        tuple: ((height, width, 3) uint8 array at least as large as the
+               printed size, the source's (width, height)), or None when the
+               data is not a readable image
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            source_size = image.size
+            image.draft('RGB', fit_size(*source_size, *max_size))
+            return np.asarray(image.convert('RGB')), source_size
+    except (UnidentifiedImageError, OSError) as e:
+        logger.warning(f"Could not decode imagery for the report ({len(data)} bytes): {e}")
+        return None
+
+
+def _bin_starts(source, target):
+    # First source index of each of `target` equal bins over `source` samples
+    return (np.arange(target, dtype=np.int64) * source // target).astype(np.intp)
+
+
+def resample_area(array, size):
+    """
+    Downsamples a (height, width) or (height, width, channels) uint8 image to
+    size (width, height) by averaging the source pixels under each output pixel.
+
+    Sources many times larger than the output are first read at a stride
+    that leaves at least two samples per output pixel in each direction, so
+    the work follows the output size rather than the source size, and only
+    the strided rows of a memory-mapped source are touched.
+
+    Raises:
+        ValueError: If the output is larger than the source
+    """
+    height, width = array.shape[:2]
+    out_width, out_height = size
+    if out_width > width or out_height > height:
+        raise ValueError(f"Cannot downsample {width}x{height} to {out_width}x{out_height}")
+    step = max(1, min(height // (2 * out_height), width // (2 * out_width)))
+    if step > 1:
+        array = array[::step, ::step]
+        height, width = array.shape[:2]
+
+    rows, cols = _bin_starts(height, out_height), _bin_starts(width, out_width)
+    sums = np.add.reduceat(np.add.reduceat(array, rows, axis=0, dtype=np.uint32), cols, axis=1)
+    counts = np.outer(np.diff(np.append(rows, height)), np.diff(np.append(cols, width))).astype(np.uint32)
+    if array.ndim == 3:
+        counts = counts[..., None]
+    return ((sums + counts // 2) // counts).astype(np.uint8)
+
+
+def resample_nearest(array, size):
+    """Resamples an image or class map to size (width, height) by picking the nearest source pixel."""
+    height, width = array.shape[:2]
+    out_width, out_height = size
+    rows = ((np.arange(out_height) + 0.5) * height / out_height).astype(np.intp)
+    cols = ((np.arange(out_width) + 0.5) * width / out_width).astype(np.intp)
+    return array[rows[:, None], cols[None, :]]
+
+
+def palette(names, colours, default=DEFAULT_COLOUR):
+    """A (256, 3) uint8 lookup table giving code i the colour of names[i]."""
+    table = np.tile(np.asarray(default, dtype=np.uint8), (256, 1))
+    for code, name in enumerate(names):
+        table[code] = colours.get(name, default)
+    return table
+
+
+def colourize(codes, table):
+    """Maps a (height, width) uint8 class map to RGB through a palette()."""
+    return table[codes]
+
+
+def blend(base, overlay, alpha):
+    """Alpha-blends two RGB images of the same shape; alpha is the overlay's weight (0-1)."""
+    weight = np.uint16(round(alpha * 256))
+    mixed = base.astype(np.uint16) * (256 - weight) + overlay.astype(np.uint16) * weight
+    return (mixed >> 8).astype(np.uint8)
+
+
+def _coverage(shape, x1, y1, x2, y2):
+    # Number of [x1, x2) x [y1, y2) boxes covering every pixel: the boxes'
+    # corners are counted into a difference array (one bincount per corner
+    # sign) and summed up once
+    height, width = shape
+    stride, size = width + 1, (height + 1) * (width + 1)
+    diff = (np.bincount(np.concatenate([y1 * stride + x1, y2 * stride + x2]), minlength=size)
+            - np.bincount(np.concatenate([y1 * stride + x2, y2 * stride + x1]), minlength=size))
+    return diff.reshape(height + 1, width + 1).cumsum(axis=0).cumsum(axis=1)[:height, :width]
+
+
+def draw_boxes(canvas, boxes, colour, thickness=1):
+    """
+    Draws the outlines of (N, 4) [x1, y1, x2, y2] pixel boxes onto a writable
+    (height, width, 3) image in place.
+
+    A pixel lies on some outline when more boxes cover it than cover it with
+    the outlines shaved off, so all N outlines are drawn with two coverage
+    counts, in O(N + pixels) whatever N is. Boxes smaller than the outline
+    are drawn filled, so tiny detections still show as dots.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    boxes = boxes[np.isfinite(boxes).all(axis=1)]
+    height, width = canvas.shape[:2]
+    x1 = np.floor(np.minimum(boxes[:, 0], boxes[:, 2]))
+    y1 = np.floor(np.minimum(boxes[:, 1], boxes[:, 3]))
+    x2 = np.floor(np.maximum(boxes[:, 0], boxes[:, 2])) + 1
+    y2 = np.floor(np.maximum(boxes[:, 1], boxes[:, 3])) + 1
+    visible = (x2 > 0) & (y2 > 0) & (x1 < width) & (y1 < height)
+    if not visible.any():
+        return canvas
+    x1, x2 = (np.clip(values[visible], 0, width).astype(np.intp) for values in (x1, x2))
+    y1, y2 = (np.clip(values[visible], 0, height).astype(np.intp) for values in (y1, y2))
+
+    # Only the region the boxes span is counted
+    left, top, right, bottom = x1.min(), y1.min(), x2.max(), y2.max()
+    x1, x2, y1, y2 = x1 - left, x2 - left, y1 - top, y2 - top
+    region = (bottom - top, right - left)
+    inner_x1, inner_y1 = x1 + thickness, y1 + thickness
+    inner_x2, inner_y2 = np.maximum(x2 - thickness, inner_x1), np.maximum(y2 - thickness, inner_y1)
+    outline = _coverage(region, x1, y1, x2, y2) > _coverage(region, inner_x1, inner_y1, inner_x2, inner_y2)
+    canvas[top:bottom, left:right][outline] = colour
+    return canvas
+
+
+def draw_polylines(canvas, points, colour, counts=None):
+    """
+    Draws pixel polylines onto a writable image in place.
+
+    The polylines are given as one (M, 2) array of [x, y] vertices and the
+    number of vertices of each polyline (`counts`; all the points form one
+    polyline when None). Every segment is sampled at one point per pixel of
+    its length, all segments at once, and single points are drawn as dots.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if not len(points):
+        return canvas
+    height, width = canvas.shape[:2]
+    # A segment joins consecutive vertices of the same polyline
+    ends = np.cumsum(counts if counts is not None else [len(points)]) - 1
+    starts = np.setdiff1d(np.arange(len(points) - 1), ends)
+    begin, end = points[starts], points[starts + 1]
+    # Samples per segment, capped at what can cross the image
+    lengths = np.minimum(np.ceil(np.abs(end - begin).max(axis=1, initial=0)), width + height)
+    lengths = np.nan_to_num(lengths).astype(np.intp) + 1
+    segment = np.repeat(np.arange(len(starts)), lengths)
+    t = (np.arange(len(segment)) - np.repeat(np.cumsum(lengths) - lengths, lengths)) / np.maximum(
+        np.repeat(lengths - 1, lengths), 1)
+    samples = np.concatenate([begin[segment] + (end - begin)[segment] * t[:, None], points])
+
+    samples = samples[np.isfinite(samples).all(axis=1)]
+    xs, ys = np.floor(samples[:, 0]).astype(np.intp), np.floor(samples[:, 1]).astype(np.intp)
+    inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+    canvas[ys[inside], xs[inside]] = colour
+    return canvas
+
+
+class ImageEncoder:
+    """
+    Encodes rasters for embedding in a PDF, once per distinct raster.
+
+    Rasters are addressed by a SHA-256 of their pixels, shape and format, so
+    a raster placed several times is encoded once and always yields the same
+    bytes. fpdf2 in turn stores identical image bytes as a single image
+    object, so the PDF holds one copy however often it is shown.
+
+    Photographic rasters are encoded as JPEG, which fpdf2 embeds without
+    decoding. Flat-coloured ones are encoded as palette PNG, which keeps
+    their edges crisp at one byte per pixel; fpdf2 recompresses PNG itself,
+    so it is written with light compression.
+
+    Args:
+        jpeg_quality (int): JPEG quality (1-95)
+    """
+
+    def __init__(self, jpeg_quality=JPEG_QUALITY):
+        self.jpeg_quality = jpeg_quality
+        self._encoded = {}
+        self.hits = 0
+
+    def encode(self, array, image_format='JPEG'):
+        """
+        Encodes a (height, width, 3) uint8 image.
+
+        Returns:
+            bytes: The encoded image
+        """
+        array = np.ascontiguousarray(array, dtype=np.uint8)
+        digest = hashlib.sha256(f"{image_format}|{array.shape}".encode('ascii'))
+        digest.update(array.data)
+        key = digest.hexdigest()
+        data = self._encoded.get(key)
+        if data is not None:
+            self.hits += 1
+            return data
+
+        buffer = io.BytesIO()
+        image = Image.fromarray(array)
+        if image_format == 'JPEG':
+            image.save(buffer, 'JPEG', quality=self.jpeg_quality, optimize=True)
+        elif image_format == 'PNG':
+            # Exact for up to PNG_COLOURS distinct colours
+            image.quantize(PNG_COLOURS, method=Image.Quantize.FASTOCTREE).save(buffer, 'PNG', compress_level=1)
+        else:
+            raise ValueError(f"Unsupported image format: {image_format}")
+        data = self._encoded[key] = buffer.getvalue()
+        logger.debug(f"Encoded {array.shape[1]}x{array.shape[0]} {image_format} image ({len(data)} bytes)")
+        return data
+
+    def __len__(self):
+        return len(self._encoded)
+
+
+def land_cover_legend(classes=LAND_COVER_CLASSES):
+    """(label, colour) pairs for a land cover figure."""
+    return [(name.replace('_', ' ').title(), LAND_COVER_COLOURS.get(name, DEFAULT_COLOUR)) for name in classes]
+
+
+def detection_legend(categories):
+    """(label, colour) pairs for a detections figure."""
+    return [(category.replace('_', ' ').title(), DETECTION_COLOURS.get(category, DEFAULT_COLOUR))
+            for category in categories]
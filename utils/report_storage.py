@@ -0,0 +1,179 @@
+import json
+import logging
+import struct
+import zlib
+from collections.abc import Mapping
+
+from utils.land_cover import get_dominant_land_cover
+from utils.object_detection import count_objects_by_type
+
+logger = logging.getLogger(__name__)
+
+# Blob layout: magic, header length, JSON header, then the compressed sections.
+# The header maps each section name to [offset, length] within the payload.
+BLOB_MAGIC = b'GSRB'
+BLOB_VERSION = 1
+_PREFIX = struct.Struct('<4sBI')  # magic, version, header length
+
+# Nested values large enough to deserve their own section, so reading the
+# small part of a result (e.g. land cover percentages) never inflates them
+DEFERRED_KEYS = {
+    'land_cover': ('map_data',),
+}
+
+COMPRESSION_LEVEL = 6
+
+
+def summarize_results(results):
+    """
+    Extracts the summary fields stored in indexed report columns.
+
+    Args:
+        results (dict): Analysis results
+
+    Returns:
+        dict: dominant_land_cover, dominant_land_cover_pct, object_count and
+              confidence_score (None where the results lack the field)
+    """
+    land_cover = results.get('land_cover') or {}
+    dominant, percentage = get_dominant_land_cover(land_cover)
+    objects = results.get('objects') or {}
+    confidence = land_cover.get('confidence_score')
+    if not percentage or percentage <= 0:
+        dominant = None  # Nothing was classified
+    return {
+        'dominant_land_cover': dominant,
+        'dominant_land_cover_pct': float(percentage) if dominant else None,
+        'object_count': sum(count_objects_by_type(objects).values()) if isinstance(objects, dict) else 0,
+        'confidence_score': float(confidence) if isinstance(confidence, (int, float)) else None
+    }
+
+
+def _compress(value):
+    return zlib.compress(json.dumps(value, separators=(',', ':')).encode('utf-8'), COMPRESSION_LEVEL)
+
+
+def encode_results(results):
+    """
+    Packs analysis results into a sectioned, compressed blob.
+
+    Every top-level key becomes its own zlib-compressed JSON section, and the
+    keys listed in DEFERRED_KEYS are split out of their parent into separate
+    sections, so a reader only inflates what it touches.
+
+    Args:
+        results (dict): JSON-serializable analysis results
+
+    Returns:
+        bytes: The blob
+    """
+    sections = {}
+    for name, value in results.items():
+        deferred = DEFERRED_KEYS.get(name, ())
+        if isinstance(value, dict) and deferred:
+            value = dict(value)
+            for key in deferred:
+                if key in value:
+                    sections[f"{name}.{key}"] = _compress(value.pop(key))
+        sections[name] = _compress(value)
+
+    header, offset, payload = {}, 0, []
+    for name, data in sections.items():
+        header[name] = [offset, len(data)]
+        offset += len(data)
+        payload.append(data)
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    return b''.join([_PREFIX.pack(BLOB_MAGIC, BLOB_VERSION, len(header_bytes)), header_bytes] + payload)
+
+
+class _SectionReader:
+    # Holds the blob and inflates a named section on request
+    def __init__(self, blob):
+        blob = memoryview(blob)
+        magic, version, header_length = _PREFIX.unpack_from(blob)
+        if magic != BLOB_MAGIC or version != BLOB_VERSION:
+            raise ValueError(f"Not a report results blob (magic {bytes(magic)!r}, version {version})")
+        start = _PREFIX.size
+        self.sections = json.loads(bytes(blob[start:start + header_length]))
+        self._payload = blob[start + header_length:]
+        self.decoded = set()
+
+    def load(self, name):
+        offset, length = self.sections[name]
+        self.decoded.add(name)
+        return json.loads(zlib.decompress(self._payload[offset:offset + length]))
+
+
+class LazySection(Mapping):
+    """A decoded section whose deferred children are inflated on first access."""
+
+    def __init__(self, reader, name, value):
+        self._reader = reader
+        self._name = name
+        self._value = value
+        self._deferred = {key for key in DEFERRED_KEYS.get(name, ()) if f"{name}.{key}" in reader.sections}
+
+    def __getitem__(self, key):
+        if key in self._deferred:
+            self._value[key] = self._reader.load(f"{self._name}.{key}")
+            self._deferred.discard(key)
+        return self._value[key]
+
+    def __iter__(self):
+        # Snapshot: reading a deferred key while iterating moves it into _value
+        return iter(list(self._value) + sorted(self._deferred))
+
+    def __len__(self):
+        return len(self._value) + len(self._deferred)
+
+    def __contains__(self, key):
+        return key in self._value or key in self._deferred
+
+
+class LazyResults(Mapping):
+    """
+    Read-only view of stored analysis results that decodes sections lazily.
+
+    Only the blob header is parsed up front; each top-level section is
+    decompressed and parsed the first time it is read, then kept.
+
+    Args:
+        blob (bytes): Output of encode_results
+    """
+
+    def __init__(self, blob):
+        self._reader = _SectionReader(blob)
+        self._names = [name for name in self._reader.sections if '.' not in name]
+        self._cache = {}
+
+    def __getitem__(self, key):
+        if key not in self._cache:
+            if key not in self._names:
+                raise KeyError(key)
+            value = self._reader.load(key)
+            if isinstance(value, dict) and key in DEFERRED_KEYS:
+                value = LazySection(self._reader, key, value)
+            self._cache[key] = value
+        return self._cache[key]
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, key):
+        return key in self._names
+
+    @property
+    def decoded_sections(self):
+        """Names of the sections inflated so far."""
+        return set(self._reader.decoded)
+
+
+def to_plain(value):
+    """Converts lazy mappings back into plain dicts (e.g. for json.dumps), decoding every section."""
+    # Decoded section contents are already plain JSON values; only the lazy wrappers need converting
+    if isinstance(value, (LazyResults, LazySection)):
+        return {key: to_plain(value[key]) for key in value}
+    return value
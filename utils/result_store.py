@@ -0,0 +1,308 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+_KEY_PATTERN = re.compile(r'^[A-Za-z0-9_.-]{1,128}$')
+
+
+def _check_key(key):
+    if not isinstance(key, str) or not _KEY_PATTERN.match(key):
+        raise ValueError(f"Invalid store key: {key!r}")
+    return key
+
+
+class MemoryBackend:
+    """
+    In-process LRU backend. Entries expire ttl seconds after they were written
+    and the least recently used entries are evicted beyond max_items/max_bytes.
+    """
+
+    def __init__(self, ttl=3600, max_items=256, max_bytes=64 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (written_at, value)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _remove(self, key):
+        _, value = self._entries.pop(key)
+        self._size -= len(value)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry[0] > self.ttl:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, value):
+        _check_key(key)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.time(), value)
+            self._size += len(value)
+            while self._entries and (len(self._entries) > self.max_items or self._size > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def purge_expired(self):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [key for key, (written_at, _) in self._entries.items() if written_at < cutoff]
+            for key in expired:
+                self._remove(key)
+        return len(expired)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """
+    SQLite table backend, shared by every server process that points at the
+    same database file.
+    """
+
+    def __init__(self, path, ttl=3600, max_items=10000, max_bytes=512 * 1024 * 1024, table='result_store'):
+        if not re.match(r'^[A-Za-z_][A-Za-z0-9_]*$', table):
+            raise ValueError(f"Invalid table name: {table!r}")
+        self.path = path
+        self.ttl = ttl
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.table = table
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+                "written_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_accessed_at ON {table} (accessed_at)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT value, written_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                return None
+            conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            return bytes(row[0])
+
+    def put(self, key, value):
+        _check_key(key)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, size, written_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, sqlite3.Binary(value), len(value), now, now)
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        count, total = conn.execute(f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}").fetchone()
+        if count <= self.max_items and total <= self.max_bytes:
+            return
+        rows = conn.execute(f"SELECT key, size FROM {self.table} ORDER BY accessed_at").fetchall()
+        doomed = []
+        for key, size in rows:
+            if count <= self.max_items and total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            count -= 1
+            total -= size
+        conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", doomed)
+
+    def delete(self, key):
+        with self._connect() as conn:
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def purge_expired(self):
+        with self._connect() as conn:
+            cursor = conn.execute(f"DELETE FROM {self.table} WHERE written_at < ?", (time.time() - self.ttl,))
+            return cursor.rowcount
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+class DirectoryBackend:
+    """
+    Local-directory spool backend: one file per entry. Writes go through a
+    temporary file and an atomic rename so concurrent readers never see a
+    partial entry. The file mtime records the write time and the atime the
+    last access.
+    """
+
+    suffix = '.entry'
+
+    def __init__(self, root, ttl=3600, max_items=10000, max_bytes=512 * 1024 * 1024):
+        self.root = root
+        self.ttl = ttl
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, _check_key(key) + self.suffix)
+
+    def get(self, key):
+        try:
+            path = self._path(key)
+        except ValueError:
+            return None
+        try:
+            stat = os.stat(path)
+            if time.time() - stat.st_mtime > self.ttl:
+                os.remove(path)
+                return None
+            with open(path, 'rb') as f:
+                value = f.read()
+            os.utime(path, (time.time(), stat.st_mtime))
+            return value
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, value):
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._evict()
+
+    def _entries(self):
+        entries = []
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if entry.name.endswith(self.suffix):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_atime, stat.st_size, stat.st_mtime, entry.path))
+        return entries
+
+    def _evict(self):
+        entries = self._entries()
+        count = len(entries)
+        total = sum(e[1] for e in entries)
+        if count <= self.max_items and total <= self.max_bytes:
+            return
+        for _, size, _, path in sorted(entries):
+            if count <= self.max_items and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            count -= 1
+            total -= size
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except (FileNotFoundError, ValueError):
+            pass
+
+    def purge_expired(self):
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for _, _, mtime, path in self._entries():
+            if mtime < cutoff:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    def __len__(self):
+        return len(self._entries())
+
+
+def create_backend(kind, path=None, **options):
+    """
+    Builds a storage backend by name.
+
+    Args:
+        kind (str): 'memory', 'sqlite' or 'directory'
+        path (str): Database file (sqlite) or spool directory (directory)
+        **options: ttl, max_items, max_bytes
+
+    Returns:
+        A backend instance
+    """
+    if kind == 'memory':
+        return MemoryBackend(**options)
+    if kind == 'sqlite':
+        return SQLiteBackend(path, **options)
+    if kind == 'directory':
+        return DirectoryBackend(path, **options)
+    raise ValueError(f"Unknown result store backend: {kind}")
+
+
+class ResultStore:
+    """
+    Server-side store for analysis results, addressed by opaque result ids.
+
+    Results are serialized to JSON once on put. get_json() hands back that
+    stored text unchanged so it can be persisted without serializing again.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def put(self, results):
+        """Stores results and returns the new result id."""
+        result_id = uuid.uuid4().hex
+        self.backend.put(result_id, json.dumps(results).encode('utf-8'))
+        return result_id
+
+    def get_json(self, result_id):
+        """Returns the stored JSON text for result_id, or None if missing/expired."""
+        if not result_id:
+            return None
+        value = self.backend.get(result_id)
+        return value.decode('utf-8') if value is not None else None
+
+    def get(self, result_id):
+        """Returns the results dict for result_id, or None if missing/expired."""
+        raw = self.get_json(result_id)
+        return json.loads(raw) if raw is not None else None
+
+    def delete(self, result_id):
+        self.backend.delete(result_id)
@@ -0,0 +1,610 @@
+import hashlib
+import json
+import logging
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.geometry import as_points
+
+logger = logging.getLogger(__name__)
+
+# Entries per R-tree node
+DEFAULT_NODE_CAPACITY = 16
+
+# Pending inserts (and removals) tolerated before a SpatialIndex repacks its
+# tree: at least this many, or this share of the indexed entries
+REBUILD_MIN_PENDING = 64
+REBUILD_PENDING_SHARE = 0.1
+
+# Detection indexes kept by detection_index()
+DETECTION_INDEX_CACHE_SIZE = 32
+
+# Sphere radius of web-mercator (EPSG:3857)
+MERCATOR_RADIUS_M = 6378137.0
+MAX_MERCATOR_LAT = 85.05112878
+
+
+def mercator_metres(coordinates):
+    """
+    Projects [lat, lng] degrees to web-mercator metres.
+
+    Returns:
+        numpy.ndarray: (N, 2) array of [x (east), y (north)]
+    """
+    points = as_points(coordinates)
+    lat = np.radians(np.clip(points[:, 0], -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT))
+    return np.column_stack([np.radians(points[:, 1]) * MERCATOR_RADIUS_M,
+                            np.log(np.tan(np.pi / 4 + lat / 2)) * MERCATOR_RADIUS_M])
+
+
+def mercator_distance(distance_m, latitude):
+    """Web-mercator length of a ground distance at a latitude (mercator stretches by 1/cos)."""
+    return distance_m / math.cos(math.radians(min(abs(latitude), MAX_MERCATOR_LAT)))
+
+
+def _bounds_box(bounds):
+    # {'north', 'south', 'east', 'west'} to a mercator [x1, y1, x2, y2] box
+    corners = mercator_metres([[bounds['south'], bounds['west']], [bounds['north'], bounds['east']]])
+    return np.concatenate([corners[0], corners[1]])
+
+
+def _box_distances(boxes, point):
+    # Distance from one point to each (N, 4) box; 0 inside
+    dx = np.maximum(np.maximum(boxes[:, 0] - point[0], point[0] - boxes[:, 2]), 0.0)
+    dy = np.maximum(np.maximum(boxes[:, 1] - point[1], point[1] - boxes[:, 3]), 0.0)
+    return np.hypot(dx, dy)
+
+
+def _rowwise_box_distances(boxes, points):
+    # Element-wise distance from (N, 2) points to (N, 4) boxes
+    dx = np.maximum(np.maximum(boxes[:, 0] - points[:, 0], points[:, 0] - boxes[:, 2]), 0.0)
+    dy = np.maximum(np.maximum(boxes[:, 1] - points[:, 1], points[:, 1] - boxes[:, 3]), 0.0)
+    return np.hypot(dx, dy)
+
+
+def _point_segment_distances(points, start, end):
+    # Element-wise distance from (N, 2) points to (N, 2)-(N, 2) segments
+    direction = end - start
+    length_sq = np.einsum('ij,ij->i', direction, direction)
+    t = np.einsum('ij,ij->i', points - start, direction)
+    t = np.clip(np.divide(t, length_sq, out=np.zeros_like(t), where=length_sq > 0), 0.0, 1.0)
+    return np.hypot(*(points - (start + t[:, None] * direction)).T)
+
+
+def _segments_cross(a, b, c, d):
+    # Element-wise proper or touching intersection of segments a-b and c-d
+    def orientation(p, q, r):
+        return np.sign((q[:, 0] - p[:, 0]) * (r[:, 1] - p[:, 1]) - (q[:, 1] - p[:, 1]) * (r[:, 0] - p[:, 0]))
+    return ((orientation(a, b, c) != orientation(a, b, d)) & (orientation(c, d, a) != orientation(c, d, b)))
+
+
+def box_segment_distances(boxes, start, end):
+    """
+    Element-wise distance between (N, 4) boxes and (N, 2)-(N, 2) segments.
+
+    Zero when the segment touches the box; otherwise the smallest distance
+    between the segment's end points and the box, or the box corners and
+    the segment.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    corners = [boxes[:, [0, 1]], boxes[:, [2, 1]], boxes[:, [2, 3]], boxes[:, [0, 3]]]
+    distances = np.minimum(_rowwise_box_distances(boxes, start), _rowwise_box_distances(boxes, end))
+    for corner in corners:
+        np.minimum(distances, _point_segment_distances(corner, start, end), out=distances)
+    # A segment crossing the box without an end point inside it
+    crossing = np.zeros(len(boxes), dtype=bool)
+    for first, second in zip(corners, corners[1:] + corners[:1]):
+        crossing |= _segments_cross(start, end, first, second)
+    distances[crossing] = 0.0
+    return distances
+
+
+def points_in_polygon(points, polygon):
+    """Even-odd test of (N, 2) points against one (M, 2) ring, vectorized over both."""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    polygon = np.asarray(polygon, dtype=np.float64).reshape(-1, 2)
+    if len(polygon) < 3:
+        return np.zeros(len(points), dtype=bool)
+    x, y = points[:, :1], points[:, 1:]
+    x1, y1 = polygon[:, 0], polygon[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+    straddles = (y1 > y) != (y2 > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        crossing_x = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+    return ((straddles & (x < crossing_x)).sum(axis=1) % 2) == 1
+
+
+def intersects_bounds(coordinates, bounds, closed=False):
+    """
+    Exact test of whether a geometry touches a {'north', 'south', 'east', 'west'} box.
+
+    True when any edge of the geometry touches the box or, for a closed
+    ring, when the box lies inside the ring. Works in degrees, treating
+    edges as straight lines, as the map draws them.
+    """
+    points = as_points(coordinates)
+    if len(points) == 0:
+        return False
+    box = np.array([[bounds['south'], bounds['west'], bounds['north'], bounds['east']]])
+    if len(points) == 1:
+        return bool(_box_distances(box, points[0])[0] == 0.0)
+    end = np.roll(points, -1, axis=0) if closed else points[1:]
+    start = points if closed else points[:-1]
+    if (box_segment_distances(np.repeat(box, len(start), axis=0), start, end) == 0.0).any():
+        return True
+    return bool(closed and points_in_polygon([[bounds['south'], bounds['west']]], points)[0])
+
+
+class STRTree:
+    """
+    A static, packed R-tree built with Sort-Tile-Recursive bulk loading.
+
+    The boxes are sorted into vertical slices by centre x and, within each
+    slice, by centre y, then packed `node_capacity` at a time into leaves;
+    every upper level groups consecutive runs of the level below, which the
+    sort already keeps spatially coherent. Each level is a
+    single (M, 4) array whose node i owns children [i * capacity, (i + 1) *
+    capacity) of the level below, so there are no node objects or pointers
+    and a search walks the levels with array operations, many query boxes
+    at once.
+
+    Args:
+        boxes: (N, 4) array-like of [x1, y1, x2, y2]
+        node_capacity (int): Entries per node
+    """
+
+    def __init__(self, boxes, node_capacity=DEFAULT_NODE_CAPACITY):
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        if node_capacity < 2:
+            raise ValueError("Node capacity must be at least 2")
+        self.node_capacity = node_capacity
+        self.order = self._str_order(boxes, node_capacity)
+        self.boxes = boxes
+        # levels[0] holds the item boxes in leaf order; the last level is the root
+        self.levels = [boxes[self.order]]
+        while len(self.levels[-1]) > 1:
+            self.levels.append(self._pack(self.levels[-1], node_capacity))
+
+    @staticmethod
+    def _str_order(boxes, capacity):
+        count = len(boxes)
+        if count == 0:
+            return np.empty(0, dtype=np.int64)
+        centres = (boxes[:, :2] + boxes[:, 2:]) / 2
+        leaves = math.ceil(count / capacity)
+        slice_size = math.ceil(math.sqrt(leaves)) * capacity
+        by_x = np.argsort(centres[:, 0], kind='stable')
+        slice_of = np.empty(count, dtype=np.int64)
+        slice_of[by_x] = np.arange(count) // slice_size
+        return np.lexsort((centres[:, 1], slice_of))
+
+    @staticmethod
+    def _pack(level, capacity):
+        # Bounding box of every run of `capacity` consecutive entries
+        starts = np.arange(0, len(level), capacity)
+        return np.column_stack([
+            np.minimum.reduceat(level[:, 0], starts), np.minimum.reduceat(level[:, 1], starts),
+            np.maximum.reduceat(level[:, 2], starts), np.maximum.reduceat(level[:, 3], starts)])
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def search(self, query_boxes):
+        """
+        Finds every (query, item) pair whose boxes intersect.
+
+        Args:
+            query_boxes: (Q, 4) array-like of [x1, y1, x2, y2]
+
+        Returns:
+            tuple: (query indices, item indices) arrays of equal length
+        """
+        queries = np.asarray(query_boxes, dtype=np.float64).reshape(-1, 4)
+        if len(self.boxes) == 0 or len(queries) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        query_index = np.arange(len(queries))
+        node_index = np.zeros(len(queries), dtype=np.int64)
+        for depth in range(len(self.levels) - 1, -1, -1):
+            level = self.levels[depth]
+            nodes, boxes = level[node_index], queries[query_index]
+            hit = ((nodes[:, 0] <= boxes[:, 2]) & (nodes[:, 2] >= boxes[:, 0])
+                   & (nodes[:, 1] <= boxes[:, 3]) & (nodes[:, 3] >= boxes[:, 1]))
+            query_index, node_index = query_index[hit], node_index[hit]
+            if depth == 0:
+                break
+            # Expand every surviving node into its children on the level below
+            first = node_index * self.node_capacity
+            counts = np.minimum(first + self.node_capacity, len(self.levels[depth - 1])) - first
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            query_index = np.repeat(query_index, counts)
+            node_index = np.repeat(first, counts) + offsets
+        return query_index, self.order[node_index]
+
+    def query_bbox(self, box):
+        """Indices of the items intersecting one [x1, y1, x2, y2] box, ascending."""
+        return np.sort(self.search([box])[1])
+
+    def query_radius(self, point, radius):
+        """Indices of the items within `radius` of a point (box distance), ascending."""
+        x, y = float(point[0]), float(point[1])
+        candidates = self.query_bbox([x - radius, y - radius, x + radius, y + radius])
+        return candidates[_box_distances(self.boxes[candidates], (x, y)) <= radius]
+
+    def nearest(self, point, k=1):
+        """
+        The k items closest to a point (box distance), nearest first.
+
+        Searches a square around the point, doubling its size until it holds
+        k items; every item closer than the k-th found one lies inside the
+        square, so the result is exact.
+
+        Returns:
+            tuple: (item indices, distances)
+        """
+        k = min(int(k), len(self.boxes))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        root = self.levels[-1][0]
+        radius = max(float(np.hypot(root[2] - root[0], root[3] - root[1])) * math.sqrt(k / len(self.boxes)), 1e-9)
+        while True:
+            found = self.query_radius(point, radius)
+            if len(found) >= k:
+                break
+            radius *= 2
+        distances = _box_distances(self.boxes[found], (float(point[0]), float(point[1])))
+        closest = np.argsort(distances, kind='stable')[:k]
+        return found[closest], distances[closest]
+
+    def query_line(self, line, distance):
+        """Indices of the items within `distance` of a polyline, ascending."""
+        line = np.asarray(line, dtype=np.float64).reshape(-1, 2)
+        if len(line) == 1:
+            return self.query_radius(line[0], distance)
+        start, end = line[:-1], line[1:]
+        segments = np.hstack([np.minimum(start, end) - distance, np.maximum(start, end) + distance])
+        segment_index, item_index = self.search(segments)
+        close = box_segment_distances(self.boxes[item_index], start[segment_index], end[segment_index]) <= distance
+        return np.unique(item_index[close])
+
+
+class SpatialIndex:
+    """
+    An id-keyed spatial index that accepts inserts and removals.
+
+    Entries live in a packed STRTree plus a small unsorted buffer of recent
+    inserts that queries scan directly. Once the buffer (or the number of
+    removed entries still in the tree) outgrows REBUILD_MIN_PENDING or
+    REBUILD_PENDING_SHARE of the index, the tree is repacked, so a stream
+    of single inserts costs amortized O(log n) rather than a rebuild each.
+
+    Args:
+        node_capacity (int): Entries per R-tree node
+    """
+
+    def __init__(self, node_capacity=DEFAULT_NODE_CAPACITY):
+        self.node_capacity = node_capacity
+        self.rebuilds = 0
+        self._tree = STRTree(np.empty((0, 4)), node_capacity)
+        self._tree_ids = np.empty(0, dtype=object)
+        self._pending_ids = []
+        self._pending_boxes = []
+        self._boxes = {}  # id -> box, for every live entry
+        self._stale = 0  # removed or replaced entries still in the tree
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._boxes)
+
+    def __contains__(self, entry_id):
+        return entry_id in self._boxes
+
+    def insert(self, ids, boxes):
+        """Adds entries, replacing any with the same id."""
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        ids = list(ids)
+        if len(ids) != len(boxes):
+            raise ValueError(f"{len(ids)} ids for {len(boxes)} boxes")
+        with self._lock:
+            for entry_id, box in zip(ids, boxes):
+                if entry_id in self._boxes:
+                    self._stale += 1
+                self._boxes[entry_id] = box
+                self._pending_ids.append(entry_id)
+                self._pending_boxes.append(box)
+            self._maybe_rebuild()
+
+    def remove(self, ids):
+        """Removes entries by id; unknown ids are ignored."""
+        with self._lock:
+            for entry_id in ids:
+                if self._boxes.pop(entry_id, None) is not None:
+                    self._stale += 1
+            self._maybe_rebuild()
+
+    def rebuild(self):
+        """Repacks every live entry into a new tree."""
+        with self._lock:
+            self._rebuild()
+
+    def _maybe_rebuild(self):
+        threshold = max(REBUILD_MIN_PENDING, REBUILD_PENDING_SHARE * len(self._boxes))
+        if len(self._pending_ids) + self._stale > threshold:
+            self._rebuild()
+
+    def _rebuild(self):
+        ids = list(self._boxes)
+        boxes = np.array([self._boxes[entry_id] for entry_id in ids]).reshape(-1, 4)
+        self._tree = STRTree(boxes, self.node_capacity)
+        self._tree_ids = np.empty(len(ids), dtype=object)
+        self._tree_ids[:] = ids
+        self._pending_ids, self._pending_boxes = [], []
+        self._stale = 0
+        self.rebuilds += 1
+
+    def _live(self, ids, boxes):
+        # Drops tree hits whose entry was since removed or replaced
+        return [entry_id for entry_id, box in zip(ids, boxes)
+                if entry_id in self._boxes and np.array_equal(self._boxes[entry_id], box)]
+
+    def _query(self, tree_hits, pending_hit):
+        with self._lock:
+            ids = self._live(self._tree_ids[tree_hits], self._tree.boxes[tree_hits])
+            if self._pending_ids:
+                pending = np.asarray(self._pending_boxes)
+                hit = np.flatnonzero(pending_hit(pending))
+                ids += self._live([self._pending_ids[i] for i in hit], pending[hit])
+        return list(dict.fromkeys(ids))
+
+    def query_bbox(self, box):
+        """Ids of the entries intersecting an [x1, y1, x2, y2] box."""
+        box = np.asarray(box, dtype=np.float64)
+        return self._query(self._tree.query_bbox(box), lambda boxes: (
+            (boxes[:, 0] <= box[2]) & (boxes[:, 2] >= box[0]) & (boxes[:, 1] <= box[3]) & (boxes[:, 3] >= box[1])))
+
+    def query_radius(self, point, radius):
+        """Ids of the entries within `radius` of a point."""
+        return self._query(self._tree.query_radius(point, radius),
+                           lambda boxes: _box_distances(boxes, point) <= radius)
+
+    def query_line(self, line, distance):
+        """Ids of the entries within `distance` of a polyline."""
+        line = np.asarray(line, dtype=np.float64).reshape(-1, 2)
+
+        def near_line(boxes):
+            if len(line) == 1:
+                return _box_distances(boxes, line[0]) <= distance
+            count = len(line) - 1
+            box_index = np.repeat(np.arange(len(boxes)), count)
+            segment = np.tile(np.arange(count), len(boxes))
+            close = box_segment_distances(boxes[box_index], line[segment], line[segment + 1]) <= distance
+            return np.bincount(box_index[close], minlength=len(boxes)) > 0
+        return self._query(self._tree.query_line(line, distance), near_line)
+
+    def nearest(self, point, k=1):
+        """
+        Ids of the k entries closest to a point, nearest first.
+
+        Returns:
+            list: (id, distance) pairs
+        """
+        with self._lock:
+            entries = len(self._tree) + len(self._pending_ids)
+            # Over-fetch from the tree by the entries that may be stale
+            tree_hits, tree_distances = self._tree.nearest(point, min(len(self._tree), k + self._stale))
+            candidates = list(zip(self._tree_ids[tree_hits], self._tree.boxes[tree_hits], tree_distances))
+            if self._pending_ids:
+                pending = np.asarray(self._pending_boxes)
+                candidates += zip(self._pending_ids, pending, _box_distances(pending, point))
+        if not entries:
+            return []
+        best = {}
+        for entry_id, box, distance in sorted(candidates, key=lambda candidate: candidate[2]):
+            if entry_id not in best and self._live([entry_id], [box]):
+                best[entry_id] = float(distance)
+        return list(best.items())[:k]
+
+
+class DetectionIndex:
+    """
+    Spatial index over georeferenced object detections (see utils.georef).
+
+    Every detection with a 'geo_bbox', 'lat_lngs' line or 'lat_lng' point
+    is indexed by its extent in web-mercator metres. Distances passed to the
+    queries are ground metres, converted at the query's latitude.
+
+    Args:
+        detections (dict): Category name -> list of detections
+        node_capacity (int): Entries per R-tree node
+    """
+
+    def __init__(self, detections, node_capacity=DEFAULT_NODE_CAPACITY, extents=None):
+        # `extents` is the (entries, boxes) pair of _extents(detections), when already computed
+        self.entries, boxes = extents if extents is not None else self._extents(detections)
+        self.fingerprint = self._fingerprint(self.entries, boxes)
+        self.tree = STRTree(boxes, node_capacity)
+
+    @staticmethod
+    def _extents(detections):
+        entries = []
+        bbox_rows, bboxes = [], []  # detections with a 'geo_bbox'
+        vertex_rows, vertices, counts = [], [], []  # lines and points
+        for category, items in (detections or {}).items():
+            if not isinstance(items, list):
+                continue
+            for item in items:
+                if not isinstance(item, dict):
+                    continue
+                if item.get('geo_bbox'):
+                    bbox_rows.append(len(entries))
+                    bboxes.append(item['geo_bbox'])
+                elif item.get('lat_lngs'):
+                    vertex_rows.append(len(entries))
+                    vertices.extend(item['lat_lngs'])
+                    counts.append(len(item['lat_lngs']))
+                elif item.get('lat_lng'):
+                    vertex_rows.append(len(entries))
+                    vertices.append(item['lat_lng'])
+                    counts.append(1)
+                else:
+                    continue
+                entries.append((category, item))
+        boxes = np.empty((len(entries), 4))
+        if bboxes:
+            # [south, west, north, east] rows converted and projected at once
+            extents = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+            boxes[bbox_rows, :2] = mercator_metres(extents[:, :2])
+            boxes[bbox_rows, 2:] = mercator_metres(extents[:, 2:])
+        if vertices:
+            # Project every vertex at once, then reduce each detection to its box
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            projected = mercator_metres(as_points(vertices))
+            boxes[vertex_rows] = np.column_stack([
+                np.minimum.reduceat(projected[:, 0], starts), np.minimum.reduceat(projected[:, 1], starts),
+                np.maximum.reduceat(projected[:, 0], starts), np.maximum.reduceat(projected[:, 1], starts)])
+        return entries, boxes
+
+    @staticmethod
+    def _fingerprint(entries, boxes):
+        # Covers the indexed detections themselves, not only where they are,
+        # so a change of type or confidence is not answered with old items
+        digest = hashlib.blake2b(boxes.tobytes(), digest_size=16)
+        digest.update(json.dumps(entries, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _select(self, indices, categories):
+        selected = [self.entries[i] for i in indices.tolist()]
+        if categories is not None:
+            selected = [entry for entry in selected if entry[0] in categories]
+        return selected
+
+    def in_bounds(self, bounds, categories=None):
+        """(category, detection) pairs intersecting a bounds dict."""
+        return self._select(self.tree.query_bbox(_bounds_box(bounds)), categories)
+
+    def within_radius(self, lat_lng, radius_m, categories=None):
+        """(category, detection) pairs within radius_m metres of a [lat, lng] point."""
+        point = mercator_metres([lat_lng])[0]
+        return self._select(self.tree.query_radius(point, mercator_distance(radius_m, lat_lng[0])), categories)
+
+    def nearest(self, lat_lng, k=1, categories=None):
+        """The k (category, detection) pairs closest to a [lat, lng] point, nearest first."""
+        if categories is None:
+            indices, _ = self.tree.nearest(mercator_metres([lat_lng])[0], k)
+            return self._select(indices, None)
+        indices, _ = self.tree.nearest(mercator_metres([lat_lng])[0], len(self.entries))
+        return self._select(indices, categories)[:k]
+
+    def within_line(self, line, distance_m, categories=None):
+        """(category, detection) pairs within distance_m metres of a [lat, lng] polyline."""
+        line = as_points(line)
+        if len(line) == 0:
+            return []
+        latitude = float(np.abs(line[:, 0]).max())  # the largest stretch, so nothing is missed
+        indices = self.tree.query_line(mercator_metres(line), mercator_distance(distance_m, latitude))
+        return self._select(indices, categories)
+
+    def within_polygon(self, polygon, categories=None):
+        """(category, detection) pairs whose centre lies inside a [lat, lng] ring."""
+        ring = mercator_metres(polygon)
+        if len(ring) < 3:
+            return []
+        candidates = self.tree.query_bbox(np.concatenate([ring.min(axis=0), ring.max(axis=0)]))
+        boxes = self.tree.boxes[candidates]
+        inside = points_in_polygon((boxes[:, :2] + boxes[:, 2:]) / 2, ring)
+        return self._select(candidates[inside], categories)
+
+
+_detection_indexes = OrderedDict()
+_detection_indexes_lock = threading.Lock()
+
+
+def detection_index(detections, cache_key=None):
+    """
+    Returns a DetectionIndex over detections, built lazily and cached per key.
+
+    With a cache_key (e.g. the project id), the index built for that key is
+    reused as long as the indexed detections are unchanged; the most recent
+    DETECTION_INDEX_CACHE_SIZE keys are kept.
+    """
+    if cache_key is None:
+        return DetectionIndex(detections)
+    extents = DetectionIndex._extents(detections)
+    fingerprint = DetectionIndex._fingerprint(*extents)
+    with _detection_indexes_lock:
+        index = _detection_indexes.get(cache_key)
+        if index is not None and index.fingerprint == fingerprint:
+            _detection_indexes.move_to_end(cache_key)
+            return index
+    index = DetectionIndex(detections, extents=extents)
+    with _detection_indexes_lock:
+        _detection_indexes[cache_key] = index
+        _detection_indexes.move_to_end(cache_key)
+        while len(_detection_indexes) > DETECTION_INDEX_CACHE_SIZE:
+            _detection_indexes.popitem(last=False)
+    return index
+
+
+class ProjectIndex:
+    """
+    Spatial index over project footprints, by their bounding boxes.
+
+    Projects are added incrementally with add(); the underlying SpatialIndex
+    batches inserts and repacks its tree as it grows. Queries take and
+    return geographic coordinates and project ids.
+    """
+
+    def __init__(self, node_capacity=DEFAULT_NODE_CAPACITY):
+        self.index = SpatialIndex(node_capacity)
+        self.last_id = 0  # highest project id added, for loading only newer projects
+
+    def __len__(self):
+        return len(self.index)
+
+    def add(self, projects):
+        """
+        Indexes projects, replacing earlier entries with the same id.
+
+        Args:
+            projects: Iterable of (project id, [[lat, lng], ...]) pairs;
+                      projects without coordinates are skipped
+        """
+        ids, boxes = [], []
+        for project_id, coordinates in projects:
+            self.last_id = max(self.last_id, project_id)
+            points = as_points(coordinates) if coordinates else np.empty((0, 2))
+            if len(points) == 0:
+                continue
+            projected = mercator_metres(points)
+            ids.append(project_id)
+            boxes.append(np.concatenate([projected.min(axis=0), projected.max(axis=0)]))
+        if ids:
+            self.index.insert(ids, boxes)
+
+    def remove(self, project_ids):
+        self.index.remove(project_ids)
+
+    def in_bounds(self, bounds):
+        """Ids of the projects whose bounding box intersects a bounds dict."""
+        return self.index.query_bbox(_bounds_box(bounds))
+
+    def within_radius(self, lat_lng, radius_m):
+        """Ids of the projects within radius_m metres of a [lat, lng] point."""
+        point = mercator_metres([lat_lng])[0]
+        return self.index.query_radius(point, mercator_distance(radius_m, lat_lng[0]))
+
+    def nearest(self, lat_lng, k=1):
+        """
+        The k projects closest to a [lat, lng] point, nearest first.
+
+        Returns:
+            list: (project id, distance in metres) pairs
+        """
+        point = mercator_metres([lat_lng])[0]
+        scale = math.cos(math.radians(min(abs(lat_lng[0]), MAX_MERCATOR_LAT)))
+        return [(project_id, distance * scale) for project_id, distance in self.index.nearest(point, k)]
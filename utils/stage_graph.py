@@ -0,0 +1,177 @@
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+# Stage states that stop every stage depending on it
+_UNUSABLE = frozenset({'failed', 'timed_out', 'skipped', 'cancelled'})
+
+
+class StageError(Exception):
+    """
+    Raised when a fatal stage fails or times out. The remaining stages are
+    cancelled; `run` holds what had completed (see StageGraph.run).
+    """
+
+    def __init__(self, stage, message, run=None):
+        super().__init__(f"Stage '{stage}' {message}")
+        self.stage = stage
+        self.run = run
+
+
+class StageTimeoutError(StageError):
+    """Raised when a fatal stage exceeds its timeout."""
+
+
+def _timed_call(fn, args):
+    # Runs in the worker, so the duration excludes time spent queued
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+class StageGraph:
+    """
+    Runs pipeline stages concurrently in dependency order.
+
+    Stages are declared with add(), after the stages they require, so the
+    graph is acyclic by construction. A stage is called with the outputs of
+    its required stages as positional arguments and is submitted as soon as
+    they are all done, so independent stages overlap and the graph takes
+    about as long as its slowest chain.
+
+    A stage that raises or runs past its timeout (counted from submission)
+    fails. A fatal failure cancels every stage not yet finished and raises
+    StageError; a non-fatal one only skips the stages depending on it.
+    Threads cannot be interrupted, so a timed-out stage keeps running in the
+    background but its result is discarded.
+    """
+
+    def __init__(self):
+        self._stages = {}
+
+    def add(self, name, fn, requires=(), timeout=None, fatal=True):
+        """
+        Declares a stage.
+
+        Args:
+            name (str): Stage name, also the key of its output and timing
+            fn (callable): Called with the required stages' outputs; must be
+                           picklable (module-level) for a process pool
+            requires (tuple): Names of previously added stages
+            timeout (float): Seconds the stage may take, or None
+            fatal (bool): Whether a failure aborts the whole graph
+
+        Returns:
+            StageGraph: self, for chaining
+        """
+        if name in self._stages:
+            raise ValueError(f"Stage '{name}' is already defined")
+        unknown = [required for required in requires if required not in self._stages]
+        if unknown:
+            raise ValueError(f"Stage '{name}' requires undefined stage(s): {', '.join(unknown)}")
+        self._stages[name] = {'fn': fn, 'requires': tuple(requires), 'timeout': timeout, 'fatal': fatal}
+        return self
+
+    def __len__(self):
+        return len(self._stages)
+
+    def run(self, executor=None, executor_type='thread', max_workers=None):
+        """
+        Runs every stage.
+
+        Args:
+            executor (Executor): Pool to run stages on; a pool of executor_type
+                                 is created (and shut down) when None
+            executor_type (str): 'thread' or 'process'
+            max_workers (int): Size of the created pool; one per stage when None
+
+        Returns:
+            dict: {'results': output per completed stage,
+                   'timings': seconds per stage (wall time in the worker),
+                   'status': 'done'/'failed'/'timed_out'/'skipped'/'cancelled' per stage,
+                   'errors': message per failed stage,
+                   'total': wall seconds for the whole graph}
+
+        Raises:
+            StageError: If a fatal stage fails (StageTimeoutError if it timed out)
+        """
+        owned = executor is None
+        if owned:
+            if executor_type not in ('thread', 'process'):
+                raise ValueError(f"Unknown executor type: {executor_type}")
+            workers = max(1, max_workers or len(self._stages))
+            executor = (ProcessPoolExecutor(max_workers=workers) if executor_type == 'process'
+                        else ThreadPoolExecutor(max_workers=workers, thread_name_prefix='stage'))
+
+        run = {'results': {}, 'timings': {}, 'status': {name: 'pending' for name in self._stages},
+               'errors': {}, 'total': 0.0}
+        status = run['status']
+        running = {}  # future -> (stage name, deadline)
+        abandoned = False  # a timed-out stage may still be running
+        started = time.perf_counter()
+        try:
+            while True:
+                self._submit_ready(executor, run, running)
+                if not running:
+                    break
+                deadlines = [deadline for _, deadline in running.values() if deadline is not None]
+                timeout = max(0.0, min(deadlines) - time.perf_counter()) if deadlines else None
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    name, _ = running.pop(future)
+                    try:
+                        result, seconds = future.result()
+                    except Exception as e:
+                        self._fail(run, name, 'failed', f"failed: {e}", error=e)
+                        continue
+                    run['results'][name] = result
+                    run['timings'][name] = round(seconds, 4)
+                    status[name] = 'done'
+
+                now = time.perf_counter()
+                for future, (name, deadline) in list(running.items()):
+                    if deadline is not None and now >= deadline:
+                        del running[future]
+                        if not future.cancel():
+                            abandoned = True
+                        run['timings'][name] = self._stages[name]['timeout']
+                        self._fail(run, name, 'timed_out', f"timed out after {self._stages[name]['timeout']}s")
+        finally:
+            for future, (name, _) in running.items():
+                future.cancel()
+                status[name] = 'cancelled'
+            for name, state in status.items():
+                if state == 'pending':
+                    status[name] = 'cancelled'
+            run['total'] = round(time.perf_counter() - started, 4)
+            if owned:
+                executor.shutdown(wait=not (running or abandoned), cancel_futures=True)
+        return run
+
+    def _submit_ready(self, executor, run, running):
+        status = run['status']
+        for name, stage in self._stages.items():
+            if status[name] != 'pending':
+                continue
+            required = [status[dependency] for dependency in stage['requires']]
+            if any(state in _UNUSABLE for state in required):
+                status[name] = 'skipped'
+            elif all(state == 'done' for state in required):
+                args = [run['results'][dependency] for dependency in stage['requires']]
+                future = executor.submit(_timed_call, stage['fn'], args)
+                deadline = time.perf_counter() + stage['timeout'] if stage['timeout'] is not None else None
+                running[future] = (name, deadline)
+                status[name] = 'running'
+
+    def _fail(self, run, name, state, message, error=None):
+        run['status'][name] = state
+        run['errors'][name] = message
+        if not self._stages[name]['fatal']:
+            logger.warning(f"Stage '{name}' {message}; its dependants are skipped")
+            return
+        logger.error(f"Stage '{name}' {message}; cancelling the remaining stages")
+        error_type = StageTimeoutError if state == 'timed_out' else StageError
+        raise error_type(name, message, run) from error
@@ -0,0 +1,57 @@
+import logging
+
+import numpy as np
+
+from utils.geometry import as_points
+
+logger = logging.getLogger(__name__)
+
+STATIC_MAP_URL = "https://maps.googleapis.com/maps/api/staticmap"
+
+
+def encode_polyline(coordinates, precision=5):
+    """
+    Encodes [lat, lng] pairs with Google's encoded polyline algorithm.
+
+    All vertices are encoded at once: values are delta/zigzag coded and split
+    into 5-bit chunks with array operations rather than per-character loops.
+
+    Args:
+        coordinates: (N, 2) array-like of [lat, lng]
+        precision (int): Decimal places kept (5 for the Maps APIs)
+
+    Returns:
+        str: The encoded polyline
+    """
+    points = as_points(coordinates)
+    if len(points) == 0:
+        return ''
+    scaled = np.round(points * 10 ** precision).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+
+    # Up to 7 chunks of 5 bits each cover a 32-bit value
+    shifts = np.arange(7, dtype=np.int64) * 5
+    chunks = (values[:, None] >> shifts) & 0x1F
+    chunk_count = 1 + (values[:, None] >= (np.int64(1) << shifts[1:])).sum(axis=1)
+    index = np.arange(7)[None, :]
+    used = index < chunk_count[:, None]
+    continuation = index < (chunk_count[:, None] - 1)
+    encoded = (chunks | np.where(continuation, 0x20, 0)) + 63
+    return encoded[used].astype(np.uint8).tobytes().decode('ascii')
+
+
+def decode_polyline(encoded, precision=5):
+    """Decodes a Google encoded polyline into an (N, 2) array of [lat, lng]."""
+    values = []
+    current = shift = 0
+    for char in encoded.encode('ascii'):
+        chunk = char - 63
+        current |= (chunk & 0x1F) << shift
+        shift += 5
+        if not chunk & 0x20:
+            values.append(~(current >> 1) if current & 1 else current >> 1)
+            current = shift = 0
+    deltas = np.asarray(values, dtype=np.int64).reshape(-1, 2)
+    return np.cumsum(deltas, axis=0) / 10 ** precision
+
@@ -0,0 +1,239 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Request parameters that do not change the returned image
+_VOLATILE_PARAMS = frozenset({'key', 'signature'})
+
+_MAGIC = b'GSTILE1\n'
+
+
+def tile_key(base_url, params, precision=6):
+    """
+    Returns the content address (SHA-256 hex digest) of an imagery request.
+
+    The request is normalized before hashing: credentials are dropped,
+    parameter names are sorted and numeric values are rounded to `precision`
+    decimals, so the same bounds, size, map type, zoom and overlay always map
+    to the same entry whichever API key or parameter order produced them.
+
+    Args:
+        base_url (str): Imagery endpoint
+        params (dict): Request parameters
+        precision (int): Decimal places kept for float parameters
+
+    Returns:
+        str: The cache key
+    """
+    normalized = {}
+    for name, value in params.items():
+        if name in _VOLATILE_PARAMS or value is None:
+            continue
+        if isinstance(value, float):
+            value = round(value, precision)
+        normalized[name] = str(value)
+    canonical = json.dumps([base_url, normalized], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class CachedTile:
+    """
+    A cache entry mapped into memory.
+
+    `data` is a read-only memoryview over the mmapped file, so the image bytes
+    are paged in by the OS and never copied into a Python bytes object. The
+    mapping stays valid after the entry is evicted or replaced on disk.
+    """
+
+    __slots__ = ('key', 'content_type', 'data', '_map')
+
+    def __init__(self, key, content_type, mapped, offset):
+        self.key = key
+        self.content_type = content_type
+        self._map = mapped
+        self.data = memoryview(mapped)[offset:]
+
+    def __len__(self):
+        return len(self.data)
+
+
+class TileCache:
+    """
+    Content-addressed on-disk cache for fetched imagery.
+
+    Entries live under `root` in two-level fan-out directories named by
+    tile_key. Writes go through a temporary file and an atomic rename, so
+    several worker processes can share one directory without readers ever
+    seeing a partial image. The file atime records the last access and the
+    least recently used entries are evicted once the directory exceeds
+    `max_bytes`. Hit/miss counters are per process.
+
+    Args:
+        root (str): Cache directory
+        max_bytes (int): Size budget for all entries
+    """
+
+    suffix = '.tile'
+
+    def __init__(self, root, max_bytes=512 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._size_estimate = None
+        self._counters = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0, 'bytes_served': 0}
+
+    def __getstate__(self):
+        # Counters are per process; a pickled copy (process pool) starts fresh
+        return {'root': self.root, 'max_bytes': self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(state['root'], state['max_bytes'])
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key + self.suffix)
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            self._counters[counter] += amount
+
+    def get(self, key):
+        """Returns the CachedTile for a key, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):  # ValueError: empty file
+            self._count('misses')
+            return None
+
+        header_end = mapped.find(b'\n', len(_MAGIC))
+        if mapped[:len(_MAGIC)] != _MAGIC or header_end < 0:
+            logger.warning(f"Discarding unreadable tile cache entry {key}")
+            mapped.close()
+            self._remove(path)
+            self._count('misses')
+            return None
+
+        try:
+            os.utime(path, (time.time(), stat.st_mtime))
+        except FileNotFoundError:
+            pass  # Evicted by another worker; the mapping is still valid
+        tile = CachedTile(key, mapped[len(_MAGIC):header_end].decode('ascii'), mapped, header_end + 1)
+        self._count('hits')
+        self._count('bytes_served', len(tile))
+        return tile
+
+    def put(self, key, content, content_type):
+        """Stores image bytes under a key, replacing any existing entry atomically."""
+        if not content:
+            return
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_MAGIC + content_type.encode('ascii') + b'\n')
+                f.write(content)
+            os.replace(tmp_path, path)
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+        self._count('writes')
+
+        with self._lock:
+            if self._size_estimate is not None:
+                self._size_estimate += len(content)
+            needs_scan = self._size_estimate is None or self._size_estimate > self.max_bytes
+        if needs_scan:
+            self._evict()
+
+    def _entries(self):
+        entries = []
+        with os.scandir(self.root) as shards:
+            for shard in shards:
+                if not shard.is_dir():
+                    continue
+                with os.scandir(shard.path) as it:
+                    for entry in it:
+                        if entry.name.endswith(self.suffix):
+                            try:
+                                stat = entry.stat()
+                            except FileNotFoundError:
+                                continue
+                            entries.append((stat.st_atime, stat.st_size, entry.path))
+        return entries
+
+    def _evict(self):
+        # Other workers write to the same directory, so the budget is checked
+        # against a fresh scan rather than this process's running estimate
+        entries = self._entries()
+        total = sum(e[1] for e in entries)
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if self._remove(path):
+                evicted += 1
+            total -= size
+        with self._lock:
+            self._size_estimate = total
+            self._counters['evictions'] += evicted
+        if evicted:
+            logger.info(f"Evicted {evicted} imagery tile(s) from {self.root}")
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def size_bytes(self):
+        return sum(e[1] for e in self._entries())
+
+    def __len__(self):
+        return len(self._entries())
+
+    def stats(self):
+        """Returns hit/miss/write/eviction counters for this process."""
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters['hits'] + counters['misses']
+        counters['hit_rate'] = round(counters['hits'] / lookups, 4) if lookups else None
+        return counters
+
+
+_tile_cache = None
+_tile_cache_lock = threading.Lock()
+
+_DEFAULT_TILE_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                       'instance', 'tile_cache')
+
+
+def get_tile_cache():
+    """
+    Returns the process-wide imagery tile cache, creating it on first use from
+    TILE_CACHE_DIR and TILE_CACHE_MAX_BYTES, or None when TILE_CACHE_DIR is 'none'.
+    """
+    global _tile_cache
+    with _tile_cache_lock:
+        root = os.environ.get('TILE_CACHE_DIR', _DEFAULT_TILE_CACHE_DIR)
+        if root == 'none':
+            return None
+        if _tile_cache is None:
+            _tile_cache = TileCache(
+                root,
+                max_bytes=int(os.environ.get('TILE_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+            )
+        return _tile_cache
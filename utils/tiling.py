@@ -0,0 +1,501 @@
+import logging
+import math
+
+import numpy as np
+
+from utils.geometry import as_points
+from utils.land_cover import MAP_DATA_MAX_SIDE
+from utils.raster import LAND_COVER_CLASSES, ClassMap
+
+logger = logging.getLogger(__name__)
+
+# Web-mercator world size in pixels at zoom 0 (Static Maps, scale=1)
+WORLD_TILE_PX = 256
+# Ground resolution in metres per pixel at the equator at zoom 0
+EQUATOR_RESOLUTION_M = 2 * math.pi * 6378137.0 / WORLD_TILE_PX
+MAX_MERCATOR_LAT = 85.05112878
+MAX_ZOOM = 21
+
+# Static Maps returns at most 640x640 pixels at scale=1
+DEFAULT_TILE_SIZE = (640, 640)
+
+
+def lat_lng_to_pixels(coordinates, zoom):
+    """
+    Projects [lat, lng] degrees to global web-mercator pixel coordinates.
+
+    Args:
+        coordinates: (N, 2) array-like of [lat, lng]
+        zoom (int): Zoom level
+
+    Returns:
+        numpy.ndarray: (N, 2) array of [x, y], y growing southwards
+    """
+    points = as_points(coordinates)
+    world = WORLD_TILE_PX * 2 ** zoom
+    lat = np.radians(np.clip(points[:, 0], -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT))
+    x = (points[:, 1] + 180.0) / 360.0 * world
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / np.pi) / 2.0 * world
+    return np.column_stack([x, y])
+
+
+def pixels_to_lat_lng(pixels, zoom):
+    """Inverse of lat_lng_to_pixels: global pixel [x, y] to [lat, lng] degrees."""
+    pixels = np.asarray(pixels, dtype=np.float64).reshape(-1, 2)
+    world = WORLD_TILE_PX * 2 ** zoom
+    lng = pixels[:, 0] / world * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1.0 - 2.0 * pixels[:, 1] / world))))
+    return np.column_stack([lat, lng])
+
+
+def ground_resolution_m(latitude, zoom):
+    """Metres per pixel at a latitude and zoom level."""
+    return EQUATOR_RESOLUTION_M * math.cos(math.radians(latitude)) / 2 ** zoom
+
+
+def zoom_for_resolution(target_resolution_m, latitude):
+    """Lowest zoom level whose ground resolution is at least as fine as the target."""
+    scale = EQUATOR_RESOLUTION_M * math.cos(math.radians(latitude)) / target_resolution_m
+    return int(min(MAX_ZOOM, max(0, math.ceil(math.log2(max(scale, 1e-12))))))
+
+
+def _clip_half_plane(points, axis, bound, keep_greater):
+    # One Sutherland-Hodgman pass, vectorized over all polygon edges: for every
+    # edge (prev -> cur) emit the crossing point when the edge crosses the
+    # boundary, then cur when it lies inside.
+    if len(points) == 0:
+        return points
+    inside = points[:, axis] >= bound if keep_greater else points[:, axis] <= bound
+    previous = np.roll(points, 1, axis=0)
+    previous_inside = np.roll(inside, 1)
+    crossing = inside != previous_inside
+    delta = points[:, axis] - previous[:, axis]
+    t = np.divide(bound - previous[:, axis], delta, out=np.zeros(len(points)), where=crossing)
+    crossings = previous + t[:, None] * (points - previous)
+
+    out = np.empty((2 * len(points), 2))
+    keep = np.empty(2 * len(points), dtype=bool)
+    out[0::2], keep[0::2] = crossings, crossing
+    out[1::2], keep[1::2] = points, inside
+    return out[keep]
+
+
+def clipped_polygon_area(points, box):
+    """
+    Area of a polygon (pixel coordinates) inside an axis-aligned box.
+
+    Args:
+        points: (N, 2) ring vertices
+        box: (x0, y0, x1, y1)
+
+    Returns:
+        float: Intersection area in square pixels
+    """
+    x0, y0, x1, y1 = box
+    clipped = _clip_half_plane(points, 0, x0, True)
+    clipped = _clip_half_plane(clipped, 0, x1, False)
+    clipped = _clip_half_plane(clipped, 1, y0, True)
+    clipped = _clip_half_plane(clipped, 1, y1, False)
+    if len(clipped) < 3:
+        return 0.0
+    x, y = clipped[:, 0], clipped[:, 1]
+    return float(abs(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y)) / 2.0)
+
+
+def clipped_line_length(points, box):
+    """
+    Length of a polyline (pixel coordinates) inside an axis-aligned box.
+
+    Liang-Barsky clipping of all segments at once.
+    """
+    if len(points) < 2:
+        return 0.0
+    x0, y0, x1, y1 = box
+    start, end = points[:-1], points[1:]
+    delta = end - start
+    t_enter = np.zeros(len(start))
+    t_exit = np.ones(len(start))
+    for p, q in ((-delta[:, 0], start[:, 0] - x0), (delta[:, 0], x1 - start[:, 0]),
+                 (-delta[:, 1], start[:, 1] - y0), (delta[:, 1], y1 - start[:, 1])):
+        parallel = p == 0
+        outside = parallel & (q < 0)
+        t_exit[outside] = -1.0
+        ratio = np.divide(q, p, out=np.zeros(len(p)), where=~parallel)
+        t_enter = np.where(~parallel & (p < 0), np.maximum(t_enter, ratio), t_enter)
+        t_exit = np.where(~parallel & (p > 0), np.minimum(t_exit, ratio), t_exit)
+    fraction = np.clip(t_exit - t_enter, 0.0, None)
+    return float(np.sum(fraction * np.hypot(delta[:, 0], delta[:, 1])))
+
+
+def line_box_distance(points, box):
+    """
+    Shortest distance between a polyline and an axis-aligned box (0 when the
+    line enters the box). All segments are measured at once.
+    """
+    if len(points) == 1:
+        points = np.vstack([points, points])
+    if clipped_line_length(points, box) > 0.0:
+        return 0.0
+    x0, y0, x1, y1 = box
+    # Separated convex shapes: the closest pair involves a segment endpoint or a box corner
+    dx = np.maximum.reduce([x0 - points[:, 0], np.zeros(len(points)), points[:, 0] - x1])
+    dy = np.maximum.reduce([y0 - points[:, 1], np.zeros(len(points)), points[:, 1] - y1])
+    endpoint_distance = np.hypot(dx, dy).min()
+    corners = np.array([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], dtype=np.float64)
+    corner_distance = _point_segment_distances(corners, points[:-1], points[1:]).min()
+    return float(min(endpoint_distance, corner_distance))
+
+
+def _point_segment_distances(query, start, end):
+    # (Q, S) distances from query points to segments start[i]-end[i]
+    delta = end - start
+    length_sq = np.einsum('ij,ij->i', delta, delta)
+    relative = query[:, None, :] - start[None, :, :]
+    t = np.divide(np.einsum('qsj,sj->qs', relative, delta), length_sq,
+                  out=np.zeros((len(query), len(start))), where=length_sq > 0)
+    nearest = start[None, :, :] + np.clip(t, 0.0, 1.0)[..., None] * delta[None, :, :]
+    return np.hypot(*(query[:, None, :] - nearest).transpose(2, 0, 1))
+
+
+def corridor_mask(tile, plan):
+    """
+    Boolean (height, width) mask of the tile pixels inside a plan's corridor.
+
+    Pixel centres are measured against the alignment segments that come
+    within reach of the tile, keeping a running minimum so memory stays at
+    one float32 image per tile.
+
+    Args:
+        tile (dict): A tile from plan['tiles']
+        plan (dict): A plan made with corridor_m
+
+    Returns:
+        numpy.ndarray: The mask, True inside the corridor
+    """
+    corridor = plan['corridor']
+    half_width = corridor['half_width_px']
+    x0, y0, x1, y1 = tile['pixel_box']
+    width, height = int(round(x1 - x0)), int(round(y1 - y0))
+    # Work in tile-local pixels so float32 keeps sub-pixel precision at high zoom
+    line = (np.asarray(corridor['line_px'], dtype=np.float64) + np.asarray(plan['origin_px'])
+            - np.array([x0, y0]))
+    x0, y0, x1, y1 = 0.0, 0.0, float(width), float(height)
+    xs = (np.arange(width) + 0.5).astype(np.float32)
+    ys = (np.arange(height) + 0.5).astype(np.float32)[:, None]
+
+    if len(line) == 1:
+        line = np.vstack([line, line])
+    start, end = line[:-1], line[1:]
+    lo = np.minimum(start, end) - half_width
+    hi = np.maximum(start, end) + half_width
+    near = (lo[:, 0] <= x1) & (hi[:, 0] >= x0) & (lo[:, 1] <= y1) & (hi[:, 1] >= y0)
+
+    best = np.full((height, width), np.inf, dtype=np.float32)
+    for ax, ay, bx, by in np.hstack([start[near], end[near]]).tolist():
+        dx, dy = bx - ax, by - ay
+        length_sq = dx * dx + dy * dy
+        if length_sq == 0:
+            distance_sq = (xs - ax) ** 2 + (ys - ay) ** 2
+        else:
+            t = np.clip(((xs - ax) * dx + (ys - ay) * dy) / length_sq, 0.0, 1.0)
+            distance_sq = (xs - (ax + t * dx)) ** 2 + (ys - (ay + t * dy)) ** 2
+        np.minimum(best, distance_sq, out=best)
+    return best <= half_width ** 2
+
+
+def _grid(span, size, stride):
+    # Number of tiles needed to cover `span` pixels with the given stride
+    return max(1, math.ceil(max(span - size, 0) / stride) + 1)
+
+
+def plan_tiles(coordinates, target_resolution_m=1.2, tile_size=DEFAULT_TILE_SIZE, overlap_px=32,
+               max_tiles=64, closed=None, max_candidates=4096, corridor_m=None):
+    """
+    Cuts a project geometry into a grid of web-mercator imagery tiles.
+
+    The zoom level is chosen from the target ground resolution at the
+    geometry's mean latitude and lowered until at most `max_tiles` tiles are
+    needed. Neighbouring tiles overlap by `overlap_px` so that objects on a
+    seam are seen whole by at least one tile. Every tile owns a
+    non-overlapping cell of the grid; tiles whose cell does not intersect the
+    polygon (or, for open lines, that the line does not pass through) are
+    discarded, and the rest carry the intersection area or length as their
+    merge weight.
+
+    With `corridor_m`, an open line is treated as a right-of-way corridor of
+    that total width: tiles are kept when their cell lies within half the
+    width of the alignment, and the plan records the half-width in pixels so
+    that corridor_mask can restrict analysis to the buffered pixels.
+
+    Args:
+        coordinates (list): [lat, lng] pairs
+        target_resolution_m (float): Desired metres per pixel
+        tile_size (tuple): (width, height) of each tile in pixels
+        overlap_px (int): Overlap between neighbouring tiles in pixels
+        max_tiles (int): Upper bound on kept tiles
+        closed (bool): Treat as a polygon; inferred as len(coordinates) > 2 when None
+        max_candidates (int): Upper bound on grid cells examined per zoom level
+        corridor_m (float): Right-of-way width for open lines
+
+    Returns:
+        dict: Plan with 'zoom', 'resolution_m', 'tile_size', 'overlap_px',
+              'origin_px', 'candidates', 'discarded', 'closed', 'corridor' and the kept 'tiles'
+    """
+    points = as_points(coordinates)
+    if len(points) == 0:
+        raise ValueError("Cannot plan tiles for an empty geometry")
+    if closed is None:
+        closed = len(points) > 2
+    width, height = tile_size
+    stride_x, stride_y = width - overlap_px, height - overlap_px
+    if stride_x <= 0 or stride_y <= 0:
+        raise ValueError("Tile overlap must be smaller than the tile size")
+    latitude = float(points[:, 0].mean())
+    corridor = corridor_m is not None and not closed
+
+    zoom = zoom_for_resolution(target_resolution_m, latitude)
+    while True:
+        pixels = lat_lng_to_pixels(points, zoom)
+        half_width_px = corridor_m / 2 / ground_resolution_m(latitude, zoom) if corridor else 0.0
+        origin = pixels.min(axis=0) - half_width_px
+        span = pixels.max(axis=0) + half_width_px - origin
+        columns, rows = _grid(span[0], width, stride_x), _grid(span[1], height, stride_y)
+        if columns * rows <= max_candidates or zoom == 0:
+            tiles = _keep_intersecting(pixels, origin, columns, rows, tile_size, overlap_px, closed, zoom,
+                                       half_width_px if corridor else None)
+            if len(tiles) <= max_tiles or zoom == 0:
+                break
+        zoom -= 1
+
+    resolution = ground_resolution_m(latitude, zoom)
+    if resolution > target_resolution_m * 1.01:
+        logger.info(f"Tile plan coarsened to zoom {zoom} ({resolution:.2f} m/px) to stay within {max_tiles} tiles")
+    return {
+        'zoom': zoom,
+        'resolution_m': round(resolution, 3),
+        'tile_size': [width, height],
+        'overlap_px': overlap_px,
+        'origin_px': origin.tolist(),
+        'candidates': columns * rows,
+        'discarded': columns * rows - len(tiles),
+        'closed': closed,
+        'corridor': {'width_m': corridor_m, 'half_width_px': round(half_width_px, 3),
+                     'line_px': (pixels - origin).round(3).tolist()} if corridor else None,
+        'tiles': tiles
+    }
+
+
+def _keep_intersecting(pixels, origin, columns, rows, tile_size, overlap_px, closed, zoom, half_width_px=None):
+    width, height = tile_size
+    stride_x, stride_y = width - overlap_px, height - overlap_px
+    tiles = []
+    for row in range(rows):
+        for column in range(columns):
+            x0, y0 = origin[0] + column * stride_x, origin[1] + row * stride_y
+            # The cell a tile owns ends where the next tile's cell starts
+            cell = (x0, y0,
+                    x0 + (stride_x if column < columns - 1 else width),
+                    y0 + (stride_y if row < rows - 1 else height))
+            if half_width_px is not None:
+                if line_box_distance(pixels, cell) > half_width_px:
+                    continue
+                # Upper bound of the corridor area in the cell; refined from the mask when analysed
+                weight = float((cell[2] - cell[0]) * (cell[3] - cell[1]))
+            else:
+                if closed:
+                    weight = clipped_polygon_area(pixels, cell)
+                else:
+                    weight = clipped_line_length(pixels, cell)
+                if weight <= 0.0 and not (len(pixels) == 1 and column == row == 0):
+                    continue
+            box = [x0, y0, x0 + width, y0 + height]
+            corners = pixels_to_lat_lng([[box[0], box[1]], [box[2], box[3]]], zoom)
+            center = pixels_to_lat_lng([[x0 + width / 2, y0 + height / 2]], zoom)[0]
+            tiles.append({
+                'index': len(tiles),
+                'row': row,
+                'column': column,
+                'zoom': zoom,
+                'center': [round(float(center[0]), 7), round(float(center[1]), 7)],
+                'pixel_box': box,
+                'cell_box': list(cell),
+                'bounds': {
+                    'north': float(corners[0, 0]),
+                    'south': float(corners[1, 0]),
+                    'east': float(corners[1, 1]),
+                    'west': float(corners[0, 1])
+                },
+                'weight': max(weight, 1.0)
+            })
+    return tiles
+
+
+class LandCoverMerger:
+    """
+    Folds per-tile land cover results into one area-weighted result.
+
+    Only running weighted sums are kept, so tiles can be merged as they
+    finish and their results dropped. Given the plan's tiles, each tile's
+    class map is also pasted, by its pixel_box, onto one coarse mosaic over
+    the tiles' extent, at most MAP_DATA_MAX_SIDE pixels on a side; ground no
+    tile covered is coded 'not_analysed'.
+
+    Args:
+        tiles (list): The plan's tiles (see plan_tiles), to build the merged map_data
+    """
+
+    def __init__(self, tiles=None):
+        self.total_weight = 0.0
+        self.tiles = 0
+        self._percentages = {}
+        self._details = {}
+        self._confidence = 0.0
+        self._template = None
+        self._mosaic = None
+        self._mapped = 0
+        if tiles:
+            boxes = np.asarray([tile['pixel_box'] for tile in tiles], dtype=np.float64)
+            self._origin = boxes[:, :2].min(axis=0)
+            self._end = boxes[:, 2:].max(axis=0)
+            span = self._end - self._origin
+            self._step = max(1.0, math.ceil(span.max() / MAP_DATA_MAX_SIDE))
+            columns, rows = (int(math.ceil(side / self._step)) for side in span)
+            self._mosaic = np.full((rows, columns), len(LAND_COVER_CLASSES), dtype=np.uint8)
+
+    def add(self, land_cover, weight, tile=None):
+        if self._template is None:
+            self._template = land_cover
+        self.tiles += 1
+        self.total_weight += weight
+        self._confidence += weight * land_cover.get('confidence_score', 0.0)
+        for name, values in land_cover.get('classifications', {}).items():
+            if not isinstance(values, dict):
+                continue
+            self._percentages[name] = self._percentages.get(name, 0.0) + weight * values.get('percentage', 0.0)
+            details = self._details.setdefault(name, {})
+            for detail, percentage in values.get('details', {}).items():
+                details[detail] = details.get(detail, 0.0) + weight * percentage
+        if self._mosaic is not None and tile is not None and land_cover.get('map_data'):
+            self._paste(ClassMap.from_json(land_cover['map_data']).codes, tile)
+
+    def _paste(self, codes, tile):
+        # Mosaic pixels whose centres fall in the cell the tile owns take the
+        # code of the nearest pixel of the tile's map, which spans its pixel_box.
+        # Centres past the extent (the last mosaic pixel overhangs it) are pulled back in.
+        x0, y0, x1, y1 = tile['pixel_box']
+        cx0, cy0, cx1, cy1 = tile.get('cell_box', tile['pixel_box'])
+        rows, columns = self._mosaic.shape
+        xs = np.minimum(self._origin[0] + (np.arange(columns) + 0.5) * self._step, self._end[0] - 0.5)
+        ys = np.minimum(self._origin[1] + (np.arange(rows) + 0.5) * self._step, self._end[1] - 0.5)
+        inside_x = np.flatnonzero((xs >= cx0) & (xs < cx1))
+        inside_y = np.flatnonzero((ys >= cy0) & (ys < cy1))
+        if len(inside_x) == 0 or len(inside_y) == 0:
+            return
+        height, width = codes.shape
+        source_x = np.clip(((xs[inside_x] - x0) / (x1 - x0) * width).astype(np.int64), 0, width - 1)
+        source_y = np.clip(((ys[inside_y] - y0) / (y1 - y0) * height).astype(np.int64), 0, height - 1)
+        self._mosaic[np.ix_(inside_y, inside_x)] = codes[np.ix_(source_y, source_x)]
+        self._mapped += 1
+
+    def result(self, plan=None):
+        if self._template is None:
+            return None
+        total = self.total_weight or 1.0
+        merged = {key: value for key, value in self._template.items()
+                  if key not in ('classifications', 'confidence_score', 'map_data', 'pixels_classified')}
+        merged['classifications'] = {
+            name: {
+                'percentage': round(weighted / total, 2),
+                'details': {detail: round(value / total, 2) for detail, value in self._details[name].items()}
+            }
+            for name, weighted in self._percentages.items()
+        }
+        merged['confidence_score'] = round(self._confidence / total, 3)
+        if self._mapped:
+            merged['map_data'] = ClassMap(self._mosaic, LAND_COVER_CLASSES + ('not_analysed',)).to_json()
+        else:
+            merged['map_status'] = ('No classification map: no analysed tile returned one.' if self._mosaic is not None
+                                    else 'No classification map: tile positions were not given.')
+        if plan is not None:
+            merged['tiling'] = {
+                'tiles': self.tiles,
+                'zoom': plan['zoom'],
+                'resolution_m': plan['resolution_m']
+            }
+        return merged
+
+
+def _box_of(item):
+    if 'bbox' in item:
+        return [float(v) for v in item['bbox']]
+    points = np.asarray(item.get('points', []), dtype=np.float64).reshape(-1, 2)
+    if len(points) == 0:
+        return None
+    return [*points.min(axis=0).tolist(), *points.max(axis=0).tolist()]
+
+
+class ObjectMerger:
+    """
+    Folds per-tile detections into one set in mosaic pixel coordinates.
+
+    Boxes and point lists are shifted from tile to mosaic coordinates (the
+    plan origin is 0, 0). Objects of the same category and type whose boxes
+    overlap by more than `iou_threshold` are duplicates seen by two
+    overlapping tiles; the most confident one is kept. Duplicates are
+    resolved once in result() with the grid-based non_max_suppression, so
+    only boxes near each other are ever compared.
+    """
+
+    def __init__(self, origin_px, iou_threshold=0.5):
+        self.origin = np.asarray(origin_px, dtype=np.float64)
+        self.iou_threshold = iou_threshold
+        self.duplicates = 0
+        self._items = {}
+        self._template = None
+
+    def add(self, detections, tile):
+        if self._template is None:
+            self._template = detections
+        offset = np.asarray(tile['pixel_box'][:2]) - self.origin
+        for category, items in detections.items():
+            if not isinstance(items, list):
+                continue
+            self._items.setdefault(category, []).extend(self._shifted(item, offset) for item in items)
+
+    @staticmethod
+    def _shifted(item, offset):
+        item = dict(item)
+        if 'bbox' in item:
+            x1, y1, x2, y2 = item['bbox']
+            item['bbox'] = [round(x1 + offset[0], 1), round(y1 + offset[1], 1),
+                            round(x2 + offset[0], 1), round(y2 + offset[1], 1)]
+        if 'points' in item:
+            item['points'] = [[round(x + offset[0], 1), round(y + offset[1], 1)] for x, y in item['points']]
+        return item
+
+    def _deduplicated(self, items):
+        # Imported here: utils.object_detection depends on this module through utils.georef
+        from utils.object_detection import non_max_suppression
+
+        boxed = [(position, _box_of(item)) for position, item in enumerate(items)]
+        boxed = [(position, box) for position, box in boxed if box is not None]
+        if not boxed:
+            return items
+        positions = np.array([position for position, _ in boxed])
+        types = {}
+        classes = [types.setdefault(items[position].get('type'), len(types)) for position in positions]
+        keep = non_max_suppression([box for _, box in boxed],
+                                   [items[position].get('confidence', 0) for position in positions],
+                                   classes=classes, iou_threshold=self.iou_threshold)
+        self.duplicates += len(boxed) - len(keep)
+        dropped = set(positions.tolist()) - set(positions[keep].tolist())
+        return [item for position, item in enumerate(items) if position not in dropped]
+
+    def result(self):
+        if self._template is None:
+            return None
+        merged = {key: value for key, value in self._template.items() if not isinstance(value, list)}
+        self.duplicates = 0
+        merged.update({category: self._deduplicated(items) for category, items in self._items.items()})
+        merged['duplicates_removed'] = self.duplicates
+        return merged